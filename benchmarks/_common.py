@@ -0,0 +1,23 @@
+"""Harness shared by the benchmarks: their command line."""
+
+import argparse
+
+
+def parse_args(doc: str | None, **options: tuple[type, object, str]) -> argparse.Namespace:
+    """Parse the command line of a benchmark.
+
+    The description is the first line of the benchmark's docstring. Each
+    keyword adds an option, named with dashes for its underscores, from
+    ``(type, default, help)``; an option whose default is a list takes one
+    or more values.
+    """
+    parser = argparse.ArgumentParser(description=doc.splitlines()[0] if doc else None)
+    for name, (type_, default, help_) in options.items():
+        parser.add_argument(
+            "--" + name.replace("_", "-"),
+            type=type_,
+            nargs="+" if isinstance(default, list) else None,
+            default=default,
+            help=help_,
+        )
+    return parser.parse_args()
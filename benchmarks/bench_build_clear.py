@@ -0,0 +1,91 @@
+"""Benchmark: building, solving and clearing large sketches.
+
+Times the phases of a sketch's life separately on a chain of dimensioned
+line segments forming a staircase:
+
+- ``build``: adding the geometry and constraints,
+- ``solve``: a solve after changing one dimension,
+- ``clear``: ``Sketch.clear()``, which tears down every constraint,
+- ``clear geometry``: ``Sketch.clear()`` of the same chain without its
+  constraints.
+
+The difference between the two clears is what the constraints cost to tear
+down, apart from the geometry tables of the sketch.
+
+Run with::
+
+    python benchmarks/bench_build_clear.py [--segments 100000] [--repeat 5]
+"""
+
+import time
+
+from _common import parse_args
+
+from planegcs import Sketch, SolveStatus
+
+
+def build_chain(segments: int, constrained: bool = True) -> tuple[Sketch, list]:
+    s = Sketch()
+    prev = s.add_fixed_point(0, 0)
+    dims = []
+    for i in range(segments):
+        # a staircase: vertical and horizontal unit segments, perturbed
+        p = s.add_point((i + 1) // 2 + 0.1 * (i % 3), (i + 2) // 2 - 0.1 * (i % 2))
+        line = s.add_line(prev, p)
+        d = s.add_param(1.0)
+        if constrained:
+            if i % 2:
+                s.horizontal(line)
+            else:
+                s.vertical(line)
+            s.p2p_distance(prev, p, d)
+        dims.append(d)
+        prev = p
+    return s, dims
+
+
+def time_clear(segments: int, constrained: bool) -> float:
+    s, _ = build_chain(segments, constrained)
+    start = time.perf_counter()
+    s.clear()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__,
+        segments=(int, 100000, "segments in the chain"),
+        solve_segments=(int, 500, "segments in the solved chain"),
+        repeat=(int, 5, "best of this many runs"),
+    )
+
+    build = clear = clear_geometry = solve = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        s, _ = build_chain(args.segments)
+        build = min(build, time.perf_counter() - start)
+        start = time.perf_counter()
+        s.clear()
+        clear = min(clear, time.perf_counter() - start)
+        clear_geometry = min(clear_geometry, time_clear(args.segments, constrained=False))
+
+        s, dims = build_chain(args.solve_segments)
+        assert s.solve() == SolveStatus.Success
+        s.set_param(dims[len(dims) // 2], 1.5)
+        start = time.perf_counter()
+        assert s.solve() == SolveStatus.Success
+        solve = min(solve, time.perf_counter() - start)
+
+    rows = [
+        (f"build ({args.segments} segments)", build),
+        (f"clear ({args.segments} segments)", clear),
+        (f"clear geometry ({args.segments} segments)", clear_geometry),
+        ("  of which constraints", clear - clear_geometry),
+        (f"solve ({args.solve_segments} segments)", solve),
+    ]
+    for label, seconds in rows:
+        print(f"{label + ':':40} {seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
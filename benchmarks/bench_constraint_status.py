@@ -0,0 +1,50 @@
+"""Benchmark: checking constraints added to a large diagnosed sketch.
+
+The sketch is the truss of ``bench_diagnose_repeat`` with a free point per
+bay. After one diagnosis, each bay gets a new distance to its free point,
+and ``Sketch.constraint_status()`` is called after every addition, as an
+editor would to flag the constraint just added. Compares this with a full
+diagnosis after every addition.
+
+Run with::
+
+    python benchmarks/bench_constraint_status.py [--constraints 400] [--added 20]
+"""
+
+import time
+
+from _common import parse_args
+from bench_diagnose_repeat import build_truss
+
+from planegcs import ConstraintStatus, Sketch
+
+
+def add_checked(s: Sketch, points: list, added: int, full: bool) -> float:
+    start = time.perf_counter()
+    for i in range(added):
+        tag = s.set_p2p_distance(points[i], points[i + 1], 1.0)
+        if full:
+            assert tag not in s.diagnose().conflicting
+        else:
+            assert s.constraint_status(tag) == ConstraintStatus.Independent
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__,
+        constraints=(int, 400, "approximate number of truss constraints"),
+        added=(int, 20, "number of constraints added"),
+    )
+
+    for full in (True, False):
+        s, _ = build_truss(args.constraints)
+        points = [s.add_point(0.5 + i, 3.0 + 0.1 * (i % 2)) for i in range(args.added + 1)]
+        assert s.dof() == 1 + 2 * len(points)
+        elapsed = add_checked(s, points, args.added, full)
+        label = "full diagnosis" if full else "constraint_status"
+        print(f"{label:18s} ({args.added} added): {elapsed * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Benchmark: diagnosing sketches made of many unconnected profiles.
+
+Each profile is a closed rectangle with one redundant and one conflicting
+dimension, anchored at its own fixed corner, so the reduced Jacobian has
+one block per profile. Times ``Sketch.dof()`` and a full diagnosis (reading
+the conflicting and redundant tags) for a single profile and for many.
+
+Run with::
+
+    python benchmarks/bench_diagnose_components.py [--profiles 200] [--repeat 3]
+"""
+
+import time
+
+from _common import parse_args
+
+from planegcs import Sketch
+
+
+def build_profiles(profiles: int) -> Sketch:
+    s = Sketch()
+    for i in range(profiles):
+        x = 20.0 * i
+        corners = [
+            s.add_fixed_point(x, 0),
+            s.add_point(x + 10.5, 0.2),
+            s.add_point(x + 10.2, 5.3),
+            s.add_point(x - 0.3, 4.8),
+        ]
+        lines = [s.add_line(corners[k], corners[(k + 1) % 4]) for k in range(4)]
+        s.horizontal(lines[0])
+        s.vertical(lines[1])
+        s.horizontal(lines[2])
+        s.vertical(lines[3])
+        s.set_p2p_distance(corners[0], corners[1], 10.0)
+        s.set_p2p_distance(corners[1], corners[2], 5.0)
+        s.set_p2p_distance(corners[2], corners[3], 10.0)  # redundant
+        s.set_p2p_distance(corners[3], corners[0], 6.0)  # conflicting
+    return s
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__,
+        profiles=(int, 200, "number of profiles"),
+        repeat=(int, 3, "best of this many runs"),
+    )
+
+    for profiles in (1, args.profiles):
+        dof = diagnose = float("inf")
+        for _ in range(args.repeat):
+            s = build_profiles(profiles)
+            start = time.perf_counter()
+            s.dof()
+            dof = min(dof, time.perf_counter() - start)
+
+            s = build_profiles(profiles)
+            start = time.perf_counter()
+            diag = s.diagnose()
+            assert diag.conflicting and diag.partially_redundant is not None
+            diagnose = min(diagnose, time.perf_counter() - start)
+
+        print(f"dof      ({profiles:5d} profiles): {dof * 1000:9.1f} ms")
+        print(f"diagnose ({profiles:5d} profiles): {diagnose * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
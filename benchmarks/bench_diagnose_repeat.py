@@ -0,0 +1,76 @@
+"""Benchmark: repeated diagnoses of a large connected sketch.
+
+The sketch is a rigid truss of two rails of points joined by rungs and
+diagonals, all dimensioned with distances, anchored at one fixed point.
+It forms a single block of the Jacobian, large enough for SparseQR.
+Times the first diagnosis and the following ones, each after changing a
+dimension, which keeps the sparsity pattern of the Jacobian.
+
+Run with::
+
+    python benchmarks/bench_diagnose_repeat.py [--constraints 10000] [--repeat 5]
+"""
+
+import math
+import time
+
+from _common import parse_args
+
+from planegcs import Sketch
+
+
+def build_truss(constraints: int, *, rigid: bool = False) -> tuple[Sketch, list]:
+    # rigid=True also holds the first rung vertical, which leaves no degree of freedom
+    s = Sketch()
+    bays = (constraints + 1) // 4
+    top = [s.add_fixed_point(0, 0)]
+    bottom = [s.add_point(0.02, -1.01)]
+    dims = []
+
+    def bar(p, q, length):
+        d = s.add_param(length)
+        s.p2p_distance(p, q, d)
+        dims.append(d)
+
+    bar(top[0], bottom[0], 1.0)
+    if rigid:
+        s.vertical_points(top[0], bottom[0])
+    for i in range(1, bays + 1):
+        # perturbed start points, so that no gradient is exactly zero
+        top.append(s.add_point(i + 0.01 * (i % 3), 0.01 * (i % 2)))
+        bottom.append(s.add_point(i - 0.01 * (i % 2), -1 + 0.01 * (i % 3)))
+        bar(top[i - 1], top[i], 1.0)
+        bar(bottom[i - 1], bottom[i], 1.0)
+        bar(top[i], bottom[i], 1.0)
+        bar(top[i - 1], bottom[i], math.sqrt(2))
+    return s, dims
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__,
+        constraints=(int, 10000, "approximate number of constraints"),
+        repeat=(int, 5, "best of this many diagnoses"),
+    )
+
+    s, dims = build_truss(args.constraints)
+
+    start = time.perf_counter()
+    dof = s.dof()
+    first = time.perf_counter() - start
+    assert dof == 1
+
+    repeated = float("inf")
+    for i in range(args.repeat):
+        s.set_param(dims[len(dims) // 2], 1.0 + 0.01 * (i + 1))
+        start = time.perf_counter()
+        assert s.dof() == 1
+        repeated = min(repeated, time.perf_counter() - start)
+
+    print(f"constraints: {len(dims)}")
+    print(f"first diagnosis:    {first * 1000:9.1f} ms")
+    print(f"repeated diagnosis: {repeated * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
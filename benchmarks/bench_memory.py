@@ -0,0 +1,70 @@
+"""Benchmark: memory held by a sketch against its size, phase by phase.
+
+The sketch is the rigid truss of bench_diagnose_repeat.py, at a number of
+sizes. For each, records ``Sketch.memory_usage()`` and the peak resident
+memory the process gained, after building the sketch, diagnosing it and
+solving it. Each size runs in a process of its own, so that the peak of
+one does not hide those of the next. Needs the ``resource`` module, so
+does not run on Windows.
+
+Run with::
+
+    python benchmarks/bench_memory.py [--constraints 250 500 1000 2000]
+"""
+
+import multiprocessing
+import resource
+import sys
+from dataclasses import astuple, fields
+
+from _common import parse_args
+from bench_diagnose_repeat import build_truss
+
+from planegcs import MemoryUsage, SolveStatus
+
+# ru_maxrss is in kilobytes, except on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+
+def measure(constraints, results) -> None:
+    start = peak_rss()
+    phases = []
+
+    def record(phase, s):
+        phases.append((phase, s.memory_usage(), peak_rss() - start))
+
+    s, _dims = build_truss(constraints, rigid=True)
+    record("build", s)
+    assert not s.diagnose().conflicting
+    record("diagnose", s)
+    assert s.solve() == SolveStatus.Success
+    record("solve", s)
+    results.put((len(s.constraint_errors()[0]), phases))
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__, constraints=(int, [250, 500, 1000, 2000], "approximate numbers of constraints")
+    )
+
+    names = [field.name for field in fields(MemoryUsage)]
+    print("KiB held by each part, the total, and the peak resident memory gained")
+    print(f"{'constraints':>11} {'phase':>8} " + " ".join(f"{n:>11}" for n in names), end="")
+    print(f" {'total':>11} {'peak':>11}")
+    for constraints in args.constraints:
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(target=measure, args=(constraints, results))
+        process.start()
+        count, phases = results.get()
+        process.join()
+        for phase, usage, peak in phases:
+            row = [*astuple(usage), usage.total, peak]
+            print(f"{count:>11} {phase:>8} " + " ".join(f"{b / 1024:>11.1f}" for b in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Benchmark: finding the geometry a solve moved in a large sketch.
+
+The sketch is many unconnected rectangles, as in bench_solve_edit.py. After
+the width of one of them changes and the sketch is solved again, times
+``Sketch.moved()``, which finds the few points and lines to redraw among
+all of them.
+
+Run with::
+
+    python benchmarks/bench_moved.py [--profiles 5000] [--repeat 5]
+"""
+
+import time
+
+from _common import parse_args
+from bench_solve_edit import build_profiles
+
+from planegcs import SolveStatus
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__,
+        profiles=(int, 5000, "number of profiles"),
+        repeat=(int, 5, "best of this many edits"),
+    )
+
+    s, widths = build_profiles(args.profiles)
+    assert s.solve() == SolveStatus.Success
+
+    best = float("inf")
+    for i in range(args.repeat):
+        s.set_param(widths[len(widths) // 2], 10.0 + 0.5 * (i + 1))
+        assert s.solve() == SolveStatus.Success
+        start = time.perf_counter()
+        moved = s.moved(1e-9)
+        best = min(best, time.perf_counter() - start)
+
+    print(f"points: {4 * args.profiles}, lines: {4 * args.profiles}")
+    print(f"moved: {len(moved.points)} points, {len(moved.lines)} lines")
+    print(f"moved(): {best * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
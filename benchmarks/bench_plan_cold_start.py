@@ -0,0 +1,67 @@
+"""Benchmark: the first solve of a sketch in a fresh process, with and without a plan.
+
+The sketch is a chain of unit squares, each corner held by a distance to a
+corner of the previous square, whose first solve is dominated by the
+diagnosis. A plan saved from one sketch is loaded into a new sketch of the
+same structure before its first solve, as a worker process would on its
+first request. Times the first solve without a plan, and loading the plan
+plus the first solve with it.
+
+Run with::
+
+    python benchmarks/bench_plan_cold_start.py [--squares 100]
+"""
+
+import math
+import tempfile
+import time
+from pathlib import Path
+
+from _common import parse_args
+
+from planegcs import Sketch, SolveStatus
+
+
+def build_quads(quads: int) -> Sketch:
+    s = Sketch()
+    corners = [(0, 0), (1, 0), (1, 1), (0, 1)]
+    positions = [(-0.6, -0.8), (1.8, -0.6), (1.6, 1.8), (-0.8, 1.6)]
+    previous = [s.add_fixed_point(x, y) for x, y in positions]
+    for k in range(quads):
+        square = [(x + 2.5 * k, y + 0.3 * (k % 2)) for x, y in corners]
+        points = [s.add_point(x + 0.05 * (i % 2), y - 0.04) for i, (x, y) in enumerate(square)]
+        for i in range(4):
+            j = (i + 1) % 4 if k else i
+            s.set_p2p_distance(previous[j], points[i], math.dist(positions[j], square[i]))
+            s.set_p2p_distance(points[i], points[(i + 1) % 4], 1.0)
+        previous, positions = points, square
+    return s
+
+
+def main() -> None:
+    args = parse_args(__doc__, squares=(int, 100, "number of squares"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "quads.plan"
+        start = time.perf_counter()
+        build_quads(args.squares).save_plan(path)
+        save = time.perf_counter() - start
+
+        s = build_quads(args.squares)
+        start = time.perf_counter()
+        assert s.solve() == SolveStatus.Success
+        cold = time.perf_counter() - start
+
+        s = build_quads(args.squares)
+        start = time.perf_counter()
+        s.load_plan(path)
+        assert s.solve() == SolveStatus.Success
+        planned = time.perf_counter() - start
+
+        print(f"plan: {path.stat().st_size} bytes, saved in {save * 1000:.1f} ms")
+    print(f"first solve without plan: {cold * 1000:9.1f} ms")
+    print(f"load plan + first solve:  {planned * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark: a long editing session that adds and removes geometry.
+
+The sketch is many unconnected rectangles, as in bench_solve_edit.py. Each
+edit adds a dimensioned, fixed circle next to them, solves, and removes
+it again, as an editor does for a tentative entity. The unknowns stay the
+same however many edits are made, but the storage of the parameters
+removed is only reclaimed by ``compact()``. Times the edits at the start
+and at the end of the session, ``remove_geometry()``, ``compact()``, and
+the edits after it.
+
+Run with::
+
+    python benchmarks/bench_remove_compact.py [--profiles 500] [--edits 5000]
+"""
+
+import time
+
+from _common import parse_args
+from bench_solve_edit import build_profiles
+
+from planegcs import SolveStatus
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__,
+        profiles=(int, 500, "number of profiles"),
+        edits=(int, 5000, "circles added and removed"),
+    )
+
+    s, _widths = build_profiles(args.profiles)
+    assert s.solve() == SolveStatus.Success
+    unknowns = s.solver.param_values(False).size
+
+    removing = 0.0
+
+    def edit(i):
+        nonlocal removing
+        start = time.perf_counter()
+        center = s.add_fixed_point(-10.0, 0.1 * i)
+        circle = s.add_circle(center, 1.5)
+        s.set_circle_radius(circle, 2.0)
+        assert s.solve() == SolveStatus.Success
+        removed = time.perf_counter()
+        s.remove_geometry([center])
+        end = time.perf_counter()
+        removing += end - removed
+        return end - start
+
+    window = max(1, args.edits // 10)
+    times = [edit(i) for i in range(args.edits)]
+    first, last = sum(times[:window]), sum(times[-window:])
+    assert s.solver.param_values(False).size == unknowns
+
+    start = time.perf_counter()
+    s.compact()
+    compacting = time.perf_counter() - start
+    after = sum(edit(i) for i in range(window))
+
+    print(f"profiles: {args.profiles}, edits: {args.edits}, unknowns: {unknowns}")
+    print(f"edit, first {window}:     {first / window * 1000:9.3f} ms")
+    print(f"edit, last {window}:      {last / window * 1000:9.3f} ms")
+    print(f"edit, after compact: {after / window * 1000:9.3f} ms")
+    print(f"remove_geometry():   {removing / (args.edits + window) * 1000:9.3f} ms")
+    print(f"compact():           {compacting * 1000:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
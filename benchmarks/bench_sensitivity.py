@@ -0,0 +1,56 @@
+"""Benchmark: derivatives of a solved sketch with respect to its dimensions.
+
+The sketch is the truss of bench_diagnose_repeat.py, made rigid. Times
+``Sketch.sensitivity()`` for a number of its dimensions against finite
+differences, which solve the sketch again once per dimension.
+
+Run with::
+
+    python benchmarks/bench_sensitivity.py [--constraints 400] [--dimensions 20]
+"""
+
+import time
+
+import numpy as np
+from _common import parse_args
+from bench_diagnose_repeat import build_truss
+
+from planegcs import SolveStatus
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__,
+        constraints=(int, 400, "approximate number of constraints"),
+        dimensions=(int, 20, "dimensions to differentiate by"),
+    )
+
+    s, dims = build_truss(args.constraints, rigid=True)
+    assert s.solve() == SolveStatus.Success
+    dims = dims[:: max(1, len(dims) // args.dimensions)][: args.dimensions]
+
+    start = time.perf_counter()
+    _unknowns, matrix = s.sensitivity(dims)
+    analytic = time.perf_counter() - start
+
+    step = 1e-7
+    solved = s.solver.param_values(False)
+    differences = np.empty_like(matrix)
+    start = time.perf_counter()
+    for j, dim in enumerate(dims):
+        value = s.get_param(dim)
+        s.set_param(dim, value + step)
+        assert s.solve() == SolveStatus.Success
+        differences[:, j] = (s.solver.param_values(False) - solved) / step
+        s.set_param(dim, value)
+        s.solver.set_param_values(solved, False)
+    finite = time.perf_counter() - start
+
+    print(f"constraints: {len(s.constraint_errors()[0])}, dimensions: {len(dims)}")
+    print(f"sensitivity():      {analytic * 1000:9.1f} ms")
+    print(f"finite differences: {finite * 1000:9.1f} ms")
+    print(f"largest difference: {abs(matrix - differences).max():.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark: a configurator solving the same parametric part many times.
+
+Each request builds a fresh sketch of a rigid truss and solves it, with
+and without a shared :class:`SolutionCache`. Times the solves only, not
+building the sketches.
+
+- repeats: the bar lengths come from one of a few dimension sets, so
+  most requests hit the cache.
+- sweep: every request has its own bar length, always drawn with the
+  points where bars of length 1 would put them, so every request misses.
+  Solved without closed-form placement, which would place every point of
+  the truss. Reports the iterations and failed solves when starting from
+  the drawn points and from the nearest cached solution.
+
+Run with::
+
+    python benchmarks/bench_solution_cache.py [--bays 100] [--requests 200] [--variants 5]
+"""
+
+import math
+import time
+
+from _common import parse_args
+
+from planegcs import Sketch, SolutionCache, SolveStatus
+
+
+def build_truss(bays: int, length: float, drawn: float | None = None) -> Sketch:
+    s = Sketch()
+    top = [s.add_fixed_point(0, 0)]
+    bottom = [s.add_fixed_point(0, -1)]
+    x = length if drawn is None else drawn
+    for i in range(1, bays + 1):
+        top.append(s.add_point(i * x + 0.1 * (i % 3), 0.1 * (i % 2)))
+        bottom.append(s.add_point(i * x - 0.1 * (i % 2), -1 + 0.1 * (i % 3)))
+        s.set_p2p_distance(top[i - 1], top[i], length)
+        s.set_p2p_distance(bottom[i - 1], bottom[i], length)
+        s.set_p2p_distance(top[i], bottom[i], 1.0)
+        s.set_p2p_distance(top[i - 1], bottom[i], math.hypot(length, 1.0))
+    return s
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__,
+        bays=(int, 100, "bays of the truss"),
+        requests=(int, 200, "sketches solved"),
+        variants=(int, 5, "distinct dimension sets"),
+    )
+
+    print("repeats:")
+    for cache in (None, SolutionCache()):
+        elapsed = 0.0
+        for request in range(args.requests):
+            s = build_truss(args.bays, 1.0 + 0.1 * (request % args.variants))
+            start = time.perf_counter()
+            assert s.solve(cache=cache) == SolveStatus.Success
+            elapsed += time.perf_counter() - start
+        label = "uncached" if cache is None else "cached"
+        print(f"  {label:>10}: {elapsed * 1000:9.1f} ms for {args.requests} solves")
+        if cache is not None:
+            print(f"              {cache.stats()}")
+
+    print("sweep:")
+    for warm_start in (False, True):
+        cache = SolutionCache(warm_start=warm_start)
+        elapsed = 0.0
+        iterations = failed = 0
+        for request in range(args.requests):
+            s = build_truss(args.bays, 1.0 + 2.0 * request / args.requests, drawn=1.0)
+            start = time.perf_counter()
+            status = s.solve(cache=cache, place=False)
+            elapsed += time.perf_counter() - start
+            iterations += s.solve_stats().iterations
+            failed += status == SolveStatus.Failed
+        label = "warm start" if warm_start else "drawn"
+        print(
+            f"  {label:>10}: {elapsed * 1000:9.1f} ms for {args.requests} solves, "
+            f"{iterations} iterations, {failed} failed"
+        )
+
+
+if __name__ == "__main__":
+    main()
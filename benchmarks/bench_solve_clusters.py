@@ -0,0 +1,96 @@
+"""Benchmark: solving large well-constrained sketches.
+
+Both sketches are one connected component that decomposes into a chain of
+rigid clusters, with points starting away from their solved positions:
+
+- ``truss``: two rails of points joined by rungs and diagonals, all
+  dimensioned with distances and anchored at both ends of the first rung.
+  Each new point is placed by two distances to points placed before it.
+- ``quads``: a chain of unit squares, each corner held by a distance to a
+  corner of the previous square. No point of a square can be placed
+  without the others, so each square is a block of 8 unknowns.
+
+Times the first solve, which includes the diagnosis and planning the
+clusters, and a re-solve after changing a dimension halfway along the
+chain, each with and without placing points in closed form first, and
+reports the iterations the numerical solver took.
+
+Run with::
+
+    python benchmarks/bench_solve_clusters.py [--size 100]
+"""
+
+import math
+import time
+
+from _common import parse_args
+
+from planegcs import Sketch, SolveStatus
+
+
+def build_truss(bays: int) -> tuple[Sketch, list]:
+    s = Sketch()
+    top = [s.add_fixed_point(0, 0)]
+    bottom = [s.add_fixed_point(0, -1)]
+    dims = []
+
+    def bar(p, q, length):
+        d = s.add_param(length)
+        s.p2p_distance(p, q, d)
+        dims.append(d)
+
+    for i in range(1, bays + 1):
+        top.append(s.add_point(i + 0.1 * (i % 3), 0.1 * (i % 2)))
+        bottom.append(s.add_point(i - 0.1 * (i % 2), -1 + 0.1 * (i % 3)))
+        bar(top[i - 1], top[i], 1.0)
+        bar(bottom[i - 1], bottom[i], 1.0)
+        bar(top[i], bottom[i], 1.0)
+        bar(top[i - 1], bottom[i], math.sqrt(2))
+    return s, dims
+
+
+def build_quads(quads: int) -> tuple[Sketch, list]:
+    s = Sketch()
+    corners = [(0, 0), (1, 0), (1, 1), (0, 1)]
+    positions = [(-0.6, -0.8), (1.8, -0.6), (1.6, 1.8), (-0.8, 1.6)]
+    previous = [s.add_fixed_point(x, y) for x, y in positions]
+    dims = []
+    for k in range(quads):
+        square = [(x + 2.5 * k, y + 0.3 * (k % 2)) for x, y in corners]
+        points = [s.add_point(x + 0.05 * (i % 2), y - 0.04) for i, (x, y) in enumerate(square)]
+        for i in range(4):
+            j = (i + 1) % 4 if k else i
+            s.set_p2p_distance(previous[j], points[i], math.dist(positions[j], square[i]))
+            dims.append(s.add_param(1.0))
+            s.p2p_distance(points[i], points[(i + 1) % 4], dims[-1])
+        previous, positions = points, square
+    return s, dims
+
+
+def main() -> None:
+    args = parse_args(__doc__, size=(int, 100, "number of bays or squares"))
+
+    for name, build in (("truss", build_truss), ("quads", build_quads)):
+        for place in (False, True):
+            s, dims = build(args.size)
+            start = time.perf_counter()
+            assert s.solve(place=place) == SolveStatus.Success
+            first = time.perf_counter() - start
+            first_iterations = s.solve_stats().iterations
+
+            s.set_param(dims[len(dims) // 2], 1.01)
+            start = time.perf_counter()
+            assert s.solve(place=place) == SolveStatus.Success
+            resolve = time.perf_counter() - start
+
+            label = "placed" if place else "not placed"
+            print(f"{name} ({len(dims)} dimensions, {label}):")
+            print(f"  first solve: {first * 1000:9.1f} ms, {first_iterations:5d} iterations")
+            print(
+                f"  re-solve:    {resolve * 1000:9.1f} ms, "
+                f"{s.solve_stats().iterations:5d} iterations"
+            )
+
+
+if __name__ == "__main__":
+    main()
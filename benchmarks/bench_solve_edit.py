@@ -0,0 +1,68 @@
+"""Benchmark: re-solving a sketch of many unconnected profiles after one edit.
+
+Each profile is a closed rectangle anchored at its own fixed corner and
+dimensioned with two distances. Times the first solve, which solves every
+profile, and the following ones, each after changing the width of a single
+profile, which only solve that profile again.
+
+Run with::
+
+    python benchmarks/bench_solve_edit.py [--profiles 2000] [--repeat 5]
+"""
+
+import time
+
+from _common import parse_args
+
+from planegcs import Sketch, SolveStatus
+
+
+def build_profiles(profiles: int) -> tuple[Sketch, list]:
+    s = Sketch()
+    widths = []
+    for i in range(profiles):
+        x = 20.0 * i
+        corners = [
+            s.add_fixed_point(x, 0),
+            s.add_point(x + 10.5, 0.2),
+            s.add_point(x + 10.2, 5.3),
+            s.add_point(x - 0.3, 4.8),
+        ]
+        lines = [s.add_line(corners[k], corners[(k + 1) % 4]) for k in range(4)]
+        s.horizontal(lines[0])
+        s.vertical(lines[1])
+        s.horizontal(lines[2])
+        s.vertical(lines[3])
+        widths.append(s.add_param(10.0))
+        s.p2p_distance(corners[0], corners[1], widths[-1])
+        s.set_p2p_distance(corners[1], corners[2], 5.0)
+    return s, widths
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__,
+        profiles=(int, 2000, "number of profiles"),
+        repeat=(int, 5, "best of this many edits"),
+    )
+
+    s, widths = build_profiles(args.profiles)
+    start = time.perf_counter()
+    assert s.solve(place=False) == SolveStatus.Success
+    first = time.perf_counter() - start
+
+    edited = float("inf")
+    for i in range(args.repeat):
+        s.set_param(widths[len(widths) // 2], 10.0 + 0.5 * (i + 1))
+        start = time.perf_counter()
+        assert s.solve(place=False) == SolveStatus.Success
+        edited = min(edited, time.perf_counter() - start)
+        assert s.solve_stats().skipped == args.profiles - 1
+
+    print(f"profiles: {args.profiles}")
+    print(f"first solve:       {first * 1000:9.1f} ms")
+    print(f"solve after edit:  {edited * 1000:9.1f} ms, {s.solve_stats().skipped} skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark: solving a large under-constrained sketch with each algorithm.
+
+The sketch is a grid of points joined by distances along its rows and
+columns, anchored at one corner. Without diagonals every square can shear,
+so the whole grid is one under-constrained component. All distances share
+one dimension, which is changed before the timed re-solve, so the
+diagnosis of the first solve is not part of the timing.
+
+Dense BFGS updates an inverse Hessian of size unknowns x unknowns on every
+iteration. L-BFGS keeps a few correction pairs instead.
+
+Run with::
+
+    python benchmarks/bench_solve_lbfgs.py [--size 25]
+"""
+
+import time
+
+from _common import parse_args
+
+from planegcs import Algorithm, ParamId, Sketch
+
+
+def build_grid(size: int) -> tuple[Sketch, ParamId]:
+    s = Sketch()
+    side = s.add_param(1.0)
+    grid = {}
+    for i in range(size):
+        for j in range(size):
+            if i == j == 0:
+                grid[i, j] = s.add_fixed_point(0, 0)
+            else:
+                grid[i, j] = s.add_point(
+                    i + 0.03 * ((7 * i + 3 * j) % 5 - 2), j + 0.03 * ((3 * i + 5 * j) % 5 - 2)
+                )
+            if i:
+                s.p2p_distance(grid[i - 1, j], grid[i, j], side)
+            if j:
+                s.p2p_distance(grid[i, j - 1], grid[i, j], side)
+    return s, side
+
+
+def main() -> None:
+    args = parse_args(__doc__, size=(int, 25, "points along each side"))
+
+    print(f"unknowns: {2 * args.size**2 - 2}")
+    for alg in (Algorithm.LBFGS, Algorithm.BFGS, Algorithm.DogLeg):
+        s, side = build_grid(args.size)
+        s.solve(alg)
+        s.set_param(side, 1.05)
+        start = time.perf_counter()
+        status = s.solve(alg)
+        elapsed = time.perf_counter() - start
+        _tags, errors = s.constraint_errors()
+        print(
+            f"{alg.name:>8}: {elapsed * 1000:9.1f} ms, "
+            f"{s.solve_stats().iterations:5d} iterations, {status.name}, "
+            f"max error {abs(errors).max():.1e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
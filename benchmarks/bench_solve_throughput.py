@@ -0,0 +1,70 @@
+"""Benchmark: solve throughput on small sketches.
+
+Measures how many solves per second planegcs manages on a small,
+fully constrained sketch (a triangle and a circle). Two workloads are
+timed:
+
+- ``resolve``: one sketch, a driving dimension changed before every solve.
+  This is the interactive-editing case, where per-solve allocations
+  dominate.
+- ``rebuild``: a fresh sketch built and solved every time.
+
+Run with::
+
+    python benchmarks/bench_solve_throughput.py [--seconds 2.0]
+"""
+
+import time
+
+from _common import parse_args
+
+from planegcs import ParamId, Sketch, SolveStatus
+
+
+def build_sketch() -> tuple[Sketch, ParamId]:
+    s = Sketch()
+    p1 = s.add_fixed_point(0, 0)
+    p2 = s.add_point(5, 0.3)
+    p3 = s.add_point(2.4, 4)
+    l1 = s.add_line(p1, p2)
+    l2 = s.add_line(p2, p3)
+    l3 = s.add_line(p3, p1)
+    s.equal_length(l1, l2)
+    s.equal_length(l2, l3)
+    s.horizontal(l1)
+    side = s.add_param(5.0)
+    s.p2p_distance(p1, p2, side)
+    c = s.add_circle(p3, 1.2)
+    s.set_circle_radius(c, 1.0)
+    return s, side
+
+
+def bench_resolve(seconds: float) -> float:
+    s, side = build_sketch()
+    n = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < seconds:
+        s.set_param(side, 5.0 + (n % 10) * 0.1)
+        assert s.solve() == SolveStatus.Success
+        n += 1
+    return n / elapsed
+
+
+def bench_rebuild(seconds: float) -> float:
+    n = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < seconds:
+        s, _ = build_sketch()
+        assert s.solve() == SolveStatus.Success
+        n += 1
+    return n / elapsed
+
+
+def main() -> None:
+    args = parse_args(__doc__, seconds=(float, 2.0, "time per workload"))
+    print(f"resolve: {bench_resolve(args.seconds):10.0f} solves/s")
+    print(f"rebuild: {bench_rebuild(args.seconds):10.0f} solves/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark: taking back a failed edit of a large sketch.
+
+The sketch is the rigid truss of bench_diagnose_repeat.py, diagnosed and
+solved. The edit changes the length of one bar and adds a point with
+two constraints that conflict, which a diagnosis finds. Times taking the
+edit back and solving the sketch again three ways: rolling back a
+``Sketch.transaction()``, undoing the edit by hand, which leaves the
+diagnosis and solving plan to be worked out again, and building the
+sketch again.
+
+Run with::
+
+    python benchmarks/bench_transaction.py [--constraints 2000] [--repeat 5]
+"""
+
+import time
+
+from _common import parse_args
+from bench_diagnose_repeat import build_truss
+
+from planegcs import SolveStatus
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__,
+        constraints=(int, 2000, "approximate number of constraints"),
+        repeat=(int, 5, "best of this many edits"),
+    )
+
+    s, dims = build_truss(args.constraints, rigid=True)
+    assert s.dof() == 0
+    assert s.solve() == SolveStatus.Success
+    bar = dims[len(dims) // 2]
+
+    def edit():
+        s.set_param(bar, 1.1)
+        anchor = s.add_fixed_point(0, 3)
+        p = s.add_point(0.5, 3.0)
+        tags = [s.set_p2p_distance(anchor, p, 1.0), s.coincident(anchor, p)]
+        assert s.diagnose().conflicting
+        return tags
+
+    rolled_back = by_hand = rebuilt = float("inf")
+    for _ in range(args.repeat):
+        with s.transaction() as t:
+            edit()
+            start = time.perf_counter()
+        assert s.solve() == SolveStatus.Success
+        rolled_back = min(rolled_back, time.perf_counter() - start)
+        assert t.rolled_back
+
+        tags = edit()
+        start = time.perf_counter()
+        s.clear_by_tags(tags)
+        s.set_param(bar, 1.0)
+        assert s.solve() == SolveStatus.Success
+        by_hand = min(by_hand, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        s, dims = build_truss(args.constraints, rigid=True)
+        assert s.solve() == SolveStatus.Success
+        rebuilt = min(rebuilt, time.perf_counter() - start)
+
+    print(f"constraints: {len(s.constraint_errors()[0])}")
+    print(f"transaction rollback: {rolled_back * 1000:9.2f} ms")
+    print(f"undone by hand:       {by_hand * 1000:9.2f} ms")
+    print(f"rebuilt:              {rebuilt * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
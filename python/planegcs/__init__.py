@@ -2,6 +2,7 @@
 
 from planegcs._planegcs import (
     Algorithm,
+    ConstraintStatus,
     DebugMode,
     InternalAlignmentType,
     SketchSolver,
@@ -10,6 +11,7 @@ from planegcs._planegcs import (
 from planegcs.sketch import (
     ArcId,
     ArcInfo,
+    CacheStats,
     CircleId,
     CircleInfo,
     ConstraintTag,
@@ -18,18 +20,26 @@ from planegcs.sketch import (
     EllipseInfo,
     LineId,
     LineInfo,
+    MemoryUsage,
+    MovedGeometry,
     ParamId,
     PointId,
     PointInfo,
+    Removed,
     Sketch,
+    SolutionCache,
+    SolveStats,
+    Transaction,
 )
 
 __all__ = [
     "ArcId",
     "ArcInfo",
     "Algorithm",
+    "CacheStats",
     "CircleId",
     "CircleInfo",
+    "ConstraintStatus",
     "ConstraintTag",
     "DebugMode",
     "Diagnosis",
@@ -38,10 +48,16 @@ __all__ = [
     "InternalAlignmentType",
     "LineId",
     "LineInfo",
+    "MemoryUsage",
+    "MovedGeometry",
     "ParamId",
     "PointId",
     "PointInfo",
+    "Removed",
     "Sketch",
     "SketchSolver",
+    "SolutionCache",
+    "SolveStats",
     "SolveStatus",
+    "Transaction",
 ]
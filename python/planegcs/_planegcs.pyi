@@ -4,11 +4,17 @@ Python bindings for FreeCAD's PlaneGCS 2D geometric constraint solver
 
 from __future__ import annotations
 
+import collections.abc
 import typing
 
+import numpy
+import numpy.typing
+
 __all__: list[str] = [
     "Algorithm",
     "BFGS",
+    "Conflicting",
+    "ConstraintStatus",
     "Converged",
     "DebugMode",
     "DiagnosisResult",
@@ -32,11 +38,15 @@ __all__: list[str] = [
     "HyperbolaPositiveMajorY",
     "HyperbolaPositiveMinorX",
     "HyperbolaPositiveMinorY",
+    "Independent",
     "InternalAlignmentType",
     "IterationLevel",
+    "LBFGS",
     "LevenbergMarquardt",
     "Minimal",
     "NoDebug",
+    "PartiallyRedundant",
+    "Redundant",
     "SketchSolver",
     "SolveStatus",
     "Success",
@@ -52,14 +62,54 @@ class Algorithm:
       LevenbergMarquardt
 
       DogLeg
+
+      LBFGS
     """
 
     BFGS: typing.ClassVar[Algorithm]  # value = <Algorithm.BFGS: 0>
     DogLeg: typing.ClassVar[Algorithm]  # value = <Algorithm.DogLeg: 2>
+    LBFGS: typing.ClassVar[Algorithm]  # value = <Algorithm.LBFGS: 3>
     LevenbergMarquardt: typing.ClassVar[Algorithm]  # value = <Algorithm.LevenbergMarquardt: 1>
     __members__: typing.ClassVar[
         dict[str, Algorithm]
-    ]  # value = {'BFGS': <Algorithm.BFGS: 0>, 'LevenbergMarquardt': <Algorithm.LevenbergMarquardt: 1>, 'DogLeg': <Algorithm.DogLeg: 2>}
+    ]  # value = {'BFGS': <Algorithm.BFGS: 0>, 'LevenbergMarquardt': <Algorithm.LevenbergMarquardt: 1>, 'DogLeg': <Algorithm.DogLeg: 2>, 'LBFGS': <Algorithm.LBFGS: 3>}
+    def __eq__(self, other: typing.Any) -> bool: ...
+    def __getstate__(self) -> int: ...
+    def __hash__(self) -> int: ...
+    def __index__(self) -> int: ...
+    def __init__(self, value: typing.SupportsInt) -> None: ...
+    def __int__(self) -> int: ...
+    def __ne__(self, other: typing.Any) -> bool: ...
+    def __repr__(self) -> str: ...
+    def __setstate__(self, state: typing.SupportsInt) -> None: ...
+    def __str__(self) -> str: ...
+    @property
+    def name(self) -> str: ...
+    @property
+    def value(self) -> int: ...
+
+class ConstraintStatus:
+    """
+    Members:
+
+      Independent
+
+      Redundant
+
+      PartiallyRedundant
+
+      Conflicting
+    """
+
+    Conflicting: typing.ClassVar[ConstraintStatus]  # value = <ConstraintStatus.Conflicting: 3>
+    Independent: typing.ClassVar[ConstraintStatus]  # value = <ConstraintStatus.Independent: 0>
+    PartiallyRedundant: typing.ClassVar[
+        ConstraintStatus
+    ]  # value = <ConstraintStatus.PartiallyRedundant: 2>
+    Redundant: typing.ClassVar[ConstraintStatus]  # value = <ConstraintStatus.Redundant: 1>
+    __members__: typing.ClassVar[
+        dict[str, ConstraintStatus]
+    ]  # value = {'Independent': <ConstraintStatus.Independent: 0>, 'Redundant': <ConstraintStatus.Redundant: 1>, 'PartiallyRedundant': <ConstraintStatus.PartiallyRedundant: 2>, 'Conflicting': <ConstraintStatus.Conflicting: 3>}
     def __eq__(self, other: typing.Any) -> bool: ...
     def __getstate__(self) -> int: ...
     def __hash__(self) -> int: ...
@@ -250,9 +300,10 @@ class SketchSolver:
         radius: typing.SupportsFloat,
         start_angle: typing.SupportsFloat,
         end_angle: typing.SupportsFloat,
+        fixed: bool = False,
     ) -> int:
         """
-        Add an arc from center point, radius and angles. Returns arc ID.
+        Add an arc from center point, radius and angles. fixed=True fixes the radius, angles and end points. Returns arc ID.
         """
     def add_arc_from_start_end(
         self,
@@ -272,9 +323,10 @@ class SketchSolver:
         end_angle: typing.SupportsFloat,
         start_id: typing.SupportsInt,
         end_id: typing.SupportsInt,
+        fixed: bool = False,
     ) -> int:
         """
-        Add an arc of ellipse. Returns ID.
+        Add an arc of ellipse. fixed=True fixes radmin and the angles. Returns ID.
         """
     def add_arc_of_hyperbola(
         self,
@@ -285,9 +337,10 @@ class SketchSolver:
         end_angle: typing.SupportsFloat,
         start_id: typing.SupportsInt,
         end_id: typing.SupportsInt,
+        fixed: bool = False,
     ) -> int:
         """
-        Add an arc of hyperbola. Returns ID.
+        Add an arc of hyperbola. fixed=True fixes radmin and the angles. Returns ID.
         """
     def add_arc_of_parabola(
         self,
@@ -297,31 +350,36 @@ class SketchSolver:
         end_angle: typing.SupportsFloat,
         start_id: typing.SupportsInt,
         end_id: typing.SupportsInt,
+        fixed: bool = False,
     ) -> int:
         """
-        Add an arc of parabola. Returns ID.
+        Add an arc of parabola. fixed=True fixes the angles. Returns ID.
         """
-    def add_circle(self, center_id: typing.SupportsInt, radius: typing.SupportsFloat) -> int:
+    def add_circle(
+        self, center_id: typing.SupportsInt, radius: typing.SupportsFloat, fixed: bool = False
+    ) -> int:
         """
-        Add a circle. Returns circle ID.
+        Add a circle. fixed=True fixes the radius. Returns circle ID.
         """
     def add_ellipse(
         self,
         center_id: typing.SupportsInt,
         focus1_id: typing.SupportsInt,
         radmin: typing.SupportsFloat,
+        fixed: bool = False,
     ) -> int:
         """
-        Add an ellipse. Returns ellipse ID.
+        Add an ellipse. fixed=True fixes radmin. Returns ellipse ID.
         """
     def add_hyperbola(
         self,
         center_id: typing.SupportsInt,
         focus1_id: typing.SupportsInt,
         radmin: typing.SupportsFloat,
+        fixed: bool = False,
     ) -> int:
         """
-        Add a hyperbola. Returns ID.
+        Add a hyperbola. fixed=True fixes radmin. Returns ID.
         """
     @typing.overload
     def add_line(self, p1_id: typing.SupportsInt, p2_id: typing.SupportsInt) -> int:
@@ -335,6 +393,7 @@ class SketchSolver:
         y1: typing.SupportsFloat,
         x2: typing.SupportsFloat,
         y2: typing.SupportsFloat,
+        fixed: bool = False,
     ) -> int:
         """
         Add a line with endpoint coordinates. Returns line ID.
@@ -347,9 +406,11 @@ class SketchSolver:
         """
         Allocate a parameter. fixed=True for driving constraint values. Returns param ID.
         """
-    def add_point(self, x: typing.SupportsFloat, y: typing.SupportsFloat) -> int:
+    def add_point(
+        self, x: typing.SupportsFloat, y: typing.SupportsFloat, fixed: bool = False
+    ) -> int:
         """
-        Add a point. Returns point ID.
+        Add a point. fixed=True makes its coordinates fixed params that never become unknowns. Returns point ID.
         """
     def arc_diameter(
         self, arc_id: typing.SupportsInt, diameter_id: typing.SupportsInt, driving: bool = True
@@ -373,6 +434,18 @@ class SketchSolver:
         """
         Add arc rules constraint (start/end computed from center+radius+angles).
         """
+    def attach_params(
+        self, tag: typing.SupportsInt, param_ids: collections.abc.Sequence[typing.SupportsInt]
+    ) -> None:
+        """
+        Attach parameters created for the constraints of a tag, such as the value of a
+        dimension, so that they are removed along with them.
+        """
+    def begin_transaction(self) -> None:
+        """
+        Start recording changes to the sketch, so that rollback() can undo them.
+        Raises RuntimeError if a transaction is already open.
+        """
     def c2c_distance(
         self,
         c1_id: typing.SupportsInt,
@@ -407,11 +480,17 @@ class SketchSolver:
         """
     def clear(self) -> None:
         """
-        Clear all geometry, constraints, and parameters.
+        Clear all geometry, constraints, and parameters. Raises RuntimeError during a
+        transaction.
         """
     def clear_by_tag(self, tag: typing.SupportsInt) -> None:
         """
-        Clear all constraints with the given tag.
+        Clear all constraints with the given tag, and the parameters attached to them.
+        """
+    def clear_by_tags(self, tags: collections.abc.Sequence[typing.SupportsInt]) -> None:
+        """
+        Clear all constraints with any of the given tags, and the parameters attached to
+        them.
         """
     def coincident(
         self, pt1_id: typing.SupportsInt, pt2_id: typing.SupportsInt, driving: bool = True
@@ -419,10 +498,34 @@ class SketchSolver:
         """
         Add coincident constraint between two points.
         """
+    def commit(self) -> None:
+        """
+        Keep the changes made since begin_transaction() and end the transaction.
+        """
+    def compact(self) -> None:
+        """
+        Move the parameters to new storage without the removed ones, keeping their ids.
+        Raises RuntimeError during a transaction.
+        """
     def constraint_error(self, tag: typing.SupportsInt) -> float:
         """
         Calculate RMS error of all constraints with given tag.
         """
+    def constraint_errors(
+        self, driving: bool | None = None
+    ) -> tuple[numpy.typing.NDArray[numpy.int32], numpy.typing.NDArray[numpy.float64]]:
+        """
+        Calculate the error of every tag, as constraint_error does, in one pass.
+        Returns (tags, errors) arrays sorted by tag. driving=True or False only
+        evaluates driving or non-driving constraints.
+        """
+    def constraint_status(
+        self, tag: typing.SupportsInt, algorithm: Algorithm = Algorithm.DogLeg
+    ) -> ConstraintStatus:
+        """
+        Return the ConstraintStatus of the constraints of a tag. Constraints added after a
+        diagnosis without dependent constraints are checked without a new diagnosis.
+        """
     def coordinate_x(
         self, pt_id: typing.SupportsInt, x_id: typing.SupportsInt, driving: bool = True
     ) -> int:
@@ -435,9 +538,12 @@ class SketchSolver:
         """
         Fix the Y coordinate of a point.
         """
-    def diagnose(self, algorithm: Algorithm = Algorithm.DogLeg) -> DiagnosisResult:
+    def diagnose(
+        self, algorithm: Algorithm = Algorithm.DogLeg, split: bool = True
+    ) -> DiagnosisResult:
         """
         Run full diagnosis. Returns DiagnosisResult with dof, conflicting, redundant, and partially_redundant constraint tags.
+        split=False decomposes the Jacobian as a whole rather than by independent blocks.
         """
     def difference(
         self,
@@ -449,9 +555,10 @@ class SketchSolver:
         """
         Add difference constraint.
         """
-    def dof(self) -> int:
+    def dof(self, algorithm: Algorithm = Algorithm.DogLeg) -> int:
         """
-        Return degrees of freedom after running diagnosis. 0 = fully constrained, >0 = under-constrained.
+        Return degrees of freedom. 0 = fully constrained, >0 = under-constrained.
+        Only computes the rank of the system, unless it may be over-constrained.
         """
     def equal(
         self, param1_id: typing.SupportsInt, param2_id: typing.SupportsInt, driving: bool = True
@@ -483,6 +590,12 @@ class SketchSolver:
         """
         Constrain two circles to have equal radius.
         """
+    def export_plan(self, algorithm: Algorithm = Algorithm.DogLeg) -> bytes:
+        """
+        Return the diagnosis of the sketch as bytes, running it first if needed.
+        import_plan() gives it to a sketch of the same structure, whose next solve
+        then skips the diagnosis.
+        """
     def get_arc_center(self, arc_id: typing.SupportsInt) -> tuple[float, float]: ...
     def get_arc_end_angle(self, arc_id: typing.SupportsInt) -> float: ...
     def get_arc_end_point(self, arc_id: typing.SupportsInt) -> tuple[float, float]: ...
@@ -504,6 +617,10 @@ class SketchSolver:
         """
         Get the (x, y) of a point.
         """
+    def get_point_params(self, point_id: typing.SupportsInt) -> tuple[int, int]:
+        """
+        Get the (x, y) parameter ids of a point.
+        """
     def horizontal_line(self, line_id: typing.SupportsInt, driving: bool = True) -> int:
         """
         Constrain line to be horizontal.
@@ -514,6 +631,15 @@ class SketchSolver:
         """
         Constrain two points to have same Y.
         """
+    def import_plan(self, plan: bytes) -> None:
+        """
+        Use a plan made by export_plan() instead of diagnosing the sketch. Raises
+        ValueError if the plan was made for a sketch of another structure.
+        """
+    def in_transaction(self) -> bool:
+        """
+        Return True between begin_transaction() and commit() or rollback().
+        """
     def internal_alignment_point2ellipse(
         self,
         ellipse_id: typing.SupportsInt,
@@ -538,12 +664,34 @@ class SketchSolver:
         """
         Add line-to-line angle constraint.
         """
+    def memory_usage(self) -> tuple[int, int, int, int, int, int, int]:
+        """
+        Return the estimated bytes held by (params, geometry, constraints, adjacency,
+        subsystems, diagnosis, transaction): the parameter storage with the unknowns,
+        the geometry tables, the constraint objects with their tag tables, the
+        constraint-parameter adjacency and partition, the solving plan, what the last
+        diagnosis kept, and what an open transaction set aside.
+        """
     def midpoint_on_line(
         self, l1_id: typing.SupportsInt, l2_id: typing.SupportsInt, driving: bool = True
     ) -> int:
         """
         Constrain midpoint of l1 to lie on l2.
         """
+    def moved_geometry(
+        self, tolerance: typing.SupportsFloat = 0.0
+    ) -> tuple[
+        numpy.typing.NDArray[numpy.int32],
+        numpy.typing.NDArray[numpy.int32],
+        numpy.typing.NDArray[numpy.int32],
+        numpy.typing.NDArray[numpy.int32],
+        numpy.typing.NDArray[numpy.int32],
+    ]:
+        """
+        Return (points, lines, circles, arcs, ellipses) arrays of the ids of the
+        geometry with a parameter changed by more than tolerance since
+        record_positions(), or added since.
+        """
     def p2c_distance(
         self,
         pt_id: typing.SupportsInt,
@@ -590,6 +738,11 @@ class SketchSolver:
         """
         Add parallel constraint.
         """
+    def param_values(self, fixed: bool | None = None) -> numpy.typing.NDArray[numpy.float64]:
+        """
+        Return the values of the parameters in ID order as an array. fixed=True or
+        False only returns the fixed or the unknown ones.
+        """
     def perpendicular(
         self, l1_id: typing.SupportsInt, l2_id: typing.SupportsInt, driving: bool = True
     ) -> int:
@@ -636,6 +789,43 @@ class SketchSolver:
         """
         Add proportional constraint.
         """
+    def record_positions(self) -> None:
+        """
+        Store the current parameter values, which moved_geometry() compares with.
+        Call it before solve() to find what the solve moved.
+        """
+    def remove_geometry(
+        self, geo_ids: collections.abc.Sequence[typing.SupportsInt]
+    ) -> tuple[list[int], list[int], list[int]]:
+        """
+        Remove geometry, along with the points and parameters created for it, the
+        geometry built on any of those, and the constraints created on any of them.
+        Returns the ids of the geometry, constraint tags and parameters removed.
+        """
+    def remove_params(
+        self, param_ids: collections.abc.Sequence[typing.SupportsInt]
+    ) -> tuple[list[int], list[int], list[int]]:
+        """
+        Remove parameters, along with the geometry built on them and the constraints
+        created on any of those. Returns the ids of the geometry, constraint tags and
+        parameters removed.
+        """
+    def rollback(self) -> None:
+        """
+        Undo the changes made since begin_transaction() and end the transaction: the
+        geometry, parameters and constraints added go, the constraints removed come
+        back and every parameter gets its value back, along with the diagnosis and
+        solving plan of that time, which are not computed again.
+        """
+    def sensitivity(
+        self, param_ids: collections.abc.Sequence[typing.SupportsInt]
+    ) -> tuple[numpy.typing.NDArray[numpy.int32], numpy.typing.NDArray[numpy.float64]]:
+        """
+        Derivatives of the unknowns with respect to fixed parameters (driving values)
+        at the current solution. Returns (unknowns, matrix): the ids of the unknowns,
+        and their derivatives, a row for each unknown and a column for each param_id.
+        Raises ValueError if one of param_ids is an unknown.
+        """
     def set_param(self, param_id: typing.SupportsInt, value: typing.SupportsFloat) -> None:
         """
         Set the value of a parameter.
@@ -644,9 +834,31 @@ class SketchSolver:
         """
         Set whether a parameter is fixed.
         """
-    def solve(self, algorithm: Algorithm = Algorithm.DogLeg) -> SolveStatus:
+    def set_param_values(
+        self,
+        values: typing.Annotated[numpy.typing.ArrayLike, numpy.float64],
+        fixed: bool | None = None,
+    ) -> None:
+        """
+        Set the parameters from an array in ID order, as returned by param_values()
+        with the same fixed argument.
+        """
+    def solve(self, algorithm: Algorithm = Algorithm.DogLeg, place: bool = False) -> SolveStatus:
+        """
+        Solve the system. Returns SolveStatus. place=True first places points held by
+        two constraints in closed form.
+        """
+    def solve_stats(self) -> tuple[int, int, int]:
+        """
+        Return (iterations, placed, skipped) of the last solve: the iterations of the
+        numerical solvers, the points placed in closed form before them, and the
+        independent parts left as they were, nothing in them having changed.
+        """
+    def structure_hash(self) -> int:
         """
-        Solve the system. Returns SolveStatus.
+        Hash of the sketch structure: parameters and whether they are fixed, geometry,
+        and constraint types, tags, driving flags, parameters and built-in values.
+        Parameter values are not part of it.
         """
     def symmetric_points_line(
         self,
@@ -765,6 +977,7 @@ class SolveStatus:
     def value(self) -> int: ...
 
 BFGS: Algorithm  # value = <Algorithm.BFGS: 0>
+Conflicting: ConstraintStatus  # value = <ConstraintStatus.Conflicting: 3>
 Converged: SolveStatus  # value = <SolveStatus.Converged: 1>
 DogLeg: Algorithm  # value = <Algorithm.DogLeg: 2>
 EllipseFocus2X: InternalAlignmentType  # value = <InternalAlignmentType.EllipseFocus2X: 8>
@@ -818,9 +1031,13 @@ HyperbolaPositiveMinorX: (
 HyperbolaPositiveMinorY: (
     InternalAlignmentType  # value = <InternalAlignmentType.HyperbolaPositiveMinorY: 15>
 )
+Independent: ConstraintStatus  # value = <ConstraintStatus.Independent: 0>
 IterationLevel: DebugMode  # value = <DebugMode.IterationLevel: 2>
+LBFGS: Algorithm  # value = <Algorithm.LBFGS: 3>
 LevenbergMarquardt: Algorithm  # value = <Algorithm.LevenbergMarquardt: 1>
 Minimal: DebugMode  # value = <DebugMode.Minimal: 1>
 NoDebug: DebugMode  # value = <DebugMode.NoDebug: 0>
+PartiallyRedundant: ConstraintStatus  # value = <ConstraintStatus.PartiallyRedundant: 2>
+Redundant: ConstraintStatus  # value = <ConstraintStatus.Redundant: 1>
 Success: SolveStatus  # value = <SolveStatus.Success: 0>
 SuccessfulSolutionInvalid: SolveStatus  # value = <SolveStatus.SuccessfulSolutionInvalid: 3>
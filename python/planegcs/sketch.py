@@ -1,9 +1,17 @@
 """High-level Pythonic interface for the PlaneGCS constraint solver."""
 
+import os
+from collections import OrderedDict
+from collections.abc import Generator, Iterable
+from contextlib import contextmanager
 from dataclasses import dataclass
+from pathlib import Path
 from typing import NewType
 
-from planegcs._planegcs import Algorithm, SketchSolver, SolveStatus
+import numpy as np
+from numpy.typing import NDArray
+
+from planegcs._planegcs import Algorithm, ConstraintStatus, SketchSolver, SolveStatus
 
 # ── Typed IDs ──────────────────────────────────────────────────────
 # These are all ints at runtime, but static type checkers will treat
@@ -95,35 +103,317 @@ class EllipseInfo:
 
 
 @dataclass(frozen=True, slots=True)
-class Diagnosis:
-    """Result of constraint system diagnosis.
+class SolveStats:
+    """Counts of the last solve, returned by :meth:`Sketch.solve_stats`."""
 
-    Returned by :meth:`Sketch.diagnose`.
+    iterations: int
+    """Iterations of the numerical solvers, summed over all subsystems."""
+
+    placed: int
+    """Points placed in closed form before the numerical solvers ran."""
+
+    skipped: int
+    """Independent parts of the sketch not solved again, nothing having
+    changed in them since their last solve."""
+
+
+@dataclass(frozen=True, slots=True)
+class MovedGeometry:
+    """Geometry the last solve moved, returned by :meth:`Sketch.moved`."""
+
+    points: NDArray[np.int32]
+    """IDs of the points that moved."""
+
+    lines: NDArray[np.int32]
+    """IDs of the lines with an end point that moved."""
+
+    circles: NDArray[np.int32]
+    """IDs of the circles whose center or radius changed."""
+
+    arcs: NDArray[np.int32]
+    """IDs of the arcs with a point, radius or angle that changed."""
+
+    ellipses: NDArray[np.int32]
+    """IDs of the ellipses with a point or radius that changed."""
+
+
+@dataclass(frozen=True, slots=True)
+class Removed:
+    """What :meth:`Sketch.remove_geometry` or :meth:`Sketch.remove_params` removed.
+
+    Attributes:
+        geometry: Ids of the geometry removed, of any kind.
+        constraints: Tags of the constraints removed.
+        params: Ids of the parameters removed.
     """
 
-    dof: int
-    """Degrees of freedom.
+    geometry: list[int]
+    constraints: list[ConstraintTag]
+    params: list[ParamId]
+
 
-    - ``0``: Fully constrained.
-    - ``> 0``: Under-constrained (this many degrees of freedom remain).
+@dataclass(frozen=True, slots=True)
+class MemoryUsage:
+    """Estimated bytes held by a sketch, returned by :meth:`Sketch.memory_usage`.
+
+    Containers are counted by the storage they allocate, and the solver's
+    constraint objects by their exact size, but not the slack of the
+    allocators around them, so the process may hold somewhat more.
     """
 
-    conflicting: list[ConstraintTag]
-    """Tags of conflicting constraints.
+    params: int
+    """The parameter values and their ids, with the list of unknowns."""
+
+    geometry: int
+    """The tables of points, lines, circles, arcs and other geometry."""
+
+    constraints: int
+    """The solver's constraint objects and the tables of their tags."""
+
+    adjacency: int
+    """Which parameters each constraint reads, and the partition of the
+    unknowns into independent parts."""
+
+    subsystems: int
+    """The solving plan: the subsystems of the independent parts, with the
+    matrices their solvers keep between solves."""
+
+    diagnosis: int
+    """What the last diagnosis kept: its results, and the decompositions
+    of the Jacobian used to check constraints added after it."""
+
+    transaction: int
+    """What an open :meth:`Sketch.transaction` set aside to roll back to."""
+
+    @property
+    def total(self) -> int:
+        """The sum of all the others."""
+        return (
+            self.params
+            + self.geometry
+            + self.constraints
+            + self.adjacency
+            + self.subsystems
+            + self.diagnosis
+            + self.transaction
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class CacheStats:
+    """Counts of a :class:`SolutionCache`, returned by :meth:`SolutionCache.stats`."""
+
+    hits: int
+    """Solves answered from the cache."""
+
+    misses: int
+    """Solves that had to run."""
+
+    warm_starts: int
+    """Misses solved from the nearest solution of the same structure, without failing."""
+
+    size: int
+    """Solutions held."""
+
+    maxsize: int
+    """Most solutions held before the least recently used is evicted."""
 
-    Non-empty means the system is over-constrained. These are the
-    constraint tags that conflict with each other.
+
+type _Topology = tuple[int, Algorithm]
+
+
+class SolutionCache:
+    """Bounded LRU cache of solutions, for sketches solved again and again.
+
+    Pass it to :meth:`Sketch.solve` as ``cache=``. One cache can be shared
+    by any number of sketches, such as one built per request from the
+    same parametric part. A solution is keyed by a hash of the sketch
+    structure (geometry kinds, constraint types, tags and driving flags,
+    and which parameters they use), the algorithm, and the values of the
+    fixed parameters: the driving dimensions and fixed geometry. The
+    starting coordinates of unknown geometry are not part of the key, so
+    a hit restores the solution found the first time even if the sketch
+    was drawn differently since.
+
+    On a miss, the unknowns start from the cached solution of the same
+    structure whose fixed parameter values are nearest, which is usually
+    a better guess than the coordinates the sketch was drawn with. If
+    that solve fails, the sketch is solved again from its own coordinates.
+
+    Args:
+        maxsize: Most solutions held. The least recently used one is
+                 evicted to make room for a new one.
+        warm_start: Start misses from the nearest cached solution.
     """
 
-    redundant: list[ConstraintTag]
-    """Tags of redundant constraints.
+    __slots__ = (
+        "_entries",
+        "_topologies",
+        "_maxsize",
+        "_hits",
+        "_misses",
+        "_warm_starts",
+        "warm_start",
+    )
+
+    def __init__(self, maxsize: int = 128, *, warm_start: bool = True) -> None:
+        self._entries: OrderedDict[
+            tuple[_Topology, bytes], tuple[NDArray[np.float64], SolveStatus]
+        ] = OrderedDict()
+        # the fixed values of the entries of each structure, for finding the nearest
+        self._topologies: dict[_Topology, dict[bytes, None]] = {}
+        self._maxsize = 0
+        self._hits = 0
+        self._misses = 0
+        self._warm_starts = 0
+        self.warm_start = warm_start
+        self.maxsize = maxsize
 
-    Redundant constraints are satisfied but provide no additional
-    information (they duplicate information already present).
+    @property
+    def maxsize(self) -> int:
+        """Most solutions held. Lowering it evicts the least recently used ones."""
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize: int) -> None:
+        if maxsize < 0:
+            raise ValueError(f"maxsize must not be negative, got {maxsize}")
+        self._maxsize = maxsize
+        while len(self._entries) > maxsize:
+            self._evict()
+
+    def stats(self) -> CacheStats:
+        """Return the hits, misses, warm starts and size of the cache."""
+        return CacheStats(
+            self._hits, self._misses, self._warm_starts, len(self._entries), self._maxsize
+        )
+
+    def clear(self) -> None:
+        """Drop all solutions and reset the counts."""
+        self._entries.clear()
+        self._topologies.clear()
+        self._hits = 0
+        self._misses = 0
+        self._warm_starts = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(
+        self, topology: _Topology, fixed: NDArray[np.float64]
+    ) -> tuple[NDArray[np.float64], SolveStatus] | None:
+        key = (topology, fixed.tobytes())
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def _nearest(
+        self, topology: _Topology, fixed: NDArray[np.float64]
+    ) -> NDArray[np.float64] | None:
+        """Unknowns of the solution of this structure with the nearest fixed values."""
+        candidates = self._topologies.get(topology)
+        if not self.warm_start or not candidates:
+            return None
+        keys = list(candidates)
+        others = np.frombuffer(b"".join(keys)).reshape(len(keys), -1)
+        nearest = keys[int(np.argmin(np.linalg.norm(others - fixed, axis=1)))]
+        return self._entries[topology, nearest][0]
+
+    def _put(
+        self,
+        topology: _Topology,
+        fixed: NDArray[np.float64],
+        unknowns: NDArray[np.float64],
+        status: SolveStatus,
+    ) -> None:
+        if self._maxsize == 0:
+            return
+        key = (topology, fixed.tobytes())
+        self._entries[key] = (unknowns, status)
+        self._entries.move_to_end(key)
+        self._topologies.setdefault(topology, {})[key[1]] = None
+        if len(self._entries) > self._maxsize:
+            self._evict()
+
+    def _evict(self) -> None:
+        (topology, fixed), _ = self._entries.popitem(last=False)
+        candidates = self._topologies[topology]
+        del candidates[fixed]
+        if not candidates:
+            del self._topologies[topology]
+
+
+class Diagnosis:
+    """Result of constraint system diagnosis.
+
+    Returned by :meth:`Sketch.diagnose`.
+
+    The diagnosis is computed lazily, in two tiers, when its attributes
+    are first read. Reading only :attr:`dof` counts the degrees of
+    freedom from the rank of the system, which is much cheaper than
+    identifying the conflicting and redundant constraints; reading any
+    of the tag lists runs the full diagnosis, whose count of the degrees
+    of freedom then replaces the first one. Attributes reflect the
+    sketch at the time they are computed, so read what you need before
+    changing the sketch.
     """
 
-    partially_redundant: list[ConstraintTag]
-    """Tags of partially redundant constraints."""
+    __slots__ = ("_solver", "_algorithm", "_dof", "_tags")
+
+    def __init__(self, solver: SketchSolver, algorithm: Algorithm) -> None:
+        self._solver = solver
+        self._algorithm = algorithm
+        self._dof: int | None = None
+        self._tags: tuple[list[ConstraintTag], ...] | None = None
+
+    def _diagnose(self) -> tuple[list[ConstraintTag], ...]:
+        if self._tags is None:
+            r = self._solver.diagnose(self._algorithm)
+            self._dof = r.dof
+            self._tags = (
+                [ConstraintTag(t) for t in r.conflicting],
+                [ConstraintTag(t) for t in r.redundant],
+                [ConstraintTag(t) for t in r.partially_redundant],
+            )
+        return self._tags
+
+    @property
+    def dof(self) -> int:
+        """Degrees of freedom.
+
+        - ``0``: Fully constrained.
+        - ``> 0``: Under-constrained (this many degrees of freedom remain).
+        """
+        if self._dof is None:
+            self._dof = self._solver.dof(self._algorithm)
+        return self._dof
+
+    @property
+    def conflicting(self) -> list[ConstraintTag]:
+        """Tags of conflicting constraints.
+
+        Non-empty means the system is over-constrained. These are the
+        constraint tags that conflict with each other.
+        """
+        return self._diagnose()[0]
+
+    @property
+    def redundant(self) -> list[ConstraintTag]:
+        """Tags of redundant constraints.
+
+        Redundant constraints are satisfied but provide no additional
+        information (they duplicate information already present).
+        """
+        return self._diagnose()[1]
+
+    @property
+    def partially_redundant(self) -> list[ConstraintTag]:
+        """Tags of partially redundant constraints."""
+        return self._diagnose()[2]
 
     @property
     def is_fully_constrained(self) -> bool:
@@ -140,6 +430,49 @@ class Diagnosis:
         """True if there are conflicting constraints."""
         return bool(self.conflicting)
 
+    def _values(self) -> tuple[object, ...]:
+        tags = self._diagnose()  # first, as it settles the dof
+        return (self.dof, *(tuple(t) for t in tags))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Diagnosis):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self) -> int:
+        return hash(self._values())
+
+    def __repr__(self) -> str:
+        conflicting, redundant, partially_redundant = self._diagnose()
+        return (
+            f"Diagnosis(dof={self.dof}, conflicting={conflicting}, "
+            f"redundant={redundant}, partially_redundant={partially_redundant})"
+        )
+
+
+class Transaction:
+    """The changes made to a sketch within :meth:`Sketch.transaction`.
+
+    Tells, once the ``with`` block is over, whether they were kept.
+    """
+
+    __slots__ = ("_failed_solve", "_diagnosis", "_rolled_back")
+
+    def __init__(self) -> None:
+        self._failed_solve = False
+        self._diagnosis: Diagnosis | None = None
+        self._rolled_back = False
+
+    def _failed(self) -> bool:
+        # a diagnosis is only taken for failed if it was read, so that nothing is computed here
+        tags = None if self._diagnosis is None else self._diagnosis._tags
+        return self._failed_solve or bool(tags and tags[0])
+
+    @property
+    def rolled_back(self) -> bool:
+        """True if the changes were undone."""
+        return self._rolled_back
+
 
 class Sketch:
     """A 2D constraint sketch.
@@ -168,6 +501,7 @@ class Sketch:
 
     def __init__(self) -> None:
         self._solver = SketchSolver()
+        self._transaction: Transaction | None = None
 
     @property
     def solver(self) -> SketchSolver:
@@ -213,19 +547,31 @@ class Sketch:
 
     # ── Geometry ───────────────────────────────────────────────────
 
-    def add_point(self, x: float, y: float) -> PointId:
-        """Add a point at (x, y). Returns point ID."""
-        return PointId(self._solver.add_point(x, y))
+    def add_point(self, x: float, y: float, *, fixed: bool = False) -> PointId:
+        """Add a point at (x, y). Returns point ID.
+
+        With ``fixed=True`` the coordinates are fixed parameters: the point
+        never becomes an unknown and needs no constraints to stay in place.
+        """
+        return PointId(self._solver.add_point(x, y, fixed))
 
     def get_point(self, point_id: PointId) -> PointInfo:
         """Get current (x, y) of a point."""
         return self._solver.get_point(point_id)
 
+    def get_point_params(self, point_id: PointId) -> tuple[ParamId, ParamId]:
+        """Get the IDs of the x and y parameters of a point."""
+        px, py = self._solver.get_point_params(point_id)
+        return ParamId(px), ParamId(py)
+
     def add_fixed_point(self, x: float, y: float, *, driving: bool = True) -> PointId:
         """Add a point and fix it at (x, y) in one step.
 
         This is a convenience method equivalent to calling :meth:`add_point`
-        followed by :meth:`fix_point`.
+        followed by :meth:`fix_point`. The point stays an unknown held in
+        place by two constraints, which take part in the diagnosis. For
+        reference geometry that never moves, ``add_point(x, y, fixed=True)``
+        is cheaper.
 
         Args:
             x: X coordinate.
@@ -243,9 +589,14 @@ class Sketch:
         """Add a line between two existing points. Returns line ID."""
         return LineId(self._solver.add_line(p1_id, p2_id))
 
-    def add_line_xy(self, x1: float, y1: float, x2: float, y2: float) -> LineId:
-        """Add a line with endpoint coordinates. Returns line ID."""
-        return LineId(self._solver.add_line(x1, y1, x2, y2))
+    def add_line_xy(
+        self, x1: float, y1: float, x2: float, y2: float, *, fixed: bool = False
+    ) -> LineId:
+        """Add a line with endpoint coordinates. Returns line ID.
+
+        With ``fixed=True`` both endpoints are fixed points.
+        """
+        return LineId(self._solver.add_line(x1, y1, x2, y2, fixed))
 
     def get_line(self, line_id: LineId) -> LineInfo:
         """Get all properties of a line.
@@ -257,9 +608,13 @@ class Sketch:
             p2=self._solver.get_line_p2(line_id),
         )
 
-    def add_circle(self, center_id: PointId, radius: float) -> CircleId:
-        """Add a circle. Returns circle ID."""
-        return CircleId(self._solver.add_circle(center_id, radius))
+    def add_circle(self, center_id: PointId, radius: float, *, fixed: bool = False) -> CircleId:
+        """Add a circle. Returns circle ID.
+
+        With ``fixed=True`` the radius is a fixed parameter. Use a fixed
+        center point for a circle that is fixed altogether.
+        """
+        return CircleId(self._solver.add_circle(center_id, radius, fixed))
 
     def get_circle(self, circle_id: CircleId) -> CircleInfo:
         """Get all properties of a circle.
@@ -278,9 +633,18 @@ class Sketch:
         radius: float,
         start_angle: float,
         end_angle: float,
+        *,
+        fixed: bool = False,
     ) -> ArcId:
-        """Add an arc from center point, radius and angles. Returns arc ID."""
-        return ArcId(self._solver.add_arc_from_center(center_id, radius, start_angle, end_angle))
+        """Add an arc from center point, radius and angles. Returns arc ID.
+
+        With ``fixed=True`` the radius, angles and end points are fixed
+        parameters. Use a fixed center point for an arc that is fixed
+        altogether; such an arc needs no :meth:`arc_rules`.
+        """
+        return ArcId(
+            self._solver.add_arc_from_center(center_id, radius, start_angle, end_angle, fixed)
+        )
 
     def add_arc_from_start_end(
         self,
@@ -323,9 +687,14 @@ class Sketch:
             end_point=self._solver.get_arc_end_point(arc_id),
         )
 
-    def add_ellipse(self, center_id: PointId, focus1_id: PointId, radmin: float) -> EllipseId:
-        """Add an ellipse. Returns ellipse ID."""
-        return EllipseId(self._solver.add_ellipse(center_id, focus1_id, radmin))
+    def add_ellipse(
+        self, center_id: PointId, focus1_id: PointId, radmin: float, *, fixed: bool = False
+    ) -> EllipseId:
+        """Add an ellipse. Returns ellipse ID.
+
+        With ``fixed=True`` the minor radius is a fixed parameter.
+        """
+        return EllipseId(self._solver.add_ellipse(center_id, focus1_id, radmin, fixed))
 
     def get_ellipse(self, ellipse_id: EllipseId) -> EllipseInfo:
         """Get all properties of an ellipse.
@@ -355,6 +724,8 @@ class Sketch:
         py = self.add_param(y, fixed=True)
         tx = ConstraintTag(self._solver.coordinate_x(pt_id, px, driving))
         ty = ConstraintTag(self._solver.coordinate_y(pt_id, py, driving))
+        self._solver.attach_params(tx, [px])
+        self._solver.attach_params(ty, [py])
         return tx, ty
 
     def horizontal(self, line_id: LineId, *, driving: bool = True) -> ConstraintTag:
@@ -397,7 +768,9 @@ class Sketch:
         :meth:`add_param`.
         """
         d = self.add_param(distance, fixed=True)
-        return self.p2p_distance(pt1_id, pt2_id, d, driving=driving)
+        tag = self.p2p_distance(pt1_id, pt2_id, d, driving=driving)
+        self._solver.attach_params(tag, [d])
+        return tag
 
     def p2l_distance(
         self, pt_id: PointId, line_id: LineId, distance_id: ParamId, *, driving: bool = True
@@ -418,7 +791,9 @@ class Sketch:
         :meth:`add_param`.
         """
         d = self.add_param(distance, fixed=True)
-        return self.p2l_distance(pt_id, line_id, d, driving=driving)
+        tag = self.p2l_distance(pt_id, line_id, d, driving=driving)
+        self._solver.attach_params(tag, [d])
+        return tag
 
     def point_on_line(
         self, pt_id: PointId, line_id: LineId, *, driving: bool = True
@@ -465,7 +840,9 @@ class Sketch:
         :meth:`add_param`.
         """
         a = self.add_param(angle, fixed=True)
-        return self.l2l_angle(l1_id, l2_id, a, driving=driving)
+        tag = self.l2l_angle(l1_id, l2_id, a, driving=driving)
+        self._solver.attach_params(tag, [a])
+        return tag
 
     def point_on_circle(
         self, pt_id: PointId, circle_id: CircleId, *, driving: bool = True
@@ -492,7 +869,9 @@ class Sketch:
         :meth:`add_param`.
         """
         r = self.add_param(radius, fixed=True)
-        return self.circle_radius(circle_id, r, driving=driving)
+        tag = self.circle_radius(circle_id, r, driving=driving)
+        self._solver.attach_params(tag, [r])
+        return tag
 
     def tangent_line_circle(
         self, line_id: LineId, circle_id: CircleId, *, driving: bool = True
@@ -534,14 +913,153 @@ class Sketch:
         """Constrain midpoint of l1 to lie on l2."""
         return ConstraintTag(self._solver.midpoint_on_line(l1_id, l2_id, driving))
 
+    # ── Removing constraints ───────────────────────────────────────
+
+    def clear_by_tags(self, tags: Iterable[ConstraintTag]) -> None:
+        """Remove every constraint carrying one of the given tags.
+
+        Removing a batch of constraints this way costs time in proportion
+        to the number removed, not to the size of the sketch. Unknown tags
+        are ignored.
+        """
+        self._solver.clear_by_tags(list(tags))
+
+    # ── Removing geometry ──────────────────────────────────────────
+
+    def remove_geometry(self, ids: Iterable[int]) -> Removed:
+        """Remove points, lines, circles, arcs or conics.
+
+        Along with each goes what depends on it: the points and parameters
+        created for it (such as the end points of an arc, or its radius),
+        the geometry built on any of those (the lines and circles on a
+        point), the constraints created on any of them, and the parameters
+        created by ``fix_point`` and the ``set_*`` methods for those
+        constraints. The ids of what is removed are not handed out again.
+
+        Parameter storage is only reclaimed by :meth:`compact`.
+
+        Raises ``IndexError`` for an id that is not a geometry of the
+        sketch, removing nothing.
+        """
+        return Removed(*self._removed(self._solver.remove_geometry(list(ids))))
+
+    def remove_params(self, ids: Iterable[ParamId]) -> Removed:
+        """Remove parameters, along with the geometry built on them and the
+        constraints created on either; see :meth:`remove_geometry`."""
+        return Removed(*self._removed(self._solver.remove_params(list(ids))))
+
+    @staticmethod
+    def _removed(
+        removed: tuple[list[int], list[int], list[int]],
+    ) -> tuple[list[int], list[ConstraintTag], list[ParamId]]:
+        geometry, tags, params = removed
+        return geometry, [ConstraintTag(t) for t in tags], [ParamId(p) for p in params]
+
+    def compact(self) -> None:
+        """Reclaim the storage of removed parameters.
+
+        Moves the remaining parameters to new storage, keeping their ids,
+        so a sketch edited for a long time does not keep growing. What the
+        solver worked out about the sketch is dropped, so the next
+        :meth:`solve` or :meth:`diagnose` starts afresh; call it between
+        editing sessions rather than after every removal.
+
+        Raises ``RuntimeError`` within :meth:`transaction`.
+        """
+        self._solver.compact()
+
     # ── Solving ────────────────────────────────────────────────────
 
-    def solve(self, algorithm: Algorithm = Algorithm.DogLeg) -> SolveStatus:
+    def solve(
+        self,
+        algorithm: Algorithm = Algorithm.DogLeg,
+        *,
+        place: bool = False,
+        cache: SolutionCache | None = None,
+    ) -> SolveStatus:
         """Solve the constraint system.
 
         Returns :class:`SolveStatus` indicating result.
+
+        ``Algorithm.LBFGS`` needs memory and time per iteration linear in the
+        number of unknowns, for very large under-constrained sketches that
+        the dense algorithms solve too slowly.
+
+        With ``place=True``, a point held by two constraints on circles or
+        lines around geometry placed before it (such as two distances, a
+        distance and an angle, or a point on a line and a distance to
+        another) is first moved to their intersection nearest to it, so that
+        the numerical solver starts from the solution. By default the solver
+        starts from the current coordinates; :meth:`solve_stats` tells the
+        iterations either way took.
+
+        Independent parts of the sketch (geometry not connected by any
+        constraint) whose coordinates and dimensions are those their last
+        successful solve left are not solved again, so that changing one
+        dimension only re-solves the part it belongs to.
+
+        With a :class:`SolutionCache`, a sketch of the same structure and
+        fixed parameter values as one solved before gets its unknowns
+        restored from the cache instead of being solved, and the status of
+        that solve is returned. :meth:`solve_stats` then still describes
+        the last solve that ran. Otherwise the unknowns start from the
+        nearest solution of the same structure the cache holds. Solves that
+        fail are not cached.
         """
-        return self._solver.solve(algorithm)
+        status = self._solve(algorithm, place, cache)
+        if self._transaction is not None:
+            self._transaction._failed_solve = status == SolveStatus.Failed
+        return status
+
+    def _solve(
+        self, algorithm: Algorithm, place: bool, cache: SolutionCache | None
+    ) -> SolveStatus:
+        self._solver.record_positions()
+        if cache is None:
+            return self._solver.solve(algorithm, place)
+        topology = (self._solver.structure_hash(), algorithm)
+        fixed = self._solver.param_values(True)
+        entry = cache._get(topology, fixed)
+        if entry is not None:
+            unknowns, status = entry
+            self._solver.set_param_values(unknowns, False)
+            return status
+        status = SolveStatus.Failed
+        seed = cache._nearest(topology, fixed)
+        if seed is not None:
+            drawn = self._solver.param_values(False)
+            self._solver.set_param_values(seed, False)
+            status = self._solver.solve(algorithm, place)
+            if status == SolveStatus.Failed:
+                self._solver.set_param_values(drawn, False)
+            else:
+                cache._warm_starts += 1
+        if status == SolveStatus.Failed:
+            status = self._solver.solve(algorithm, place)
+        if status in (SolveStatus.Success, SolveStatus.Converged):
+            cache._put(topology, fixed, self._solver.param_values(False), status)
+        return status
+
+    def solve_stats(self) -> SolveStats:
+        """Return the :class:`SolveStats` of the last :meth:`solve`."""
+        return SolveStats(*self._solver.solve_stats())
+
+    def moved(self, tolerance: float = 0.0) -> MovedGeometry:
+        """Return the geometry the last :meth:`solve` moved.
+
+        A geometry moved if one of its coordinates, radii or angles changed
+        by more than ``tolerance`` since the start of that solve, or if it
+        was added since. Geometry left where it was (such as unconnected
+        parts of the sketch the solve did not change) is left out, so that
+        only what moved needs to be redrawn.
+
+        Example::
+
+            s.solve()
+            for line_id in s.moved(1e-9).lines:
+                redraw(s.get_line(line_id))
+        """
+        return MovedGeometry(*self._solver.moved_geometry(tolerance))
 
     def diagnose(self, algorithm: Algorithm = Algorithm.DogLeg) -> Diagnosis:
         """Diagnose the constraint system.
@@ -558,6 +1076,9 @@ class Sketch:
         - Convenience properties: ``is_fully_constrained``,
           ``is_under_constrained``, ``is_over_constrained``.
 
+        Nothing is computed until one of these is read, and then only
+        what it needs; see :class:`Diagnosis`.
+
         Example::
 
             s = Sketch()
@@ -569,22 +1090,179 @@ class Sketch:
             print(diag.dof)  # 3 (under-constrained)
             print(diag.is_under_constrained)  # True
         """
-        r = self._solver.diagnose(algorithm)
-        return Diagnosis(
-            dof=r.dof,
-            conflicting=[ConstraintTag(t) for t in r.conflicting],
-            redundant=[ConstraintTag(t) for t in r.redundant],
-            partially_redundant=[ConstraintTag(t) for t in r.partially_redundant],
-        )
+        diagnosis = Diagnosis(self._solver, algorithm)
+        if self._transaction is not None:
+            self._transaction._diagnosis = diagnosis
+        return diagnosis
+
+    def constraint_status(
+        self, tag: ConstraintTag, algorithm: Algorithm = Algorithm.DogLeg
+    ) -> ConstraintStatus:
+        """Return whether the constraints of a tag are independent, redundant
+        or conflicting.
+
+        Returns a :class:`ConstraintStatus`. After a diagnosis (including
+        :meth:`dof`) of a sketch without redundant or conflicting
+        constraints, constraints added since are checked in the order they
+        were added, each against the ones before it, without diagnosing the
+        whole sketch again. This holds until the geometry moves or a
+        constraint is removed; otherwise a full diagnosis is run, whose
+        heuristics may blame a different member of a dependent group.
+
+        A dependent constraint counts as redundant if the current geometry
+        satisfies it, so solve the sketch before adding it.
+
+        Example::
+
+            s.solve()
+            tag = s.horizontal(line)
+            if s.constraint_status(tag) == ConstraintStatus.Conflicting:
+                s.clear_by_tags([tag])
+
+        Raises :class:`IndexError` for an unknown tag.
+        """
+        return self._solver.constraint_status(tag, algorithm)
+
+    def save_plan(
+        self, path: str | os.PathLike[str], algorithm: Algorithm = Algorithm.DogLeg
+    ) -> None:
+        """Write the diagnosis of the sketch to a file, running it first if needed.
+
+        A new process that builds a sketch of the same structure can
+        :meth:`load_plan` it, so that its first :meth:`solve` skips the
+        diagnosis, which dominates the cost of solving a large sketch for
+        the first time. The plan holds the redundant and conflicting
+        constraints found for this sketch's dimensions; the sketch that
+        loads it is solved as if it had the same ones.
+        """
+        Path(path).write_bytes(self._solver.export_plan(algorithm))
+
+    def load_plan(self, path: str | os.PathLike[str]) -> None:
+        """Use a plan written by :meth:`save_plan` instead of diagnosing the sketch.
+
+        Raises :class:`ValueError` if the file is not a plan, or was written
+        for a sketch of another structure: other geometry or constraints, or
+        the same ones added in another order.
+        """
+        self._solver.import_plan(Path(path).read_bytes())
+
+    def constraint_errors(
+        self, *, driving: bool | None = None
+    ) -> tuple[NDArray[np.int32], NDArray[np.float64]]:
+        """Return the error of every constraint tag, evaluated in one pass.
+
+        Returns ``(tags, errors)``, two arrays of equal length sorted by
+        tag. A tag made of a single solver constraint gets its signed
+        error, a tag made of several (such as :meth:`coincident`) gets
+        their RMS error.
+
+        Pass ``driving=True`` to only check driving constraints, or
+        ``driving=False`` to only evaluate driven (reference) ones.
+
+        Example::
+
+            tags, errors = s.constraint_errors(driving=True)
+            bad = tags[abs(errors) > 1e-6]
+        """
+        return self._solver.constraint_errors(driving)
+
+    def sensitivity(
+        self, params: Iterable[ParamId]
+    ) -> tuple[NDArray[np.int32], NDArray[np.float64]]:
+        """Return the derivatives of the solution with respect to dimensions.
+
+        ``params`` are fixed parameters, typically the values of driving
+        dimensions. Returns ``(unknowns, matrix)``: the parameter IDs of the
+        unknowns, and a matrix with a row for each of them and a column for
+        each of ``params``, holding how fast the unknown moves as the
+        parameter changes. The sketch should be solved first, as the
+        derivatives are taken at the current values.
+
+        They come from the Jacobian of the driving constraints at the
+        solution, without solving again, so that one call replaces a solve
+        per dimension of finite differences. Where the constraints leave an
+        unknown free, the derivatives are those that move the unknowns
+        least.
+
+        Example::
+
+            unknowns, matrix = s.sensitivity([width])
+            px, py = s.get_point_params(corner)
+            dx_dwidth = matrix[unknowns == px, 0]
+        """
+        return self._solver.sensitivity(list(params))
 
     def dof(self) -> int:
         """Return degrees of freedom of the constraint system.
 
         Shorthand for ``diagnose().dof``. Returns 0 when fully
-        constrained, positive when under-constrained.
+        constrained, positive when under-constrained. Only the rank of the
+        system is computed, unless it may be over-constrained.
         """
         return self._solver.dof()
 
     def clear(self) -> None:
-        """Clear all geometry, constraints and parameters."""
+        """Clear all geometry, constraints and parameters.
+
+        Raises ``RuntimeError`` within :meth:`transaction`.
+        """
         self._solver.clear()
+
+    # ── Transactions ───────────────────────────────────────────────
+
+    @contextmanager
+    def transaction(self) -> Generator[Transaction]:
+        """Make tentative changes, undone if they fail.
+
+        The changes made within the ``with`` block are undone if it raises,
+        if the last :meth:`solve` in it fails, or if the last
+        :meth:`diagnose` in it was read and found conflicting constraints.
+        Undoing them removes the geometry, parameters and constraints
+        added, brings back the constraints removed, and gives every
+        parameter back its value. The diagnosis and solving plan of the
+        sketch as it was come back with it instead of being computed
+        again, so trying a constraint and taking it back costs about as
+        much as adding it. Otherwise the changes are kept.
+
+        Transactions do not nest. Ids handed out within one that was
+        undone are not valid any more, and will be handed out again.
+
+        Example::
+
+            with s.transaction() as t:
+                s.set_p2p_distance(p1, p2, 7.0)
+                s.solve()
+            if t.rolled_back:
+                print("7.0 does not fit")
+        """
+        self._solver.begin_transaction()
+        self._transaction = transaction = Transaction()
+        try:
+            yield transaction
+        except BaseException:
+            transaction._rolled_back = True
+            raise
+        else:
+            transaction._rolled_back = transaction._failed()
+        finally:
+            self._transaction = None
+            if transaction._rolled_back:
+                self._solver.rollback()
+            else:
+                self._solver.commit()
+
+    # ── Memory ─────────────────────────────────────────────────────
+
+    def memory_usage(self) -> MemoryUsage:
+        """Return the estimated bytes the sketch holds, by what they are for.
+
+        The parameters, geometry and constraints grow with the sketch. The
+        solving plan is made by the first :meth:`solve` after a change, and
+        the diagnosis kept by :meth:`solve` or by reading a :meth:`diagnose`.
+
+        Example::
+
+            s.solve()
+            print(s.memory_usage().total)
+        """
+        return MemoryUsage(*self._solver.memory_usage())
@@ -1,4 +1,5 @@
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
 #include <pybind11/stl.h>
 #include "wrapper.h"
 
@@ -19,6 +20,14 @@ PYBIND11_MODULE(_planegcs, m) {
         .value("BFGS", GCS::BFGS)
         .value("LevenbergMarquardt", GCS::LevenbergMarquardt)
         .value("DogLeg", GCS::DogLeg)
+        .value("LBFGS", GCS::LBFGS)
+        .export_values();
+
+    py::enum_<GCS::ConstraintStatus>(m, "ConstraintStatus")
+        .value("Independent", GCS::Independent)
+        .value("Redundant", GCS::Redundant)
+        .value("PartiallyRedundant", GCS::PartiallyRedundant)
+        .value("Conflicting", GCS::Conflicting)
         .export_values();
 
     py::enum_<GCS::DebugMode>(m, "DebugMode")
@@ -77,16 +86,19 @@ PYBIND11_MODULE(_planegcs, m) {
 
         // Geometry: Points
         .def("add_point", &SketchSolver::add_point, py::arg("x"), py::arg("y"),
-             "Add a point. Returns point ID.")
+             py::arg("fixed") = false,
+             "Add a point. fixed=True makes its coordinates fixed params that never become unknowns. Returns point ID.")
         .def("get_point", &SketchSolver::get_point, py::arg("point_id"),
              "Get the (x, y) of a point.")
+        .def("get_point_params", &SketchSolver::get_point_params, py::arg("point_id"),
+             "Get the (x, y) parameter ids of a point.")
 
         // Geometry: Lines
         .def("add_line", py::overload_cast<int, int>(&SketchSolver::add_line),
              py::arg("p1_id"), py::arg("p2_id"),
              "Add a line between two existing points. Returns line ID.")
-        .def("add_line", py::overload_cast<double, double, double, double>(&SketchSolver::add_line),
-             py::arg("x1"), py::arg("y1"), py::arg("x2"), py::arg("y2"),
+        .def("add_line", py::overload_cast<double, double, double, double, bool>(&SketchSolver::add_line),
+             py::arg("x1"), py::arg("y1"), py::arg("x2"), py::arg("y2"), py::arg("fixed") = false,
              "Add a line with endpoint coordinates. Returns line ID.")
 
         // Geometry: Line accessors
@@ -95,8 +107,8 @@ PYBIND11_MODULE(_planegcs, m) {
 
         // Geometry: Circles
         .def("add_circle", &SketchSolver::add_circle,
-             py::arg("center_id"), py::arg("radius"),
-             "Add a circle. Returns circle ID.")
+             py::arg("center_id"), py::arg("radius"), py::arg("fixed") = false,
+             "Add a circle. fixed=True fixes the radius. Returns circle ID.")
 
         // Geometry: Circle accessors
         .def("get_circle_center", &SketchSolver::get_circle_center, py::arg("circle_id"))
@@ -105,8 +117,8 @@ PYBIND11_MODULE(_planegcs, m) {
         // Geometry: Arcs
         .def("add_arc_from_center", &SketchSolver::add_arc_from_center,
              py::arg("center_id"), py::arg("radius"),
-             py::arg("start_angle"), py::arg("end_angle"),
-             "Add an arc from center point, radius and angles. Returns arc ID.")
+             py::arg("start_angle"), py::arg("end_angle"), py::arg("fixed") = false,
+             "Add an arc from center point, radius and angles. fixed=True fixes the radius, angles and end points. Returns arc ID.")
         .def("add_arc_from_start_end", &SketchSolver::add_arc_from_start_end,
              py::arg("start_id"), py::arg("end_id"), py::arg("radius_id"),
              "Add an arc from start/end points and a radius parameter. Automatically adds arc rules and coincident constraints. Returns arc ID.")
@@ -121,8 +133,8 @@ PYBIND11_MODULE(_planegcs, m) {
 
         // Geometry: Ellipses
         .def("add_ellipse", &SketchSolver::add_ellipse,
-             py::arg("center_id"), py::arg("focus1_id"), py::arg("radmin"),
-             "Add an ellipse. Returns ellipse ID.")
+             py::arg("center_id"), py::arg("focus1_id"), py::arg("radmin"), py::arg("fixed") = false,
+             "Add an ellipse. fixed=True fixes radmin. Returns ellipse ID.")
 
         // Geometry: Ellipse accessors
         .def("get_ellipse_center", &SketchSolver::get_ellipse_center, py::arg("ellipse_id"))
@@ -133,20 +145,20 @@ PYBIND11_MODULE(_planegcs, m) {
         .def("add_arc_of_ellipse", &SketchSolver::add_arc_of_ellipse,
              py::arg("center_id"), py::arg("focus1_id"), py::arg("radmin"),
              py::arg("start_angle"), py::arg("end_angle"),
-             py::arg("start_id"), py::arg("end_id"),
-             "Add an arc of ellipse. Returns ID.")
+             py::arg("start_id"), py::arg("end_id"), py::arg("fixed") = false,
+             "Add an arc of ellipse. fixed=True fixes radmin and the angles. Returns ID.")
 
         // Geometry: Hyperbola
         .def("add_hyperbola", &SketchSolver::add_hyperbola,
-             py::arg("center_id"), py::arg("focus1_id"), py::arg("radmin"),
-             "Add a hyperbola. Returns ID.")
+             py::arg("center_id"), py::arg("focus1_id"), py::arg("radmin"), py::arg("fixed") = false,
+             "Add a hyperbola. fixed=True fixes radmin. Returns ID.")
 
         // Geometry: ArcOfHyperbola
         .def("add_arc_of_hyperbola", &SketchSolver::add_arc_of_hyperbola,
              py::arg("center_id"), py::arg("focus1_id"), py::arg("radmin"),
              py::arg("start_angle"), py::arg("end_angle"),
-             py::arg("start_id"), py::arg("end_id"),
-             "Add an arc of hyperbola. Returns ID.")
+             py::arg("start_id"), py::arg("end_id"), py::arg("fixed") = false,
+             "Add an arc of hyperbola. fixed=True fixes radmin and the angles. Returns ID.")
 
         // Geometry: Parabola
         .def("add_parabola", &SketchSolver::add_parabola,
@@ -157,20 +169,62 @@ PYBIND11_MODULE(_planegcs, m) {
         .def("add_arc_of_parabola", &SketchSolver::add_arc_of_parabola,
              py::arg("vertex_id"), py::arg("focus1_id"),
              py::arg("start_angle"), py::arg("end_angle"),
-             py::arg("start_id"), py::arg("end_id"),
-             "Add an arc of parabola. Returns ID.")
+             py::arg("start_id"), py::arg("end_id"), py::arg("fixed") = false,
+             "Add an arc of parabola. fixed=True fixes the angles. Returns ID.")
 
         // Solving
         .def("solve", &SketchSolver::solve,
-             py::arg("algorithm") = GCS::DogLeg,
-             "Solve the system. Returns SolveStatus.")
+             py::arg("algorithm") = GCS::DogLeg, py::arg("place") = false,
+             "Solve the system. Returns SolveStatus. place=True first places points held by\n"
+             "two constraints in closed form.")
+        .def("solve_stats", &SketchSolver::solve_stats,
+             "Return (iterations, placed, skipped) of the last solve: the iterations of the\n"
+             "numerical solvers, the points placed in closed form before them, and the\n"
+             "independent parts left as they were, nothing in them having changed.")
+        .def("record_positions", &SketchSolver::record_positions,
+             "Store the current parameter values, which moved_geometry() compares with.\n"
+             "Call it before solve() to find what the solve moved.")
+        .def("moved_geometry",
+             [](SketchSolver& self, double tolerance) {
+                 auto ids = self.moved_geometry(tolerance);
+                 auto array = [&ids](int kind) {
+                     return py::array_t<int>(ids[kind].size(), ids[kind].data());
+                 };
+                 return std::make_tuple(array(0), array(1), array(2), array(3), array(4));
+             },
+             py::arg("tolerance") = 0.0,
+             "Return (points, lines, circles, arcs, ellipses) arrays of the ids of the\n"
+             "geometry with a parameter changed by more than tolerance since\n"
+             "record_positions(), or added since.")
         .def("dof", &SketchSolver::dof,
-             "Return degrees of freedom after running diagnosis. 0 = fully constrained, >0 = under-constrained.")
-        .def("diagnose", &SketchSolver::diagnose,
              py::arg("algorithm") = GCS::DogLeg,
-             "Run full diagnosis. Returns DiagnosisResult with dof, conflicting, redundant, and partially_redundant constraint tags.")
+             "Return degrees of freedom. 0 = fully constrained, >0 = under-constrained.\n"
+             "Only computes the rank of the system, unless it may be over-constrained.")
+        .def("diagnose", &SketchSolver::diagnose,
+             py::arg("algorithm") = GCS::DogLeg, py::arg("split") = true,
+             "Run full diagnosis. Returns DiagnosisResult with dof, conflicting, redundant, and partially_redundant constraint tags.\n"
+             "split=False decomposes the Jacobian as a whole rather than by independent blocks.")
+        .def("constraint_status", &SketchSolver::constraint_status,
+             py::arg("tag"), py::arg("algorithm") = GCS::DogLeg,
+             "Return the ConstraintStatus of the constraints of a tag. Constraints added after a\n"
+             "diagnosis without dependent constraints are checked without a new diagnosis.")
         .def("clear", &SketchSolver::clear,
-             "Clear all geometry, constraints, and parameters.")
+             "Clear all geometry, constraints, and parameters. Raises RuntimeError during a\n"
+             "transaction.")
+
+        // Transactions
+        .def("begin_transaction", &SketchSolver::begin_transaction,
+             "Start recording changes to the sketch, so that rollback() can undo them.\n"
+             "Raises RuntimeError if a transaction is already open.")
+        .def("commit", &SketchSolver::commit,
+             "Keep the changes made since begin_transaction() and end the transaction.")
+        .def("rollback", &SketchSolver::rollback,
+             "Undo the changes made since begin_transaction() and end the transaction: the\n"
+             "geometry, parameters and constraints added go, the constraints removed come\n"
+             "back and every parameter gets its value back, along with the diagnosis and\n"
+             "solving plan of that time, which are not computed again.")
+        .def("in_transaction", &SketchSolver::in_transaction,
+             "Return True between begin_transaction() and commit() or rollback().")
 
         // Constraints
         .def("coincident", &SketchSolver::coincident,
@@ -323,8 +377,95 @@ PYBIND11_MODULE(_planegcs, m) {
              py::arg("internal") = false, py::arg("driving") = true,
              "Tangent circumference constraint.")
         .def("clear_by_tag", &SketchSolver::clear_by_tag, py::arg("tag"),
-             "Clear all constraints with the given tag.")
+             "Clear all constraints with the given tag, and the parameters attached to them.")
+        .def("clear_by_tags", &SketchSolver::clear_by_tags, py::arg("tags"),
+             "Clear all constraints with any of the given tags, and the parameters attached to\n"
+             "them.")
+        .def("attach_params", &SketchSolver::attach_params, py::arg("tag"), py::arg("param_ids"),
+             "Attach parameters created for the constraints of a tag, such as the value of a\n"
+             "dimension, so that they are removed along with them.")
+
+        // Removal
+        .def("remove_geometry", &SketchSolver::remove_geometry, py::arg("geo_ids"),
+             "Remove geometry, along with the points and parameters created for it, the\n"
+             "geometry built on any of those, and the constraints created on any of them.\n"
+             "Returns the ids of the geometry, constraint tags and parameters removed.")
+        .def("remove_params", &SketchSolver::remove_params, py::arg("param_ids"),
+             "Remove parameters, along with the geometry built on them and the constraints\n"
+             "created on any of those. Returns the ids of the geometry, constraint tags and\n"
+             "parameters removed.")
+        .def("compact", &SketchSolver::compact,
+             "Move the parameters to new storage without the removed ones, keeping their ids.\n"
+             "Raises RuntimeError during a transaction.")
+        .def("memory_usage", &SketchSolver::memory_usage,
+             "Return the estimated bytes held by (params, geometry, constraints, adjacency,\n"
+             "subsystems, diagnosis, transaction): the parameter storage with the unknowns,\n"
+             "the geometry tables, the constraint objects with their tag tables, the\n"
+             "constraint-parameter adjacency and partition, the solving plan, what the last\n"
+             "diagnosis kept, and what an open transaction set aside.")
         .def("constraint_error", &SketchSolver::constraint_error, py::arg("tag"),
              "Calculate RMS error of all constraints with given tag.")
+        .def("structure_hash", &SketchSolver::structure_hash,
+             "Hash of the sketch structure: parameters and whether they are fixed, geometry,\n"
+             "and constraint types, tags, driving flags, parameters and built-in values.\n"
+             "Parameter values are not part of it.")
+        .def("param_values",
+             [](const SketchSolver& self, std::optional<bool> fixed) {
+                 auto values = self.param_values(fixed);
+                 return py::array_t<double>(values.size(), values.data());
+             },
+             py::arg("fixed") = py::none(),
+             "Return the values of the parameters in ID order as an array. fixed=True or\n"
+             "False only returns the fixed or the unknown ones.")
+        .def("set_param_values",
+             [](SketchSolver& self,
+                py::array_t<double, py::array::c_style | py::array::forcecast> values,
+                std::optional<bool> fixed) {
+                 self.set_param_values(values.data(), values.size(), fixed);
+             },
+             py::arg("values"), py::arg("fixed") = py::none(),
+             "Set the parameters from an array in ID order, as returned by param_values()\n"
+             "with the same fixed argument.")
+        .def("export_plan",
+             [](SketchSolver& self, GCS::Algorithm alg) {
+                 return py::bytes(self.export_plan(alg));
+             },
+             py::arg("algorithm") = GCS::DogLeg,
+             "Return the diagnosis of the sketch as bytes, running it first if needed.\n"
+             "import_plan() gives it to a sketch of the same structure, whose next solve\n"
+             "then skips the diagnosis.")
+        .def("import_plan",
+             [](SketchSolver& self, const py::bytes& plan) {
+                 self.import_plan(std::string(plan));
+             },
+             py::arg("plan"),
+             "Use a plan made by export_plan() instead of diagnosing the sketch. Raises\n"
+             "ValueError if the plan was made for a sketch of another structure.")
+        .def("sensitivity",
+             [](SketchSolver& self, const std::vector<int>& param_ids) {
+                 auto [unknowns, matrix] = self.sensitivity(param_ids);
+                 return std::make_pair(
+                     py::array_t<int>(unknowns.size(), unknowns.data()),
+                     py::array_t<double>(
+                         {matrix.rows(), matrix.cols()},
+                         {sizeof(double), sizeof(double) * matrix.rows()},
+                         matrix.data()));
+             },
+             py::arg("param_ids"),
+             "Derivatives of the unknowns with respect to fixed parameters (driving values)\n"
+             "at the current solution. Returns (unknowns, matrix): the ids of the unknowns,\n"
+             "and their derivatives, a row for each unknown and a column for each param_id.\n"
+             "Raises ValueError if one of param_ids is an unknown.")
+        .def("constraint_errors",
+             [](SketchSolver& self, std::optional<bool> driving) {
+                 auto [tags, errors] = self.constraint_errors(driving);
+                 return std::make_pair(
+                     py::array_t<int>(tags.size(), tags.data()),
+                     py::array_t<double>(errors.size(), errors.data()));
+             },
+             py::arg("driving") = py::none(),
+             "Calculate the error of every tag, as constraint_error does, in one pass.\n"
+             "Returns (tags, errors) arrays sorted by tag. driving=True or False only\n"
+             "evaluates driving or non-driving constraints.")
     ;
 }
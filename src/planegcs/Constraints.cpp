@@ -47,9 +47,31 @@ namespace GCS
 // Constraints
 ///////////////////////////////////////
 
+namespace
+{
+thread_local std::pmr::memory_resource* constraintAllocationResource = nullptr;
+}
+
+Constraint::AllocationScope::AllocationScope(std::pmr::memory_resource* resource)
+    : previous(constraintAllocationResource)
+{
+    constraintAllocationResource = resource;
+}
+
+Constraint::AllocationScope::~AllocationScope()
+{
+    constraintAllocationResource = previous;
+}
+
+std::pmr::memory_resource* Constraint::allocationResource()
+{
+    return constraintAllocationResource ? constraintAllocationResource
+                                        : std::pmr::get_default_resource();
+}
+
 Constraint::Constraint()
-    : origpvec(0)
-    , pvec(0)
+    : origpvec(allocationResource())
+    , pvec(allocationResource())
     , scale(1.)
     , tag(0)
     , pvecChangedFlag(true)
@@ -75,6 +97,24 @@ void Constraint::revertParams()
     pvecChangedFlag = true;
 }
 
+void Constraint::remapParams(const MAP_pD_pD& locations)
+{
+    for (auto vec : {&origpvec, &pvec}) {
+        for (auto& param : *vec) {
+            MAP_pD_pD::const_iterator it = locations.find(param);
+            if (it != locations.end()) {
+                param = it->second;
+            }
+        }
+    }
+    pvecChangedFlag = true;
+}
+
+std::size_t Constraint::heapMemoryUsage() const
+{
+    return heapBytes(origpvec) + heapBytes(pvec);
+}
+
 ConstraintType Constraint::getTypeId()
 {
     return None;
@@ -85,7 +125,7 @@ void Constraint::rescale(double coef)
     scale = coef * 1.0;
 }
 
-double Constraint::maxStep(MAP_pD_D& /*dir*/, double lim)
+double Constraint::maxStep(const StepDirection& /*dir*/, double lim)
 {
     return lim;
 }
@@ -144,16 +184,21 @@ ConstraintWeightedLinearCombination::ConstraintWeightedLinearCombination(
     const std::vector<double*>& givenpvec,
     const std::vector<double>& givenfactors
 )
-    : factors(givenfactors)
+    : factors(givenfactors.begin(), givenfactors.end(), allocationResource())
     , numpoles(givennumpoles)
 {
-    pvec = givenpvec;
+    pvec.assign(givenpvec.begin(), givenpvec.end());
     assert(pvec.size() == 2 * numpoles + 1);
     assert(factors.size() == numpoles);
     origpvec = pvec;
     rescale();
 }
 
+std::size_t ConstraintWeightedLinearCombination::heapMemoryUsage() const
+{
+    return Constraint::heapMemoryUsage() + heapBytes(factors);
+}
+
 ConstraintType ConstraintWeightedLinearCombination::getTypeId()
 {
     return WeightedLinearCombination;
@@ -216,10 +261,10 @@ ConstraintCenterOfGravity::ConstraintCenterOfGravity(
     const std::vector<double*>& givenpvec,
     const std::vector<double>& givenweights
 )
-    : weights(givenweights)
+    : weights(givenweights.begin(), givenweights.end(), allocationResource())
     , numpoints(givenpvec.size() - 1)
 {
-    pvec = givenpvec;
+    pvec.assign(givenpvec.begin(), givenpvec.end());
 
     assert(pvec.size() > 1);
     assert(weights.size() == numpoints);
@@ -227,6 +272,11 @@ ConstraintCenterOfGravity::ConstraintCenterOfGravity(
     rescale();
 }
 
+std::size_t ConstraintCenterOfGravity::heapMemoryUsage() const
+{
+    return Constraint::heapMemoryUsage() + heapBytes(weights);
+}
+
 ConstraintType ConstraintCenterOfGravity::getTypeId()
 {
     return CenterOfGravity;
@@ -262,6 +312,8 @@ double ConstraintCenterOfGravity::grad(double* param)
 // --------------------------------------------------------
 // Slope at B-spline knot
 ConstraintSlopeAtBSplineKnot::ConstraintSlopeAtBSplineKnot(BSpline& b, Line& l, size_t knotindex)
+    : factors(allocationResource())
+    , slopefactors(allocationResource())
 {
     // set up pvec: pole x-coords, pole y-coords, pole weights,
     // line point 1 coords, line point 2 coords
@@ -318,6 +370,11 @@ ConstraintSlopeAtBSplineKnot::ConstraintSlopeAtBSplineKnot(BSpline& b, Line& l,
     ConstraintSlopeAtBSplineKnot::rescale();
 }
 
+std::size_t ConstraintSlopeAtBSplineKnot::heapMemoryUsage() const
+{
+    return Constraint::heapMemoryUsage() + heapBytes(factors) + heapBytes(slopefactors);
+}
+
 ConstraintType ConstraintSlopeAtBSplineKnot::getTypeId()
 {
     return SlopeAtBSplineKnot;
@@ -715,33 +772,15 @@ double ConstraintP2PDistance::grad(double* param)
     return scale * deriv;
 }
 
-double ConstraintP2PDistance::maxStep(MAP_pD_D& dir, double lim)
+double ConstraintP2PDistance::maxStep(const StepDirection& dir, double lim)
 {
-    MAP_pD_D::iterator it;
-    it = dir.find(distance());
-    if (it != dir.end()) {
-        if (it->second < 0.) {
-            lim = std::min(lim, -(*distance()) / it->second);
-        }
+    double ddist = dir[distance()];
+    if (ddist < 0.) {
+        lim = std::min(lim, -(*distance()) / ddist);
     }
     // restrict actual distance change
-    double ddx = 0., ddy = 0.;
-    it = dir.find(p1x());
-    if (it != dir.end()) {
-        ddx += it->second;
-    }
-    it = dir.find(p1y());
-    if (it != dir.end()) {
-        ddy += it->second;
-    }
-    it = dir.find(p2x());
-    if (it != dir.end()) {
-        ddx -= it->second;
-    }
-    it = dir.find(p2y());
-    if (it != dir.end()) {
-        ddy -= it->second;
-    }
+    double ddx = dir[p1x()] - dir[p2x()];
+    double ddy = dir[p1y()] - dir[p2y()];
     double dd = sqrt(ddx * ddx + ddy * ddy);
     double dist = *distance();
     if (dd > dist) {
@@ -821,16 +860,13 @@ double ConstraintP2PAngle::grad(double* param)
     return scale * deriv;
 }
 
-double ConstraintP2PAngle::maxStep(MAP_pD_D& dir, double lim)
+double ConstraintP2PAngle::maxStep(const StepDirection& dir, double lim)
 {
     constexpr double pi_18 = std::numbers::pi / 18;
 
-    MAP_pD_D::iterator it = dir.find(angle());
-    if (it != dir.end()) {
-        double step = std::abs(it->second);
-        if (step > pi_18) {
-            lim = std::min(lim, pi_18 / step);
-        }
+    double step = std::abs(dir[angle()]);
+    if (step > pi_18) {
+        lim = std::min(lim, pi_18 / step);
     }
     return lim;
 }
@@ -910,43 +946,17 @@ double ConstraintP2LDistance::grad(double* param)
     return scale * deriv;
 }
 
-double ConstraintP2LDistance::maxStep(MAP_pD_D& dir, double lim)
+double ConstraintP2LDistance::maxStep(const StepDirection& dir, double lim)
 {
-    MAP_pD_D::iterator it;
-    it = dir.find(distance());
-    if (it != dir.end()) {
-        if (it->second < 0.) {
-            lim = std::min(lim, -(*distance()) / it->second);
-        }
+    double ddist = dir[distance()];
+    if (ddist < 0.) {
+        lim = std::min(lim, -(*distance()) / ddist);
     }
     // restrict actual area change
-    double darea = 0.;
     double x0 = *p0x(), x1 = *p1x(), x2 = *p2x();
     double y0 = *p0y(), y1 = *p1y(), y2 = *p2y();
-    it = dir.find(p0x());
-    if (it != dir.end()) {
-        darea += (y1 - y2) * it->second;
-    }
-    it = dir.find(p0y());
-    if (it != dir.end()) {
-        darea += (x2 - x1) * it->second;
-    }
-    it = dir.find(p1x());
-    if (it != dir.end()) {
-        darea += (y2 - y0) * it->second;
-    }
-    it = dir.find(p1y());
-    if (it != dir.end()) {
-        darea += (x0 - x2) * it->second;
-    }
-    it = dir.find(p2x());
-    if (it != dir.end()) {
-        darea += (y0 - y1) * it->second;
-    }
-    it = dir.find(p2y());
-    if (it != dir.end()) {
-        darea += (x1 - x0) * it->second;
-    }
+    double darea = (y1 - y2) * dir[p0x()] + (x2 - x1) * dir[p0y()] + (y2 - y0) * dir[p1x()]
+        + (x0 - x2) * dir[p1y()] + (y0 - y1) * dir[p2x()] + (x1 - x0) * dir[p2y()];
 
     darea = std::abs(darea);
     if (darea > 0.) {
@@ -1359,16 +1369,13 @@ double ConstraintL2LAngle::grad(double* param)
     return scale * deriv;
 }
 
-double ConstraintL2LAngle::maxStep(MAP_pD_D& dir, double lim)
+double ConstraintL2LAngle::maxStep(const StepDirection& dir, double lim)
 {
     constexpr double pi_18 = std::numbers::pi / 18;
 
-    MAP_pD_D::iterator it = dir.find(angle());
-    if (it != dir.end()) {
-        double step = std::abs(it->second);
-        if (step > pi_18) {
-            lim = std::min(lim, pi_18 / step);
-        }
+    double step = std::abs(dir[angle()]);
+    if (step > pi_18) {
+        lim = std::min(lim, pi_18 / step);
     }
     return lim;
 }
@@ -2048,6 +2055,11 @@ ConstraintCurveValue::~ConstraintCurveValue()
     this->crv = nullptr;
 }
 
+std::size_t ConstraintCurveValue::heapMemoryUsage() const
+{
+    return Constraint::heapMemoryUsage() + crv->memoryUsage();
+}
+
 void ConstraintCurveValue::ReconstructGeomPointers()
 {
     int i = 0;
@@ -2104,7 +2116,7 @@ void ConstraintCurveValue::errorgrad(double* err, double* grad, double* param)
     }
 }
 
-double ConstraintCurveValue::maxStep(MAP_pD_D& /*dir*/, double lim)
+double ConstraintCurveValue::maxStep(const StepDirection& /*dir*/, double lim)
 {
     return lim;
 }
@@ -2256,6 +2268,11 @@ ConstraintPointOnParabola::~ConstraintPointOnParabola()
     this->parab = nullptr;
 }
 
+std::size_t ConstraintPointOnParabola::heapMemoryUsage() const
+{
+    return Constraint::heapMemoryUsage() + parab->memoryUsage();
+}
+
 void ConstraintPointOnParabola::ReconstructGeomPointers()
 {
     int i = 0;
@@ -2334,6 +2351,11 @@ ConstraintAngleViaPoint::~ConstraintAngleViaPoint()
     crv2 = nullptr;
 }
 
+std::size_t ConstraintAngleViaPoint::heapMemoryUsage() const
+{
+    return Constraint::heapMemoryUsage() + crv1->memoryUsage() + crv2->memoryUsage();
+}
+
 void ConstraintAngleViaPoint::ReconstructGeomPointers()
 {
     int cnt = 0;
@@ -2429,6 +2451,11 @@ ConstraintAngleViaTwoPoints::~ConstraintAngleViaTwoPoints()
     crv2 = nullptr;
 }
 
+std::size_t ConstraintAngleViaTwoPoints::heapMemoryUsage() const
+{
+    return Constraint::heapMemoryUsage() + crv1->memoryUsage() + crv2->memoryUsage();
+}
+
 void ConstraintAngleViaTwoPoints::ReconstructGeomPointers()
 {
     int cnt = 0;
@@ -2527,6 +2554,11 @@ ConstraintAngleViaPointAndParam::~ConstraintAngleViaPointAndParam()
     crv2 = nullptr;
 }
 
+std::size_t ConstraintAngleViaPointAndParam::heapMemoryUsage() const
+{
+    return Constraint::heapMemoryUsage() + crv1->memoryUsage() + crv2->memoryUsage();
+}
+
 void ConstraintAngleViaPointAndParam::ReconstructGeomPointers()
 {
     int cnt = 0;
@@ -2624,6 +2656,11 @@ ConstraintAngleViaPointAndTwoParams::~ConstraintAngleViaPointAndTwoParams()
     crv2 = nullptr;
 }
 
+std::size_t ConstraintAngleViaPointAndTwoParams::heapMemoryUsage() const
+{
+    return Constraint::heapMemoryUsage() + crv1->memoryUsage() + crv2->memoryUsage();
+}
+
 void ConstraintAngleViaPointAndTwoParams::ReconstructGeomPointers()
 {
     int cnt = 0;
@@ -2731,6 +2768,12 @@ ConstraintSnell::~ConstraintSnell()
     boundary = nullptr;
 }
 
+std::size_t ConstraintSnell::heapMemoryUsage() const
+{
+    return Constraint::heapMemoryUsage() + ray1->memoryUsage() + ray2->memoryUsage()
+        + boundary->memoryUsage();
+}
+
 void ConstraintSnell::ReconstructGeomPointers()
 {
     int cnt = 0;
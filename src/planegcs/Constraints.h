@@ -25,6 +25,9 @@
 #ifndef PLANEGCS_CONSTRAINTS_H
 #define PLANEGCS_CONSTRAINTS_H
 
+#include <functional>
+#include <memory_resource>
+
 #include "SketcherGlobal.h"
 #include "Geo.h"
 
@@ -109,6 +112,31 @@ enum InternalAlignmentType
     HyperbolaNegativeMinorY = 17
 };
 
+// Search direction of a solver step. The entries are indexed like the contiguous parameter
+// values a SubSystem redirects its constraints to, so looking up the step of a parameter is a
+// pointer offset. Parameters outside of that storage are not moved by the step.
+class StepDirection
+{
+    const double* base;
+    const double* dir;
+    int size;
+
+public:
+    StepDirection(const double* base_, const double* dir_, int size_)
+        : base(base_)
+        , dir(dir_)
+        , size(size_)
+    {}
+    double operator[](const double* param) const
+    {
+        std::less<const double*> less;
+        if (less(param, base) || !less(param, base + size)) {
+            return 0.;
+        }
+        return dir[param - base];
+    }
+};
+
 class SketcherExport Constraint
 {
 
@@ -131,6 +159,19 @@ public:
     Alignment internalAlignment;
 
 public:
+    // While a scope is alive, the constraints constructed on its thread allocate their vectors
+    // from its memory resource, see System::createConstraint()
+    class AllocationScope
+    {
+        std::pmr::memory_resource* previous;
+
+    public:
+        explicit AllocationScope(std::pmr::memory_resource* resource);
+        ~AllocationScope();
+        AllocationScope(const AllocationScope&) = delete;
+        AllocationScope& operator=(const AllocationScope&) = delete;
+    };
+
     Constraint();
     virtual ~Constraint()
     {}
@@ -139,9 +180,17 @@ public:
     {
         return pvec;
     }
+    const VEC_pD& origParams() const
+    {
+        return origpvec;
+    }
 
     void redirectParams(const MAP_pD_pD& redirectionmap);
     void revertParams();
+    // for parameters moved elsewhere: points both pvec and origpvec at the new locations
+    void remapParams(const MAP_pD_pD& locations);
+    // bytes the constraint holds on the heap, besides the object itself
+    virtual std::size_t heapMemoryUsage() const;
     void setTag(int tagId)
     {
         tag = tagId;
@@ -202,12 +251,15 @@ public:
         return deriv * scale;
     };
     // virtual void grad(MAP_pD_D &deriv);  --> TODO: vectorized grad version
-    virtual double maxStep(MAP_pD_D& dir, double lim = 1.);
+    virtual double maxStep(const StepDirection& dir, double lim = 1.);
     // Finds first occurrence of param in pvec. This is useful to test if a constraint depends
     // on the parameter (it may not actually depend on it, e.g. angle-via-point doesn't depend
     // on ellipse's b (radmin), but b will be included within the constraint anyway.
     // Returns -1 if not found.
     int findParamInPvec(double* param);
+
+protected:
+    static std::pmr::memory_resource* allocationResource();
 };
 
 // Equal
@@ -226,6 +278,10 @@ private:
 
 public:
     ConstraintEqual(double* p1, double* p2, double p1p2ratio = 1.0);
+    double getRatio() const
+    {
+        return ratio;
+    }
     ConstraintType getTypeId() override;
     double error() override;
     double grad(double*) override;
@@ -252,12 +308,13 @@ public:
         const std::vector<double*>& givenpvec,
         const std::vector<double>& givenweights
     );
+    std::size_t heapMemoryUsage() const override;
     ConstraintType getTypeId() override;
     double error() override;
     double grad(double*) override;
 
 private:
-    std::vector<double> weights;
+    std::pmr::vector<double> weights;
     std::size_t numpoints;
 };
 
@@ -295,12 +352,13 @@ public:
         const std::vector<double*>& givenpvec,
         const std::vector<double>& givenfactors
     );
+    std::size_t heapMemoryUsage() const override;
     ConstraintType getTypeId() override;
     double error() override;
     double grad(double*) override;
 
 private:
-    std::vector<double> factors;
+    std::pmr::vector<double> factors;
     size_t numpoles;
 };
 
@@ -341,14 +399,15 @@ public:
     // TODO: Should be able to make the geometries passed const
     // Constrains the slope at a (C1 continuous) knot of the b-spline
     ConstraintSlopeAtBSplineKnot(BSpline& b, Line& l, size_t knotindex);
+    std::size_t heapMemoryUsage() const override;
     ConstraintType getTypeId() override;
     void rescale(double coef = 1.) override;
     double error() override;
     double grad(double*) override;
 
 private:
-    std::vector<double> factors;
-    std::vector<double> slopefactors;
+    std::pmr::vector<double> factors;
+    std::pmr::vector<double> slopefactors;
     size_t numpoles;
 };
 
@@ -445,7 +504,7 @@ public:
     ConstraintType getTypeId() override;
     double error() override;
     double grad(double*) override;
-    double maxStep(MAP_pD_D& dir, double lim = 1.) override;
+    double maxStep(const StepDirection& dir, double lim = 1.) override;
 };
 
 // P2PAngle
@@ -476,6 +535,10 @@ private:
 
 public:
     ConstraintP2PAngle(Point& p1, Point& p2, double* a, double da_ = 0.);
+    double getIncrAngle() const
+    {
+        return da;
+    }
 #ifdef _GCS_EXTRACT_SOLVER_SUBSYSTEM_
     ConstraintP2PAngle()
     {}
@@ -483,7 +546,7 @@ public:
     ConstraintType getTypeId() override;
     double error() override;
     double grad(double*) override;
-    double maxStep(MAP_pD_D& dir, double lim = 1.) override;
+    double maxStep(const StepDirection& dir, double lim = 1.) override;
 };
 
 // P2LDistance
@@ -528,7 +591,7 @@ public:
     ConstraintType getTypeId() override;
     double error() override;
     double grad(double*) override;
-    double maxStep(MAP_pD_D& dir, double lim = 1.) override;
+    double maxStep(const StepDirection& dir, double lim = 1.) override;
     double abs(double darea);
 };
 
@@ -762,7 +825,7 @@ public:
     ConstraintType getTypeId() override;
     double error() override;
     double grad(double*) override;
-    double maxStep(MAP_pD_D& dir, double lim = 1.) override;
+    double maxStep(const StepDirection& dir, double lim = 1.) override;
 };
 
 // MidpointOnLine
@@ -924,6 +987,10 @@ class ConstraintInternalAlignmentPoint2Ellipse: public Constraint
 public:
     ConstraintInternalAlignmentPoint2Ellipse(Ellipse& e, Point& p1, InternalAlignmentType alignmentType);
     ConstraintType getTypeId() override;
+    InternalAlignmentType getAlignmentType() const
+    {
+        return AlignmentType;
+    }
 
 private:
     void errorgrad(double* err, double* grad, double* param) override;
@@ -943,6 +1010,10 @@ public:
         InternalAlignmentType alignmentType
     );
     ConstraintType getTypeId() override;
+    InternalAlignmentType getAlignmentType() const
+    {
+        return AlignmentType;
+    }
 
 private:
     void errorgrad(double* err, double* grad, double* param) override;
@@ -1010,8 +1081,9 @@ public:
      */
     ConstraintCurveValue(Point& p, double* pcoord, Curve& crv, double* u);
     ~ConstraintCurveValue() override;
+    std::size_t heapMemoryUsage() const override;
     ConstraintType getTypeId() override;
-    double maxStep(MAP_pD_D& dir, double lim = 1.) override;
+    double maxStep(const StepDirection& dir, double lim = 1.) override;
 };
 
 // PointOnHyperbola
@@ -1073,6 +1145,7 @@ public:
     ConstraintPointOnParabola(Point& p, Parabola& e);
     ConstraintPointOnParabola(Point& p, ArcOfParabola& a);
     ~ConstraintPointOnParabola() override;
+    std::size_t heapMemoryUsage() const override;
 #ifdef _GCS_EXTRACT_SOLVER_SUBSYSTEM_
     ConstraintPointOnParabola()
     {}
@@ -1106,6 +1179,7 @@ private:
 public:
     ConstraintAngleViaPoint(Curve& acrv1, Curve& acrv2, Point p, double* angle);
     ~ConstraintAngleViaPoint() override;
+    std::size_t heapMemoryUsage() const override;
     ConstraintType getTypeId() override;
     double error() override;
     double grad(double*) override;
@@ -1140,6 +1214,7 @@ private:
 public:
     ConstraintAngleViaTwoPoints(Curve& acrv1, Curve& acrv2, Point p1, Point p2, double* angle);
     ~ConstraintAngleViaTwoPoints() override;
+    std::size_t heapMemoryUsage() const override;
     ConstraintType getTypeId() override;
     double error() override;
     double grad(double*) override;
@@ -1189,6 +1264,7 @@ public:
         bool flipn2
     );
     ~ConstraintSnell() override;
+    std::size_t heapMemoryUsage() const override;
     ConstraintType getTypeId() override;
 };
 
@@ -1221,6 +1297,7 @@ public:
     // We assume first curve needs param1
     ConstraintAngleViaPointAndParam(Curve& acrv1, Curve& acrv2, Point p, double* param1, double* angle);
     ~ConstraintAngleViaPointAndParam() override;
+    std::size_t heapMemoryUsage() const override;
     ConstraintType getTypeId() override;
     double error() override;
     double grad(double*) override;
@@ -1266,6 +1343,7 @@ public:
         double* angle
     );
     ~ConstraintAngleViaPointAndTwoParams() override;
+    std::size_t heapMemoryUsage() const override;
     ConstraintType getTypeId() override;
     double error() override;
     double grad(double*) override;
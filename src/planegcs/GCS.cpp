@@ -49,10 +49,16 @@
 #endif
 
 #include <algorithm>
+#include <cstddef>
+#include <deque>
 #include <future>
 #include <iostream>
 #include <limits>
+#include <new>
 #include <numbers>
+#include <numeric>
+#include <thread>
+#include <utility>
 
 #include "GCS.h"
 #include "qp_eq.h"
@@ -100,8 +106,6 @@
 #include <Base/Console.h>
 #include <FCConfig.h>
 
-#include <boost/graph/connected_components.hpp>
-#include <boost_graph_adjacency_list.hpp>
 
 using MatrixIndexType = Eigen::FullPivHouseholderQR<Eigen::MatrixXd>::IntDiagSizeVectorType;
 
@@ -244,7 +248,7 @@ public:
         std::vector<std::vector<Constraint*>> constraintgroups
     );
     void LogSetOfConstraints(const std::string& str, std::set<Constraint*> constraintset);
-    void LogGroupOfParameters(const std::string& str, std::vector<std::vector<double*>> parametergroups);
+    void LogGroupOfParameters(const std::string& str, std::vector<VEC_pD> parametergroups);
 
     void LogMatrix(const std::string str, Eigen::MatrixXd matrix);
     void LogMatrix(const std::string str, MatrixIndexType matrix);
@@ -410,7 +414,7 @@ void SolverReportingManager::LogSetOfConstraints(
 
 void SolverReportingManager::LogGroupOfParameters(
     const std::string& str,
-    std::vector<std::vector<double*>> parametergroups
+    std::vector<VEC_pD> parametergroups
 )
 {
     std::stringstream tempstream;
@@ -457,7 +461,6 @@ void SolverReportingManager::LogMatrix(const std::string str, MatrixIndexType ma
 #endif
 
 
-using Graph = boost::adjacency_list<boost::vecS, boost::vecS, boost::undirectedS>;
 
 ///////////////////////////////////////
 // Solver
@@ -470,13 +473,17 @@ System::System()
     , pDependentParameters(0)
     , clist(0)
     , c2p()
-    , p2c()
+    , pComponentsAddedFrom(0)
+    , pComponentsValid(false)
+    , pComponentsReduced(false)
     , subSystems(0)
     , subSystemsAux(0)
     , reference(0)
     , dofs(0)
     , hasUnknowns(false)
     , hasDiagnosis(false)
+    , hasDofs(false)
+    , hasDependentParameters(false)
     , isInit(false)
     , emptyDiagnoseMatrix(true)
     , maxIter(100)
@@ -488,6 +495,13 @@ System::System()
     , qrAlgorithm(EigenSparseQR)
     , autoChooseAlgorithm(true)
     , autoQRThreshold(1000)
+    , lbfgsHistory(10)
+    , clusterSizeLimit(6)
+    , splitDiagnosis(true)
+    , constructivePlacement(false)
+    , solveIterations(0)
+    , solvePlacements(0)
+    , solveSkipped(0)
     , dogLegGaussStep(FullPivLU)
     , qrpivotThreshold(1E-13)
     , debugMode(Minimal)
@@ -518,6 +532,7 @@ System::~System()
 
 void System::clear()
 {
+    endTransaction();
     plist.clear();
     pdrivenlist.clear();
     pIndex.clear();
@@ -525,78 +540,604 @@ void System::clear()
     pDependentParametersGroups.clear();
     hasUnknowns = false;
     hasDiagnosis = false;
+    hasDofs = false;
+    hasDependentParameters = false;
 
     emptyDiagnoseMatrix = true;
 
     redundant.clear();
     conflictingTags.clear();
+    chosenConflictingTags.clear();
     redundantTags.clear();
     partiallyRedundantTags.clear();
 
     reference.clear();
     clearSubSystems();
-    deleteAllContent(clist);
+    // every constraint is destroyed, removed ones not yet compacted included, but the memory
+    // goes back with the pool in one go
+    constraintPool.dropping = true;
+    for (const auto constr : clist) {
+        constr->~Constraint();
+    }
+    clist.clear();
+    clistRemoved.clear();
+    constraintPool.release();
+    tagIndex.clear();
+#ifdef EIGEN_SPARSEQR_COMPATIBLE
+    diagnosisSparseQR.clear();
+#endif
+    incrementalDiagnosis.reset();
     c2p.clear();
-    p2c.clear();
+    pComponentsAddedFrom = 0;
+    pComponentsDirty.clear();
+    pComponentsValid = false;
 }
 
 void System::invalidatedDiagnosis()
 {
+    isInit = false;
     hasDiagnosis = false;
+    hasDofs = false;
+    hasDependentParameters = false;
     pDependentParameters.clear();
     pDependentParametersGroups.clear();
+    dropIncrementalDiagnosis();
 }
 
-void System::clearByTag(int tagId)
+bool System::recordDiagnosis(DiagnosisRecord& record)
+{
+    compactConstraints();
+    if (!hasUnknowns || !hasDiagnosis) {
+        return false;
+    }
+    record.dofs = dofs;
+    record.emptyDiagnoseMatrix = emptyDiagnoseMatrix;
+    record.redundant.clear();
+    for (int i = 0; i < int(clist.size()); i++) {
+        if (redundant.count(clist[i]) > 0) {
+            record.redundant.push_back(i);
+        }
+    }
+    record.conflictingTags = conflictingTags;
+    record.chosenConflictingTags = chosenConflictingTags;
+    record.redundantTags = redundantTags;
+    record.partiallyRedundantTags = partiallyRedundantTags;
+    record.hasDependentParameters = hasDependentParameters;
+    auto indices = [this](const VEC_pD& params) {
+        VEC_I result;
+        for (const auto param : params) {
+            result.push_back(pIndex.at(param));
+        }
+        return result;
+    };
+    record.dependentParameters = indices(pDependentParameters);
+    record.dependentParametersGroups.clear();
+    for (const auto& group : pDependentParametersGroups) {
+        record.dependentParametersGroups.push_back(indices(group));
+    }
+    return true;
+}
+
+bool System::restoreDiagnosis(const DiagnosisRecord& record)
 {
-    std::vector<Constraint*> constrvec;
-    for (const auto& constr : clist) {
-        if (constr->getTag() == tagId) {
-            constrvec.push_back(constr);
+    compactConstraints();
+    if (!hasUnknowns) {
+        return false;
+    }
+    const int constrNum = int(clist.size());
+    const int paramsNum = int(plist.size());
+    auto inRange = [](const VEC_I& indices, int size) {
+        return std::ranges::all_of(indices, [size](int i) {
+            return i >= 0 && i < size;
+        });
+    };
+    auto knownTags = [this](const VEC_I& tags) {
+        return std::ranges::all_of(tags, [this](int tag) {
+            return tagIndex.count(tag) > 0;
+        });
+    };
+    if (!inRange(record.redundant, constrNum) || !inRange(record.dependentParameters, paramsNum)
+        || !std::ranges::all_of(
+            record.dependentParametersGroups,
+            [&](const VEC_I& group) {
+                return inRange(group, paramsNum);
+            }
+        )
+        || !knownTags(record.conflictingTags) || !knownTags(record.chosenConflictingTags)
+        || !knownTags(record.redundantTags) || !knownTags(record.partiallyRedundantTags)) {
+        return false;
+    }
+
+    invalidatedDiagnosis();
+    // as diagnose() does, so that the constraints read their own parameters again
+    for (const auto constr : clist) {
+        constr->revertParams();
+    }
+    dofs = record.dofs;
+    emptyDiagnoseMatrix = record.emptyDiagnoseMatrix;
+    redundant.clear();
+    for (const int i : record.redundant) {
+        redundant.insert(clist[i]);
+    }
+    conflictingTags = record.conflictingTags;
+    chosenConflictingTags = record.chosenConflictingTags;
+    redundantTags = record.redundantTags;
+    partiallyRedundantTags = record.partiallyRedundantTags;
+    hasDependentParameters = record.hasDependentParameters;
+    for (const int i : record.dependentParameters) {
+        pDependentParameters.push_back(plist[i]);
+    }
+    for (const auto& group : record.dependentParametersGroups) {
+        auto& params = pDependentParametersGroups.emplace_back();
+        for (const int i : group) {
+            params.push_back(plist[i]);
         }
     }
-    for (const auto& constr : constrvec) {
-        removeConstraint(constr);
+    hasDiagnosis = true;
+    hasDofs = true;
+    return true;
+}
+
+void System::clearByTag(int tagId)
+{
+    auto it = tagIndex.find(tagId);
+    if (it == tagIndex.end()) {
+        return;
+    }
+    std::vector<Constraint*> constrvec = std::move(it->second);
+    tagIndex.erase(it);
+    for (const auto constr : constrvec) {
+        retireConstraint(constr);
+    }
+}
+
+void System::clearByTags(const VEC_I& tagIds)
+{
+    for (const auto tagId : tagIds) {
+        clearByTag(tagId);
     }
 }
 
+// Every constraint is preceded in the pool by the size of its allocation, so that it can be
+// returned without knowing the dynamic type of the constraint.
+constexpr std::size_t constraintHeaderSize = alignof(std::max_align_t);
+
+namespace
+{
+char* constraintAllocation(const Constraint* constr)
+{
+    return const_cast<char*>(static_cast<const char*>(dynamic_cast<const void*>(constr)))
+        - constraintHeaderSize;
+}
+}  // namespace
+
+template<typename T, typename... Args>
+T* System::createConstraint(Args&&... args)
+{
+    static_assert(alignof(T) <= constraintHeaderSize);
+    std::size_t size = constraintHeaderSize + sizeof(T);
+    char* mem = static_cast<char*>(constraintPool.allocate(size, constraintHeaderSize));
+    *reinterpret_cast<std::size_t*>(mem) = size;
+    Constraint::AllocationScope scope(&constraintPool);
+    return new (mem + constraintHeaderSize) T(std::forward<Args>(args)...);
+}
+
+void System::destroyConstraint(Constraint* constr)
+{
+    char* mem = constraintAllocation(constr);
+    std::size_t size = *reinterpret_cast<std::size_t*>(mem);
+    constr->~Constraint();
+    constraintPool.deallocate(mem, size, constraintHeaderSize);
+}
+
 int System::addConstraint(Constraint* constr)
 {
     isInit = false;
     if (constr->getTag() >= 0) {  // negatively tagged constraints have no impact
         hasDiagnosis = false;     // on the diagnosis
+        hasDofs = false;
     }
 
     clist.push_back(constr);
-    VEC_pD constr_params = constr->params();
-    for (const auto& param : constr_params) {
-        // jacobi.set(constr, *param, 0.);
-        c2p[constr].push_back(param);
-        p2c[param].push_back(constr);
-    }
+    tagIndex[constr->getTag()].push_back(constr);
     return clist.size() - 1;
 }
 
 void System::removeConstraint(Constraint* constr)
 {
-    std::vector<Constraint*>::iterator it;
-    it = std::ranges::find(clist, constr);
-    if (it == clist.end()) {
+    auto tagIt = tagIndex.find(constr->getTag());
+    if (tagIt == tagIndex.end()) {
+        return;
+    }
+    std::vector<Constraint*>& constrvec = tagIt->second;
+    std::vector<Constraint*>::iterator it = std::ranges::find(constrvec, constr);
+    if (it == constrvec.end()) {
         return;
     }
 
-    clist.erase(it);
+    constrvec.erase(it);
+    if (constrvec.empty()) {
+        tagIndex.erase(tagIt);
+    }
+    retireConstraint(constr);
+}
+
+void System::retireConstraint(Constraint* constr)
+{
+    // constr is already out of tagIndex, it leaves clist with the next compactConstraints()
+    clistRemoved.insert(constr);
     if (constr->getTag() >= 0) {
         hasDiagnosis = false;
+        hasDofs = false;
+    }
+    dropIncrementalDiagnosis();
+    clearSubSystems();
+
+    if (pComponentsValid) {
+        for (const auto param : constr->origParams()) {
+            MAP_pD_I::const_iterator it = pIndex.find(param);
+            if (it != pIndex.end()) {
+                pComponentsDirty.push_back(it->second);
+            }
+        }
+    }
+}
+
+void System::compactConstraints()
+{
+    if (clistRemoved.empty()) {
+        return;
+    }
+
+    std::size_t kept = 0;
+    std::size_t addedFrom = 0;
+    for (std::size_t i = 0; i < clist.size(); i++) {
+        if (i == pComponentsAddedFrom) {
+            addedFrom = kept;
+        }
+        if (clistRemoved.count(clist[i]) == 0) {
+            clist[kept++] = clist[i];
+        }
+    }
+    pComponentsAddedFrom = pComponentsAddedFrom < clist.size() ? addedFrom : kept;
+    clist.resize(kept);
+
+    for (const auto constr : clistRemoved) {
+        if (transaction && transaction->kept.count(constr) != 0) {
+            transaction->retired.push_back(constr);
+        }
+        else {
+            destroyConstraint(constr);
+        }
+    }
+    clistRemoved.clear();
+}
+
+void System::dropIncrementalDiagnosis()
+{
+    if (transaction && incrementalDiagnosis.get() == transaction->incremental) {
+        transaction->droppedIncremental = std::move(incrementalDiagnosis);
+    }
+    incrementalDiagnosis.reset();
+}
+
+void System::beginTransaction()
+{
+    endTransaction();
+    compactConstraints();
+    auto state = std::make_unique<Transaction>();
+    state->clist = clist;
+    state->kept.insert(clist.begin(), clist.end());
+    state->plist = plist;
+    state->hasUnknowns = hasUnknowns;
+
+    state->dofs = dofs;
+    state->redundant = redundant;
+    state->conflictingTags = conflictingTags;
+    state->chosenConflictingTags = chosenConflictingTags;
+    state->redundantTags = redundantTags;
+    state->partiallyRedundantTags = partiallyRedundantTags;
+    state->pDependentParameters = pDependentParameters;
+    state->pDependentParametersGroups = pDependentParametersGroups;
+    state->hasDiagnosis = hasDiagnosis;
+    state->hasDofs = hasDofs;
+    state->hasDependentParameters = hasDependentParameters;
+    state->emptyDiagnoseMatrix = emptyDiagnoseMatrix;
+
+    state->incremental = incrementalDiagnosis.get();
+    if (incrementalDiagnosis) {
+        // it only grows as constraints are added, so how far it had got is enough to go back
+        const auto& incremental = *incrementalDiagnosis;
+        state->incrementalConstraintsNum = incremental.constraintsNum;
+        state->incrementalValuesNum = incremental.values.size();
+        state->incrementalSatisfiedNum = incremental.satisfiedNum;
+        state->incrementalBasisNum = incremental.basis.size();
+        state->incrementalRank = incremental.rank;
+        state->incrementalMaxPivot = incremental.maxPivot;
+        state->incrementalMinPivot = incremental.minPivot;
+        state->incrementalAddedTags = incremental.addedTags;
+        state->incrementalConflicting = incremental.conflicting;
+    }
+
+    state->pComponents = pComponents;
+    state->pComponentsAddedFrom = pComponentsAddedFrom;
+    state->pComponentsDirty = pComponentsDirty;
+    state->pComponentsValid = pComponentsValid;
+    state->pComponentsReduced = pComponentsReduced;
+    state->isInit = isInit;
+    transaction = std::move(state);
+}
+
+void System::commitTransaction()
+{
+    endTransaction();
+}
+
+void System::endTransaction()
+{
+    if (!transaction) {
+        return;
+    }
+    // the plan set aside refers to the retired constraints, so it goes first
+    deleteAllContent(transaction->subSystems);
+    deleteAllContent(transaction->subSystemsAux);
+    transaction->clusters.clear();
+    for (const auto constr : transaction->retired) {
+        destroyConstraint(constr);
+    }
+    transaction.reset();
+}
+
+void System::rollbackTransaction()
+{
+    if (!transaction) {
+        return;
+    }
+    std::unique_ptr<Transaction> state = std::move(transaction);
+
+    // the plan in use is the one of the beginning, unless it was set aside
+    if (state->planKept) {
+        clearSubSystems();
+        subSystems = std::move(state->subSystems);
+        subSystemsAux = std::move(state->subSystemsAux);
+        clusters = std::move(state->clusters);
+        componentStates = std::move(state->componentStates);
+        plists = std::move(state->plists);
+        clists = std::move(state->clists);
+        reductionmaps = std::move(state->reductionmaps);
+        constantConstraints = std::move(state->constantConstraints);
+        c2p = std::move(state->c2p);
+    }
+    isInit = state->isInit;
+
+    // the constraints added meanwhile go, the retired ones come back
+    for (const auto constr : clist) {
+        if (state->kept.count(constr) == 0) {
+            destroyConstraint(constr);
+        }
+    }
+    clistRemoved.clear();
+    clist = std::move(state->clist);
+    tagIndex.clear();
+    for (const auto constr : clist) {
+        tagIndex[constr->getTag()].push_back(constr);
+    }
+
+    if (plist != state->plist) {
+        plist = std::move(state->plist);
+        pIndex.clear();
+        for (int i = 0; i < int(plist.size()); ++i) {
+            pIndex[plist[i]] = i;
+        }
+    }
+    hasUnknowns = state->hasUnknowns;
+
+    dofs = state->dofs;
+    redundant = std::move(state->redundant);
+    conflictingTags = std::move(state->conflictingTags);
+    chosenConflictingTags = std::move(state->chosenConflictingTags);
+    redundantTags = std::move(state->redundantTags);
+    partiallyRedundantTags = std::move(state->partiallyRedundantTags);
+    pDependentParameters = std::move(state->pDependentParameters);
+    pDependentParametersGroups = std::move(state->pDependentParametersGroups);
+    hasDiagnosis = state->hasDiagnosis;
+    hasDofs = state->hasDofs;
+    hasDependentParameters = state->hasDependentParameters;
+    emptyDiagnoseMatrix = state->emptyDiagnoseMatrix;
+
+    if (state->droppedIncremental) {
+        incrementalDiagnosis = std::move(state->droppedIncremental);
+    }
+    if (incrementalDiagnosis && incrementalDiagnosis.get() == state->incremental) {
+        auto& incremental = *incrementalDiagnosis;
+        incremental.constraintsNum = state->incrementalConstraintsNum;
+        incremental.values.resize(state->incrementalValuesNum);
+        incremental.satisfiedNum = state->incrementalSatisfiedNum;
+        incremental.basis.resize(state->incrementalBasisNum);
+        incremental.rank = state->incrementalRank;
+        incremental.maxPivot = state->incrementalMaxPivot;
+        incremental.minPivot = state->incrementalMinPivot;
+        incremental.addedTags = std::move(state->incrementalAddedTags);
+        incremental.conflicting = std::move(state->incrementalConflicting);
+    }
+    else {
+        incrementalDiagnosis.reset();
+    }
+
+    pComponents = std::move(state->pComponents);
+    pComponentsAddedFrom = state->pComponentsAddedFrom;
+    pComponentsDirty = std::move(state->pComponentsDirty);
+    pComponentsValid = state->pComponentsValid;
+    pComponentsReduced = state->pComponentsReduced;
+
+    for (const auto constr : state->retired) {
+        constr->revertParams();
+    }
+}
+
+void System::remapParams(const MAP_pD_pD& locations)
+{
+    compactConstraints();
+    for (const auto constr : clist) {
+        constr->remapParams(locations);
+    }
+    for (auto& param : pdrivenlist) {
+        MAP_pD_pD::const_iterator it = locations.find(param);
+        if (it != locations.end()) {
+            param = it->second;
+        }
     }
+    invalidatedDiagnosis();
     clearSubSystems();
+    plist.clear();
+    pIndex.clear();
+    hasUnknowns = false;
+    pComponentsValid = false;
+}
+
+std::size_t System::constraintMemoryUsage(const Constraint* constr)
+{
+    return *reinterpret_cast<const std::size_t*>(constraintAllocation(constr))
+        + constr->heapMemoryUsage();
+}
+
+void System::planMemoryUsage(
+    const std::vector<SubSystem*>& subSystems,
+    const std::vector<SubSystem*>& subSystemsAux,
+    const std::vector<std::vector<Cluster>>& clusters,
+    const std::vector<ComponentState>& componentStates,
+    const std::vector<VEC_pD>& plists,
+    const std::vector<std::vector<Constraint*>>& clists,
+    const std::vector<MAP_pD_pD>& reductionmaps,
+    const std::vector<Constraint*>& constantConstraints,
+    std::size_t& subsystems,
+    std::size_t& adjacency
+)
+{
+    auto addSubsystem = [&](const SubSystem* subsys) {
+        if (subsys) {
+            std::size_t bytes, adjacencyBytes;
+            subsys->memoryUsage(bytes, adjacencyBytes);
+            subsystems += bytes - adjacencyBytes;
+            adjacency += adjacencyBytes;
+        }
+    };
+    subsystems += heapBytes(subSystems) + heapBytes(subSystemsAux) + heapBytes(clusters)
+        + heapBytes(componentStates) + heapBytes(plists) + heapBytes(clists)
+        + heapBytes(reductionmaps) + heapBytes(constantConstraints);
+    for (const auto subsys : subSystems) {
+        addSubsystem(subsys);
+    }
+    for (const auto subsys : subSystemsAux) {
+        addSubsystem(subsys);
+    }
+    for (const auto& componentClusters : clusters) {
+        for (const auto& cluster : componentClusters) {
+            subsystems += heapBytes(cluster.aliases) + heapBytes(cluster.placing);
+            addSubsystem(cluster.subsys.get());
+        }
+    }
+    for (const auto& state : componentStates) {
+        subsystems += heapBytes(state.params) + heapBytes(state.applied);
+    }
+}
+
+std::size_t System::diagnosisBlockMemoryUsage(const DiagnosisBlock& block)
+{
+    // the factors of the dense QR decomposition, with its Householder coefficients, its row and
+    // column transpositions and permutation, and a scratch vector
+    const auto& qr = block.denseQR;
+    std::size_t size = std::min(qr.rows(), qr.cols());
+    return heapBytes(block.rows) + heapBytes(block.cols) + heapBytes(block.conflictGroups)
+        + qr.rows() * qr.cols() * sizeof(double) + size * (sizeof(double) + 2 * sizeof(int))
+        + qr.cols() * (sizeof(int) + sizeof(double));
+}
+
+std::size_t System::incrementalDiagnosisMemoryUsage(const IncrementalDiagnosis& incremental)
+{
+    std::size_t bytes = sizeof(IncrementalDiagnosis) + heapBytes(incremental.pdiagnoselist)
+        + heapBytes(incremental.colOfParam) + heapBytes(incremental.blocks)
+        + heapBytes(incremental.blockOfCol) + heapBytes(incremental.values)
+        + heapBytes(incremental.conflicting) + heapBytes(incremental.basis)
+        + heapBytes(incremental.addedTags);
+    for (const auto& block : incremental.blocks) {
+        bytes += diagnosisBlockMemoryUsage(block);
+    }
+    return bytes;
+}
+
+void System::memoryUsage(MemoryUsage& usage) const
+{
+    usage = MemoryUsage();
+    usage.unknowns = heapBytes(plist) + heapBytes(pdrivenlist) + heapBytes(pIndex)
+        + heapBytes(reference);
 
-    for (const auto& param : c2p[constr]) {
-        p2c[param].erase(std::ranges::find(p2c[param], constr));
+    usage.constraints = heapBytes(clist) + heapBytes(tagIndex) + heapBytes(clistRemoved);
+    for (const auto constr : clist) {
+        usage.constraints += constraintMemoryUsage(constr);
     }
-    c2p.erase(constr);
 
-    delete (constr);
+    usage.adjacency = heapBytes(c2p) + heapBytes(pComponents) + heapBytes(pComponentsDirty);
+    planMemoryUsage(
+        subSystems,
+        subSystemsAux,
+        clusters,
+        componentStates,
+        plists,
+        clists,
+        reductionmaps,
+        constantConstraints,
+        usage.subsystems,
+        usage.adjacency
+    );
+
+    usage.diagnosis = heapBytes(pDependentParameters) + heapBytes(pDependentParametersGroups)
+        + heapBytes(redundant) + heapBytes(conflictingTags) + heapBytes(redundantTags)
+        + heapBytes(partiallyRedundantTags) + heapBytes(chosenConflictingTags);
+#ifdef EIGEN_SPARSEQR_COMPATIBLE
+    // of a SparseQR decomposition, the R factor and the column permutations, which are what
+    // can be read back from it
+    usage.diagnosis += heapBytes(diagnosisSparseQR);
+    for (const auto& [first, cache] : diagnosisSparseQR) {
+        const auto& R = cache.qr.matrixR();
+        usage.diagnosis += heapBytes(cache.pattern)
+            + R.data().allocatedSize() * (sizeof(double) + sizeof(int))
+            + (R.outerSize() + 1) * sizeof(int) + 3 * R.cols() * sizeof(int);
+    }
+#endif
+    if (incrementalDiagnosis) {
+        usage.diagnosis += incrementalDiagnosisMemoryUsage(*incrementalDiagnosis);
+    }
+
+    if (transaction) {
+        const Transaction& state = *transaction;
+        usage.transaction = sizeof(Transaction) + heapBytes(state.clist) + heapBytes(state.kept)
+            + heapBytes(state.retired) + heapBytes(state.plist) + heapBytes(state.redundant)
+            + heapBytes(state.conflictingTags) + heapBytes(state.chosenConflictingTags)
+            + heapBytes(state.redundantTags) + heapBytes(state.partiallyRedundantTags)
+            + heapBytes(state.pDependentParameters) + heapBytes(state.pDependentParametersGroups)
+            + heapBytes(state.incrementalAddedTags) + heapBytes(state.incrementalConflicting)
+            + heapBytes(state.pComponents) + heapBytes(state.pComponentsDirty)
+            + heapBytes(state.c2p);
+        for (const auto constr : state.retired) {
+            usage.transaction += constraintMemoryUsage(constr);
+        }
+        if (state.droppedIncremental) {
+            usage.transaction += incrementalDiagnosisMemoryUsage(*state.droppedIncremental);
+        }
+        planMemoryUsage(
+            state.subSystems,
+            state.subSystemsAux,
+            state.clusters,
+            state.componentStates,
+            state.plists,
+            state.clists,
+            state.reductionmaps,
+            state.constantConstraints,
+            usage.transaction,
+            usage.transaction
+        );
+    }
 }
 
 // basic constraints
@@ -609,7 +1150,7 @@ int System::addConstraintEqual(
     Constraint::Alignment internalalignment
 )
 {
-    Constraint* constr = new ConstraintEqual(param1, param2);
+    Constraint* constr = createConstraint<ConstraintEqual>(param1, param2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     constr->setInternalAlignment(internalalignment);
@@ -618,7 +1159,7 @@ int System::addConstraintEqual(
 
 int System::addConstraintProportional(double* param1, double* param2, double ratio, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintEqual(param1, param2, ratio);
+    Constraint* constr = createConstraint<ConstraintEqual>(param1, param2, ratio);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -626,7 +1167,7 @@ int System::addConstraintProportional(double* param1, double* param2, double rat
 
 int System::addConstraintDifference(double* param1, double* param2, double* difference, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintDifference(param1, param2, difference);
+    Constraint* constr = createConstraint<ConstraintDifference>(param1, param2, difference);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -634,7 +1175,7 @@ int System::addConstraintDifference(double* param1, double* param2, double* diff
 
 int System::addConstraintP2PDistance(Point& p1, Point& p2, double* distance, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintP2PDistance(p1, p2, distance);
+    Constraint* constr = createConstraint<ConstraintP2PDistance>(p1, p2, distance);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -642,7 +1183,7 @@ int System::addConstraintP2PDistance(Point& p1, Point& p2, double* distance, int
 
 int System::addConstraintP2PAngle(Point& p1, Point& p2, double* angle, double incrAngle, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintP2PAngle(p1, p2, angle, incrAngle);
+    Constraint* constr = createConstraint<ConstraintP2PAngle>(p1, p2, angle, incrAngle);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -655,7 +1196,7 @@ int System::addConstraintP2PAngle(Point& p1, Point& p2, double* angle, int /*tag
 
 int System::addConstraintP2LDistance(Point& p, Line& l, double* distance, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintP2LDistance(p, l, distance);
+    Constraint* constr = createConstraint<ConstraintP2LDistance>(p, l, distance);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -663,7 +1204,7 @@ int System::addConstraintP2LDistance(Point& p, Line& l, double* distance, int ta
 
 int System::addConstraintPointOnLine(Point& p, Line& l, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintPointOnLine(p, l);
+    Constraint* constr = createConstraint<ConstraintPointOnLine>(p, l);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -671,7 +1212,7 @@ int System::addConstraintPointOnLine(Point& p, Line& l, int tagId, bool driving)
 
 int System::addConstraintPointOnLine(Point& p, Point& lp1, Point& lp2, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintPointOnLine(p, lp1, lp2);
+    Constraint* constr = createConstraint<ConstraintPointOnLine>(p, lp1, lp2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -679,7 +1220,7 @@ int System::addConstraintPointOnLine(Point& p, Point& lp1, Point& lp2, int tagId
 
 int System::addConstraintPointOnPerpBisector(Point& p, Line& l, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintPointOnPerpBisector(p, l);
+    Constraint* constr = createConstraint<ConstraintPointOnPerpBisector>(p, l);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -687,7 +1228,7 @@ int System::addConstraintPointOnPerpBisector(Point& p, Line& l, int tagId, bool
 
 int System::addConstraintPointOnPerpBisector(Point& p, Point& lp1, Point& lp2, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintPointOnPerpBisector(p, lp1, lp2);
+    Constraint* constr = createConstraint<ConstraintPointOnPerpBisector>(p, lp1, lp2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -695,7 +1236,7 @@ int System::addConstraintPointOnPerpBisector(Point& p, Point& lp1, Point& lp2, i
 
 int System::addConstraintParallel(Line& l1, Line& l2, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintParallel(l1, l2);
+    Constraint* constr = createConstraint<ConstraintParallel>(l1, l2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -703,7 +1244,7 @@ int System::addConstraintParallel(Line& l1, Line& l2, int tagId, bool driving)
 
 int System::addConstraintPerpendicular(Line& l1, Line& l2, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintPerpendicular(l1, l2);
+    Constraint* constr = createConstraint<ConstraintPerpendicular>(l1, l2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -718,7 +1259,7 @@ int System::addConstraintPerpendicular(
     bool driving
 )
 {
-    Constraint* constr = new ConstraintPerpendicular(l1p1, l1p2, l2p1, l2p2);
+    Constraint* constr = createConstraint<ConstraintPerpendicular>(l1p1, l1p2, l2p1, l2p2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -726,7 +1267,7 @@ int System::addConstraintPerpendicular(
 
 int System::addConstraintL2LAngle(Line& l1, Line& l2, double* angle, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintL2LAngle(l1, l2, angle);
+    Constraint* constr = createConstraint<ConstraintL2LAngle>(l1, l2, angle);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -742,7 +1283,7 @@ int System::addConstraintL2LAngle(
     bool driving
 )
 {
-    Constraint* constr = new ConstraintL2LAngle(l1p1, l1p2, l2p1, l2p2, angle);
+    Constraint* constr = createConstraint<ConstraintL2LAngle>(l1p1, l1p2, l2p1, l2p2, angle);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -750,7 +1291,7 @@ int System::addConstraintL2LAngle(
 
 int System::addConstraintAngleViaPoint(Curve& crv1, Curve& crv2, Point& p, double* angle, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintAngleViaPoint(crv1, crv2, p, angle);
+    Constraint* constr = createConstraint<ConstraintAngleViaPoint>(crv1, crv2, p, angle);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -766,7 +1307,7 @@ int System::addConstraintAngleViaTwoPoints(
     bool driving
 )
 {
-    Constraint* constr = new ConstraintAngleViaTwoPoints(crv1, crv2, p1, p2, angle);
+    Constraint* constr = createConstraint<ConstraintAngleViaTwoPoints>(crv1, crv2, p1, p2, angle);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -782,7 +1323,8 @@ int System::addConstraintAngleViaPointAndParam(
     bool driving
 )
 {
-    Constraint* constr = new ConstraintAngleViaPointAndParam(crv1, crv2, p, cparam, angle);
+    Constraint* constr
+        = createConstraint<ConstraintAngleViaPointAndParam>(crv1, crv2, p, cparam, angle);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -799,8 +1341,9 @@ int System::addConstraintAngleViaPointAndTwoParams(
     bool driving
 )
 {
-    Constraint* constr
-        = new ConstraintAngleViaPointAndTwoParams(crv1, crv2, p, cparam1, cparam2, angle);
+    Constraint* constr = createConstraint<ConstraintAngleViaPointAndTwoParams>(
+        crv1, crv2, p, cparam1, cparam2, angle
+    );
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -808,7 +1351,7 @@ int System::addConstraintAngleViaPointAndTwoParams(
 
 int System::addConstraintMidpointOnLine(Line& l1, Line& l2, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintMidpointOnLine(l1, l2);
+    Constraint* constr = createConstraint<ConstraintMidpointOnLine>(l1, l2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -823,7 +1366,7 @@ int System::addConstraintMidpointOnLine(
     bool driving
 )
 {
-    Constraint* constr = new ConstraintMidpointOnLine(l1p1, l1p2, l2p1, l2p2);
+    Constraint* constr = createConstraint<ConstraintMidpointOnLine>(l1p1, l1p2, l2p1, l2p2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -839,7 +1382,7 @@ int System::addConstraintTangentCircumf(
     bool driving
 )
 {
-    Constraint* constr = new ConstraintTangentCircumf(p1, p2, rad1, rad2, internal);
+    Constraint* constr = createConstraint<ConstraintTangentCircumf>(p1, p2, rad1, rad2, internal);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -853,7 +1396,7 @@ int System::addConstraintTangentAtBSplineKnot(
     bool driving
 )
 {
-    Constraint* constr = new ConstraintSlopeAtBSplineKnot(b, l, knotindex);
+    Constraint* constr = createConstraint<ConstraintSlopeAtBSplineKnot>(b, l, knotindex);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -861,7 +1404,7 @@ int System::addConstraintTangentAtBSplineKnot(
 
 int System::addConstraintC2CDistance(Circle& c1, Circle& c2, double* dist, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintC2CDistance(c1, c2, dist);
+    Constraint* constr = createConstraint<ConstraintC2CDistance>(c1, c2, dist);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -869,7 +1412,7 @@ int System::addConstraintC2CDistance(Circle& c1, Circle& c2, double* dist, int t
 
 int System::addConstraintC2LDistance(Circle& c, Line& l, double* dist, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintC2LDistance(c, l, dist);
+    Constraint* constr = createConstraint<ConstraintC2LDistance>(c, l, dist);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -877,7 +1420,7 @@ int System::addConstraintC2LDistance(Circle& c, Line& l, double* dist, int tagId
 
 int System::addConstraintP2CDistance(Point& p, Circle& c, double* distance, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintP2CDistance(p, c, distance);
+    Constraint* constr = createConstraint<ConstraintP2CDistance>(p, c, distance);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -885,7 +1428,7 @@ int System::addConstraintP2CDistance(Point& p, Circle& c, double* distance, int
 
 int System::addConstraintArcLength(Arc& a, double* distance, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintArcLength(a, distance);
+    Constraint* constr = createConstraint<ConstraintArcLength>(a, distance);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -943,7 +1486,7 @@ int System::addConstraintPointOnCircle(Point& p, Circle& c, int tagId, bool driv
 
 int System::addConstraintPointOnEllipse(Point& p, Ellipse& e, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintPointOnEllipse(p, e);
+    Constraint* constr = createConstraint<ConstraintPointOnEllipse>(p, e);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -951,7 +1494,7 @@ int System::addConstraintPointOnEllipse(Point& p, Ellipse& e, int tagId, bool dr
 
 int System::addConstraintPointOnHyperbolicArc(Point& p, ArcOfHyperbola& e, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintPointOnHyperbola(p, e);
+    Constraint* constr = createConstraint<ConstraintPointOnHyperbola>(p, e);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -959,7 +1502,7 @@ int System::addConstraintPointOnHyperbolicArc(Point& p, ArcOfHyperbola& e, int t
 
 int System::addConstraintPointOnParabolicArc(Point& p, ArcOfParabola& e, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintPointOnParabola(p, e);
+    Constraint* constr = createConstraint<ConstraintPointOnParabola>(p, e);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -967,12 +1510,12 @@ int System::addConstraintPointOnParabolicArc(Point& p, ArcOfParabola& e, int tag
 
 int System::addConstraintPointOnBSpline(Point& p, BSpline& b, double* pointparam, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintPointOnBSpline(p.x, pointparam, 0, b);
+    Constraint* constr = createConstraint<ConstraintPointOnBSpline>(p.x, pointparam, 0, b);
     constr->setTag(tagId);
     constr->setDriving(driving);
     addConstraint(constr);
 
-    constr = new ConstraintPointOnBSpline(p.y, pointparam, 1, b);
+    constr = createConstraint<ConstraintPointOnBSpline>(p.y, pointparam, 1, b);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -986,11 +1529,11 @@ int System::addConstraintArcOfEllipseRules(ArcOfEllipse& a, int tagId, bool driv
 
 int System::addConstraintCurveValue(Point& p, Curve& a, double* u, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintCurveValue(p, p.x, a, u);
+    Constraint* constr = createConstraint<ConstraintCurveValue>(p, p.x, a, u);
     constr->setTag(tagId);
     constr->setDriving(driving);
     addConstraint(constr);
-    constr = new ConstraintCurveValue(p, p.y, a, u);
+    constr = createConstraint<ConstraintCurveValue>(p, p.y, a, u);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -1099,7 +1642,7 @@ int System::addConstraintTangent(Line& l, Circle& c, int tagId, bool driving)
 
 int System::addConstraintTangent(Line& l, Ellipse& e, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintEllipseTangentLine(l, e);
+    Constraint* constr = createConstraint<ConstraintEllipseTangentLine>(l, e);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -1180,7 +1723,7 @@ int System::addConstraintArcDiameter(Arc& a, double* diameter, int tagId, bool d
 
 int System::addConstraintEqualLength(Line& l1, Line& l2, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintEqualLineLength(l1, l2);
+    Constraint* constr = createConstraint<ConstraintEqualLineLength>(l1, l2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -1195,7 +1738,7 @@ int System::addConstraintEqualRadii(Ellipse& e1, Ellipse& e2, int tagId, bool dr
 {
     addConstraintEqual(e1.radmin, e2.radmin, tagId, driving);
 
-    Constraint* constr = new ConstraintEqualMajorAxesConic(&e1, &e2);
+    Constraint* constr = createConstraint<ConstraintEqualMajorAxesConic>(&e1, &e2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -1205,7 +1748,7 @@ int System::addConstraintEqualRadii(ArcOfHyperbola& a1, ArcOfHyperbola& a2, int
 {
     addConstraintEqual(a1.radmin, a2.radmin, tagId, driving);
 
-    Constraint* constr = new ConstraintEqualMajorAxesConic(&a1, &a2);
+    Constraint* constr = createConstraint<ConstraintEqualMajorAxesConic>(&a1, &a2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -1213,7 +1756,7 @@ int System::addConstraintEqualRadii(ArcOfHyperbola& a1, ArcOfHyperbola& a2, int
 
 int System::addConstraintEqualFocus(ArcOfParabola& a1, ArcOfParabola& a2, int tagId, bool driving)
 {
-    Constraint* constr = new ConstraintEqualFocalDistance(&a1, &a2);
+    Constraint* constr = createConstraint<ConstraintEqualFocalDistance>(&a1, &a2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -1254,7 +1797,8 @@ int System::addConstraintSnellsLaw(
     bool driving
 )
 {
-    Constraint* constr = new ConstraintSnell(ray1, ray2, boundary, p, n1, n2, flipn1, flipn2);
+    Constraint* constr
+        = createConstraint<ConstraintSnell>(ray1, ray2, boundary, p, n1, n2, flipn1, flipn2);
     constr->setTag(tagId);
     constr->setDriving(driving);
     return addConstraint(constr);
@@ -1268,7 +1812,8 @@ int System::addConstraintInternalAlignmentPoint2Ellipse(
     bool driving
 )
 {
-    Constraint* constr = new ConstraintInternalAlignmentPoint2Ellipse(e, p1, alignmentType);
+    Constraint* constr
+        = createConstraint<ConstraintInternalAlignmentPoint2Ellipse>(e, p1, alignmentType);
     constr->setTag(tagId);
     constr->setDriving(driving);
     constr->setInternalAlignment(Constraint::Alignment::InternalAlignment);
@@ -1283,7 +1828,8 @@ int System::addConstraintInternalAlignmentPoint2Hyperbola(
     bool driving
 )
 {
-    Constraint* constr = new ConstraintInternalAlignmentPoint2Hyperbola(e, p1, alignmentType);
+    Constraint* constr
+        = createConstraint<ConstraintInternalAlignmentPoint2Hyperbola>(e, p1, alignmentType);
     constr->setTag(tagId);
     constr->setDriving(driving);
     constr->setInternalAlignment(Constraint::Alignment::InternalAlignment);
@@ -1602,7 +2148,8 @@ int System::addConstraintInternalAlignmentKnotPoint(
         pvec.push_back(b.weights[(startpole + i) % b.poles.size()]);
     }
 
-    Constraint* constr = new ConstraintWeightedLinearCombination(numpoles, pvec, factors);
+    Constraint* constr
+        = createConstraint<ConstraintWeightedLinearCombination>(numpoles, pvec, factors);
     constr->setTag(tagId);
     constr->setDriving(driving);
     constr->setInternalAlignment(Constraint::Alignment::InternalAlignment);
@@ -1617,7 +2164,7 @@ int System::addConstraintInternalAlignmentKnotPoint(
         pvec.push_back(b.weights[(startpole + i) % b.poles.size()]);
     }
 
-    constr = new ConstraintWeightedLinearCombination(numpoles, pvec, factors);
+    constr = createConstraint<ConstraintWeightedLinearCombination>(numpoles, pvec, factors);
     constr->setTag(tagId);
     constr->setDriving(driving);
     constr->setInternalAlignment(Constraint::Alignment::InternalAlignment);
@@ -1665,12 +2212,13 @@ double System::calculateConstraintErrorByTag(int tagId)
     double sqErr = 0.0;  // accumulator of squared errors
     double err = 0.0;    // last computed signed error value
 
-    for (const auto& constr : clist) {
-        if (constr->getTag() == tagId) {
+    auto it = tagIndex.find(tagId);
+    if (it != tagIndex.end()) {
+        for (const auto& constr : it->second) {
             err = constr->error();
             sqErr += err * err;
             cnt++;
-        };
+        }
     }
     switch (cnt) {
         case 0:  // constraint not found!
@@ -1684,8 +2232,144 @@ double System::calculateConstraintErrorByTag(int tagId)
     }
 }
 
+void System::calculateConstraintErrors(VEC_I& tagIds, VEC_D& errors, std::optional<bool> driving)
+{
+    tagIds.clear();
+    tagIds.reserve(tagIndex.size());
+    for (const auto& [tagId, constrvec] : tagIndex) {
+        tagIds.push_back(tagId);
+    }
+    std::ranges::sort(tagIds);
+
+    errors.clear();
+    errors.reserve(tagIds.size());
+    std::size_t kept = 0;
+    for (const auto tagId : tagIds) {
+        int cnt = 0;
+        double sqErr = 0.0;
+        double err = 0.0;
+        for (const auto constr : tagIndex.at(tagId)) {
+            if (driving && constr->isDriving() != *driving) {
+                continue;
+            }
+            err = constr->error();
+            sqErr += err * err;
+            cnt++;
+        }
+        if (cnt == 0) {
+            continue;
+        }
+        tagIds[kept++] = tagId;
+        errors.push_back(cnt == 1 ? err : sqrt(sqErr / (double)cnt));
+    }
+    tagIds.resize(kept);
+}
+
+void System::calculateSensitivities(const VEC_pD& params, Eigen::MatrixXd& sensitivities)
+{
+    // Differentiating F(x, p) = 0 gives J_x dx/dp = -J_p. The driving constraints linked to
+    // params through shared unknowns are gathered in blocks of connected ones, and one
+    // decomposition of the J_x of each block serves all the columns of J_p.
+    compactConstraints();
+    sensitivities.setZero(plist.size(), params.size());
+
+    std::unordered_map<double*, std::vector<Constraint*>> readers;
+    for (const auto constr : clist) {
+        if (constr->isDriving()) {
+            constr->revertParams();
+            for (double* param : constr->params()) {
+                readers[param].push_back(constr);
+            }
+        }
+    }
+
+    std::unordered_set<Constraint*> visited;
+    std::unordered_map<double*, int> column;  // of the unknowns in the J_x of their block
+    for (double* seed : params) {
+        std::vector<Constraint*> rows;
+        VEC_I columns;  // plist indices
+        std::vector<double*> pending {seed};
+        while (!pending.empty()) {
+            double* param = pending.back();
+            pending.pop_back();
+            const auto found = readers.find(param);
+            if (found == readers.end()) {
+                continue;
+            }
+            for (const auto constr : found->second) {
+                if (!visited.insert(constr).second) {
+                    continue;
+                }
+                rows.push_back(constr);
+                for (double* p : constr->params()) {
+                    const auto index = pIndex.find(p);
+                    if (index != pIndex.end() && column.emplace(p, int(columns.size())).second) {
+                        columns.push_back(index->second);
+                        pending.push_back(p);
+                    }
+                }
+            }
+        }
+        if (rows.empty() || columns.empty()) {
+            continue;
+        }
+
+        const auto m = Eigen::Index(rows.size());
+        const auto n = Eigen::Index(columns.size());
+        std::vector<Eigen::Triplet<double>> entries;
+        Eigen::MatrixXd jp(m, params.size());
+        for (Eigen::Index i = 0; i < m; i++) {
+            for (double* p : rows[i]->params()) {
+                const auto col = column.find(p);
+                if (col != column.end()) {
+                    entries.emplace_back(col->second, i, rows[i]->grad(p));
+                }
+            }
+            for (std::size_t j = 0; j < params.size(); j++) {
+                jp(i, j) = rows[i]->grad(params[j]);
+            }
+        }
+        Eigen::SparseMatrix<double> jxt(n, m);  // J_x transposed
+        jxt.setFromTriplets(entries.begin(), entries.end(), [](double a, double) { return a; });
+
+        Eigen::MatrixXd dx;
+#ifdef EIGEN_SPARSEQR_COMPATIBLE
+        // J_x^T P = Q R, so if the constraints are independent, the least-norm solution of
+        // J_x X = B is Q [R1^-T P^T B; 0], with R1 the top rows of R
+        Eigen::SparseQR<Eigen::SparseMatrix<double>, Eigen::COLAMDOrdering<int>> qr;
+        qr.setPivotThreshold(qrpivotThreshold);
+        qr.compute(jxt);
+        if (qr.info() == Eigen::Success && qr.rank() == m) {
+            const Eigen::SparseMatrix<double> r1t = qr.matrixR().topLeftCorner(m, m).transpose();
+            Eigen::MatrixXd z = Eigen::MatrixXd::Zero(n, params.size());
+            z.topRows(m) =
+                r1t.triangularView<Eigen::Lower>().solve(qr.colsPermutation().transpose() * jp);
+            dx = -(qr.matrixQ() * z);
+        }
+#endif
+        if (dx.size() == 0) {
+            // redundant constraints: the least-norm solution of the least-squares problem, which
+            // a complete orthogonal decomposition finds whatever the rank
+            Eigen::CompleteOrthogonalDecomposition<Eigen::MatrixXd> cod;
+            cod.setThreshold(qrpivotThreshold);
+            cod.compute(Eigen::MatrixXd(jxt).transpose());
+            dx = -cod.solve(jp);
+        }
+        for (Eigen::Index c = 0; c < n; c++) {
+            sensitivities.row(columns[c]) = dx.row(c);
+        }
+    }
+}
+
+const std::vector<Constraint*>& System::getConstraints()
+{
+    compactConstraints();
+    return clist;
+}
+
 void System::rescaleConstraint(int id, double coeff)
 {
+    compactConstraints();
     if (id >= static_cast<int>(clist.size()) || id < 0) {
         return;
     }
@@ -1696,6 +2380,17 @@ void System::rescaleConstraint(int id, double coeff)
 
 void System::declareUnknowns(VEC_pD& params)
 {
+    // re-declaring the same unknowns keeps the current partitioning and diagnosis
+    if (hasUnknowns && params == plist) {
+        return;
+    }
+    isInit = false;
+    hasDiagnosis = false;
+    hasDofs = false;
+    // the partition survives new unknowns being appended, as the existing indices are kept
+    if (params.size() < plist.size() || !std::equal(plist.begin(), plist.end(), params.begin())) {
+        pComponentsValid = false;
+    }
     plist = params;
     pIndex.clear();
     for (int i = 0; i < int(plist.size()); ++i) {
@@ -1721,15 +2416,24 @@ void System::initSolution(Algorithm alg)
     // - Organizes the rest of constraints into two subsystems for
     //   tag ids >=0 and < 0 respectively and applies the
     //   system reduction specified in the previous step
+    // If nothing structural changed since the last call, only the reference
+    // configuration is refreshed and the existing subsystems are reused.
 
-    isInit = false;
+    compactConstraints();
     if (!hasUnknowns) {
+        isInit = false;
         return;
     }
 
     // storing reference configuration
     setReference();
 
+    if (isInit) {
+        return;
+    }
+    // the plan is about to be replaced
+    setPlanAside();
+
     // diagnose conflicting or redundant constraints
     if (!hasDiagnosis) {
         diagnose(alg);
@@ -1750,55 +2454,95 @@ void System::initSolution(Algorithm alg)
         clistR = clist;
     }
 
-    // partitioning into decoupled components
-    Graph g;
-    for (int i = 0; i < int(plist.size() + clistR.size()); i++) {
-        boost::add_vertex(g);
-    }
-
-    int cvtid = int(plist.size());
+    c2p.clear();
     for (const auto constr : clistR) {
-        VEC_pD& cparams = c2p[constr];
-        for (const auto param : cparams) {
+        for (const auto param : constr->origParams()) {
             MAP_pD_I::const_iterator it = pIndex.find(param);
             if (it != pIndex.end()) {
-                boost::add_edge(cvtid, it->second, g);
+                c2p.index.push_back(it->second);
             }
         }
-        ++cvtid;
+        c2p.endRow();
     }
 
-    VEC_I components(boost::num_vertices(g));
+    // partitioning into decoupled components, numbered in order of their first parameter
+    updateComponents(clistR);
+    VEC_I components(plist.size() + clistR.size(), -1);
     int componentsSize = 0;
-    if (!components.empty()) {
-        componentsSize = boost::connected_components(g, &components[0]);
+    {
+        VEC_I rootComponent(plist.size(), -1);
+        for (int i = 0; i < int(plist.size()); i++) {
+            int& cid = rootComponent[pComponents.find(i)];
+            if (cid < 0) {
+                cid = componentsSize++;
+            }
+            components[i] = cid;
+        }
+        // constraints without unknowns are left out, there is nothing to solve for them, but the
+        // driving ones are checked after solving
+        constantConstraints.clear();
+        for (int i = 0; i < c2p.rows(); i++) {
+            if (c2p.begin(i) != c2p.end(i)) {
+                components[plist.size() + i] = components[*c2p.begin(i)];
+            }
+            else if (clistR[i]->isDriving()) {
+                constantConstraints.push_back(clistR[i]);
+            }
+        }
     }
 
     // identification of equality constraints and parameter reduction
+    // Equalities between two unknowns merge them into one, and driving equalities between an
+    // unknown and a parameter that is not an unknown (e.g. a fixed coordinate) substitute that
+    // parameter for the unknown. An equality that would tie two different such constants
+    // together is left to the solver.
     std::set<Constraint*> reducedConstrs;  // constraints that will be eliminated through reduction
     reductionmaps.clear();                 // destroy any maps
     reductionmaps.resize(componentsSize);  // create empty maps to be filled in
     {
-        VEC_pD reducedParams = plist;
+        DisjointSets equalParams;
+        equalParams.reset(int(plist.size()));
+        VEC_pD kept = plist;                     // kept parameter, per root
+        VEC_pD constant(plist.size(), nullptr);  // substituted constant, per root
 
         for (const auto& constr : clistR) {
-            if (!(constr->getTag() >= 0 && constr->getTypeId() == Equal)) {
+            if (!isReducibleEquality(constr)) {
                 continue;
             }
-            const auto it1 = pIndex.find(constr->params()[0]);
-            const auto it2 = pIndex.find(constr->params()[1]);
-            if (it1 == pIndex.end() || it2 == pIndex.end()) {
-                continue;
+            double* param1 = constr->origParams()[0];
+            double* param2 = constr->origParams()[1];
+            const auto it1 = pIndex.find(param1);
+            const auto it2 = pIndex.find(param2);
+            if (it1 != pIndex.end() && it2 != pIndex.end()) {
+                int root1 = equalParams.find(it1->second);
+                int root2 = equalParams.find(it2->second);
+                if (constant[root1] && constant[root2] && constant[root1] != constant[root2]) {
+                    continue;
+                }
+                reducedConstrs.insert(constr);
+                double* p_kept = kept[root1];
+                double* p_constant = constant[root1] ? constant[root1] : constant[root2];
+                equalParams.unite(root1, root2);
+                int root = equalParams.find(root1);
+                kept[root] = p_kept;
+                constant[root] = p_constant;
+            }
+            else if ((it1 == pIndex.end()) != (it2 == pIndex.end()) && constr->isDriving()) {
+                int root = equalParams.find(it1 != pIndex.end() ? it1->second : it2->second);
+                double* p_constant = it1 != pIndex.end() ? param2 : param1;
+                if (constant[root] && constant[root] != p_constant) {
+                    continue;
+                }
+                reducedConstrs.insert(constr);
+                constant[root] = p_constant;
             }
-            reducedConstrs.insert(constr);
-            double* p_kept = reducedParams[it1->second];
-            double* p_replaced = reducedParams[it2->second];
-            std::ranges::replace(reducedParams, p_replaced, p_kept);
         }
         for (size_t i = 0; i < plist.size(); ++i) {
-            if (plist[i] != reducedParams[i]) {
+            int root = equalParams.find(int(i));
+            double* target = constant[root] ? constant[root] : kept[root];
+            if (plist[i] != target) {
                 int cid = components[i];
-                reductionmaps[cid][plist[i]] = reducedParams[i];
+                reductionmaps[cid][plist[i]] = target;
             }
         }
     }
@@ -1810,8 +2554,8 @@ void System::initSolution(Algorithm alg)
     clists.resize(componentsSize);  // create empty lists to be filled in
     size_t i = plist.size();
     for (const auto& constr : clistR) {
-        if (reducedConstrs.count(constr) == 0) {
-            int cid = components[i];
+        int cid = components[i];
+        if (cid >= 0 && reducedConstrs.count(constr) == 0) {
             clists[cid].push_back(constr);
         }
         ++i;
@@ -1828,6 +2572,7 @@ void System::initSolution(Algorithm alg)
     clearSubSystems();
     subSystems.resize(clists.size(), nullptr);
     subSystemsAux.resize(clists.size(), nullptr);
+    clusters.resize(clists.size());
     for (std::size_t cid = 0; cid < clists.size(); ++cid) {
         std::vector<Constraint*> clist0, clist1;
         std::ranges::partition_copy(
@@ -1843,683 +2588,1848 @@ void System::initSolution(Algorithm alg)
         if (!clist1.empty()) {
             subSystemsAux[cid] = new SubSystem(clist1, plists[cid], reductionmaps[cid]);
         }
+        else if (!clist0.empty()) {
+            planClusters(int(cid));
+        }
+    }
+
+    componentStates.resize(clists.size());
+    for (std::size_t cid = 0; cid < clists.size(); ++cid) {
+        setComponentParams(int(cid));
     }
 
     isInit = true;
 }
 
-void System::setReference()
+bool System::isReducibleEquality(Constraint* constr)
 {
-    reference.clear();
-    reference.reserve(plist.size());
-    for (const auto& param : plist) {
-        reference.push_back(*param);
-    }
+    return constr->getTag() >= 0 && constr->getTypeId() == Equal
+        && static_cast<ConstraintEqual*>(constr)->getRatio() == 1.;
 }
 
-void System::resetToReference()
+void System::setComponentParams(int cid)
 {
-    if (reference.size() == plist.size()) {
-        VEC_D::const_iterator ref = reference.begin();
-        VEC_pD::iterator param = plist.begin();
-        for (; ref != reference.end(); ++ref, ++param) {
-            **param = *ref;
-        }
+    // the parameters a solution of the component depends on
+    VEC_pD& params = componentStates[cid].params;
+    params = plists[cid];
+    for (const auto constr : clists[cid]) {
+        const VEC_pD& cparams = constr->origParams();
+        params.insert(params.end(), cparams.begin(), cparams.end());
+    }
+    for (const auto& [reduced, kept] : reductionmaps[cid]) {
+        params.push_back(reduced);
+        params.push_back(kept);
     }
+    std::ranges::sort(params);
+    params.erase(std::ranges::unique(params).begin(), params.end());
 }
 
-int System::solve(VEC_pD& params, bool isFine, Algorithm alg, bool isRedundantsolving)
+void System::updateComponents(const std::vector<Constraint*>& clistR)
 {
-    declareUnknowns(params);
-    initSolution();
-    return solve(isFine, alg, isRedundantsolving);
-}
+    // c2p must be up to date with clistR
+    bool reduced = clistR.size() != clist.size();
+    if (!pComponentsValid || reduced || pComponentsReduced) {
+        pComponents.reset(int(plist.size()));
+        for (int i = 0; i < c2p.rows(); i++) {
+            for (const int* j = c2p.begin(i); j != c2p.end(i); ++j) {
+                pComponents.unite(*c2p.begin(i), *j);
+            }
+        }
+        pComponentsAddedFrom = clist.size();
+        pComponentsDirty.clear();
+        pComponentsValid = true;
+        pComponentsReduced = reduced;
+        return;
+    }
 
-int System::solve(bool isFine, Algorithm alg, bool isRedundantsolving)
-{
-    if (!isInit) {
-        return Failed;
-    }
-
-    bool isReset = false;
-    // return success by default in order to permit coincidence constraints to be applied
-    // even if no other system has to be solved
-    int res = Success;
-    for (int cid = 0; cid < int(subSystems.size()); cid++) {
-        if ((subSystems[cid] || subSystemsAux[cid]) && !isReset) {
-            resetToReference();
-            isReset = true;
-        }
-        if (subSystems[cid] && subSystemsAux[cid]) {
-            res = std::max(res, solve(subSystems[cid], subSystemsAux[cid], isFine, isRedundantsolving));
-        }
-        else if (subSystems[cid]) {
-            res = std::max(res, solve(subSystems[cid], isFine, alg, isRedundantsolving));
-        }
-        else if (subSystemsAux[cid]) {
-            res = std::max(res, solve(subSystemsAux[cid], isFine, alg, isRedundantsolving));
-        }
-    }
-    if (res == Success) {
-        for (std::set<Constraint*>::const_iterator constr = redundant.begin();
-             constr != redundant.end();
-             ++constr) {
-            // DeepSOIC: there used to be a comparison of signed error value to
-            // convergence, which makes no sense. Potentially I fixed bug, and
-            // chances are low I've broken anything.
-            double err = (*constr)->error();
-            if (err * err > (isRedundantsolving ? convergenceRedundant : convergence)) {
-                res = Converged;
-                return res;
+    pComponents.grow(int(plist.size()));
+    for (std::size_t i = pComponentsAddedFrom; i < clist.size(); i++) {
+        const Constraint* constr = clist[i];
+        int first = -1;
+        for (const auto param : constr->origParams()) {
+            MAP_pD_I::const_iterator it = pIndex.find(param);
+            if (it == pIndex.end()) {
+                continue;
+            }
+            if (first < 0) {
+                first = it->second;
+            }
+            else {
+                pComponents.unite(first, it->second);
             }
         }
     }
-    return res;
-}
+    pComponentsAddedFrom = clist.size();
+    if (pComponentsDirty.empty()) {
+        return;
+    }
 
-int System::solve(SubSystem* subsys, bool isFine, Algorithm alg, bool isRedundantsolving)
-{
-    if (alg == BFGS) {
-        return solve_BFGS(subsys, isFine, isRedundantsolving);
+    // recompute the components touched by removed constraints: isolate their parameters and
+    // merge them again with the constraints that remain on them
+    std::vector<char> dirtyRoot(plist.size(), 0);
+    for (const int i : pComponentsDirty) {
+        dirtyRoot[pComponents.find(i)] = 1;
     }
-    else if (alg == LevenbergMarquardt) {
-        return solve_LM(subsys, isRedundantsolving);
+    std::vector<char> dirty(plist.size(), 0);
+    for (int i = 0; i < int(plist.size()); i++) {
+        dirty[i] = dirtyRoot[pComponents.find(i)];
     }
-    else if (alg == DogLeg) {
-        return solve_DL(subsys, isRedundantsolving);
+    for (int i = 0; i < int(plist.size()); i++) {
+        if (dirty[i]) {
+            pComponents.isolate(i);
+        }
     }
-    else {
-        return Failed;
+    for (int i = 0; i < c2p.rows(); i++) {
+        if (c2p.begin(i) != c2p.end(i) && dirty[*c2p.begin(i)]) {
+            for (const int* j = c2p.begin(i); j != c2p.end(i); ++j) {
+                pComponents.unite(*c2p.begin(i), *j);
+            }
+        }
     }
+    pComponentsDirty.clear();
 }
 
-int System::solve_BFGS(SubSystem* subsys, bool /*isFine*/, bool isRedundantsolving)
+namespace
 {
-#ifdef _GCS_EXTRACT_SOLVER_SUBSYSTEM_
-    extractSubsystem(subsys, isRedundantsolving);
-#endif
 
-    int xsize = subsys->pSize();
-    if (xsize == 0) {
-        return Success;
+// Splits the constraints (rows of c2v) and unknowns (rows of v2c) given into the blocks of their
+// Dulmage-Mendelsohn decomposition, in an order in which each block can be solved with the
+// unknowns of the blocks before it fixed: the over-determined part, which only involves its own
+// unknowns, then the square part in block triangular order, i.e. the strongly connected
+// components of the graph in which a constraint leads to the constraints matched to its unknowns,
+// and last the under-determined part. Unknowns not given are taken as fixed. Returns the
+// unknowns and the constraints of each block.
+std::vector<std::pair<VEC_I, VEC_I>> dulmageMendelsohnBlocks(
+    const AdjacencyCSR& c2v,
+    const AdjacencyCSR& v2c,
+    const VEC_I& vars,
+    const VEC_I& constrs
+)
+{
+    std::vector<std::pair<VEC_I, VEC_I>> blocks;
+    const int varsNum = int(vars.size());
+    const int constrsNum = int(constrs.size());
+    VEC_I localVar(v2c.rows(), -1);
+    for (int v = 0; v < varsNum; v++) {
+        localVar[vars[v]] = v;
     }
 
-    subsys->redirectParams();
-
-    Eigen::MatrixXd D = Eigen::MatrixXd::Identity(xsize, xsize);
-    Eigen::VectorXd x(xsize);
-    Eigen::VectorXd xdir(xsize);
-    Eigen::VectorXd grad(xsize);
-    Eigen::VectorXd h(xsize);
-    Eigen::VectorXd y(xsize);
-    Eigen::VectorXd Dy(xsize);
-
-    // Initial unknowns vector and initial gradient vector
-    subsys->getParams(x);
-    subsys->calcGrad(grad);
-
-    // Initial search direction opposed to gradient (steepest-descent)
-    xdir = -grad;
-    lineSearch(subsys, xdir);
-    double err = subsys->error();
-
-    h = x;
-    subsys->getParams(x);
-    h = x - h;  // = x - xold
-
-    // double convergence = isFine ? convergence : XconvergenceRough;
-    int maxIterNumber = (sketchSizeMultiplier ? maxIter * xsize : maxIter);
-    double convCriterion = convergence;
-    if (isRedundantsolving) {
-        maxIterNumber = (sketchSizeMultiplierRedundant ? maxIterRedundant * xsize : maxIterRedundant);
-        convCriterion = convergenceRedundant;
+    // bipartite graph of the given constraints and unknowns, in local indices
+    AdjacencyCSR adj;
+    for (int c : constrs) {
+        for (const int* v = c2v.begin(c); v != c2v.end(c); ++v) {
+            if (localVar[*v] >= 0) {
+                adj.index.push_back(localVar[*v]);
+            }
+        }
+        adj.endRow();
+    }
+    AdjacencyCSR adjT;
+    adjT.transpose(adj, varsNum);
+
+    // maximum matching, greedy first, then completed by augmenting paths found breadth first
+    VEC_I varOfConstr(constrsNum, -1), constrOfVar(varsNum, -1);
+    for (int c = 0; c < constrsNum; c++) {
+        for (const int* v = adj.begin(c); v != adj.end(c); ++v) {
+            if (constrOfVar[*v] < 0) {
+                varOfConstr[c] = *v;
+                constrOfVar[*v] = c;
+                break;
+            }
+        }
     }
-
-    if (debugMode == IterationLevel) {
-        std::stringstream stream;
-        stream << "BFGS: convergence: " << convCriterion << ", xsize: " << xsize
-               << ", maxIter: " << maxIterNumber << "\n";
-
-        const std::string tmp = stream.str();
-        Base::Console().log(tmp.c_str());
+    VEC_I parent(constrsNum), visited(varsNum, -1), queue;
+    for (int c0 = 0; c0 < constrsNum; c0++) {
+        if (varOfConstr[c0] >= 0) {
+            continue;
+        }
+        queue.assign(1, c0);
+        parent[c0] = -1;
+        int freeVar = -1;
+        for (std::size_t head = 0; head < queue.size() && freeVar < 0; head++) {
+            const int c = queue[head];
+            for (const int* v = adj.begin(c); v != adj.end(c); ++v) {
+                if (visited[*v] == c0) {
+                    continue;
+                }
+                visited[*v] = c0;
+                if (constrOfVar[*v] < 0) {
+                    // augment along the path back to c0, each constraint taking the unknown
+                    // that led to the next one
+                    freeVar = *v;
+                    for (int c1 = c, v1 = freeVar; c1 >= 0; c1 = parent[c1]) {
+                        std::swap(varOfConstr[c1], v1);
+                        constrOfVar[varOfConstr[c1]] = c1;
+                    }
+                    break;
+                }
+                parent[constrOfVar[*v]] = c;
+                queue.push_back(constrOfVar[*v]);
+            }
+        }
     }
 
-    double divergingLim = 1e6 * err + 1e12;
-    double h_norm {};
-
-    for (int iter = 1; iter < maxIterNumber; ++iter) {
-        h_norm = h.norm();
-        if (h_norm <= convCriterion || err <= smallF) {
-            if (debugMode == IterationLevel) {
-                std::stringstream stream;
-                stream << "BFGS Converged!!: "
-                       << ", err: " << err << ", h_norm: " << h_norm << "\n";
-
-                const std::string tmp = stream.str();
-                Base::Console().log(tmp.c_str());
+    // the under-determined part: reached from unmatched unknowns by alternating paths
+    std::vector<char> underVar(varsNum, 0), underConstr(constrsNum, 0);
+    queue.clear();
+    for (int v = 0; v < varsNum; v++) {
+        if (constrOfVar[v] < 0) {
+            underVar[v] = 1;
+            queue.push_back(v);
+        }
+    }
+    for (std::size_t head = 0; head < queue.size(); head++) {
+        const int v = queue[head];
+        for (const int* c = adjT.begin(v); c != adjT.end(v); ++c) {
+            if (underConstr[*c]) {
+                continue;
+            }
+            underConstr[*c] = 1;
+            const int v1 = varOfConstr[*c];
+            if (!underVar[v1]) {
+                underVar[v1] = 1;
+                queue.push_back(v1);
             }
-            break;
         }
-        if (err > divergingLim || err != err) {
-            // check for diverging and NaN
-            if (debugMode == IterationLevel) {
-                std::stringstream stream;
-                stream << "BFGS Failed: Diverging!!: "
-                       << ", err: " << err << ", divergingLim: " << divergingLim << "\n";
+    }
 
-                const std::string tmp = stream.str();
-                Base::Console().log(tmp.c_str());
+    // the over-determined part: reached from unmatched constraints by alternating paths
+    std::vector<char> overVar(varsNum, 0), overConstr(constrsNum, 0);
+    queue.clear();
+    for (int c = 0; c < constrsNum; c++) {
+        if (varOfConstr[c] < 0) {
+            overConstr[c] = 1;
+            queue.push_back(c);
+        }
+    }
+    for (std::size_t head = 0; head < queue.size(); head++) {
+        const int c = queue[head];
+        for (const int* v = adj.begin(c); v != adj.end(c); ++v) {
+            if (overVar[*v]) {
+                continue;
+            }
+            overVar[*v] = 1;
+            const int c1 = constrOfVar[*v];
+            if (!overConstr[c1]) {
+                overConstr[c1] = 1;
+                queue.push_back(c1);
             }
-            break;
         }
+    }
 
-        y = grad;
-        subsys->calcGrad(grad);
-        y = grad - y;  // = grad - gradold
-
-        double hty = h.dot(y);
-        // make sure that hty is never 0
-        if (hty == 0) {
-            hty = .0000000001;
+    auto addBlock = [&](const VEC_I& blockVars, const VEC_I& blockConstrs) {
+        auto& [unknowns, members] = blocks.emplace_back();
+        for (int v : blockVars) {
+            unknowns.push_back(vars[v]);
         }
-
-        Dy = D * y;
-
-        double ytDy = y.dot(Dy);
-
-        // Now calculate the BFGS update on D
-        D += (1. + ytDy / hty) / hty * h * h.transpose();
-        D -= 1. / hty * (h * Dy.transpose() + Dy * h.transpose());
-
-        xdir = -D * grad;
-        lineSearch(subsys, xdir);
-        err = subsys->error();
-
-        h = x;
-        subsys->getParams(x);
-        h = x - h;  // = x - xold
-
-        if (debugMode == IterationLevel) {
-            std::stringstream stream;
-            stream << "BFGS, Iteration: " << iter << ", err: " << err << ", h_norm: " << h_norm
-                   << "\n";
-
-            const std::string tmp = stream.str();
-            Base::Console().log(tmp.c_str());
+        for (int c : blockConstrs) {
+            members.push_back(constrs[c]);
+        }
+    };
+    VEC_I blockVars, blockConstrs;
+    for (int v = 0; v < varsNum; v++) {
+        if (overVar[v]) {
+            blockVars.push_back(v);
+        }
+    }
+    for (int c = 0; c < constrsNum; c++) {
+        if (overConstr[c]) {
+            blockConstrs.push_back(c);
+        }
+    }
+    if (!blockConstrs.empty()) {
+        addBlock(blockVars, blockConstrs);
+    }
+
+    // the square part, by Tarjan's algorithm without recursion: a strongly connected component
+    // is completed after all the ones it leads to, which is the order to solve them in
+    VEC_I order(constrsNum, -1), low(constrsNum, 0), stack;
+    std::vector<char> onStack(constrsNum, 0);
+    std::vector<std::pair<int, const int*>> path;  // constraint and its next unknown to follow
+    int counter = 0;
+    auto inSquare = [&](int c) {
+        return !underConstr[c] && !overConstr[c];
+    };
+    auto visit = [&](int c) {
+        order[c] = low[c] = counter++;
+        stack.push_back(c);
+        onStack[c] = 1;
+        path.emplace_back(c, adj.begin(c));
+    };
+    for (int c0 = 0; c0 < constrsNum; c0++) {
+        if (!inSquare(c0) || order[c0] >= 0) {
+            continue;
+        }
+        visit(c0);
+        while (!path.empty()) {
+            auto& [c, v] = path.back();
+            if (v != adj.end(c)) {
+                const int c1 = constrOfVar[*v++];
+                if (c1 == c || !inSquare(c1)) {
+                    continue;
+                }
+                if (order[c1] < 0) {
+                    visit(c1);
+                }
+                else if (onStack[c1]) {
+                    low[c] = std::min(low[c], order[c1]);
+                }
+                continue;
+            }
+            const int root = c;
+            path.pop_back();
+            if (!path.empty()) {
+                low[path.back().first] = std::min(low[path.back().first], low[root]);
+            }
+            if (low[root] != order[root]) {
+                continue;
+            }
+            blockVars.clear();
+            blockConstrs.clear();
+            int c1;
+            do {
+                c1 = stack.back();
+                stack.pop_back();
+                onStack[c1] = 0;
+                blockConstrs.push_back(c1);
+                blockVars.push_back(varOfConstr[c1]);
+            } while (c1 != root);
+            addBlock(blockVars, blockConstrs);
         }
     }
 
-    subsys->revertParams();
-
-    if (err <= smallF) {
-        return Success;
+    blockVars.clear();
+    blockConstrs.clear();
+    for (int v = 0; v < varsNum; v++) {
+        if (underVar[v]) {
+            blockVars.push_back(v);
+        }
     }
-    if (h.norm() <= convCriterion) {
-        return Converged;
+    for (int c = 0; c < constrsNum; c++) {
+        if (underConstr[c]) {
+            blockConstrs.push_back(c);
+        }
     }
-    return Failed;
+    if (!blockConstrs.empty()) {
+        addBlock(blockVars, blockConstrs);
+    }
+    return blocks;
 }
 
-int System::solve_LM(SubSystem* subsys, bool isRedundantsolving)
+// The places in origParams() at which a constraint may hold a point on a circle or a line:
+// the distance and the angle between two points hold either on a circle or a ray around the
+// other, the distance to a line and a point on a line hold the first point.
+VEC_I pointSlots(Constraint* constr)
 {
-#ifdef _GCS_EXTRACT_SOLVER_SUBSYSTEM_
-    extractSubsystem(subsys, isRedundantsolving);
-#endif
-
-    int xsize = subsys->pSize();
-    int csize = subsys->cSize();
-
-    if (xsize == 0) {
-        return Success;
+    switch (constr->getTypeId()) {
+        case P2PDistance:
+        case P2PAngle:
+            return {0, 2};
+        case PointOnLine:
+        case P2LDistance:
+            return {0};
+        default:
+            return {};
     }
+}
 
-    Eigen::VectorXd e(csize),
-        e_new(csize);  // vector of all function errors (every constraint is one function)
-    Eigen::MatrixXd J(csize, xsize);  // Jacobi of the subsystem
-    Eigen::MatrixXd A(xsize, xsize);
-    Eigen::VectorXd x(xsize), h(xsize), x_new(xsize), g(xsize), diag_A(xsize);
-
-    subsys->redirectParams();
-
-    subsys->getParams(x);
-    subsys->calcResidual(e);
-    e *= -1;
-
-    int maxIterNumber = (sketchSizeMultiplier ? maxIter * xsize : maxIter);
-
-    double divergingLim = 1e6 * e.squaredNorm() + 1e12;
-
-    double eps = LM_eps;
-    double eps1 = LM_eps1;
-    double tau = LM_tau;
-
-    if (isRedundantsolving) {
-        maxIterNumber = (sketchSizeMultiplierRedundant ? maxIterRedundant * xsize : maxIterRedundant);
-        eps = LM_epsRedundant;
-        eps1 = LM_eps1Redundant;
-        tau = LM_tauRedundant;
+// the slot of pointSlots() at which a constraint holds the point (x, y), -1 if it does not
+int pointSlot(Constraint* constr, double* x, double* y, const MAP_pD_pD& reductionmap)
+{
+    auto keptOf = [&reductionmap](double* param) {
+        const auto it = reductionmap.find(param);
+        return it != reductionmap.end() ? it->second : param;
+    };
+    for (int slot : pointSlots(constr)) {
+        if (keptOf(constr->origParams()[slot]) == x
+            && keptOf(constr->origParams()[slot + 1]) == y) {
+            return slot;
+        }
     }
+    return -1;
+}
 
-    if (debugMode == IterationLevel) {
-        std::stringstream stream;
-        stream << "LM: eps: " << eps << ", eps1: " << eps1 << ", tau: " << tau
-               << ", convergence: " << (isRedundantsolving ? convergenceRedundant : convergence)
-               << ", xsize: " << xsize << ", maxIter: " << maxIterNumber << "\n";
-
-        const std::string tmp = stream.str();
-        Base::Console().log(tmp.c_str());
-    }
+// A curve a constraint holds a point on: a circle, a line, or a ray from its origin.
+struct Locus
+{
+    Eigen::Vector2d origin;  // the center of a circle
+    Eigen::Vector2d dir;     // zero for a circle
+    double radius = 0.;
+    bool ray = false;
+};
 
-    double nu = 2, mu = 0;
-    int iter = 0, stop = 0;
-    for (iter = 0; iter < maxIterNumber && !stop; ++iter) {
-        // check error
-        double err = e.squaredNorm();
-        if (err <= eps * eps) {
-            // error is small, Success
-            stop = 1;
+// Appends the loci a constraint holds the point at slot on, reading the other parameters through
+// the reduction map. The distance to a line holds it on either of two parallel lines.
+void appendLoci(
+    Constraint* constr,
+    int slot,
+    const MAP_pD_pD& reductionmap,
+    std::vector<Locus>& loci
+)
+{
+    const VEC_pD& params = constr->origParams();
+    auto value = [&](int i) {
+        const auto it = reductionmap.find(params[i]);
+        return *(it != reductionmap.end() ? it->second : params[i]);
+    };
+    const int other = 2 - slot;
+    switch (constr->getTypeId()) {
+        case P2PDistance:
+            loci.push_back({{value(other), value(other + 1)}, {0., 0.}, std::abs(value(4))});
+            break;
+        case P2PAngle: {
+            const double incr = static_cast<ConstraintP2PAngle*>(constr)->getIncrAngle();
+            const double angle = value(4) + incr;
+            const double sign = slot == 2 ? 1. : -1.;
+            Eigen::Vector2d dir(sign * std::cos(angle), sign * std::sin(angle));
+            loci.push_back({{value(other), value(other + 1)}, dir, 0., true});
             break;
         }
-        else if (err > divergingLim || err != err) {
-            // check for diverging and NaN
-            stop = 6;
+        case PointOnLine:
+        case P2LDistance: {
+            const Eigen::Vector2d p1(value(2), value(3));
+            const Eigen::Vector2d dir = Eigen::Vector2d(value(4), value(5)) - p1;
+            if (dir.norm() == 0.) {
+                break;
+            }
+            if (constr->getTypeId() == PointOnLine) {
+                loci.push_back({p1, dir});
+                break;
+            }
+            const Eigen::Vector2d normal = Eigen::Vector2d(-dir.y(), dir.x()).normalized();
+            const Eigen::Vector2d offset = value(6) * normal;
+            loci.push_back({p1 + offset, dir});
+            loci.push_back({p1 - offset, dir});
             break;
         }
-
-        // J^T J, J^T e
-        subsys->calcJacobi(J);
-
-        A = J.transpose() * J;
-        g = J.transpose() * e;
-
-        // Compute ||J^T e||_inf
-        double g_inf = g.lpNorm<Eigen::Infinity>();
-        diag_A = A.diagonal();  // save diagonal entries so that augmentation can be later canceled
-
-        // check for convergence
-        if (g_inf <= eps1) {
-            stop = 2;
+        default:
             break;
-        }
+    }
+}
 
-        // compute initial damping factor
-        if (iter == 0) {
-            mu = tau * diag_A.lpNorm<Eigen::Infinity>();
+// Appends the intersections of two loci. Circles that only just miss each other or a line, by
+// rounding, are taken as touching it.
+void intersectLoci(const Locus& a, const Locus& b, std::vector<Eigen::Vector2d>& points)
+{
+    const bool aCircle = a.dir.isZero();
+    const bool bCircle = b.dir.isZero();
+    if (!aCircle && !bCircle) {
+        const double det = a.dir.x() * b.dir.y() - a.dir.y() * b.dir.x();
+        if (std::abs(det) <= 1e-12 * a.dir.norm() * b.dir.norm()) {
+            return;
+        }
+        const Eigen::Vector2d d = b.origin - a.origin;
+        const double t = (d.x() * b.dir.y() - d.y() * b.dir.x()) / det;
+        points.push_back(a.origin + t * a.dir);
+        return;
+    }
+    if (!aCircle || !bCircle) {
+        const Locus& line = aCircle ? b : a;
+        const Locus& circle = aCircle ? a : b;
+        const Eigen::Vector2d unit = line.dir.normalized();
+        const Eigen::Vector2d foot =
+            line.origin + (circle.origin - line.origin).dot(unit) * unit;
+        const double h2 = circle.radius * circle.radius - (circle.origin - foot).squaredNorm();
+        if (h2 < -1e-10 * circle.radius * circle.radius) {
+            return;
+        }
+        const double h = std::sqrt(std::max(h2, 0.));
+        points.push_back(foot + h * unit);
+        points.push_back(foot - h * unit);
+        return;
+    }
+    const Eigen::Vector2d d = b.origin - a.origin;
+    const double dist = d.norm();
+    if (dist == 0.) {
+        return;
+    }
+    const double along = (a.radius * a.radius - b.radius * b.radius + dist * dist) / (2 * dist);
+    const double h2 = a.radius * a.radius - along * along;
+    if (h2 < -1e-10 * a.radius * a.radius) {
+        return;
+    }
+    const double h = std::sqrt(std::max(h2, 0.));
+    const Eigen::Vector2d unit = d / dist;
+    const Eigen::Vector2d foot = a.origin + along * unit;
+    points.emplace_back(foot + h * Eigen::Vector2d(-unit.y(), unit.x()));
+    points.emplace_back(foot - h * Eigen::Vector2d(-unit.y(), unit.x()));
+}
+
+}  // namespace
+
+void System::planClusters(int cid)
+{
+    // Graph-constructive decomposition of a component (DR-planning): starting from the
+    // parameters that are not unknowns, repeatedly find a small cluster of constraints that
+    // has as many equations as it has unknowns not determined yet, and fix those unknowns.
+    // Clusters are grown from the constraints next to the determined unknowns, so that a
+    // well-constrained sketch is solved as a sequence of small systems, e.g. a point placed by
+    // two distances to points placed before it. What no cluster determines is ordered by its
+    // Dulmage-Mendelsohn decomposition.
+    const std::vector<Constraint*>& constrs = clists[cid];
+    const MAP_pD_pD& reductionmap = reductionmaps[cid];
+    const int sizeLimit = clusterSizeLimit;
+
+    // the unknowns of the component, after the reduction of equalities
+    std::unordered_map<double*, int> varOf;
+    VEC_pD vars;
+    std::vector<VEC_pD> aliasesOf;
+    auto keptOf = [&reductionmap](double* param) {
+        const auto it = reductionmap.find(param);
+        return it != reductionmap.end() ? it->second : param;
+    };
+    for (double* param : plists[cid]) {
+        double* kept = keptOf(param);
+        if (pIndex.count(kept) == 0) {
+            continue;  // substituted by a constant
+        }
+        const auto [it, inserted] = varOf.try_emplace(kept, int(vars.size()));
+        if (inserted) {
+            vars.push_back(kept);
+            aliasesOf.emplace_back();
+        }
+        if (param != kept) {
+            aliasesOf[it->second].push_back(param);
         }
+    }
+    const int varsNum = int(vars.size());
+    const int constrsNum = int(constrs.size());
+    if (sizeLimit <= 0 || varsNum <= sizeLimit) {
+        return;
+    }
 
-        double h_norm {};
-        // determine increment using adaptive damping
-        int k = 0;
-        while (k < 50) {
-            // augment normal equations A = A+uI
-            for (int i = 0; i < xsize; ++i) {
-                A(i, i) += mu;
+    AdjacencyCSR c2v, v2c;
+    for (const auto constr : constrs) {
+        const auto rowBegin = c2v.index.size();
+        for (double* param : constr->origParams()) {
+            const auto it = varOf.find(keptOf(param));
+            if (it != varOf.end()) {
+                c2v.index.push_back(it->second);
             }
+        }
+        const auto rowStart = c2v.index.begin() + rowBegin;
+        std::sort(rowStart, c2v.index.end());
+        c2v.index.erase(std::unique(rowStart, c2v.index.end()), c2v.index.end());
+        c2v.endRow();
+    }
+    v2c.transpose(c2v, varsNum);
+
+    std::vector<char> solved(varsNum, 0), done(constrsNum, 0);
+    VEC_I openNum(constrsNum);  // unknowns of each constraint not determined yet
+    for (int c = 0; c < constrsNum; c++) {
+        openNum[c] = int(c2v.end(c) - c2v.begin(c));
+    }
+
+    // constraints made only of determined unknowns and those of vars, counted with stamps
+    VEC_I varStamp(varsNum, 0), constrStamp(constrsNum, 0);
+    int stamp = 0;
+    auto clusterOf = [&](const VEC_I& unknowns, VEC_I& members) {
+        ++stamp;
+        for (int v : unknowns) {
+            varStamp[v] = stamp;
+        }
+        members.clear();
+        for (int v : unknowns) {
+            for (const int* c = v2c.begin(v); c != v2c.end(v); ++c) {
+                if (done[*c] || constrStamp[*c] == stamp) {
+                    continue;
+                }
+                constrStamp[*c] = stamp;
+                if (std::all_of(c2v.begin(*c), c2v.end(*c), [&](int w) {
+                        return solved[w] || varStamp[w] == stamp;
+                    })) {
+                    members.push_back(*c);
+                }
+            }
+        }
+    };
 
-            // solve augmented functions A*h=-g
-            h = A.fullPivLu().solve(g);
-            double rel_error = (A * h - g).norm() / g.norm();
-
-            // check if solving works
-            if (rel_error < 1e-5) {
-                // restrict h according to maxStep
-                double scale = subsys->maxStep(h);
-                if (scale < 1.) {
-                    h *= scale;
+    std::vector<std::pair<VEC_I, VEC_I>> plan;  // unknowns and constraints of each cluster
+    std::deque<int> candidates;
+    for (int c = 0; c < constrsNum; c++) {
+        if (openNum[c] <= sizeLimit) {
+            candidates.push_back(c);
+        }
+    }
+    std::stable_sort(candidates.begin(), candidates.end(), [&openNum](int c1, int c2) {
+        return openNum[c1] < openNum[c2];
+    });
+    // seeds that do not make a cluster on their own are only grown once no other seed does,
+    // so that clusters stay as small as possible
+    std::deque<int> deferred;
+    VEC_I clusterVars, members, grownVars, grownMembers;
+    while (!candidates.empty() || !deferred.empty()) {
+        const bool grow = candidates.empty();
+        std::deque<int>& queue = grow ? deferred : candidates;
+        const int seed = queue.front();
+        queue.pop_front();
+        if (done[seed] || openNum[seed] == 0 || openNum[seed] > sizeLimit) {
+            continue;
+        }
+        clusterVars.clear();
+        std::copy_if(c2v.begin(seed), c2v.end(seed), std::back_inserter(clusterVars), [&](int v) {
+            return !solved[v];
+        });
+        clusterOf(clusterVars, members);
+        if (!grow && members.size() < clusterVars.size()) {
+            deferred.push_back(seed);
+            continue;
+        }
+        // grow the cluster by the neighbouring constraint that leaves the fewest unknowns
+        // undetermined, while it has fewer equations than unknowns
+        while (int(members.size()) < int(clusterVars.size())) {
+            int bestDeficit = int(clusterVars.size()) - int(members.size());
+            VEC_I bestVars, bestMembers;
+            std::unordered_set<int> tried(members.begin(), members.end());
+            const VEC_I current = clusterVars;
+            for (int v : current) {
+                for (const int* c = v2c.begin(v); c != v2c.end(v); ++c) {
+                    if (done[*c] || !tried.insert(*c).second) {
+                        continue;
+                    }
+                    grownVars = current;
+                    for (const int* w = c2v.begin(*c); w != c2v.end(*c); ++w) {
+                        if (!solved[*w]
+                            && std::find(current.begin(), current.end(), *w) == current.end()) {
+                            grownVars.push_back(*w);
+                        }
+                    }
+                    if (int(grownVars.size()) > sizeLimit) {
+                        continue;
+                    }
+                    clusterOf(grownVars, grownMembers);
+                    const int deficit = int(grownVars.size()) - int(grownMembers.size());
+                    if (deficit < bestDeficit
+                        || (deficit == bestDeficit && !bestVars.empty()
+                            && grownVars.size() < bestVars.size())) {
+                        bestDeficit = deficit;
+                        bestVars = grownVars;
+                        bestMembers = grownMembers;
+                    }
                 }
+            }
+            if (bestVars.empty()) {
+                break;
+            }
+            clusterVars.swap(bestVars);
+            members.swap(bestMembers);
+        }
+        if (members.size() != clusterVars.size()) {
+            continue;  // not determined by its own constraints, or over-determined
+        }
 
-                // compute par's new estimate and ||d_par||^2
-                x_new = x + h;
-                h_norm = h.squaredNorm();
+        for (int c : members) {
+            done[c] = 1;
+        }
+        for (int v : clusterVars) {
+            solved[v] = 1;
+            for (const int* c = v2c.begin(v); c != v2c.end(v); ++c) {
+                if (--openNum[*c] > 0 && !done[*c]) {
+                    candidates.push_back(*c);
+                }
+            }
+        }
+        plan.emplace_back(clusterVars, members);
+    }
+    // what the clusters leave is split further by its Dulmage-Mendelsohn decomposition, which
+    // finds the square blocks of any size, and the parts with more or fewer equations than
+    // unknowns
+    VEC_I restVars, restMembers;
+    for (int v = 0; v < varsNum; v++) {
+        if (!solved[v]) {
+            restVars.push_back(v);
+        }
+    }
+    for (int c = 0; c < constrsNum; c++) {
+        if (!done[c]) {
+            restMembers.push_back(c);
+        }
+    }
+    if (!restMembers.empty()) {
+        auto blocks = dulmageMendelsohnBlocks(c2v, v2c, restVars, restMembers);
+        std::move(blocks.begin(), blocks.end(), std::back_inserter(plan));
+    }
+    if (plan.size() < 2) {
+        return;
+    }
 
-                constexpr double epsilon = std::numeric_limits<double>::epsilon();
-                if (h_norm <= eps1 * eps1 * x.norm()) {
-                    // relative change in p is small, stop
-                    stop = 3;
-                    break;
+    std::vector<char> inCluster(varsNum, 0);
+    for (const auto& [unknowns, constrIds] : plan) {
+        Cluster cluster;
+        std::vector<Constraint*> clusterConstrs;
+        SET_pD clusterParams;
+        for (int v : unknowns) {
+            inCluster[v] = 1;
+            clusterParams.insert(vars[v]);
+            for (double* alias : aliasesOf[v]) {
+                cluster.aliases.emplace_back(alias, vars[v]);
+            }
+        }
+        // the parameters of the cluster and the unknowns substituted by constants, for the
+        // reduction map to redirect them
+        for (int c : constrIds) {
+            clusterConstrs.push_back(constrs[c]);
+            for (double* param : constrs[c]->origParams()) {
+                if (pIndex.count(param) == 0) {
+                    continue;
                 }
-                else if (h_norm >= (x.norm() + eps1) / (epsilon * epsilon)) {
-                    // almost singular
-                    stop = 4;
-                    break;
+                const auto it = varOf.find(keptOf(param));
+                if (it == varOf.end() || inCluster[it->second]) {
+                    clusterParams.insert(param);
                 }
-
-                subsys->setParams(x_new);
-                subsys->calcResidual(e_new);
-                e_new *= -1;
-
-                double dF = e.squaredNorm() - e_new.squaredNorm();
-                double dL = h.dot(mu * h + g);
-
-                if (dF > 0. && dL > 0.) {  // reduction in error, increment is accepted
-                    double tmp = 2 * dF / dL - 1.;
-                    mu *= std::max(1. / 3., 1. - tmp * tmp * tmp);
-                    nu = 2;
-
-                    // update par's estimate
-                    x = x_new;
-                    e = e_new;
+            }
+        }
+        for (int v : unknowns) {
+            inCluster[v] = 0;
+        }
+        if (unknowns.size() == 2 && clusterConstrs.size() == 2) {
+            // the point is the one both constraints hold, at a place given by its type
+            for (int slot : pointSlots(clusterConstrs[0])) {
+                double* x = keptOf(clusterConstrs[0]->origParams()[slot]);
+                double* y = keptOf(clusterConstrs[0]->origParams()[slot + 1]);
+                const bool isPoint = x != y
+                    && (x == vars[unknowns[0]] || x == vars[unknowns[1]])
+                    && (y == vars[unknowns[0]] || y == vars[unknowns[1]]);
+                if (isPoint && pointSlot(clusterConstrs[1], x, y, reductionmap) >= 0) {
+                    cluster.pointX = x;
+                    cluster.pointY = y;
+                    cluster.placing = clusterConstrs;
                     break;
                 }
             }
+        }
+        VEC_pD params(clusterParams.begin(), clusterParams.end());
+        cluster.subsys = std::make_unique<SubSystem>(clusterConstrs, params, reductionmaps[cid]);
+        clusters[cid].push_back(std::move(cluster));
+    }
+}
 
-            // if this point is reached, either the linear system could not be solved or
-            // the error did not reduce; in any case, the increment must be rejected
-
-            mu *= nu;
-            nu *= 2.0;
-            for (int i = 0; i < xsize; ++i) {  // restore diagonal J^T J entries
-                A(i, i) = diag_A(i);
-            }
-
-            k++;
+int System::solveClusters(int cid, bool isFine, Algorithm alg, bool isRedundantsolving)
+{
+    // Each cluster is solved with the unknowns of the ones before it fixed at their solution.
+    // If one fails, e.g. because its constraints only determine its unknowns together with
+    // those of later clusters, the component is solved whole instead.
+    int res = Success;
+    for (const auto& cluster : clusters[cid]) {
+        if (constructivePlacement && cluster.pointX && placeCluster(cluster, reductionmaps[cid])) {
+            solvePlacements++;
         }
-        if (k > 50) {
-            stop = 7;
+        res = solve(cluster.subsys.get(), isFine, alg, isRedundantsolving);
+        if (res != Success) {
             break;
         }
-
-        if (debugMode == IterationLevel) {
-            std::stringstream stream;
-            // Iteration: 1, residual: 1e-3, tolg: 1e-5, tolx: 1e-3
-            stream << "LM, Iteration: " << iter << ", err(eps): " << err
-                   << ", g_inf(eps1): " << g_inf << ", h_norm: " << h_norm << "\n";
-
-            const std::string tmp = stream.str();
-            Base::Console().log(tmp.c_str());
+        cluster.subsys->applySolution();
+        for (const auto& [alias, kept] : cluster.aliases) {
+            *alias = *kept;
         }
     }
 
-    if (iter >= maxIterNumber) {
-        stop = 5;
+    // the solution is handed to the subsystem of the whole component, which applySolution()
+    // applies, and the parameters are reset like those of the other components
+    SubSystem* subsys = subSystems[cid];
+    if (res == Success) {
+        VEC_pD params;
+        subsys->getParamList(params);
+        Eigen::VectorXd x(params.size());
+        for (std::size_t i = 0; i < params.size(); i++) {
+            x[i] = *params[i];
+        }
+        subsys->setParams(x);
     }
+    for (double* param : plists[cid]) {
+        *param = reference[pIndex[param]];
+    }
+    if (res != Success) {
+        res = solve(subsys, isFine, alg, isRedundantsolving);
+    }
+    return res;
+}
 
-    subsys->revertParams();
-
-    return (stop == 1) ? Success : Failed;
+bool System::placeCluster(const Cluster& cluster, const MAP_pD_pD& reductionmap)
+{
+    // Intersects the curves the two constraints hold the point on, and moves it to the
+    // intersection nearest to it, which keeps the configuration it is closest to, like solving
+    // from where it is would. The cluster is still solved, from there.
+    std::vector<Locus> loci[2];
+    for (int i = 0; i < 2; i++) {
+        Constraint* constr = cluster.placing[i];
+        appendLoci(constr, pointSlot(constr, cluster.pointX, cluster.pointY, reductionmap),
+                   reductionmap, loci[i]);
+    }
+    std::vector<Eigen::Vector2d> points;
+    for (const Locus& a : loci[0]) {
+        for (const Locus& b : loci[1]) {
+            const auto begin = points.size();
+            intersectLoci(a, b, points);
+            // a ray only holds the points ahead of its origin
+            points.erase(
+                std::remove_if(points.begin() + begin, points.end(),
+                               [&a, &b](const Eigen::Vector2d& p) {
+                                   return (a.ray && (p - a.origin).dot(a.dir) < 0)
+                                       || (b.ray && (p - b.origin).dot(b.dir) < 0);
+                               }),
+                points.end()
+            );
+        }
+    }
+    if (points.empty()) {
+        return false;
+    }
+    const Eigen::Vector2d current(*cluster.pointX, *cluster.pointY);
+    const auto nearest = std::ranges::min_element(points, {}, [&current](const auto& p) {
+        return (p - current).squaredNorm();
+    });
+    *cluster.pointX = nearest->x();
+    *cluster.pointY = nearest->y();
+    for (const auto& [alias, kept] : cluster.aliases) {
+        *alias = *kept;
+    }
+    return true;
 }
 
-int System::solve_DL(SubSystem* subsys, bool isRedundantsolving)
+void System::setReference()
 {
-#ifdef _GCS_EXTRACT_SOLVER_SUBSYSTEM_
-    extractSubsystem(subsys, isRedundantsolving);
-#endif
-
-    int xsize = subsys->pSize();
-    int csize = subsys->cSize();
-
-    if (xsize == 0) {
-        return Success;
+    reference.clear();
+    reference.reserve(plist.size());
+    for (const auto& param : plist) {
+        reference.push_back(*param);
     }
+}
 
-    double tolg = DL_tolg;
-    double tolx = DL_tolx;
-    double tolf = DL_tolf;
-
-    int maxIterNumber = (sketchSizeMultiplier ? maxIter * xsize : maxIter);
-    if (isRedundantsolving) {
-        tolg = DL_tolgRedundant;
-        tolx = DL_tolxRedundant;
-        tolf = DL_tolfRedundant;
-
-        maxIterNumber = (sketchSizeMultiplierRedundant ? maxIterRedundant * xsize : maxIterRedundant);
+void System::resetToReference()
+{
+    if (reference.size() == plist.size()) {
+        VEC_D::const_iterator ref = reference.begin();
+        VEC_pD::iterator param = plist.begin();
+        for (; ref != reference.end(); ++ref, ++param) {
+            **param = *ref;
+        }
     }
+}
 
-    if (debugMode == IterationLevel) {
-        std::stringstream stream;
-        stream << "DL: tolg: " << tolg << ", tolx: " << tolx << ", tolf: " << tolf
-               << ", convergence: " << (isRedundantsolving ? convergenceRedundant : convergence)
-               << ", dogLegGaussStep: "
-               << (dogLegGaussStep == FullPivLU
-                       ? "FullPivLU"
-                       : (dogLegGaussStep == LeastNormFullPivLU ? "LeastNormFullPivLU"
-                                                                : "LeastNormLdlt"))
-               << ", xsize: " << xsize << ", csize: " << csize << ", maxIter: " << maxIterNumber
-               << "\n";
+int System::solve(VEC_pD& params, bool isFine, Algorithm alg, bool isRedundantsolving)
+{
+    declareUnknowns(params);
+    initSolution();
+    return solve(isFine, alg, isRedundantsolving);
+}
 
-        const std::string tmp = stream.str();
-        Base::Console().log(tmp.c_str());
+bool System::isComponentUnchanged(const ComponentState& state) const
+{
+    if (!state.valid || state.status != Success) {
+        return false;
     }
+    for (std::size_t i = 0; i < state.params.size(); i++) {
+        if (*state.params[i] != state.applied[i]) {
+            return false;
+        }
+    }
+    return true;
+}
 
-    Eigen::VectorXd x(xsize), x_new(xsize);
-    Eigen::VectorXd fx(csize), fx_new(csize);
-    Eigen::MatrixXd Jx(csize, xsize), Jx_new(csize, xsize);
-    Eigen::VectorXd g(xsize), h_sd(xsize), h_gn(xsize), h_dl(xsize);
-
-    subsys->redirectParams();
-
-    double err;
-    subsys->getParams(x);
-    subsys->calcResidual(fx, err);
-    subsys->calcJacobi(Jx);
-
-    g = Jx.transpose() * (-fx);
-
-    // get the infinity norm fx_inf and g_inf
-    double g_inf = g.lpNorm<Eigen::Infinity>();
-    double fx_inf = fx.lpNorm<Eigen::Infinity>();
-
-    double divergingLim = 1e6 * err + 1e12;
+int System::solve(bool isFine, Algorithm alg, bool isRedundantsolving)
+{
+    solveIterations = 0;
+    solvePlacements = 0;
+    solveSkipped = 0;
+    if (!isInit) {
+        return Failed;
+    }
 
-    double delta = 0.1;
-    double alpha = 0.;
-    double nu = 2.;
-    int iter = 0, stop = 0, reduce = 0;
-    while (!stop) {
-        // check if finished
-        if (fx_inf <= tolf) {
-            // Success
-            stop = 1;
-            break;
+    bool isReset = false;
+    // return success by default in order to permit coincidence constraints to be applied
+    // even if no other system has to be solved
+    int res = Success;
+    for (int cid = 0; cid < int(subSystems.size()); cid++) {
+        if ((subSystems[cid] || subSystemsAux[cid]) && !isReset) {
+            resetToReference();
+            isReset = true;
         }
-        else if (g_inf <= tolg) {
-            stop = 2;
-            break;
-        }
-        else if (delta <= tolx * (tolx + x.norm())) {
-            stop = 2;
-            break;
+        // A component whose unknowns and driving values are those its last solution left is not
+        // solved again. Its subsystems keep that solution, which applySolution() applies again.
+        ComponentState& state = componentStates[cid];
+        if ((subSystems[cid] || subSystemsAux[cid]) && isComponentUnchanged(state)) {
+            solveSkipped++;
+            continue;
         }
-        else if (iter >= maxIterNumber) {
-            stop = 4;
-            break;
+        state.valid = false;
+        int cres = Success;
+        if (subSystems[cid] && subSystemsAux[cid]) {
+            cres = solve(subSystems[cid], subSystemsAux[cid], isFine, isRedundantsolving);
         }
-        else if (err > divergingLim || err != err) {
-            // check for diverging and NaN
-            stop = 6;
-            break;
+        else if (!clusters[cid].empty()) {
+            cres = solveClusters(cid, isFine, alg, isRedundantsolving);
         }
-
-        // get the steepest descent direction
-        alpha = g.squaredNorm() / (Jx * g).squaredNorm();
-        h_sd = alpha * g;
-
-        // get the gauss-newton step
-        // https://forum.freecad.org/viewtopic.php?f=10&t=12769&start=50#p106220
-        // https://forum.kde.org/viewtopic.php?f=74&t=129439#p346104
-        switch (dogLegGaussStep) {
-            case FullPivLU:
-                h_gn = Jx.fullPivLu().solve(-fx);
-                break;
-            case LeastNormFullPivLU:
-                h_gn = Jx.adjoint() * (Jx * Jx.adjoint()).fullPivLu().solve(-fx);
-                break;
-            case LeastNormLdlt:
-                h_gn = Jx.adjoint() * (Jx * Jx.adjoint()).ldlt().solve(-fx);
-                break;
+        else if (subSystems[cid]) {
+            cres = solve(subSystems[cid], isFine, alg, isRedundantsolving);
         }
-
-        double rel_error = (Jx * h_gn + fx).norm() / fx.norm();
-        if (rel_error > 1e15) {
-            break;
+        else if (subSystemsAux[cid]) {
+            cres = solve(subSystemsAux[cid], isFine, alg, isRedundantsolving);
         }
-
-        // compute the dogleg step
-        if (h_gn.norm() < delta) {
-            h_dl = h_gn;
-            if (h_dl.norm() <= tolx * (tolx + x.norm())) {
-                stop = 5;
-                break;
-            }
+        if (cres == Failed) {
+            cres = solveUnsubstituted(cid, isFine, alg, isRedundantsolving);
         }
-        else if (alpha * g.norm() >= delta) {
-            h_dl = (delta / (alpha * g.norm())) * h_sd;
+        state.status = cres;
+        res = std::max(res, cres);
+    }
+    // no solution satisfies a constraint without unknowns that does not hold already
+    for (const auto constr : constantConstraints) {
+        double err = constr->error();
+        if (err * err > (isRedundantsolving ? convergenceRedundant : convergence)) {
+            return Failed;
         }
-        else {
-            // compute beta
-            double beta = 0;
-            Eigen::VectorXd b = h_gn - h_sd;
-            double bb = (b.transpose() * b).norm();
-            double gb = (h_sd.transpose() * b).norm();
-            double c = (delta + h_sd.norm()) * (delta - h_sd.norm());
-
-            if (gb > 0) {
-                beta = c / (gb + sqrt(gb * gb + c * bb));
-            }
-            else {
-                beta = (sqrt(gb * gb + c * bb) - gb) / bb;
+    }
+    if (res == Success) {
+        for (std::set<Constraint*>::const_iterator constr = redundant.begin();
+             constr != redundant.end();
+             ++constr) {
+            // DeepSOIC: there used to be a comparison of signed error value to
+            // convergence, which makes no sense. Potentially I fixed bug, and
+            // chances are low I've broken anything.
+            double err = (*constr)->error();
+            if (err * err > (isRedundantsolving ? convergenceRedundant : convergence)) {
+                res = Converged;
+                return res;
             }
-
-            // and update h_dl and dL with beta
-            h_dl = h_sd + beta * b;
         }
+    }
+    return res;
+}
 
-        // get the new values
-        double err_new;
-        x_new = x + h_dl;
-        subsys->setParams(x_new);
-        subsys->calcResidual(fx_new, err_new);
-        subsys->calcJacobi(Jx_new);
-
-        // calculate the linear model and the update ratio
-        double dL = err - 0.5 * (fx + Jx * h_dl).squaredNorm();
-        double dF = err - err_new;
-        double rho = dL / dF;
-
-        if (dF > 0 && dL > 0) {
-            x = x_new;
-            Jx = Jx_new;
-            fx = fx_new;
-            err = err_new;
-
-            g = Jx.transpose() * (-fx);
+int System::solveUnsubstituted(int cid, bool isFine, Algorithm alg, bool isRedundantsolving)
+{
+    // Substituting constants for unknowns changes the steps the solver takes, and it can fail
+    // where it succeeds with those unknowns left to it. A component with constants substituted
+    // that failed is solved again with only its equal unknowns merged, and keeps that plan if
+    // it does not fail.
+    const bool substituted = std::ranges::any_of(reductionmaps[cid], [this](const auto& item) {
+        return pIndex.count(item.second) == 0;
+    });
+    if (!substituted) {
+        return Failed;
+    }
 
-            // get infinity norms
-            g_inf = g.lpNorm<Eigen::Infinity>();
-            fx_inf = fx.lpNorm<Eigen::Infinity>();
-        }
-        else {
-            rho = -1;
+    const VEC_pD& params = plists[cid];
+    std::unordered_map<double*, int> local;
+    for (int i = 0; i < int(params.size()); i++) {
+        local[params[i]] = i;
+    }
+    const std::unordered_set<Constraint*> inComponent(clists[cid].begin(), clists[cid].end());
+    DisjointSets equalParams;
+    equalParams.reset(int(params.size()));
+    VEC_pD kept = params;  // kept parameter, per root
+    std::vector<Constraint*> constrs;
+    for (const auto constr : clist) {
+        if (redundant.count(constr) != 0) {
+            continue;
         }
-
-        // update delta
-        if (fabs(rho - 1.) < 0.2 && h_dl.norm() > delta / 3. && reduce <= 0) {
-            delta = 3 * delta;
-            nu = 2;
-            reduce = 0;
+        if (isReducibleEquality(constr)) {
+            const auto it1 = local.find(constr->origParams()[0]);
+            const auto it2 = local.find(constr->origParams()[1]);
+            if (it1 != local.end() && it2 != local.end()) {
+                int root1 = equalParams.find(it1->second);
+                double* p_kept = kept[root1];
+                equalParams.unite(root1, equalParams.find(it2->second));
+                kept[equalParams.find(root1)] = p_kept;
+                continue;
+            }
+            if (it1 != local.end() || it2 != local.end()) {
+                constrs.push_back(constr);
+                continue;
+            }
         }
-        else if (rho < 0.25) {
-            delta = delta / nu;
-            nu = 2 * nu;
-            reduce = 2;
+        if (inComponent.count(constr) != 0) {
+            constrs.push_back(constr);
         }
-        else {
-            reduce--;
+    }
+    MAP_pD_pD reductionmap;
+    for (int i = 0; i < int(params.size()); i++) {
+        double* target = kept[equalParams.find(i)];
+        if (params[i] != target) {
+            reductionmap[params[i]] = target;
         }
+    }
 
-        if (debugMode == IterationLevel) {
-            std::stringstream stream;
-            // Iteration: 1, residual: 1e-3, tolg: 1e-5, tolx: 1e-3
-            stream << "DL, Iteration: " << iter << ", fx_inf(tolf): " << fx_inf
-                   << ", g_inf(tolg): " << g_inf << ", delta(f(tolx)): " << delta
-                   << ", err(divergingLim): " << err << "\n";
+    std::vector<Constraint*> clist0, clist1;
+    std::ranges::partition_copy(
+        constrs,
+        std::back_inserter(clist0),
+        std::back_inserter(clist1),
+        [](auto constr) { return constr->getTag() >= 0 && constr->isDriving(); }
+    );
+    auto subsys0 = clist0.empty() ? nullptr : new SubSystem(clist0, plists[cid], reductionmap);
+    auto subsys1 = clist1.empty() ? nullptr : new SubSystem(clist1, plists[cid], reductionmap);
+    for (double* param : params) {
+        *param = reference[pIndex[param]];
+    }
+    int res = Failed;
+    if (subsys0 && subsys1) {
+        res = solve(subsys0, subsys1, isFine, isRedundantsolving);
+    }
+    else if (subsys0 || subsys1) {
+        res = solve(subsys0 ? subsys0 : subsys1, isFine, alg, isRedundantsolving);
+    }
+    if (res == Failed) {
+        delete subsys0;
+        delete subsys1;
+        return Failed;
+    }
 
-            const std::string tmp = stream.str();
-            Base::Console().log(tmp.c_str());
-        }
+    delete subSystems[cid];
+    delete subSystemsAux[cid];
+    subSystems[cid] = subsys0;
+    subSystemsAux[cid] = subsys1;
+    clusters[cid].clear();
+    clists[cid] = std::move(constrs);
+    reductionmaps[cid] = std::move(reductionmap);
+    setComponentParams(cid);
+    return res;
+}
 
-        // count this iteration and start again
-        iter++;
+int System::solve(SubSystem* subsys, bool isFine, Algorithm alg, bool isRedundantsolving)
+{
+    if (alg == BFGS) {
+        return solve_BFGS(subsys, isFine, isRedundantsolving);
+    }
+    else if (alg == LevenbergMarquardt) {
+        return solve_LM(subsys, isRedundantsolving);
+    }
+    else if (alg == DogLeg) {
+        return solve_DL(subsys, isRedundantsolving);
+    }
+    else if (alg == LBFGS) {
+        return solve_LBFGS(subsys, isRedundantsolving);
+    }
+    else {
+        return Failed;
     }
+}
 
+int System::checkSubstituted(SubSystem* subsys)
+{
+    // all unknowns were substituted, only the remaining residuals need checking, with the
+    // constraints pointing at the constants substituted
+    subsys->redirectParams();
+    double err = subsys->error();
     subsys->revertParams();
+    return err <= smallF ? Success : Failed;
+}
 
-    if (debugMode == IterationLevel) {
-        std::stringstream stream;
-        stream << "DL: stopcode: " << stop << ((stop == 1) ? ", Success" : ", Failed") << "\n";
+int System::solve_BFGS(SubSystem* subsys, bool /*isFine*/, bool isRedundantsolving)
+{
+#ifdef _GCS_EXTRACT_SOLVER_SUBSYSTEM_
+    extractSubsystem(subsys, isRedundantsolving);
+#endif
 
-        const std::string tmp = stream.str();
-        Base::Console().log(tmp.c_str());
+    int xsize = subsys->pSize();
+    if (xsize == 0) {
+        return checkSubstituted(subsys);
     }
 
-    return (stop == 1) ? Success : Failed;
-}
-
-#ifdef _GCS_EXTRACT_SOLVER_SUBSYSTEM_
-void System::extractSubsystem(SubSystem* subsys, bool isRedundantsolving)
-{
-    VEC_pD plistout;  // std::vector<double *>
-    std::vector<Constraint*> clist_;
-    VEC_pD clist_params_;
+    subsys->redirectParams();
 
-    subsys->getParamList(plistout);
-    subsys->getConstraintList(clist_);
+    SolverWorkspace& ws = subsys->workspace();
+    Eigen::MatrixXd& D = ws.D;
+    Eigen::VectorXd& x = ws.x;
+    Eigen::VectorXd& xdir = ws.xdir;
+    Eigen::VectorXd& grad = ws.grad;
+    Eigen::VectorXd& h = ws.h;
+    Eigen::VectorXd& y = ws.y;
+    Eigen::VectorXd& Dy = ws.Dy;
+    D.setIdentity(xsize, xsize);
+    x.resize(xsize);
+    xdir.resize(xsize);
+    grad.resize(xsize);
+    h.resize(xsize);
+    y.resize(xsize);
+    Dy.resize(xsize);
 
-    std::ofstream subsystemfile;
-    subsystemfile.open("subsystemfile.txt", std::ofstream::out | std::ofstream::app);
-    subsystemfile << std::endl;
-    subsystemfile << std::endl;
-    subsystemfile << "Solving: " << (isRedundantsolving ? "Redundant" : "Normal")
-                  << " Subsystem Dump starts here................................" << std::endl;
+    // Initial unknowns vector and initial gradient vector
+    subsys->getParams(x);
+    subsys->calcGrad(grad);
 
-    int ip = 0;
+    // Initial search direction opposed to gradient (steepest-descent)
+    xdir = -grad;
+    lineSearch(subsys, xdir);
+    double err = subsys->error();
 
-    subsystemfile << "GCS::VEC_pD plist_;" << std::endl;                     // all SYSTEM params
-    subsystemfile << "std::vector<GCS::Constraint *> clist_;" << std::endl;  // SUBSYSTEM constraints
-    subsystemfile << "GCS::VEC_pD plistsub_;" << std::endl;                  // all SUBSYSTEM params
-    // constraint params not within SYSTEM params
-    subsystemfile << "GCS::VEC_pD clist_params_;" << std::endl;
+    h = x;
+    subsys->getParams(x);
+    h = x - h;  // = x - xold
 
-    // these are all the parameters, including those not in the subsystem to
-    // which constraints in the subsystem may make reference.
-    for (VEC_pD::iterator it = plist.begin(); it != plist.end(); ++it, ++ip) {
-        subsystemfile << "plist_.push_back(new double(" << *(*it) << ")); // " << ip
-                      << " address: " << (void*)(*it) << std::endl;
+    // double convergence = isFine ? convergence : XconvergenceRough;
+    int maxIterNumber = (sketchSizeMultiplier ? maxIter * xsize : maxIter);
+    double convCriterion = convergence;
+    if (isRedundantsolving) {
+        maxIterNumber = (sketchSizeMultiplierRedundant ? maxIterRedundant * xsize : maxIterRedundant);
+        convCriterion = convergenceRedundant;
     }
 
-    int ips = 0;
-    for (VEC_pD::iterator it = plistout.begin(); it != plistout.end(); ++it, ++ips) {
-        VEC_pD::iterator p = std::ranges::find(plist, (*it));
-        size_t p_index = std::distance(plist.begin(), p);
-
-        if (p_index == plist.size()) {
-            subsystemfile << "// Error: Subsystem parameter not in system params"
-                          << "address: " << (void*)(*it) << std::endl;
-        }
+    if (debugMode == IterationLevel) {
+        std::stringstream stream;
+        stream << "BFGS: convergence: " << convCriterion << ", xsize: " << xsize
+               << ", maxIter: " << maxIterNumber << "\n";
 
-        subsystemfile << "plistsub_.push_back(plist_[" << p_index << "]); // " << ips << std::endl;
+        const std::string tmp = stream.str();
+        Base::Console().log(tmp.c_str());
     }
 
-    int ic = 0;   // constraint index
-    int icp = 0;  // index of constraint params not within SYSTEM params
-    for (std::vector<Constraint*>::iterator it = clist_.begin(); it != clist_.end(); ++it, ++ic) {
-
-        switch ((*it)->getTypeId()) {
-            case Equal: {  // 2
-                VEC_pD::iterator p1 = std::ranges::find(plist, (*it)->pvec[0]);
-                VEC_pD::iterator p2 = std::ranges::find(plist, (*it)->pvec[1]);
-                size_t i1 = std::distance(plist.begin(), p1);
-                size_t i2 = std::distance(plist.begin(), p2);
+    double divergingLim = 1e6 * err + 1e12;
+    double h_norm {};
 
-                bool npb1 = false;
-                VEC_pD::iterator np1 = std::ranges::find(clist_params_, (*it)->pvec[0]);
-                size_t ni1 = std::distance(clist_params_.begin(), np1);
+    int iter = 1;  // the steepest-descent step above counts as the first
+    for (; iter < maxIterNumber; ++iter) {
+        h_norm = h.norm();
+        if (h_norm <= convCriterion || err <= smallF) {
+            if (debugMode == IterationLevel) {
+                std::stringstream stream;
+                stream << "BFGS Converged!!: "
+                       << ", err: " << err << ", h_norm: " << h_norm << "\n";
 
-                if (i1 == plist.size()) {
-                    if (ni1 == clist_params_.size()) {
-                        subsystemfile
-                            << "// Address not in System params...rebuilding into clist_params_"
-                            << std::endl;
+                const std::string tmp = stream.str();
+                Base::Console().log(tmp.c_str());
+            }
+            break;
+        }
+        if (err > divergingLim || err != err) {
+            // check for diverging and NaN
+            if (debugMode == IterationLevel) {
+                std::stringstream stream;
+                stream << "BFGS Failed: Diverging!!: "
+                       << ", err: " << err << ", divergingLim: " << divergingLim << "\n";
+
+                const std::string tmp = stream.str();
+                Base::Console().log(tmp.c_str());
+            }
+            break;
+        }
+
+        y = grad;
+        subsys->calcGrad(grad);
+        y = grad - y;  // = grad - gradold
+
+        double hty = h.dot(y);
+        // make sure that hty is never 0
+        if (hty == 0) {
+            hty = .0000000001;
+        }
+
+        Dy.noalias() = D * y;
+
+        double ytDy = y.dot(Dy);
+
+        // Now calculate the BFGS update on D
+        D.noalias() += (1. + ytDy / hty) / hty * h * h.transpose();
+        D.noalias() -= 1. / hty * h * Dy.transpose();
+        D.noalias() -= 1. / hty * Dy * h.transpose();
+
+        xdir.noalias() = -D * grad;
+        lineSearch(subsys, xdir);
+        err = subsys->error();
+
+        h = x;
+        subsys->getParams(x);
+        h = x - h;  // = x - xold
+
+        if (debugMode == IterationLevel) {
+            std::stringstream stream;
+            stream << "BFGS, Iteration: " << iter << ", err: " << err << ", h_norm: " << h_norm
+                   << "\n";
+
+            const std::string tmp = stream.str();
+            Base::Console().log(tmp.c_str());
+        }
+    }
+
+    subsys->revertParams();
+    solveIterations += iter;
+
+    if (err <= smallF) {
+        return Success;
+    }
+    if (h.norm() <= convCriterion) {
+        return Converged;
+    }
+    return Failed;
+}
+
+// BFGS with the inverse Hessian approximation kept implicitly as the last lbfgsHistory
+// correction pairs (Nocedal & Wright, Algorithm 7.4), so memory and time per iteration are
+// linear in the number of unknowns instead of quadratic.
+int System::solve_LBFGS(SubSystem* subsys, bool isRedundantsolving)
+{
+#ifdef _GCS_EXTRACT_SOLVER_SUBSYSTEM_
+    extractSubsystem(subsys, isRedundantsolving);
+#endif
+
+    int xsize = subsys->pSize();
+    if (xsize == 0) {
+        return checkSubstituted(subsys);
+    }
+
+    subsys->redirectParams();
+
+    SolverWorkspace& ws = subsys->workspace();
+    Eigen::VectorXd& x = ws.x;
+    Eigen::VectorXd& xdir = ws.xdir;
+    Eigen::VectorXd& grad = ws.grad;
+    Eigen::VectorXd& h = ws.h;
+    Eigen::VectorXd& y = ws.y;
+    std::vector<Eigen::VectorXd>& S = ws.lbfgsS;
+    std::vector<Eigen::VectorXd>& Y = ws.lbfgsY;
+    std::vector<double>& rho = ws.lbfgsRho;
+    std::vector<double>& alpha = ws.lbfgsAlpha;
+    const int history = std::max(lbfgsHistory, 1);
+    S.resize(history);
+    Y.resize(history);
+    rho.resize(history);
+    alpha.resize(history);
+    x.resize(xsize);
+    xdir.resize(xsize);
+    grad.resize(xsize);
+    h.resize(xsize);
+    y.resize(xsize);
+
+    // Initial unknowns vector and initial gradient vector
+    subsys->getParams(x);
+    subsys->calcGrad(grad);
+
+    // Initial search direction opposed to gradient (steepest-descent)
+    xdir = -grad;
+    lineSearch(subsys, xdir);
+    double err = subsys->error();
+
+    h = x;
+    subsys->getParams(x);
+    h = x - h;  // = x - xold
+
+    // an iteration only costs O(history * xsize), so allow at least one per unknown
+    int maxIterNumber = (sketchSizeMultiplier ? maxIter * xsize : std::max(maxIter, xsize));
+    double convCriterion = convergence;
+    if (isRedundantsolving) {
+        maxIterNumber =
+            (sketchSizeMultiplierRedundant ? maxIterRedundant * xsize
+                                           : std::max(maxIterRedundant, xsize));
+        convCriterion = convergenceRedundant;
+    }
+
+    if (debugMode == IterationLevel) {
+        std::stringstream stream;
+        stream << "LBFGS: convergence: " << convCriterion << ", xsize: " << xsize
+               << ", maxIter: " << maxIterNumber << ", history: " << history << "\n";
+
+        const std::string tmp = stream.str();
+        Base::Console().log(tmp.c_str());
+    }
+
+    double divergingLim = 1e6 * err + 1e12;
+    double h_norm {};
+    int first = 0;  // ring buffer of the correction pairs: oldest at first, count of them
+    int count = 0;
+
+    int iter = 1;  // the steepest-descent step above counts as the first
+    for (; iter < maxIterNumber; ++iter) {
+        h_norm = h.norm();
+        if (h_norm <= convCriterion || err <= smallF) {
+            if (debugMode == IterationLevel) {
+                std::stringstream stream;
+                stream << "LBFGS Converged!!: "
+                       << ", err: " << err << ", h_norm: " << h_norm << "\n";
+
+                const std::string tmp = stream.str();
+                Base::Console().log(tmp.c_str());
+            }
+            break;
+        }
+        if (err > divergingLim || err != err) {
+            // check for diverging and NaN
+            if (debugMode == IterationLevel) {
+                std::stringstream stream;
+                stream << "LBFGS Failed: Diverging!!: "
+                       << ", err: " << err << ", divergingLim: " << divergingLim << "\n";
+
+                const std::string tmp = stream.str();
+                Base::Console().log(tmp.c_str());
+            }
+            break;
+        }
+
+        y = grad;
+        subsys->calcGrad(grad);
+        y = grad - y;  // = grad - gradold
+
+        // the line search does not enforce the curvature condition, pairs that break it
+        // would make the implicit inverse Hessian indefinite
+        double hty = h.dot(y);
+        if (hty > 0) {
+            int slot = (first + count) % history;
+            if (count == history) {
+                first = (first + 1) % history;
+            }
+            else {
+                ++count;
+            }
+            S[slot] = h;
+            Y[slot] = y;
+            rho[slot] = 1. / hty;
+        }
+
+        // two-loop recursion for xdir = -D * grad
+        xdir = -grad;
+        for (int k = count - 1; k >= 0; --k) {
+            int slot = (first + k) % history;
+            alpha[slot] = rho[slot] * S[slot].dot(xdir);
+            xdir.noalias() -= alpha[slot] * Y[slot];
+        }
+        if (count > 0) {
+            int newest = (first + count - 1) % history;
+            xdir *= 1. / (rho[newest] * Y[newest].squaredNorm());  // initial D = s.y/y.y * I
+        }
+        for (int k = 0; k < count; ++k) {
+            int slot = (first + k) % history;
+            double beta = rho[slot] * Y[slot].dot(xdir);
+            xdir.noalias() += (alpha[slot] - beta) * S[slot];
+        }
+
+        lineSearch(subsys, xdir);
+        err = subsys->error();
+
+        h = x;
+        subsys->getParams(x);
+        h = x - h;  // = x - xold
+
+        if (debugMode == IterationLevel) {
+            std::stringstream stream;
+            stream << "LBFGS, Iteration: " << iter << ", err: " << err << ", h_norm: " << h_norm
+                   << "\n";
+
+            const std::string tmp = stream.str();
+            Base::Console().log(tmp.c_str());
+        }
+    }
+
+    subsys->revertParams();
+    solveIterations += iter;
+
+    if (err <= smallF) {
+        return Success;
+    }
+    if (h.norm() <= convCriterion) {
+        return Converged;
+    }
+    return Failed;
+}
+
+int System::solve_LM(SubSystem* subsys, bool isRedundantsolving)
+{
+#ifdef _GCS_EXTRACT_SOLVER_SUBSYSTEM_
+    extractSubsystem(subsys, isRedundantsolving);
+#endif
+
+    int xsize = subsys->pSize();
+    int csize = subsys->cSize();
+
+    if (xsize == 0) {
+        return checkSubstituted(subsys);
+    }
+
+    SolverWorkspace& ws = subsys->workspace();
+    // vector of all function errors (every constraint is one function)
+    Eigen::VectorXd& e = ws.fx;
+    Eigen::VectorXd& e_new = ws.fx_new;
+    Eigen::MatrixXd& J = ws.Jx;  // Jacobi of the subsystem
+    Eigen::MatrixXd& A = ws.A;
+    Eigen::VectorXd& x = ws.x;
+    Eigen::VectorXd& h = ws.h;
+    Eigen::VectorXd& x_new = ws.x_new;
+    Eigen::VectorXd& g = ws.g;
+    Eigen::VectorXd& diag_A = ws.diag_A;
+    e.resize(csize);
+    e_new.resize(csize);
+    J.resize(csize, xsize);
+    A.resize(xsize, xsize);
+    x.resize(xsize);
+    h.resize(xsize);
+    x_new.resize(xsize);
+    g.resize(xsize);
+    diag_A.resize(xsize);
+
+    subsys->redirectParams();
+
+    subsys->getParams(x);
+    subsys->calcResidual(e);
+    e *= -1;
+
+    int maxIterNumber = (sketchSizeMultiplier ? maxIter * xsize : maxIter);
+
+    double divergingLim = 1e6 * e.squaredNorm() + 1e12;
+
+    double eps = LM_eps;
+    double eps1 = LM_eps1;
+    double tau = LM_tau;
+
+    if (isRedundantsolving) {
+        maxIterNumber = (sketchSizeMultiplierRedundant ? maxIterRedundant * xsize : maxIterRedundant);
+        eps = LM_epsRedundant;
+        eps1 = LM_eps1Redundant;
+        tau = LM_tauRedundant;
+    }
+
+    if (debugMode == IterationLevel) {
+        std::stringstream stream;
+        stream << "LM: eps: " << eps << ", eps1: " << eps1 << ", tau: " << tau
+               << ", convergence: " << (isRedundantsolving ? convergenceRedundant : convergence)
+               << ", xsize: " << xsize << ", maxIter: " << maxIterNumber << "\n";
+
+        const std::string tmp = stream.str();
+        Base::Console().log(tmp.c_str());
+    }
+
+    double nu = 2, mu = 0;
+    int iter = 0, stop = 0;
+    for (iter = 0; iter < maxIterNumber && !stop; ++iter) {
+        // check error
+        double err = e.squaredNorm();
+        if (err <= eps * eps) {
+            // error is small, Success
+            stop = 1;
+            break;
+        }
+        else if (err > divergingLim || err != err) {
+            // check for diverging and NaN
+            stop = 6;
+            break;
+        }
+
+        // J^T J, J^T e
+        subsys->calcJacobi(J);
+
+        A.noalias() = J.transpose() * J;
+        g.noalias() = J.transpose() * e;
+
+        // Compute ||J^T e||_inf
+        double g_inf = g.lpNorm<Eigen::Infinity>();
+        diag_A = A.diagonal();  // save diagonal entries so that augmentation can be later canceled
+
+        // check for convergence
+        if (g_inf <= eps1) {
+            stop = 2;
+            break;
+        }
+
+        // compute initial damping factor
+        if (iter == 0) {
+            mu = tau * diag_A.lpNorm<Eigen::Infinity>();
+        }
+
+        double h_norm {};
+        // determine increment using adaptive damping
+        int k = 0;
+        while (k < 50) {
+            // augment normal equations A = A+uI
+            for (int i = 0; i < xsize; ++i) {
+                A(i, i) += mu;
+            }
+
+            // solve augmented functions A*h=-g
+            ws.lu.compute(A);
+            h = ws.lu.solve(g);
+            ws.r.noalias() = A * h;
+            ws.r -= g;
+            double rel_error = ws.r.norm() / g.norm();
+
+            // check if solving works
+            if (rel_error < 1e-5) {
+                // restrict h according to maxStep
+                double scale = subsys->maxStep(h);
+                if (scale < 1.) {
+                    h *= scale;
+                }
+
+                // compute par's new estimate and ||d_par||^2
+                x_new = x + h;
+                h_norm = h.squaredNorm();
+
+                constexpr double epsilon = std::numeric_limits<double>::epsilon();
+                if (h_norm <= eps1 * eps1 * x.norm()) {
+                    // relative change in p is small, stop
+                    stop = 3;
+                    break;
+                }
+                else if (h_norm >= (x.norm() + eps1) / (epsilon * epsilon)) {
+                    // almost singular
+                    stop = 4;
+                    break;
+                }
+
+                subsys->setParams(x_new);
+                subsys->calcResidual(e_new);
+                e_new *= -1;
+
+                double dF = e.squaredNorm() - e_new.squaredNorm();
+                double dL = h.dot(mu * h + g);
+
+                if (dF > 0. && dL > 0.) {  // reduction in error, increment is accepted
+                    double tmp = 2 * dF / dL - 1.;
+                    mu *= std::max(1. / 3., 1. - tmp * tmp * tmp);
+                    nu = 2;
+
+                    // update par's estimate
+                    x = x_new;
+                    e = e_new;
+                    break;
+                }
+            }
+
+            // if this point is reached, either the linear system could not be solved or
+            // the error did not reduce; in any case, the increment must be rejected
+
+            mu *= nu;
+            nu *= 2.0;
+            for (int i = 0; i < xsize; ++i) {  // restore diagonal J^T J entries
+                A(i, i) = diag_A(i);
+            }
+
+            k++;
+        }
+        if (k > 50) {
+            stop = 7;
+            break;
+        }
+
+        if (debugMode == IterationLevel) {
+            std::stringstream stream;
+            // Iteration: 1, residual: 1e-3, tolg: 1e-5, tolx: 1e-3
+            stream << "LM, Iteration: " << iter << ", err(eps): " << err
+                   << ", g_inf(eps1): " << g_inf << ", h_norm: " << h_norm << "\n";
+
+            const std::string tmp = stream.str();
+            Base::Console().log(tmp.c_str());
+        }
+    }
+
+    if (iter >= maxIterNumber) {
+        stop = 5;
+    }
+
+    subsys->revertParams();
+    solveIterations += iter;
+
+    return (stop == 1) ? Success : Failed;
+}
+
+int System::solve_DL(SubSystem* subsys, bool isRedundantsolving)
+{
+#ifdef _GCS_EXTRACT_SOLVER_SUBSYSTEM_
+    extractSubsystem(subsys, isRedundantsolving);
+#endif
+
+    int xsize = subsys->pSize();
+    int csize = subsys->cSize();
+
+    if (xsize == 0) {
+        return checkSubstituted(subsys);
+    }
+
+    double tolg = DL_tolg;
+    double tolx = DL_tolx;
+    double tolf = DL_tolf;
+
+    int maxIterNumber = (sketchSizeMultiplier ? maxIter * xsize : maxIter);
+    if (isRedundantsolving) {
+        tolg = DL_tolgRedundant;
+        tolx = DL_tolxRedundant;
+        tolf = DL_tolfRedundant;
+
+        maxIterNumber = (sketchSizeMultiplierRedundant ? maxIterRedundant * xsize : maxIterRedundant);
+    }
+
+    if (debugMode == IterationLevel) {
+        std::stringstream stream;
+        stream << "DL: tolg: " << tolg << ", tolx: " << tolx << ", tolf: " << tolf
+               << ", convergence: " << (isRedundantsolving ? convergenceRedundant : convergence)
+               << ", dogLegGaussStep: "
+               << (dogLegGaussStep == FullPivLU
+                       ? "FullPivLU"
+                       : (dogLegGaussStep == LeastNormFullPivLU ? "LeastNormFullPivLU"
+                                                                : "LeastNormLdlt"))
+               << ", xsize: " << xsize << ", csize: " << csize << ", maxIter: " << maxIterNumber
+               << "\n";
+
+        const std::string tmp = stream.str();
+        Base::Console().log(tmp.c_str());
+    }
+
+    SolverWorkspace& ws = subsys->workspace();
+    Eigen::VectorXd& x = ws.x;
+    Eigen::VectorXd& x_new = ws.x_new;
+    Eigen::VectorXd& fx = ws.fx;
+    Eigen::VectorXd& fx_new = ws.fx_new;
+    Eigen::MatrixXd& Jx = ws.Jx;
+    Eigen::MatrixXd& Jx_new = ws.Jx_new;
+    Eigen::VectorXd& g = ws.g;
+    Eigen::VectorXd& h_sd = ws.h_sd;
+    Eigen::VectorXd& h_gn = ws.h_gn;
+    Eigen::VectorXd& h_dl = ws.h_dl;
+    Eigen::VectorXd& r = ws.r;
+    x.resize(xsize);
+    x_new.resize(xsize);
+    fx.resize(csize);
+    fx_new.resize(csize);
+    Jx.resize(csize, xsize);
+    Jx_new.resize(csize, xsize);
+    g.resize(xsize);
+    h_sd.resize(xsize);
+    h_gn.resize(xsize);
+    h_dl.resize(xsize);
+    r.resize(csize);
+
+    subsys->redirectParams();
+
+    double err;
+    subsys->getParams(x);
+    subsys->calcResidual(fx, err);
+    subsys->calcJacobi(Jx);
+
+    g.noalias() = -Jx.transpose() * fx;
+
+    // get the infinity norm fx_inf and g_inf
+    double g_inf = g.lpNorm<Eigen::Infinity>();
+    double fx_inf = fx.lpNorm<Eigen::Infinity>();
+
+    double divergingLim = 1e6 * err + 1e12;
+
+    double delta = 0.1;
+    double alpha = 0.;
+    double nu = 2.;
+    int iter = 0, stop = 0, reduce = 0;
+    while (!stop) {
+        // check if finished
+        if (fx_inf <= tolf) {
+            // Success
+            stop = 1;
+            break;
+        }
+        else if (g_inf <= tolg) {
+            stop = 2;
+            break;
+        }
+        else if (delta <= tolx * (tolx + x.norm())) {
+            stop = 2;
+            break;
+        }
+        else if (iter >= maxIterNumber) {
+            stop = 4;
+            break;
+        }
+        else if (err > divergingLim || err != err) {
+            // check for diverging and NaN
+            stop = 6;
+            break;
+        }
+
+        // get the steepest descent direction
+        r.noalias() = Jx * g;
+        alpha = g.squaredNorm() / r.squaredNorm();
+        h_sd = alpha * g;
+
+        // get the gauss-newton step
+        // https://forum.freecad.org/viewtopic.php?f=10&t=12769&start=50#p106220
+        // https://forum.kde.org/viewtopic.php?f=74&t=129439#p346104
+        switch (dogLegGaussStep) {
+            case FullPivLU:
+                ws.lu.compute(Jx);
+                h_gn = ws.lu.solve(-fx);
+                break;
+            case LeastNormFullPivLU:
+                ws.A.noalias() = Jx * Jx.adjoint();
+                ws.lu.compute(ws.A);
+                h_gn.noalias() = Jx.adjoint() * ws.lu.solve(-fx);
+                break;
+            case LeastNormLdlt:
+                ws.A.noalias() = Jx * Jx.adjoint();
+                ws.ldlt.compute(ws.A);
+                h_gn.noalias() = Jx.adjoint() * ws.ldlt.solve(-fx);
+                break;
+        }
+
+        r.noalias() = Jx * h_gn;
+        r += fx;
+        double rel_error = r.norm() / fx.norm();
+        if (rel_error > 1e15) {
+            break;
+        }
+
+        // compute the dogleg step
+        if (h_gn.norm() < delta) {
+            h_dl = h_gn;
+            if (h_dl.norm() <= tolx * (tolx + x.norm())) {
+                stop = 5;
+                break;
+            }
+        }
+        else if (alpha * g.norm() >= delta) {
+            h_dl = (delta / (alpha * g.norm())) * h_sd;
+        }
+        else {
+            // compute beta
+            double beta = 0;
+            Eigen::VectorXd& b = ws.b;
+            b = h_gn - h_sd;
+            double bb = (b.transpose() * b).norm();
+            double gb = (h_sd.transpose() * b).norm();
+            double c = (delta + h_sd.norm()) * (delta - h_sd.norm());
+
+            if (gb > 0) {
+                beta = c / (gb + sqrt(gb * gb + c * bb));
+            }
+            else {
+                beta = (sqrt(gb * gb + c * bb) - gb) / bb;
+            }
+
+            // and update h_dl and dL with beta
+            h_dl = h_sd + beta * b;
+        }
+
+        // get the new values
+        double err_new;
+        x_new = x + h_dl;
+        subsys->setParams(x_new);
+        subsys->calcResidual(fx_new, err_new);
+        subsys->calcJacobi(Jx_new);
+
+        // calculate the linear model and the update ratio
+        r.noalias() = Jx * h_dl;
+        r += fx;
+        double dL = err - 0.5 * r.squaredNorm();
+        double dF = err - err_new;
+        double rho = dL / dF;
+
+        if (dF > 0 && dL > 0) {
+            x.swap(x_new);
+            Jx.swap(Jx_new);
+            fx.swap(fx_new);
+            err = err_new;
+
+            g.noalias() = -Jx.transpose() * fx;
+
+            // get infinity norms
+            g_inf = g.lpNorm<Eigen::Infinity>();
+            fx_inf = fx.lpNorm<Eigen::Infinity>();
+        }
+        else {
+            rho = -1;
+        }
+
+        // update delta
+        if (fabs(rho - 1.) < 0.2 && h_dl.norm() > delta / 3. && reduce <= 0) {
+            delta = 3 * delta;
+            nu = 2;
+            reduce = 0;
+        }
+        else if (rho < 0.25) {
+            delta = delta / nu;
+            nu = 2 * nu;
+            reduce = 2;
+        }
+        else {
+            reduce--;
+        }
+
+        if (debugMode == IterationLevel) {
+            std::stringstream stream;
+            // Iteration: 1, residual: 1e-3, tolg: 1e-5, tolx: 1e-3
+            stream << "DL, Iteration: " << iter << ", fx_inf(tolf): " << fx_inf
+                   << ", g_inf(tolg): " << g_inf << ", delta(f(tolx)): " << delta
+                   << ", err(divergingLim): " << err << "\n";
+
+            const std::string tmp = stream.str();
+            Base::Console().log(tmp.c_str());
+        }
+
+        // count this iteration and start again
+        iter++;
+    }
+
+    subsys->revertParams();
+    solveIterations += iter;
+
+    if (debugMode == IterationLevel) {
+        std::stringstream stream;
+        stream << "DL: stopcode: " << stop << ((stop == 1) ? ", Success" : ", Failed") << "\n";
+
+        const std::string tmp = stream.str();
+        Base::Console().log(tmp.c_str());
+    }
+
+    return (stop == 1) ? Success : Failed;
+}
+
+#ifdef _GCS_EXTRACT_SOLVER_SUBSYSTEM_
+void System::extractSubsystem(SubSystem* subsys, bool isRedundantsolving)
+{
+    VEC_pD plistout;  // std::vector<double *>
+    std::vector<Constraint*> clist_;
+    VEC_pD clist_params_;
+
+    subsys->getParamList(plistout);
+    subsys->getConstraintList(clist_);
+
+    std::ofstream subsystemfile;
+    subsystemfile.open("subsystemfile.txt", std::ofstream::out | std::ofstream::app);
+    subsystemfile << std::endl;
+    subsystemfile << std::endl;
+    subsystemfile << "Solving: " << (isRedundantsolving ? "Redundant" : "Normal")
+                  << " Subsystem Dump starts here................................" << std::endl;
+
+    int ip = 0;
+
+    subsystemfile << "GCS::VEC_pD plist_;" << std::endl;                     // all SYSTEM params
+    subsystemfile << "std::vector<GCS::Constraint *> clist_;" << std::endl;  // SUBSYSTEM constraints
+    subsystemfile << "GCS::VEC_pD plistsub_;" << std::endl;                  // all SUBSYSTEM params
+    // constraint params not within SYSTEM params
+    subsystemfile << "GCS::VEC_pD clist_params_;" << std::endl;
+
+    // these are all the parameters, including those not in the subsystem to
+    // which constraints in the subsystem may make reference.
+    for (VEC_pD::iterator it = plist.begin(); it != plist.end(); ++it, ++ip) {
+        subsystemfile << "plist_.push_back(new double(" << *(*it) << ")); // " << ip
+                      << " address: " << (void*)(*it) << std::endl;
+    }
+
+    int ips = 0;
+    for (VEC_pD::iterator it = plistout.begin(); it != plistout.end(); ++it, ++ips) {
+        VEC_pD::iterator p = std::ranges::find(plist, (*it));
+        size_t p_index = std::distance(plist.begin(), p);
+
+        if (p_index == plist.size()) {
+            subsystemfile << "// Error: Subsystem parameter not in system params"
+                          << "address: " << (void*)(*it) << std::endl;
+        }
+
+        subsystemfile << "plistsub_.push_back(plist_[" << p_index << "]); // " << ips << std::endl;
+    }
+
+    int ic = 0;   // constraint index
+    int icp = 0;  // index of constraint params not within SYSTEM params
+    for (std::vector<Constraint*>::iterator it = clist_.begin(); it != clist_.end(); ++it, ++ic) {
+
+        switch ((*it)->getTypeId()) {
+            case Equal: {  // 2
+                VEC_pD::iterator p1 = std::ranges::find(plist, (*it)->pvec[0]);
+                VEC_pD::iterator p2 = std::ranges::find(plist, (*it)->pvec[1]);
+                size_t i1 = std::distance(plist.begin(), p1);
+                size_t i2 = std::distance(plist.begin(), p2);
+
+                bool npb1 = false;
+                VEC_pD::iterator np1 = std::ranges::find(clist_params_, (*it)->pvec[0]);
+                size_t ni1 = std::distance(clist_params_.begin(), np1);
+
+                if (i1 == plist.size()) {
+                    if (ni1 == clist_params_.size()) {
+                        subsystemfile
+                            << "// Address not in System params...rebuilding into clist_params_"
+                            << std::endl;
                         clist_params_.push_back((*it)->pvec[0]);
                         subsystemfile << "clist_params_.push_back(new double(" << *((*it)->pvec[0])
                                       << ")); // " << icp << " address: " << (void*)(*it)->pvec[0]
@@ -4436,608 +6346,1210 @@ void System::extractSubsystem(SubSystem* subsys, bool isRedundantsolving)
                     npb6 = true;
                 }
 
-                bool npb7 = false;
-                VEC_pD::iterator np7 = std::ranges::find(clist_params_, (*it)->pvec[6]);
-                size_t ni7 = std::distance(clist_params_.begin(), np7);
+                bool npb7 = false;
+                VEC_pD::iterator np7 = std::ranges::find(clist_params_, (*it)->pvec[6]);
+                size_t ni7 = std::distance(clist_params_.begin(), np7);
+
+                if (i7 == plist.size()) {
+                    if (ni7 == clist_params_.size()) {
+                        subsystemfile
+                            << "// Address not in System params...rebuilding into clist_params_"
+                            << std::endl;
+                        clist_params_.push_back((*it)->pvec[6]);
+                        subsystemfile << "clist_params_.push_back(new double(" << *((*it)->pvec[6])
+                                      << ")); // " << icp << " address: " << (void*)(*it)->pvec[6]
+                                      << std::endl;
+                        icp++;
+                    }
+                    npb7 = true;
+                }
+
+                subsystemfile << "ConstraintPointOnEllipse * c" << ic
+                              << "=new ConstraintPointOnEllipse();" << std::endl;
+                subsystemfile << "c" << ic << "->pvec.push_back("
+                              << (npb1 ? ("clist_params_[") : ("plist_[")) << (npb1 ? ni1 : i1)
+                              << "]);" << std::endl;
+                subsystemfile << "c" << ic << "->pvec.push_back("
+                              << (npb2 ? ("clist_params_[") : ("plist_[")) << (npb2 ? ni2 : i2)
+                              << "]);" << std::endl;
+                subsystemfile << "c" << ic << "->pvec.push_back("
+                              << (npb3 ? ("clist_params_[") : ("plist_[")) << (npb3 ? ni3 : i3)
+                              << "]);" << std::endl;
+                subsystemfile << "c" << ic << "->pvec.push_back("
+                              << (npb4 ? ("clist_params_[") : ("plist_[")) << (npb4 ? ni4 : i4)
+                              << "]);" << std::endl;
+                subsystemfile << "c" << ic << "->pvec.push_back("
+                              << (npb5 ? ("clist_params_[") : ("plist_[")) << (npb5 ? ni5 : i5)
+                              << "]);" << std::endl;
+                subsystemfile << "c" << ic << "->pvec.push_back("
+                              << (npb6 ? ("clist_params_[") : ("plist_[")) << (npb6 ? ni6 : i6)
+                              << "]);" << std::endl;
+                subsystemfile << "c" << ic << "->pvec.push_back("
+                              << (npb7 ? ("clist_params_[") : ("plist_[")) << (npb7 ? ni7 : i7)
+                              << "]);" << std::endl;
+                subsystemfile << "c" << ic << "->origpvec=c" << ic << "->pvec;" << std::endl;
+                subsystemfile << "c" << ic << "->rescale();" << std::endl;
+                subsystemfile << "clist_.push_back(c" << ic << "); // addresses = " << (*it)->pvec[0]
+                              << "," << (*it)->pvec[1] << "," << (*it)->pvec[2] << ","
+                              << (*it)->pvec[3] << "," << (*it)->pvec[4] << "," << (*it)->pvec[5]
+                              << "," << (*it)->pvec[6] << std::endl;
+                break;
+            }
+                CASE_NOT_IMP(TangentEllipseLine)
+                CASE_NOT_IMP(InternalAlignmentPoint2Ellipse)
+                CASE_NOT_IMP(EqualMajorAxesEllipse)
+                CASE_NOT_IMP(EllipticalArcRangeToEndPoints)
+                CASE_NOT_IMP(AngleViaPoint)
+                CASE_NOT_IMP(Snell)
+                CASE_NOT_IMP(None)
+        }
+    }
+
+    subsystemfile.close();
+}
+#endif
+
+// The following solver variant solves a system compound of two subsystems
+// treating the first of them as of higher priority than the second
+int System::solve(SubSystem* subsysA, SubSystem* subsysB, bool /*isFine*/, bool isRedundantsolving)
+{
+    int xsizeA = subsysA->pSize();
+    int xsizeB = subsysB->pSize();
+    int csizeA = subsysA->cSize();
+    if (xsizeA + xsizeB == 0) {
+        return checkSubstituted(subsysA);
+    }
+
+    VEC_pD plistAB(xsizeA + xsizeB);
+    {
+        VEC_pD plistA, plistB;
+        subsysA->getParamList(plistA);
+        subsysB->getParamList(plistB);
+
+        std::sort(plistA.begin(), plistA.end());
+        std::sort(plistB.begin(), plistB.end());
+
+        VEC_pD::const_iterator it;
+        it = std::set_union(plistA.begin(), plistA.end(), plistB.begin(), plistB.end(), plistAB.begin());
+        plistAB.resize(it - plistAB.begin());
+    }
+    int xsize = plistAB.size();
+
+    Eigen::MatrixXd B = Eigen::MatrixXd::Identity(xsize, xsize);
+    Eigen::MatrixXd JA(csizeA, xsize);
+    Eigen::MatrixXd Y, Z;
+
+    Eigen::VectorXd resA(csizeA);
+    Eigen::VectorXd lambda(csizeA), lambda0(csizeA), lambdadir(csizeA);
+    Eigen::VectorXd x(xsize), x0(xsize), xdir(xsize), xdir1(xsize);
+    Eigen::VectorXd grad(xsize);
+    Eigen::VectorXd h(xsize);
+    Eigen::VectorXd y(xsize);
+    Eigen::VectorXd Bh(xsize);
+
+    // We assume that there are no common constraints in subsysA and subsysB
+    subsysA->redirectParams();
+    subsysB->redirectParams();
+
+    VEC_I indicesA, indicesB;  // plistAB resolved to the variables of each subsystem
+    subsysA->getParamIndices(plistAB, indicesA);
+    subsysB->getParamIndices(plistAB, indicesB);
+
+    subsysB->getParams(indicesB, x);
+    subsysA->getParams(indicesA, x);
+    subsysB->setParams(indicesB, x);  // just to ensure that A and B are synchronized
+
+    subsysB->calcGrad(indicesB, grad);
+    subsysA->calcJacobi(indicesA, JA);
+    subsysA->calcResidual(resA);
+
+    // double convergence = isFine ? XconvergenceFine : XconvergenceRough;
+    int maxIterNumber
+        = (isRedundantsolving
+               ? (sketchSizeMultiplierRedundant ? maxIterRedundant * xsize : maxIterRedundant)
+               : (sketchSizeMultiplier ? maxIter * xsize : maxIter));
+
+    double divergingLim = 1e6 * subsysA->error() + 1e12;
+
+    double mu = 0;
+    lambda.setZero();
+    int iter = 1;
+    for (; iter < maxIterNumber; iter++) {
+        int status = qp_eq(B, grad, JA, resA, xdir, Y, Z);
+        if (status) {
+            break;
+        }
+
+        x0 = x;
+        lambda0 = lambda;
+        lambda = Y.transpose() * (B * xdir + grad);
+        lambdadir = lambda - lambda0;
+
+        // line search
+        {
+            double eta = 0.25;
+            double tau = 0.5;
+            double rho = 0.5;
+            double alpha = 1;
+            alpha = std::min(alpha, subsysA->maxStep(indicesA, xdir));
+
+            // Eq. 18.36
+            mu = std::max(
+                mu,
+                (grad.dot(xdir) + std::max(0., 0.5 * xdir.dot(B * xdir)))
+                    / ((1. - rho) * resA.lpNorm<1>())
+            );
+
+            // Eq. 18.27
+            double f0 = subsysB->error() + mu * resA.lpNorm<1>();
+
+            // Eq. 18.29
+            double deriv = grad.dot(xdir) - mu * resA.lpNorm<1>();
+
+            x = x0 + alpha * xdir;
+            subsysA->setParams(indicesA, x);
+            subsysB->setParams(indicesB, x);
+            subsysA->calcResidual(resA);
+            double f = subsysB->error() + mu * resA.lpNorm<1>();
+
+            // line search, Eq. 18.28
+            bool first = true;
+            while (f > f0 + eta * alpha * deriv) {
+                if (first) {
+                    xdir1 = -Y * resA;
+                    x += xdir1;  // = x0 + alpha * xdir + xdir1
+                    subsysA->setParams(indicesA, x);
+                    subsysB->setParams(indicesB, x);
+                    subsysA->calcResidual(resA);
+                    f = subsysB->error() + mu * resA.lpNorm<1>();
+                    if (f < f0 + eta * alpha * deriv) {
+                        break;
+                    }
+                }
+                alpha = tau * alpha;
+                if (alpha < 1e-8) {  // let the linesearch fail
+                    alpha = 0.;
+                }
+                x = x0 + alpha * xdir;
+                subsysA->setParams(indicesA, x);
+                subsysB->setParams(indicesB, x);
+                subsysA->calcResidual(resA);
+                f = subsysB->error() + mu * resA.lpNorm<1>();
+                if (alpha < 1e-8) {  // let the linesearch fail
+                    break;
+                }
+            }
+            lambda = lambda0 + alpha * lambdadir;
+        }
+        h = x - x0;
+
+        y = grad - JA.transpose() * lambda;
+        {
+            subsysB->calcGrad(indicesB, grad);
+            subsysA->calcJacobi(indicesA, JA);
+            subsysA->calcResidual(resA);
+        }
+        y = grad - JA.transpose() * lambda - y;  // Eq. 18.13
+
+        if (iter > 1) {
+            double yTh = y.dot(h);
+            if (yTh != 0) {
+                Bh = B * h;
+                // Now calculate the BFGS update on B
+                B += 1. / yTh * y * y.transpose();
+                B -= 1. / h.dot(Bh) * (Bh * Bh.transpose());
+            }
+        }
+
+        double err = subsysA->error();
+        if (h.norm() <= (isRedundantsolving ? convergenceRedundant : convergence) && err <= smallF) {
+            break;
+        }
+        if (err > divergingLim || err != err) {  // check for diverging and NaN
+            break;
+        }
+    }
+
+    int ret;
+    if (subsysA->error() <= smallF) {
+        ret = Success;
+    }
+    else if (h.norm() <= (isRedundantsolving ? convergenceRedundant : convergence)) {
+        ret = Converged;
+    }
+    else {
+        ret = Failed;
+    }
+
+    subsysA->revertParams();
+    subsysB->revertParams();
+    solveIterations += iter;
+    return ret;
+}
+
+void System::applySolution()
+{
+    for (int cid = 0; cid < int(subSystems.size()); cid++) {
+        if (subSystemsAux[cid]) {
+            subSystemsAux[cid]->applySolution();
+        }
+        if (subSystems[cid]) {
+            subSystems[cid]->applySolution();
+        }
+        for (MAP_pD_pD::const_iterator it = reductionmaps[cid].begin();
+             it != reductionmaps[cid].end();
+             ++it) {
+            *(it->first) = *(it->second);
+        }
+        ComponentState& state = componentStates[cid];
+        if (state.status == Success) {
+            state.applied.resize(state.params.size());
+            for (std::size_t i = 0; i < state.params.size(); i++) {
+                state.applied[i] = *state.params[i];
+            }
+            state.valid = true;
+        }
+    }
+}
+
+void System::undoSolution()
+{
+    resetToReference();
+}
+
+void System::makeReducedJacobian(
+    Eigen::MatrixXd& J,
+    std::map<int, int>& jacobianconstraintmap,
+    GCS::VEC_pD& pdiagnoselist,
+    std::map<int, int>& tagmultiplicity
+)
+{
+    makeDiagnoseList(pdiagnoselist);
+
+    J = Eigen::MatrixXd::Zero(clist.size(), pdiagnoselist.size());
 
-                if (i7 == plist.size()) {
-                    if (ni7 == clist_params_.size()) {
-                        subsystemfile
-                            << "// Address not in System params...rebuilding into clist_params_"
-                            << std::endl;
-                        clist_params_.push_back((*it)->pvec[6]);
-                        subsystemfile << "clist_params_.push_back(new double(" << *((*it)->pvec[6])
-                                      << ")); // " << icp << " address: " << (void*)(*it)->pvec[6]
-                                      << std::endl;
-                        icp++;
-                    }
-                    npb7 = true;
-                }
+    int jacobianconstraintcount = 0;
+    int allcount = 0;
+    for (auto& constr : clist) {
+        constr->revertParams();
+        ++allcount;
+        if (constr->getTag() >= 0 && constr->isDriving()) {
+            jacobianconstraintcount++;
+            for (int j = 0; j < int(pdiagnoselist.size()); j++) {
+                J(jacobianconstraintcount - 1, j) = constr->grad(pdiagnoselist[j]);
+            }
 
-                subsystemfile << "ConstraintPointOnEllipse * c" << ic
-                              << "=new ConstraintPointOnEllipse();" << std::endl;
-                subsystemfile << "c" << ic << "->pvec.push_back("
-                              << (npb1 ? ("clist_params_[") : ("plist_[")) << (npb1 ? ni1 : i1)
-                              << "]);" << std::endl;
-                subsystemfile << "c" << ic << "->pvec.push_back("
-                              << (npb2 ? ("clist_params_[") : ("plist_[")) << (npb2 ? ni2 : i2)
-                              << "]);" << std::endl;
-                subsystemfile << "c" << ic << "->pvec.push_back("
-                              << (npb3 ? ("clist_params_[") : ("plist_[")) << (npb3 ? ni3 : i3)
-                              << "]);" << std::endl;
-                subsystemfile << "c" << ic << "->pvec.push_back("
-                              << (npb4 ? ("clist_params_[") : ("plist_[")) << (npb4 ? ni4 : i4)
-                              << "]);" << std::endl;
-                subsystemfile << "c" << ic << "->pvec.push_back("
-                              << (npb5 ? ("clist_params_[") : ("plist_[")) << (npb5 ? ni5 : i5)
-                              << "]);" << std::endl;
-                subsystemfile << "c" << ic << "->pvec.push_back("
-                              << (npb6 ? ("clist_params_[") : ("plist_[")) << (npb6 ? ni6 : i6)
-                              << "]);" << std::endl;
-                subsystemfile << "c" << ic << "->pvec.push_back("
-                              << (npb7 ? ("clist_params_[") : ("plist_[")) << (npb7 ? ni7 : i7)
-                              << "]);" << std::endl;
-                subsystemfile << "c" << ic << "->origpvec=c" << ic << "->pvec;" << std::endl;
-                subsystemfile << "c" << ic << "->rescale();" << std::endl;
-                subsystemfile << "clist_.push_back(c" << ic << "); // addresses = " << (*it)->pvec[0]
-                              << "," << (*it)->pvec[1] << "," << (*it)->pvec[2] << ","
-                              << (*it)->pvec[3] << "," << (*it)->pvec[4] << "," << (*it)->pvec[5]
-                              << "," << (*it)->pvec[6] << std::endl;
-                break;
+            // parallel processing: create tag multiplicity map
+            if (tagmultiplicity.find(constr->getTag()) == tagmultiplicity.end()) {
+                tagmultiplicity[constr->getTag()] = 0;
             }
-                CASE_NOT_IMP(TangentEllipseLine)
-                CASE_NOT_IMP(InternalAlignmentPoint2Ellipse)
-                CASE_NOT_IMP(EqualMajorAxesEllipse)
-                CASE_NOT_IMP(EllipticalArcRangeToEndPoints)
-                CASE_NOT_IMP(AngleViaPoint)
-                CASE_NOT_IMP(Snell)
-                CASE_NOT_IMP(None)
+            else {
+                tagmultiplicity[constr->getTag()]++;
+            }
+
+            jacobianconstraintmap[jacobianconstraintcount - 1] = allcount - 1;
         }
     }
 
-    subsystemfile.close();
+    if (jacobianconstraintcount == 0) {  // only driven constraints
+        J.resize(0, 0);
+    }
 }
-#endif
 
-// The following solver variant solves a system compound of two subsystems
-// treating the first of them as of higher priority than the second
-int System::solve(SubSystem* subsysA, SubSystem* subsysB, bool /*isFine*/, bool isRedundantsolving)
+int System::diagnose(Algorithm alg)
 {
-    int xsizeA = subsysA->pSize();
-    int xsizeB = subsysB->pSize();
-    int csizeA = subsysA->cSize();
+    // Analyses the constrainess grad of the system and provides feedback
+    // The vector "conflictingTags" will hold a group of conflicting constraints
 
-    VEC_pD plistAB(xsizeA + xsizeB);
-    {
-        VEC_pD plistA, plistB;
-        subsysA->getParamList(plistA);
-        subsysB->getParamList(plistB);
+    // Hint 1: Only constraints with tag >= 0 are taken into account
+    // Hint 2: Constraints tagged with 0 are treated as high priority
+    //         constraints and they are excluded from the returned
+    //         list of conflicting constraints. Therefore, this function
+    //         will provide no feedback about possible conflicts between
+    //         two high priority constraints. For this reason, tagging
+    //         constraints with 0 should be used carefully.
+    compactConstraints();
+    isInit = false;
+    hasDiagnosis = false;
+    hasDofs = false;
+    hasDependentParameters = false;
+    if (!hasUnknowns) {
+        dofs = -1;
+        return dofs;
+    }
 
-        std::sort(plistA.begin(), plistA.end());
-        std::sort(plistB.begin(), plistB.end());
+#ifdef _DEBUG_TO_FILE
+    SolverReportingManager::Manager().LogToFile("GCS::System::diagnose()\n");
+#endif
 
-        VEC_pD::const_iterator it;
-        it = std::set_union(plistA.begin(), plistA.end(), plistB.begin(), plistB.end(), plistAB.begin());
-        plistAB.resize(it - plistAB.begin());
-    }
-    int xsize = plistAB.size();
+    // Input parameters' lists:
+    // plist            =>  list of all the parameters of the system, e.g. each coordinate
+    //                      of a point
+    // pdrivenlist      =>  list of the parameters that are driven by other parameters
+    //                      (e.g. value of driven constraints)
 
-    Eigen::MatrixXd B = Eigen::MatrixXd::Identity(xsize, xsize);
-    Eigen::MatrixXd JA(csizeA, xsize);
-    Eigen::MatrixXd Y, Z;
+    // When adding an external geometry or a constraint on an external geometry the array
+    // 'plist' is empty. No matrix without columns is decomposed (see issues #0002372/#0002373):
+    // the constraints on such geometry make blocks without parameters, which are conflicting unless
+    // they are satisfied, as they are among other unknowns.
 
-    Eigen::VectorXd resA(csizeA);
-    Eigen::VectorXd lambda(csizeA), lambda0(csizeA), lambdadir(csizeA);
-    Eigen::VectorXd x(xsize), x0(xsize), xdir(xsize), xdir1(xsize);
-    Eigen::VectorXd grad(xsize);
-    Eigen::VectorXd h(xsize);
-    Eigen::VectorXd y(xsize);
-    Eigen::VectorXd Bh(xsize);
+    redundant.clear();
+    conflictingTags.clear();
+    chosenConflictingTags.clear();
+    redundantTags.clear();
+    partiallyRedundantTags.clear();
 
-    // We assume that there are no common constraints in subsysA and subsysB
-    subsysA->redirectParams();
-    subsysB->redirectParams();
+    // This QR diagnosis uses a reduced Jacobian matrix to calculate the rank of the system
+    // and identify conflicting and redundant constraints.
+    //
+    // reduced Jacobian matrix
+    // The Jacobian has been reduced to:
+    // 1. only contain driving constraints.
+    // 2. remove the parameters of the values of driven constraints.
+    //
+    // The reduced Jacobian is block diagonal, one block per set of constraints sharing
+    // parameters, so it is first decomposed block by block, which keeps the cost of a sketch made
+    // of many independent parts linear in their number. It is only decomposed as a whole when it
+    // has dependent constraints, see below.
 
-    subsysB->getParams(plistAB, x);
-    subsysA->getParams(plistAB, x);
-    subsysB->setParams(plistAB, x);  // just to ensure that A and B are synchronized
+    // list of parameters to be diagnosed in this routine (removes value parameters from driven
+    // constraints)
+    GCS::VEC_pD pdiagnoselist;
+    makeDiagnoseList(pdiagnoselist);
 
-    subsysB->calcGrad(plistAB, grad);
-    subsysA->calcJacobi(plistAB, JA);
-    subsysA->calcResidual(resA);
+    // tag multiplicity gives the number of solver constraints associated with the same tag
+    // A tag generally corresponds to the Sketcher constraint index - There are special tag values,
+    // like 0 and -1.
+    std::map<int, int> tagmultiplicity;
 
-    // double convergence = isFine ? XconvergenceFine : XconvergenceRough;
-    int maxIterNumber
-        = (isRedundantsolving
-               ? (sketchSizeMultiplierRedundant ? maxIterRedundant * xsize : maxIterRedundant)
-               : (sketchSizeMultiplier ? maxIter * xsize : maxIter));
+    std::vector<DiagnosisBlock> blocks;
+    makeDiagnosisBlocks(pdiagnoselist, blocks, tagmultiplicity, splitDiagnosis);
 
-    double divergingLim = 1e6 * subsysA->error() + 1e12;
+    // this function will exit with a diagnosis and, unless overridden by functions below, with full
+    // DoFs
+    hasDiagnosis = true;
+    hasDofs = true;
+    dofs = pdiagnoselist.size();
 
-    double mu = 0;
-    lambda.setZero();
-    for (int iter = 1; iter < maxIterNumber; iter++) {
-        int status = qp_eq(B, grad, JA, resA, xdir, Y, Z);
-        if (status) {
-            break;
-        }
+    // Use DenseQR for small to medium systems to avoid SparseQR rank issues.
+    // SparseQR is known to fail rank detection on specific geometric structures (e.g. aligned slots).
+    // 200 parameters roughly corresponds to ~100 points/curves, covering most complex sketches
+    // where stability is preferred over pure O(N) performance.
+    // See: https://github.com/FreeCAD/FreeCAD/issues/10903
+    // The choice is made again for every block, this one is for diagnoseDependentParameters().
+    if (autoChooseAlgorithm) {
+        qrAlgorithm = dofs < autoQRThreshold ? EigenDenseQR : EigenSparseQR;
+    }
 
-        x0 = x;
-        lambda0 = lambda;
-        lambda = Y.transpose() * (B * xdir + grad);
-        lambdadir = lambda - lambda0;
+    // There is a legacy decision to use QR decomposition. I (abdullah) do not know all the
+    // consideration taken in that decisions. I see that:
+    // - QR decomposition is able to provide information about the rank and
+    // redundant/conflicting
+    //   constraints
+    // - The QR decomposition of J and the QR decomposition of the transpose of J are unrelated
+    //   (for reasons see below):
+    //   https://mathoverflow.net/questions/338729/translate-between-qr-decomposition-of-a-and-a-transpose
+    // - QR is cheaper than a SVD decomposition
+    // - QR is more expensive than a rank revealing LU factorization
+    // - QR is less stable than SVD with respect to rank
+    // - It is unclear whether it is possible to obtain information about redundancy with SVD
+    // and LU
 
-        // line search
-        {
-            double eta = 0.25;
-            double tau = 0.5;
-            double rho = 0.5;
-            double alpha = 1;
-            alpha = std::min(alpha, subsysA->maxStep(plistAB, xdir));
+    // Given this legacy decision, the following is observed:
+    // - A = QR decomposition can be used for the diagonise of dependency of the "columns" of A.
+    // the reason is that matrix R is upper triangular with columns of A showing the
+    // dependencies.
+    // - The same does not apply to the "rows".
+    // - For this reason, to enable a full diagnose of constraints, a QR decomposition must be
+    // done
+    //   on the transpose of the Jacobian matrix (J), this is JT.
+
+    // Eigen capabilities:
+    // - If Eigen full pivoting QR decomposition is used, it is possible to track the rows of JT
+    //   during the decomposition. This can be leveraged to identify a set of independent rows
+    //   of JT (geometry) that form a rank N basis. However, because the R matrix is of the JT
+    //   decomposition and not the J decomposition, it is not possible to reduce the system to
+    //   identify exactly which rows are dependent.
+    // - The effect is that it provides a set of parameters of geometry that are not constraint,
+    //   but it does not identify ALL geometries that are not fixed.
+    // - If SpareQR is used, then it is not possible to track the rows of JT during
+    // decomposition.
+    //   I do not know if it is still possible to obtain geometry information at all from
+    //   SparseQR. After several years these questions remain open:
+    //      https://stackoverflow.com/questions/49009771/getting-rows-transpositions-with-sparse-qr
+    //      https://forum.kde.org/viewtopic.php?f=74&t=151239
+    //
+    // Implementation below:
+    //
+    // Two QR decompositions are used below. One for diagnosis of constraints and a second one
+    // for diagnosis of parameters, i.e. to identify whether the parameter is fully constraint
+    // (independent) or not (i.e. it is dependent).
+
+    // QR decomposition method selection: SparseQR vs DenseQR
+
+#ifndef EIGEN_SPARSEQR_COMPATIBLE
+    if (qrAlgorithm == EigenSparseQR) {
+        Base::Console().warning(
+            "SparseQR not supported by you current version of Eigen. It "
+            "requires Eigen 3.2.2 or higher. Falling back to Dense QR\n"
+        );
+        qrAlgorithm = EigenDenseQR;
+    }
+#endif
+
+    if (blocks.empty()) {
+        emptyDiagnoseMatrix = true;
+        keepIncrementalDiagnosis(pdiagnoselist, blocks);
+        return dofs;
+    }
+
+    // From here on, there is at least one driving constraint.
+    emptyDiagnoseMatrix = false;
+
+#ifdef PROFILE_DIAGNOSE
+    Base::TimeElapsed QR_start_time;
+#endif
+
+    // The second QR decomposition, of J itself, identifies the dependent parameters. It is left to
+    // diagnoseDependentParameters(), which getDependentParams() runs on demand.
+    decomposeDiagnosisBlocks(pdiagnoselist, blocks, /*findConflictGroups=*/true);
+
+    int paramsNum = pdiagnoselist.size();
+    int constrNum = 0;
+    int rank = 0;
+    for (const auto& block : blocks) {
+        constrNum += block.rows.size();
+        rank += block.rank;
+    }
+
+    // Which of a set of dependent constraints are reported depends on the order the decomposition
+    // of the whole reduced Jacobian pivots in, and which of them are redundant on the steps the
+    // solver takes over the whole system. The blocks apart reproduce neither, so a sketch with
+    // dependent constraints is decomposed again as a whole, which the blocks only speed up when
+    // all of its constraints are independent.
+    bool isWhole = blocks.size() == 1 && blocks.front().cols.size() == pdiagnoselist.size();
+    if (constrNum > rank && !isWhole) {
+        tagmultiplicity.clear();
+        makeDiagnosisBlocks(pdiagnoselist, blocks, tagmultiplicity, /*split=*/false);
+        decomposeDiagnosisBlocks(pdiagnoselist, blocks, /*findConflictGroups=*/true);
+        rank = blocks.front().rank;
+    }
+
+    dofs = paramsNum - rank;  // unless overconstraint, which will be overridden below
+
+    // Detecting conflicting or redundant constraints
+    if (constrNum > rank) {
+        // conflicting or redundant constraints
+        int nonredundantconstrNum;
+        identifyConflictingRedundantConstraints(
+            alg,
+            blocks,
+            tagmultiplicity,
+            pdiagnoselist,
+            constrNum,
+            nonredundantconstrNum
+        );
+        if (paramsNum == rank && nonredundantconstrNum > rank) {  // over-constrained
+            dofs = paramsNum - nonredundantconstrNum;
+        }
+    }
+    keepIncrementalDiagnosis(pdiagnoselist, blocks);
 
-            // Eq. 18.36
-            mu = std::max(
-                mu,
-                (grad.dot(xdir) + std::max(0., 0.5 * xdir.dot(B * xdir)))
-                    / ((1. - rho) * resA.lpNorm<1>())
-            );
+#ifdef PROFILE_DIAGNOSE
+    Base::TimeElapsed QR_end_time;
 
-            // Eq. 18.27
-            double f0 = subsysB->error() + mu * resA.lpNorm<1>();
+    auto SolveTime = Base::TimeElapsed::diffTimeF(QR_start_time, QR_end_time);
 
-            // Eq. 18.29
-            double deriv = grad.dot(xdir) - mu * resA.lpNorm<1>();
+    Base::Console().log("\nQR - Lapsed Time: %f seconds\n", SolveTime);
+#endif
 
-            x = x0 + alpha * xdir;
-            subsysA->setParams(plistAB, x);
-            subsysB->setParams(plistAB, x);
-            subsysA->calcResidual(resA);
-            double f = subsysB->error() + mu * resA.lpNorm<1>();
+    return dofs;
+}
 
-            // line search, Eq. 18.28
-            bool first = true;
-            while (f > f0 + eta * alpha * deriv) {
-                if (first) {
-                    xdir1 = -Y * resA;
-                    x += xdir1;  // = x0 + alpha * xdir + xdir1
-                    subsysA->setParams(plistAB, x);
-                    subsysB->setParams(plistAB, x);
-                    subsysA->calcResidual(resA);
-                    f = subsysB->error() + mu * resA.lpNorm<1>();
-                    if (f < f0 + eta * alpha * deriv) {
-                        break;
-                    }
-                }
-                alpha = tau * alpha;
-                if (alpha < 1e-8) {  // let the linesearch fail
-                    alpha = 0.;
-                }
-                x = x0 + alpha * xdir;
-                subsysA->setParams(plistAB, x);
-                subsysB->setParams(plistAB, x);
-                subsysA->calcResidual(resA);
-                f = subsysB->error() + mu * resA.lpNorm<1>();
-                if (alpha < 1e-8) {  // let the linesearch fail
-                    break;
-                }
-            }
-            lambda = lambda0 + alpha * lambdadir;
+void System::makeDiagnoseList(GCS::VEC_pD& pdiagnoselist)
+{
+    // construct specific parameter list for diagonose ignoring driven constraint parameters
+    std::unordered_set<double*> driven(pdrivenlist.begin(), pdrivenlist.end());
+    for (const auto param : plist) {
+        if (driven.count(param) == 0) {
+            pdiagnoselist.push_back(param);
         }
-        h = x - x0;
+    }
+}
 
-        y = grad - JA.transpose() * lambda;
-        {
-            subsysB->calcGrad(plistAB, grad);
-            subsysA->calcJacobi(plistAB, JA);
-            subsysA->calcResidual(resA);
+void System::makeDiagnosisBlocks(
+    const GCS::VEC_pD& pdiagnoselist,
+    std::vector<DiagnosisBlock>& blocks,
+    std::map<int, int>& tagmultiplicity,
+    bool split
+)
+{
+    std::unordered_map<double*, int> colIndex;
+    for (int j = 0; j < int(pdiagnoselist.size()); j++) {
+        colIndex[pdiagnoselist[j]] = j;
+    }
+
+    // the rows of the reduced Jacobian, with the first diagnosed parameter of each
+    DisjointSets components;
+    components.reset(int(pdiagnoselist.size()));
+    VEC_I rows;
+    VEC_I rowsFirstCol;
+    for (int i = 0; i < int(clist.size()); i++) {
+        Constraint* constr = clist[i];
+        constr->revertParams();
+        if (constr->getTag() < 0 || !constr->isDriving()) {
+            continue;
         }
-        y = grad - JA.transpose() * lambda - y;  // Eq. 18.13
 
-        if (iter > 1) {
-            double yTh = y.dot(h);
-            if (yTh != 0) {
-                Bh = B * h;
-                // Now calculate the BFGS update on B
-                B += 1. / yTh * y * y.transpose();
-                B -= 1. / h.dot(Bh) * (Bh * Bh.transpose());
-            }
+        // parallel processing: create tag multiplicity map
+        if (tagmultiplicity.find(constr->getTag()) == tagmultiplicity.end()) {
+            tagmultiplicity[constr->getTag()] = 0;
+        }
+        else {
+            tagmultiplicity[constr->getTag()]++;
         }
 
-        double err = subsysA->error();
-        if (h.norm() <= (isRedundantsolving ? convergenceRedundant : convergence) && err <= smallF) {
-            break;
+        int first = -1;
+        for (const auto param : constr->params()) {
+            auto it = colIndex.find(param);
+            if (it == colIndex.end()) {
+                continue;
+            }
+            if (first < 0) {
+                first = it->second;
+            }
+            else {
+                components.unite(first, it->second);
+            }
         }
-        if (err > divergingLim || err != err) {  // check for diverging and NaN
-            break;
+        rows.push_back(i);
+        rowsFirstCol.push_back(first);
+    }
+
+    blocks.clear();
+    if (!split) {
+        // the whole reduced Jacobian as a single block
+        if (!rows.empty()) {
+            auto& block = blocks.emplace_back();
+            block.rows = std::move(rows);
+            block.cols.resize(pdiagnoselist.size());
+            std::iota(block.cols.begin(), block.cols.end(), 0);
         }
+        return;
     }
 
-    int ret;
-    if (subsysA->error() <= smallF) {
-        ret = Success;
-    }
-    else if (h.norm() <= (isRedundantsolving ? convergenceRedundant : convergence)) {
-        ret = Converged;
+    // blocks are numbered in the order of their first row, a row without diagnosed parameters
+    // makes a block of its own, and parameters without rows are in no block at all
+    VEC_I blockOfRoot(pdiagnoselist.size(), -1);
+    for (std::size_t r = 0; r < rows.size(); r++) {
+        if (rowsFirstCol[r] < 0) {
+            blocks.emplace_back().rows.push_back(rows[r]);
+            continue;
+        }
+        int root = components.find(rowsFirstCol[r]);
+        if (blockOfRoot[root] < 0) {
+            blockOfRoot[root] = int(blocks.size());
+            blocks.emplace_back();
+        }
+        blocks[blockOfRoot[root]].rows.push_back(rows[r]);
     }
-    else {
-        ret = Failed;
+    for (int j = 0; j < int(pdiagnoselist.size()); j++) {
+        int block = blockOfRoot[components.find(j)];
+        if (block >= 0) {
+            blocks[block].cols.push_back(j);
+        }
     }
-
-    subsysA->revertParams();
-    subsysB->revertParams();
-    return ret;
 }
 
-void System::applySolution()
+// Below this many floating point operations, decomposing the blocks of the reduced Jacobian on
+// several threads costs more than it saves.
+constexpr double parallelDiagnosisWork = 1e7;
+
+void System::decomposeDiagnosisBlocks(
+    const GCS::VEC_pD& pdiagnoselist,
+    std::vector<DiagnosisBlock>& blocks,
+    bool findConflictGroups
+)
 {
-    for (int cid = 0; cid < int(subSystems.size()); cid++) {
-        if (subSystemsAux[cid]) {
-            subSystemsAux[cid]->applySolution();
-        }
-        if (subSystems[cid]) {
-            subSystems[cid]->applySolution();
+    double work = 0.0;
+    for (const auto& block : blocks) {
+        double rows = block.rows.size();
+        double cols = block.cols.size();
+        work += rows * cols * std::min(rows, cols);
+    }
+    std::size_t workers = std::min<std::size_t>(std::thread::hardware_concurrency(), blocks.size());
+
+#ifdef EIGEN_SPARSEQR_COMPATIBLE
+    // the SparseQR decompositions of the previous diagnosis are kept for the blocks that start
+    // with the same constraint, the others are dropped
+    std::unordered_map<Constraint*, SparseQRCache> previousSparseQR;
+    previousSparseQR.swap(diagnosisSparseQR);
+    for (auto& block : blocks) {
+        QRAlgorithm algorithm = qrAlgorithm;
+        if (autoChooseAlgorithm) {
+            algorithm = int(block.cols.size()) < autoQRThreshold ? EigenDenseQR : EigenSparseQR;
         }
-        for (MAP_pD_pD::const_iterator it = reductionmaps[cid].begin();
-             it != reductionmaps[cid].end();
-             ++it) {
-            *(it->first) = *(it->second);
+        block.sparseQR = nullptr;
+        if (algorithm == EigenSparseQR && !block.cols.empty()) {
+            Constraint* first = clist[block.rows.front()];
+            auto node = previousSparseQR.extract(first);
+            if (node) {
+                diagnosisSparseQR.insert(std::move(node));
+            }
+            block.sparseQR = &diagnosisSparseQR[first];
         }
     }
-}
+#endif
 
-void System::undoSolution()
-{
-    resetToReference();
-}
+    // Runs process on every block, on several threads if there is enough work. The blocks are
+    // independent and the constraints only read the parameters. The worker threads are silent,
+    // as Base::Console is not thread-safe.
+    auto forEachBlock = [&](auto&& process) {
+        if (workers < 2 || work < parallelDiagnosisWork) {
+            for (auto& block : blocks) {
+                process(block, false);
+            }
+            return;
+        }
+        std::vector<std::future<void>> tasks;
+        for (std::size_t w = 0; w < workers; w++) {
+            tasks.push_back(std::async(std::launch::async, [&, w]() {
+                for (std::size_t i = w; i < blocks.size(); i += workers) {
+                    process(blocks[i], true);
+                }
+            }));
+        }
+        for (auto& task : tasks) {
+            task.get();
+        }
+    };
 
-void System::makeReducedJacobian(
-    Eigen::MatrixXd& J,
-    std::map<int, int>& jacobianconstraintmap,
-    GCS::VEC_pD& pdiagnoselist,
-    std::map<int, int>& tagmultiplicity
-)
-{
-    // construct specific parameter list for diagonose ignoring driven constraint parameters
-    for (int j = 0; j < int(plist.size()); j++) {
-        auto result1 = std::ranges::find(pdrivenlist, plist[j]);
+    forEachBlock([&](DiagnosisBlock& block, bool silent) {
+        prepareDiagnosisBlock(pdiagnoselist, block, silent);
+    });
 
-        if (result1 == std::end(pdrivenlist)) {
-            pdiagnoselist.push_back(plist[j]);
+    // The reduced Jacobian is block diagonal, so a full pivoting QR decomposition of the whole
+    // would pivot within one block at a time, as the decomposition of that block alone does, and
+    // its largest pivot is the largest of theirs. A SparseQR decomposition of the whole picks its
+    // pivot threshold from the size and the largest column of the whole.
+    double maxPivot = 0.0;
+    double maxRowNorm = 0.0;
+    std::size_t rowsNum = 0;
+    for (const auto& block : blocks) {
+        double blockPivot = block.maxRowNorm;
+#ifdef EIGEN_SPARSEQR_COMPATIBLE
+        if (!block.sparseQR && !block.cols.empty()) {
+            blockPivot = block.denseQR.maxPivot();
+        }
+#else
+        if (!block.cols.empty()) {
+            blockPivot = block.denseQR.maxPivot();
         }
+#endif
+        maxPivot = std::max(maxPivot, blockPivot);
+        maxRowNorm = std::max(maxRowNorm, block.maxRowNorm);
+        rowsNum += block.rows.size();
     }
+    double sparsePivotThreshold = 20 * double(rowsNum + pdiagnoselist.size())
+        * (maxRowNorm == 0.0 ? 1.0 : maxRowNorm) * std::numeric_limits<double>::epsilon();
 
+    forEachBlock([&](DiagnosisBlock& block, bool silent) {
+        decomposeDiagnosisBlock(block, maxPivot, sparsePivotThreshold, findConflictGroups, silent);
+    });
+}
 
-    J = Eigen::MatrixXd::Zero(clist.size(), pdiagnoselist.size());
+void System::prepareDiagnosisBlock(
+    const GCS::VEC_pD& pdiagnoselist,
+    DiagnosisBlock& block,
+    bool silent
+)
+{
+    block.maxRowNorm = 0.0;
+    if (block.cols.empty()) {
+        return;
+    }
 
-    int jacobianconstraintcount = 0;
-    int allcount = 0;
-    for (auto& constr : clist) {
-        constr->revertParams();
-        ++allcount;
-        if (constr->getTag() >= 0 && constr->isDriving()) {
-            jacobianconstraintcount++;
-            for (int j = 0; j < int(pdiagnoselist.size()); j++) {
-                J(jacobianconstraintcount - 1, j) = constr->grad(pdiagnoselist[j]);
-            }
+    std::unordered_map<double*, int> colIndex;
+    for (int j = 0; j < int(block.cols.size()); j++) {
+        colIndex[pdiagnoselist[block.cols[j]]] = j;
+    }
 
-            // parallel processing: create tag multiplicity map
-            if (tagmultiplicity.find(constr->getTag()) == tagmultiplicity.end()) {
-                tagmultiplicity[constr->getTag()] = 0;
-            }
-            else {
-                tagmultiplicity[constr->getTag()]++;
+    // the rows of J are in clist order and its columns in pdiagnoselist order, as they would be
+    // in the reduced Jacobian of the whole system
+    auto forEachGradient = [&](auto&& setEntry) {
+        for (int r = 0; r < int(block.rows.size()); r++) {
+            Constraint* constr = clist[block.rows[r]];
+            for (const auto param : constr->params()) {
+                auto it = colIndex.find(param);
+                if (it != colIndex.end()) {
+                    setEntry(r, it->second, constr->grad(param));
+                }
             }
+        }
+    };
 
-            jacobianconstraintmap[jacobianconstraintcount - 1] = allcount - 1;
+#ifdef EIGEN_SPARSEQR_COMPATIBLE
+    if (block.sparseQR) {
+        // J is assembled sparse, as a dense one would be as costly as the decomposition itself
+        std::vector<Eigen::Triplet<double>> entries;
+        forEachGradient([&entries](int r, int c, double value) {
+            entries.emplace_back(r, c, value);
+        });
+        Eigen::SparseMatrix<double, Eigen::RowMajor> rowsJ(block.rows.size(), block.cols.size());
+        // a parameter listed twice by a constraint has a single gradient, as in a dense J
+        rowsJ.setFromTriplets(entries.begin(), entries.end(), [](double, double value) {
+            return value;
+        });
+        rowsJ.prune(0.0);
+        for (int r = 0; r < rowsJ.outerSize(); r++) {
+            block.maxRowNorm = std::max(block.maxRowNorm, rowsJ.row(r).norm());
         }
+        block.SJ = rowsJ;
+        return;
     }
+#endif
+    Eigen::MatrixXd J = Eigen::MatrixXd::Zero(block.rows.size(), block.cols.size());
+    forEachGradient([&J](int r, int c, double value) { J(r, c) = value; });
+    block.maxRowNorm = J.rowwise().norm().maxCoeff();
 
-    if (jacobianconstraintcount == 0) {  // only driven constraints
-        J.resize(0, 0);
+#ifdef _GCS_DEBUG
+    if (!silent) {
+        SolverReportingManager::Manager().LogMatrix("J", J);
     }
+#else
+    (void)silent;
+#endif
+    block.denseQR.compute(J.transpose());
 }
 
-int System::diagnose(Algorithm alg)
+void System::decomposeDiagnosisBlock(
+    DiagnosisBlock& block,
+    double maxPivot,
+    double sparsePivotThreshold,
+    bool findConflictGroups,
+    bool silent
+)
 {
-    // Analyses the constrainess grad of the system and provides feedback
-    // The vector "conflictingTags" will hold a group of conflicting constraints
-
-    // Hint 1: Only constraints with tag >= 0 are taken into account
-    // Hint 2: Constraints tagged with 0 are treated as high priority
-    //         constraints and they are excluded from the returned
-    //         list of conflicting constraints. Therefore, this function
-    //         will provide no feedback about possible conflicts between
-    //         two high priority constraints. For this reason, tagging
-    //         constraints with 0 should be used carefully.
-    hasDiagnosis = false;
-    if (!hasUnknowns) {
-        dofs = -1;
-        return dofs;
+    block.rank = 0;
+    block.conflictGroups.clear();
+    if (block.cols.empty()) {
+        // a constraint without unknowns is either redundant or conflicting
+        if (findConflictGroups) {
+            for (const auto i : block.rows) {
+                block.conflictGroups.push_back({clist[i]});
+            }
+        }
+        return;
     }
 
-#ifdef _DEBUG_TO_FILE
-    SolverReportingManager::Manager().LogToFile("GCS::System::diagnose()\n");
+    Eigen::MatrixXd R;
+#ifdef EIGEN_SPARSEQR_COMPATIBLE
+    if (block.sparseQR) {
+        std::map<int, int> jacobianconstraintmap;
+        for (int r = 0; r < int(block.rows.size()); r++) {
+            jacobianconstraintmap[r] = block.rows[r];
+        }
+        auto& SqrJT = block.sparseQR->qr;
+        makeSparseQRDecomposition(
+            block.SJ,
+            jacobianconstraintmap,
+            SqrJT,
+            block.rank,
+            R,
+            true,
+            silent,
+            &block.sparseQR->pattern,
+            sparsePivotThreshold
+        );
+        block.SJ = Eigen::SparseMatrix<double>();
+        if (findConflictGroups && int(block.rows.size()) > block.rank) {
+            appendConflictGroups(SqrJT, R, block);
+        }
+        return;
+    }
+#else
+    (void)sparsePivotThreshold;
 #endif
 
-    // Input parameters' lists:
-    // plist            =>  list of all the parameters of the system, e.g. each coordinate
-    //                      of a point
-    // pdrivenlist      =>  list of the parameters that are driven by other parameters
-    //                      (e.g. value of driven constraints)
+    // the threshold Eigen applies is relative to the largest pivot of the decomposition
+    auto& qrJT = block.denseQR;
+    double blockPivot = qrJT.maxPivot();
+    qrJT.setThreshold(
+        blockPivot > 0.0 ? qrpivotThreshold * maxPivot / blockPivot : qrpivotThreshold
+    );
+    block.rank = qrJT.rank();
 
-    // When adding an external geometry or a constraint on an external geometry the array
-    // 'plist' is empty.
-    // So, we must abort here because otherwise we would create an invalid matrix and make
-    // the application eventually crash. This fixes issues #0002372/#0002373.
-    if (plist.empty() || (plist.size() - pdrivenlist.size()) == 0) {
-        hasDiagnosis = true;
-        emptyDiagnoseMatrix = true;
-        dofs = 0;
-        return dofs;
+    if (debugMode == IterationLevel && !silent) {
+        SolverReportingManager::Manager()
+            .LogQRSystemInformation(*this, qrJT.rows(), qrJT.cols(), block.rank);
     }
 
-    redundant.clear();
-    conflictingTags.clear();
-    redundantTags.clear();
-    partiallyRedundantTags.clear();
+    if (findConflictGroups && int(block.rows.size()) > block.rank) {
+        if (qrJT.cols() >= qrJT.rows()) {
+            R = qrJT.matrixQR().triangularView<Eigen::Upper>();
+        }
+        else {
+            R = qrJT.matrixQR().topRows(qrJT.cols()).triangularView<Eigen::Upper>();
+        }
+        appendConflictGroups(qrJT, R, block);
+    }
+}
 
-    // This QR diagnosis uses a reduced Jacobian matrix to calculate the rank of the system
-    // and identify conflicting and redundant constraints.
-    //
-    // reduced Jacobian matrix
-    // The Jacobian has been reduced to:
-    // 1. only contain driving constraints, but keep a full size (zero padded).
-    // 2. remove the parameters of the values of driven constraints.
-    Eigen::MatrixXd J;
+template<typename T>
+void System::appendConflictGroups(const T& qrJT, Eigen::MatrixXd& R, DiagnosisBlock& block)
+{
+    // every constraint beyond the rank forms a group with the ones it depends on
+    int rank = block.rank;
+    int constrNum = block.rows.size();
+    eliminateNonZerosOverPivotInUpperTriangularMatrix(R, rank);
+
+    for (int j = rank; j < constrNum; j++) {
+        std::vector<Constraint*>& group = block.conflictGroups.emplace_back();
+        for (int row = 0; row < rank; row++) {
+            if (fabs(R(row, j)) > 1e-10) {
+                int origCol = qrJT.colsPermutation().indices()[row];
+
+                group.push_back(clist[block.rows[origCol]]);
+            }
+        }
+        int origCol = qrJT.colsPermutation().indices()[j];
+
+        group.push_back(clist[block.rows[origCol]]);
+    }
+}
+
+int System::diagnoseDofs(Algorithm alg)
+{
+    // The cheap tier of diagnose(): a single QR decomposition of the transposed reduced Jacobian
+    // gives the rank, which is all the dofs depend on unless the system is over-constrained.
+    compactConstraints();
+    hasDofs = false;
+    if (!hasUnknowns) {
+        dofs = -1;
+        return dofs;
+    }
 
-    // maps the index of the rows of the reduced jacobian matrix (solver constraints) to
-    // the index those constraints would have in a full size Jacobian matrix
-    std::map<int, int> jacobianconstraintmap;
+    if (updateIncrementalDiagnosis()) {
+        const auto& incremental = *incrementalDiagnosis;
+        int paramsNum = incremental.pdiagnoselist.size();
+        dofs = paramsNum - incremental.rank;
+        if (paramsNum == incremental.rank) {  // over-constrained, counted as in diagnose()
+            dofs -= incremental.conflicting.size();
+        }
+        hasDofs = true;
+        return dofs;
+    }
 
-    // list of parameters to be diagnosed in this routine (removes value parameters from driven
-    // constraints)
     GCS::VEC_pD pdiagnoselist;
-
-    // tag multiplicity gives the number of solver constraints associated with the same tag
-    // A tag generally corresponds to the Sketcher constraint index - There are special tag values,
-    // like 0 and -1.
+    makeDiagnoseList(pdiagnoselist);
+    std::vector<DiagnosisBlock> blocks;
     std::map<int, int> tagmultiplicity;
+    makeDiagnosisBlocks(pdiagnoselist, blocks, tagmultiplicity, splitDiagnosis);
 
-    makeReducedJacobian(J, jacobianconstraintmap, pdiagnoselist, tagmultiplicity);
-
-    // this function will exit with a diagnosis and, unless overridden by functions below, with full
-    // DoFs
-    hasDiagnosis = true;
     dofs = pdiagnoselist.size();
-
-    // Use DenseQR for small to medium systems to avoid SparseQR rank issues.
-    // SparseQR is known to fail rank detection on specific geometric structures (e.g. aligned slots).
-    // 200 parameters roughly corresponds to ~100 points/curves, covering most complex sketches
-    // where stability is preferred over pure O(N) performance.
-    // See: https://github.com/FreeCAD/FreeCAD/issues/10903
-    if (autoChooseAlgorithm) {
-        qrAlgorithm = dofs < autoQRThreshold ? EigenDenseQR : EigenSparseQR;
+    if (blocks.empty()) {
+        keepIncrementalDiagnosis(pdiagnoselist, blocks);
+        hasDofs = true;
+        return dofs;
     }
 
-    // There is a legacy decision to use QR decomposition. I (abdullah) do not know all the
-    // consideration taken in that decisions. I see that:
-    // - QR decomposition is able to provide information about the rank and
-    // redundant/conflicting
-    //   constraints
-    // - The QR decomposition of J and the QR decomposition of the transpose of J are unrelated
-    //   (for reasons see below):
-    //   https://mathoverflow.net/questions/338729/translate-between-qr-decomposition-of-a-and-a-transpose
-    // - QR is cheaper than a SVD decomposition
-    // - QR is more expensive than a rank revealing LU factorization
-    // - QR is less stable than SVD with respect to rank
-    // - It is unclear whether it is possible to obtain information about redundancy with SVD
-    // and LU
-
-    // Given this legacy decision, the following is observed:
-    // - A = QR decomposition can be used for the diagonise of dependency of the "columns" of A.
-    // the reason is that matrix R is upper triangular with columns of A showing the
-    // dependencies.
-    // - The same does not apply to the "rows".
-    // - For this reason, to enable a full diagnose of constraints, a QR decomposition must be
-    // done
-    //   on the transpose of the Jacobian matrix (J), this is JT.
-
-    // Eigen capabilities:
-    // - If Eigen full pivoting QR decomposition is used, it is possible to track the rows of JT
-    //   during the decomposition. This can be leveraged to identify a set of independent rows
-    //   of JT (geometry) that form a rank N basis. However, because the R matrix is of the JT
-    //   decomposition and not the J decomposition, it is not possible to reduce the system to
-    //   identify exactly which rows are dependent.
-    // - The effect is that it provides a set of parameters of geometry that are not constraint,
-    //   but it does not identify ALL geometries that are not fixed.
-    // - If SpareQR is used, then it is not possible to track the rows of JT during
-    // decomposition.
-    //   I do not know if it is still possible to obtain geometry information at all from
-    //   SparseQR. After several years these questions remain open:
-    //      https://stackoverflow.com/questions/49009771/getting-rows-transpositions-with-sparse-qr
-    //      https://forum.kde.org/viewtopic.php?f=74&t=151239
-    //
-    // Implementation below:
-    //
-    // Two QR decompositions are used below. One for diagnosis of constraints and a second one
-    // for diagnosis of parameters, i.e. to identify whether the parameter is fully constraint
-    // (independent) or not (i.e. it is dependent).
+    decomposeDiagnosisBlocks(pdiagnoselist, blocks, /*findConflictGroups=*/false);
 
-    // QR decomposition method selection: SparseQR vs DenseQR
+    int paramsNum = pdiagnoselist.size();
+    int constrNum = 0;
+    int rank = 0;
+    for (const auto& block : blocks) {
+        constrNum += block.rows.size();
+        rank += block.rank;
+    }
 
-#ifndef EIGEN_SPARSEQR_COMPATIBLE
-    if (qrAlgorithm == EigenSparseQR) {
-        Base::Console().warning(
-            "SparseQR not supported by you current version of Eigen. It "
-            "requires Eigen 3.2.2 or higher. Falling back to Dense QR\n"
-        );
-        qrAlgorithm = EigenDenseQR;
+    // diagnose() takes the rank of a sketch with dependent constraints from a decomposition of
+    // the whole reduced Jacobian, and so must the dofs, which would otherwise differ
+    bool isWhole = blocks.size() == 1 && blocks.front().cols.size() == pdiagnoselist.size();
+    if (constrNum > rank && !isWhole) {
+        tagmultiplicity.clear();
+        makeDiagnosisBlocks(pdiagnoselist, blocks, tagmultiplicity, /*split=*/false);
+        decomposeDiagnosisBlocks(pdiagnoselist, blocks, /*findConflictGroups=*/false);
+        rank = blocks.front().rank;
     }
-#endif
 
-    if (J.rows() == 0) {
-        return dofs;
+    // a full rank Jacobian with surplus constraints may be over-constrained, which only the
+    // identification of the conflicting and redundant constraints can tell
+    if (constrNum > rank && paramsNum == rank) {
+        return diagnose(alg);
     }
 
-    // From here on, presuming `J.rows() > 0`.
-    emptyDiagnoseMatrix = false;
+    hasDofs = true;
+    dofs = paramsNum - rank;
+    keepIncrementalDiagnosis(pdiagnoselist, blocks);
+    return dofs;
+}
 
-    if (qrAlgorithm == EigenDenseQR) {
-#ifdef PROFILE_DIAGNOSE
-        Base::TimeElapsed DenseQR_start_time;
+void System::keepIncrementalDiagnosis(
+    const GCS::VEC_pD& pdiagnoselist,
+    std::vector<DiagnosisBlock>& blocks
+)
+{
+    dropIncrementalDiagnosis();
+    for (const auto& block : blocks) {
+        // only the dense decomposition of a block of independent constraints can be extended
+        if (int(block.rows.size()) > block.rank) {
+            return;
+        }
+#ifdef EIGEN_SPARSEQR_COMPATIBLE
+        if (block.sparseQR) {
+            return;
+        }
 #endif
+    }
 
-        int rank = 0;  // rank is not cheap to retrieve from qrJT in DenseQR
-        Eigen::MatrixXd R;
-        Eigen::FullPivHouseholderQR<Eigen::MatrixXd> qrJT;
-        // Here we give the system the possibility to run the two QR decompositions in parallel,
-        // depending on the load of the system so we are using the default std::launch::async |
-        // std::launch::deferred policy, as nobody better than the system nows if it can run the
-        // task in parallel or is oversubscribed and should deferred it. Care to wait() for the
-        // future before any prospective detection of conflicting/redundant, because the
-        // redundant solve modifies pdiagnoselist and it would NOT be thread-safe. Care to call
-        // the thread with silent=true, unless the present thread does not use Base::Console, or
-        // the launch policy is set to std::launch::deferred policy, as it is not thread-safe to
-        // use them in both at the same time.
-        //
-        // identifyDependentParametersDenseQR(J, jacobianconstraintmap, pdiagnoselist, true)
-        //
-        auto fut = std::async(
-            &System::identifyDependentParametersDenseQR,
-            this,
-            J,
-            jacobianconstraintmap,
-            pdiagnoselist,
-            true
-        );
-
-        makeDenseQRDecomposition(J, jacobianconstraintmap, qrJT, rank, R);
-
-        int paramsNum = qrJT.rows();
-        int constrNum = qrJT.cols();
-
-        // This function is legacy code that was used to obtain partial geometry dependency
-        // information from a SINGLE Dense QR decomposition. I am reluctant to remove it from
-        // here until everything new is well tested.
-        // identifyDependentGeometryParametersInTransposedJacobianDenseQRDecomposition( qrJT,
-        // pdiagnoselist, paramsNum, rank);
-
-        fut.wait();  // wait for the execution of identifyDependentParametersSparseQR to finish
-
-        dofs = paramsNum - rank;  // unless overconstraint, which will be overridden below
-
-        // Detecting conflicting or redundant constraints
-        if (constrNum > rank) {
-            // conflicting or redundant constraints
-            int nonredundantconstrNum;
-            identifyConflictingRedundantConstraints(
-                alg,
-                qrJT,
-                jacobianconstraintmap,
-                tagmultiplicity,
-                pdiagnoselist,
-                R,
-                constrNum,
-                rank,
-                nonredundantconstrNum
-            );
-            if (paramsNum == rank && nonredundantconstrNum > rank) {  // over-constrained
-                dofs = paramsNum - nonredundantconstrNum;
+    auto incremental = std::make_unique<IncrementalDiagnosis>();
+    incremental->pdiagnoselist = pdiagnoselist;
+    for (int j = 0; j < int(pdiagnoselist.size()); j++) {
+        incremental->colOfParam[pdiagnoselist[j]] = j;
+    }
+    incremental->blockOfCol.assign(pdiagnoselist.size(), -1);
+    for (int b = 0; b < int(blocks.size()); b++) {
+        for (const auto j : blocks[b].cols) {
+            incremental->blockOfCol[j] = b;
+        }
+        incremental->rank += blocks[b].rank;
+        if (!blocks[b].cols.empty()) {
+            const auto& qr = blocks[b].denseQR;
+            incremental->maxPivot = std::max(incremental->maxPivot, qr.maxPivot());
+            for (int k = 0; k < blocks[b].rank; k++) {
+                incremental->minPivot = std::min(incremental->minPivot, fabs(qr.matrixQR()(k, k)));
             }
         }
-
-#ifdef PROFILE_DIAGNOSE
-        Base::TimeElapsed DenseQR_end_time;
-
-        auto SolveTime = Base::TimeElapsed::diffTimeF(DenseQR_start_time, DenseQR_end_time);
-
-        Base::Console().log("\nDenseQR - Lapsed Time: %f seconds\n", SolveTime);
-#endif
     }
+    incremental->blocks = std::move(blocks);
+    incremental->constraintsNum = clist.size();
+    for (const auto constr : clist) {
+        for (const auto param : constr->origParams()) {
+            incremental->values.push_back(*param);
+        }
+    }
+    incrementalDiagnosis = std::move(incremental);
+}
 
-#ifdef EIGEN_SPARSEQR_COMPATIBLE
-    else if (qrAlgorithm == EigenSparseQR) {
-# ifdef PROFILE_DIAGNOSE
-        Base::TimeElapsed SparseQR_start_time;
-# endif
-        int rank = 0;
-        Eigen::MatrixXd R;
-        Eigen::SparseQR<Eigen::SparseMatrix<double>, Eigen::COLAMDOrdering<int>> SqrJT;
-        // Here we give the system the possibility to run the two QR decompositions in parallel,
-        // depending on the load of the system so we are using the default std::launch::async |
-        // std::launch::deferred policy, as nobody better than the system nows if it can run the
-        // task in parallel or is oversubscribed and should deferred it. Care to wait() for the
-        // future before any prospective detection of conflicting/redundant, because the
-        // redundant solve modifies pdiagnoselist and it would NOT be thread-safe. Care to call
-        // the thread with silent=true, unless the present thread does not use Base::Console, or
-        // the launch policy is set to std::launch::deferred policy, as it is not thread-safe to
-        // use them in both at the same time.
-        //
-        // identifyDependentParametersSparseQR(J, jacobianconstraintmap, pdiagnoselist, true)
-        //
-        // Debug:
-        // auto fut =
-        // std::async(std::launch::deferred,&System::identifyDependentParametersSparseQR, this,
-        // J, jacobianconstraintmap, pdiagnoselist, false);
-        auto fut = std::async(
-            &System::identifyDependentParametersSparseQR,
-            this,
-            J,
-            jacobianconstraintmap,
-            pdiagnoselist,
-            /*silent=*/true
+namespace
+{
+// Replaces v with its component orthogonal to the column space of the matrix decomposed by qr,
+// whose first rank columns are independent, by applying Q^T, zeroing the first rank entries and
+// applying Q, as FullPivHouseholderQR::solve() and matrixQ() do.
+void removeColumnSpaceComponent(
+    const Eigen::FullPivHouseholderQR<Eigen::MatrixXd>& qr,
+    int rank,
+    Eigen::VectorXd& v
+)
+{
+    int rows = qr.rows();
+    double workspace;
+    for (int k = 0; k < rank; k++) {
+        std::swap(v(k), v(qr.rowsTranspositions().coeff(k)));
+        v.tail(rows - k).applyHouseholderOnTheLeft(
+            qr.matrixQR().col(k).tail(rows - k - 1),
+            qr.hCoeffs().coeff(k),
+            &workspace
         );
-
-        makeSparseQRDecomposition(
-            J,
-            jacobianconstraintmap,
-            SqrJT,
-            rank,
-            R,
-            /*transposed=*/true,
-            /*silent=*/false
+    }
+    v.head(rank).setZero();
+    for (int k = rank - 1; k >= 0; k--) {
+        v.tail(rows - k).applyHouseholderOnTheLeft(
+            qr.matrixQR().col(k).tail(rows - k - 1),
+            qr.hCoeffs().coeff(k),
+            &workspace
         );
+        std::swap(v(k), v(qr.rowsTranspositions().coeff(k)));
+    }
+}
+}  // namespace
+
+bool System::updateIncrementalDiagnosis()
+{
+    if (!incrementalDiagnosis) {
+        return false;
+    }
+    auto& incremental = *incrementalDiagnosis;
 
-        int paramsNum = SqrJT.rows();
-        int constrNum = SqrJT.cols();
+    // the decompositions are only those of the current Jacobian if nothing they depend on changed
+    GCS::VEC_pD pdiagnoselist;
+    makeDiagnoseList(pdiagnoselist);
+    bool valid = (pdiagnoselist == incremental.pdiagnoselist);
+    for (std::size_t i = 0, v = 0; valid && i < incremental.constraintsNum; i++) {
+        for (const auto param : clist[i]->origParams()) {
+            if (*param != incremental.values[v++]) {
+                valid = false;
+                break;
+            }
+        }
+    }
+    if (!valid) {
+        dropIncrementalDiagnosis();
+        return false;
+    }
 
-        fut.wait();  // wait for the execution of identifyDependentParametersSparseQR to finish
+    for (std::size_t i = incremental.constraintsNum; i < clist.size(); i++) {
+        Constraint* constr = clist[i];
+        constr->revertParams();
+        for (const auto param : constr->origParams()) {
+            incremental.values.push_back(*param);
+        }
+        incremental.constraintsNum = i + 1;
+        if (constr->getTag() < 0 || !constr->isDriving()) {
+            continue;
+        }
 
-        dofs = paramsNum - rank;  // unless overconstraint, which will be overridden below
+        // the part of the row of the constraint in the reduced Jacobian that is not a combination
+        // of the rows before it
+        Eigen::VectorXd row = Eigen::VectorXd::Zero(pdiagnoselist.size());
+        std::set<int> rowBlocks;
+        for (const auto param : constr->params()) {
+            auto it = incremental.colOfParam.find(param);
+            if (it != incremental.colOfParam.end()) {
+                row(it->second) = constr->grad(param);
+                if (incremental.blockOfCol[it->second] >= 0) {
+                    rowBlocks.insert(incremental.blockOfCol[it->second]);
+                }
+            }
+        }
+        // the largest pivot a decomposition of the reduced Jacobian with the row would have, as
+        // diagnose() decides ranks against it. A row that raises it may leave rows taken as
+        // independent before it below the threshold, which only a full diagnosis can sort out.
+        // So can rows independent by a small margin: the residuals of rows that are nearly
+        // dependent together end up in the smallest pivot of a full decomposition, which is
+        // smaller than any of them and may be below the threshold.
+        incremental.maxPivot = std::max(incremental.maxPivot, row.norm());
+        double marginalPivot = std::sqrt(qrpivotThreshold) * incremental.maxPivot;
+        if (incremental.minPivot <= marginalPivot) {
+            dropIncrementalDiagnosis();
+            return false;
+        }
+        Eigen::VectorXd residual = row;
+        for (const auto b : rowBlocks) {
+            const auto& block = incremental.blocks[b];
+            Eigen::VectorXd local(block.cols.size());
+            for (int j = 0; j < int(block.cols.size()); j++) {
+                local(j) = row(block.cols[j]);
+            }
+            removeColumnSpaceComponent(block.denseQR, block.rank, local);
+            for (int j = 0; j < int(block.cols.size()); j++) {
+                residual(block.cols[j]) = local(j);
+            }
+        }
+        for (int pass = 0; pass < 2; pass++) {  // twice, for orthogonality in floating point
+            for (const auto& direction : incremental.basis) {
+                residual -= direction.dot(residual) * direction;
+            }
+        }
 
-        // Detecting conflicting or redundant constraints
-        if (constrNum > rank) {
-            int nonredundantconstrNum;
+        double residualNorm = residual.norm();
+        if (!std::isfinite(residualNorm)
+            || (residualNorm > qrpivotThreshold * incremental.maxPivot
+                && residualNorm <= marginalPivot)) {
+            dropIncrementalDiagnosis();
+            return false;
+        }
 
-            identifyConflictingRedundantConstraints(
-                alg,
-                SqrJT,
-                jacobianconstraintmap,
-                tagmultiplicity,
-                pdiagnoselist,
-                R,
-                constrNum,
-                rank,
-                nonredundantconstrNum
-            );
+        auto& tagRows = incremental.addedTags[constr->getTag()];
+        if (residualNorm > marginalPivot) {
+            incremental.minPivot = std::min(incremental.minPivot, residualNorm);
+            incremental.basis.push_back(residual.normalized());
+            incremental.rank++;
+            tagRows.independent++;
+            continue;
+        }
 
-            if (paramsNum == rank && nonredundantconstrNum > rank) {
-                // over-constrained
-                dofs = paramsNum - nonredundantconstrNum;
+        // A dependent constraint is redundant if it is satisfied where the others are, which
+        // needs the others to be satisfied, as diagnose() makes them with a solve.
+        for (; incremental.satisfiedNum < i; incremental.satisfiedNum++) {
+            Constraint* other = clist[incremental.satisfiedNum];
+            if (other->getTag() < 0 || !other->isDriving()
+                || incremental.conflicting.count(other) != 0) {
+                continue;
             }
+            double err = other->error();
+            if (err * err >= convergenceRedundant) {
+                dropIncrementalDiagnosis();
+                return false;
+            }
+        }
+        double err = constr->error();
+        if (err * err < convergenceRedundant) {
+            tagRows.redundant++;
+        }
+        else {
+            tagRows.conflicting++;
+            incremental.conflicting.insert(constr);
+        }
+    }
+    return true;
+}
+
+std::optional<ConstraintStatus> System::getConstraintStatus(int tagId, Algorithm alg)
+{
+    compactConstraints();
+    if (tagIndex.count(tagId) == 0) {
+        return std::nullopt;
+    }
+
+    if (hasUnknowns && updateIncrementalDiagnosis()) {
+        auto it = incrementalDiagnosis->addedTags.find(tagId);
+        if (it == incrementalDiagnosis->addedTags.end()) {
+            return Independent;  // diagnosed without dependent constraints
+        }
+        const auto& rows = it->second;
+        if (rows.conflicting > 0) {
+            return Conflicting;
         }
+        if (rows.redundant > 0) {
+            return rows.independent > 0 ? PartiallyRedundant : Redundant;
+        }
+        return Independent;
+    }
 
-# ifdef PROFILE_DIAGNOSE
-        Base::TimeElapsed SparseQR_end_time;
+    diagnose(alg);
+    if (!hasDiagnosis || emptyDiagnoseMatrix) {
+        return Independent;
+    }
+    if (std::ranges::binary_search(chosenConflictingTags, tagId)) {
+        return Conflicting;
+    }
+    if (std::ranges::binary_search(redundantTags, tagId)) {
+        return Redundant;
+    }
+    if (std::ranges::binary_search(partiallyRedundantTags, tagId)) {
+        return PartiallyRedundant;
+    }
+    return Independent;
+}
 
-        auto SolveTime = Base::TimeElapsed::diffTimeF(SparseQR_start_time, SparseQR_end_time);
+void System::diagnoseDependentParameters()
+{
+    hasDependentParameters = true;
+    pDependentParameters.clear();
+    pDependentParametersGroups.clear();
+    if (!hasDiagnosis || emptyDiagnoseMatrix) {
+        return;
+    }
 
-        Base::Console().log("\nSparseQR - Lapsed Time: %f seconds\n", SolveTime);
-# endif
+    Eigen::MatrixXd J;
+    std::map<int, int> jacobianconstraintmap;
+    GCS::VEC_pD pdiagnoselist;
+    std::map<int, int> tagmultiplicity;
+    makeReducedJacobian(J, jacobianconstraintmap, pdiagnoselist, tagmultiplicity);
+    if (pdiagnoselist.empty()) {
+        return;
     }
-#endif
 
-    return dofs;
+    if (qrAlgorithm == EigenDenseQR) {
+        identifyDependentParametersDenseQR(J, jacobianconstraintmap, pdiagnoselist);
+    }
+#ifdef EIGEN_SPARSEQR_COMPATIBLE
+    else {
+        identifyDependentParametersSparseQR(J, jacobianconstraintmap, pdiagnoselist);
+    }
+#endif
 }
 
 void System::makeDenseQRDecomposition(
@@ -5121,28 +7633,46 @@ void System::makeDenseQRDecomposition(
 }
 
 #ifdef EIGEN_SPARSEQR_COMPATIBLE
+namespace
+{
+// Factorizes SJG into SqrJT, redoing the ordering and symbolic analysis only if the sparsity
+// pattern of SJG differs from the one they were done for.
+void factorizeSparseQR(
+    Eigen::SparseQR<Eigen::SparseMatrix<double>, Eigen::COLAMDOrdering<int>>& SqrJT,
+    const Eigen::SparseMatrix<double>& SJG,
+    VEC_I& analyzedPattern,
+    double pivotThreshold
+)
+{
+    VEC_I pattern {int(SJG.rows()), int(SJG.cols())};
+    pattern.insert(pattern.end(), SJG.outerIndexPtr(), SJG.outerIndexPtr() + SJG.cols() + 1);
+    pattern.insert(pattern.end(), SJG.innerIndexPtr(), SJG.innerIndexPtr() + SJG.nonZeros());
+    if (pattern != analyzedPattern) {
+        SqrJT.analyzePattern(SJG);
+        analyzedPattern = std::move(pattern);
+    }
+
+    SqrJT.setPivotThreshold(pivotThreshold);
+    SqrJT.factorize(SJG);
+}
+}  // namespace
+
 void System::makeSparseQRDecomposition(
-    const Eigen::MatrixXd& J,
+    const Eigen::SparseMatrix<double>& SJ,
     const std::map<int, int>& jacobianconstraintmap,
     Eigen::SparseQR<Eigen::SparseMatrix<double>, Eigen::COLAMDOrdering<int>>& SqrJT,
     int& rank,
     Eigen::MatrixXd& R,
     bool transposeJ,
-    bool silent
+    bool silent,
+    VEC_I* analyzedPattern,
+    double pivotThreshold
 )
 {
 
-    Eigen::SparseMatrix<double> SJ;
-
-    // this creation is not optimized (done using triplets)
-    // however the time this takes is negligible compared to the
-    // time the QR decomposition itself takes
-    SJ = J.sparseView();
-    SJ.makeCompressed();
-
 # ifdef _GCS_DEBUG
     if (!silent) {
-        SolverReportingManager::Manager().LogMatrix("J", J);
+        SolverReportingManager::Manager().LogMatrix("J", Eigen::MatrixXd(SJ));
     }
 # endif
 
@@ -5167,7 +7697,12 @@ void System::makeSparseQRDecomposition(
         }
 
         if (SJG.rows() > 0 && SJG.cols() > 0) {
-            SqrJT.compute(SJG);
+            if (analyzedPattern) {
+                factorizeSparseQR(SqrJT, SJG, *analyzedPattern, pivotThreshold);
+            }
+            else {
+                SqrJT.compute(SJG);
+            }
 // Do not ask for Q Matrix!!
 // At Eigen 3.2 still has a bug that this only works for square matrices
 // if enabled it will crash
@@ -5181,7 +7716,12 @@ void System::makeSparseQRDecomposition(
             SqrJT.setPivotThreshold(qrpivotThreshold);
             rank = SqrJT.rank();
 
-            if (colsNum >= rowsNum) {
+            // R of the transposed J is only read to group the constraints beyond the rank, and
+            // it is dense
+            if (transposeJ && colsNum == rank) {
+                R.resize(0, 0);
+            }
+            else if (colsNum >= rowsNum) {
                 R = SqrJT.matrixR().triangularView<Eigen::Upper>();
             }
             else {
@@ -5203,7 +7743,7 @@ void System::makeSparseQRDecomposition(
     }
 
 # ifdef _GCS_DEBUG_SOLVER_JACOBIAN_QR_DECOMPOSITION_TRIANGULAR_MATRIX
-    if (J.rows() > 0 && !silent) {
+    if (SJ.rows() > 0 && !silent) {
 
         SolverReportingManager::Manager().LogMatrix("R", R);
 
@@ -5248,7 +7788,7 @@ void System::identifyDependentParametersSparseQR(
     int nontransprank;
 
     makeSparseQRDecomposition(
-        J,
+        J.sparseView(),
         jacobianconstraintmap,
         SqrJ,
         nontransprank,
@@ -5422,33 +7962,18 @@ void System::eliminateNonZerosOverPivotInUpperTriangularMatrix(Eigen::MatrixXd&
     }
 }
 
-template<typename T>
 void System::identifyConflictingRedundantConstraints(
     Algorithm alg,
-    const T& qrJT,
-    const std::map<int, int>& jacobianconstraintmap,
+    const std::vector<DiagnosisBlock>& blocks,
     const std::map<int, int>& tagmultiplicity,
-    GCS::VEC_pD& pdiagnoselist,
-    Eigen::MatrixXd& R,
+    const GCS::VEC_pD& pdiagnoselist,
     int constrNum,
-    int rank,
     int& nonredundantconstrNum
 )
 {
-    eliminateNonZerosOverPivotInUpperTriangularMatrix(R, rank);
-
-    std::vector<std::vector<Constraint*>> conflictGroups(constrNum - rank);
-    for (int j = rank; j < constrNum; j++) {
-        for (int row = 0; row < rank; row++) {
-            if (fabs(R(row, j)) > 1e-10) {
-                int origCol = qrJT.colsPermutation().indices()[row];
-
-                conflictGroups[j - rank].push_back(clist[jacobianconstraintmap.at(origCol)]);
-            }
-        }
-        int origCol = qrJT.colsPermutation().indices()[j];
-
-        conflictGroups[j - rank].push_back(clist[jacobianconstraintmap.at(origCol)]);
+    std::vector<std::vector<Constraint*>> conflictGroups;
+    for (const auto& block : blocks) {
+        std::ranges::copy(block.conflictGroups, std::back_inserter(conflictGroups));
     }
 
     // Augment the information regarding the group of constraints that are conflicting or redundant.
@@ -5560,8 +8085,17 @@ void System::identifyConflictingRedundantConstraints(
         return (constr->isDriving() && skipped.count(constr) == 0);
     });
 
-    SubSystem* subSysTmp = new SubSystem(clistTmp, pdiagnoselist);
-    int res = solve(subSysTmp, true, alg, true);
+    // the redundant solve must leave the parameters as it found them, which is not necessarily the
+    // reference configuration, as diagnose() may be called without initSolution()
+    VEC_D values;
+    values.reserve(pdiagnoselist.size());
+    for (const auto param : pdiagnoselist) {
+        values.push_back(*param);
+    }
+
+    VEC_pD params = pdiagnoselist;
+    SubSystem subSysTmp(clistTmp, params);
+    int res = solve(&subSysTmp, true, alg, true);
 
     if (debugMode == Minimal || debugMode == IterationLevel) {
         std::string solvername;
@@ -5575,13 +8109,16 @@ void System::identifyConflictingRedundantConstraints(
             case 2:  // solving with the BFGS solver
                 solvername = "DogLeg";
                 break;
+            case 3:
+                solvername = "LBFGS";
+                break;
         }
 
         Base::Console().log("Sketcher::RedundantSolving-%s-\n", solvername.c_str());
     }
 
     if (res == Success) {
-        subSysTmp->applySolution();
+        subSysTmp.applySolution();
         std::ranges::copy_if(
             skipped,
             std::inserter(redundant, redundant.begin()),
@@ -5590,39 +8127,40 @@ void System::identifyConflictingRedundantConstraints(
                 return (err * err < this->convergenceRedundant);
             }
         );
-        resetToReference();
-
-        if (debugMode == Minimal || debugMode == IterationLevel) {
-            Base::Console().log("Sketcher Redundant solving: %d redundants\n", redundant.size());
+        for (std::size_t i = 0; i < pdiagnoselist.size(); i++) {
+            *pdiagnoselist[i] = values[i];
         }
+    }
 
-        // TODO: Figure out why we need to iterate in reverse order and add explanation here.
-        std::vector<std::vector<Constraint*>> conflictGroupsOrig = conflictGroups;
-        conflictGroups.clear();
-        for (int i = conflictGroupsOrig.size() - 1; i >= 0; i--) {
-            auto iterRedundantEntry = std::ranges::find_if(
-                conflictGroupsOrig[i],
-                [this](const auto item) { return (this->redundant.count(item) > 0); }
-            );
-            bool hasRedundant = (iterRedundantEntry != conflictGroupsOrig[i].end());
-            if (!hasRedundant) {
-                conflictGroups.push_back(conflictGroupsOrig[i]);
-                continue;
-            }
+    if (debugMode == Minimal || debugMode == IterationLevel) {
+        Base::Console().log("Sketcher Redundant solving: %d redundants\n", redundant.size());
+    }
 
-            if (debugMode == IterationLevel) {
-                Base::Console().log(
-                    "(Partially) Redundant, Group %d, index %d, Tag: %d\n",
-                    i,
-                    iterRedundantEntry - conflictGroupsOrig[i].begin(),
-                    (*iterRedundantEntry)->getTag()
-                );
-            }
+    // TODO: Figure out why we need to iterate in reverse order and add explanation here.
+    std::vector<std::vector<Constraint*>> conflictGroupsOrig = conflictGroups;
+    conflictGroups.clear();
+    for (int i = conflictGroupsOrig.size() - 1; i >= 0; i--) {
+        auto iterRedundantEntry = std::ranges::find_if(
+            conflictGroupsOrig[i],
+            [this](const auto item) { return (this->redundant.count(item) > 0); }
+        );
+        bool hasRedundant = (iterRedundantEntry != conflictGroupsOrig[i].end());
+        if (!hasRedundant) {
+            conflictGroups.push_back(conflictGroupsOrig[i]);
+            continue;
+        }
 
-            constrNum--;
+        if (debugMode == IterationLevel) {
+            Base::Console().log(
+                "(Partially) Redundant, Group %d, index %d, Tag: %d\n",
+                i,
+                iterRedundantEntry - conflictGroupsOrig[i].begin(),
+                (*iterRedundantEntry)->getTag()
+            );
         }
+
+        constrNum--;
     }
-    delete subSysTmp;
 
     // simplified output of conflicting tags
     SET_I conflictingTagsSet;
@@ -5653,11 +8191,11 @@ void System::identifyConflictingRedundantConstraints(
     }
 
     // remove tags represented at least in one non-redundant constraint
-    for (const auto& constr : clist) {
-        if (redundant.count(constr) == 0) {
-            redundantTagsSet.erase(constr->getTag());
-        }
-    }
+    std::erase_if(redundantTagsSet, [this](int tag) {
+        return std::ranges::any_of(tagIndex.at(tag), [this](const auto& constr) {
+            return redundant.count(constr) == 0;
+        });
+    });
 
     redundantTags.resize(redundantTagsSet.size());
     std::ranges::copy(redundantTagsSet, redundantTags.begin());
@@ -5669,16 +8207,48 @@ void System::identifyConflictingRedundantConstraints(
     partiallyRedundantTags.resize(partiallyRedundantTagsSet.size());
     std::ranges::copy(partiallyRedundantTagsSet, partiallyRedundantTags.begin());
 
+    SET_I chosenConflictingTagsSet;
+    for (const auto constr : skipped) {
+        if (redundant.count(constr) == 0) {
+            chosenConflictingTagsSet.insert(constr->getTag());
+        }
+    }
+    chosenConflictingTags.assign(chosenConflictingTagsSet.begin(), chosenConflictingTagsSet.end());
+
     nonredundantconstrNum = constrNum;
 }
 
+void System::setPlanAside()
+{
+    if (transaction && !transaction->planKept) {
+        transaction->planKept = true;
+        transaction->subSystems = std::move(subSystems);
+        transaction->subSystemsAux = std::move(subSystemsAux);
+        transaction->clusters = std::move(clusters);
+        transaction->componentStates = std::move(componentStates);
+        transaction->plists = std::move(plists);
+        transaction->clists = std::move(clists);
+        transaction->reductionmaps = std::move(reductionmaps);
+        transaction->constantConstraints = std::move(constantConstraints);
+        transaction->c2p = std::move(c2p);
+        plists.clear();
+        clists.clear();
+        reductionmaps.clear();
+        constantConstraints.clear();
+        c2p.clear();
+    }
+}
+
 void System::clearSubSystems()
 {
+    setPlanAside();
     isInit = false;
     deleteAllContent(subSystems);
     deleteAllContent(subSystemsAux);
     subSystems.clear();
     subSystemsAux.clear();
+    clusters.clear();
+    componentStates.clear();
 }
 
 double lineSearch(SubSystem* subsys, Eigen::VectorXd& xdir)
@@ -5687,7 +8257,9 @@ double lineSearch(SubSystem* subsys, Eigen::VectorXd& xdir)
 
     double alphaMax = subsys->maxStep(xdir);
 
-    Eigen::VectorXd x0, x;
+    SolverWorkspace& ws = subsys->workspace();
+    Eigen::VectorXd& x0 = ws.x0;
+    Eigen::VectorXd& x = ws.xls;
 
     // Save initial values
     subsys->getParams(x0);
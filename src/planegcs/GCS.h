@@ -25,6 +25,13 @@
 #ifndef PLANEGCS_GCS_H
 #define PLANEGCS_GCS_H
 
+#include <limits>
+#include <memory>
+#include <memory_resource>
+#include <optional>
+#include <unordered_map>
+#include <unordered_set>
+
 #include <Eigen/QR>
 
 #include "SketcherGlobal.h"
@@ -64,7 +71,8 @@ enum Algorithm
 {
     BFGS = 0,
     LevenbergMarquardt = 1,
-    DogLeg = 2
+    DogLeg = 2,
+    LBFGS = 3
 };
 
 enum DogLegGaussStep
@@ -87,6 +95,14 @@ enum DebugMode
     IterationLevel = 2
 };
 
+enum ConstraintStatus
+{
+    Independent = 0,         // not implied by the other constraints
+    Redundant = 1,           // implied by the other constraints, and satisfied with them
+    PartiallyRedundant = 2,  // some solver constraints of the tag are redundant, none conflicting
+    Conflicting = 3          // implied by the other constraints, but not satisfied with them
+};
+
 // Magic numbers for Constraint tags
 // - Positive Tags identify a higher level constraint form which the solver constraint
 // originates
@@ -117,15 +133,112 @@ private:
 
     // This is a map of primary and secondary identifiers that are found dependent by the solver
     // GCS ignores from a type point
-    std::vector<std::vector<double*>> pDependentParametersGroups;
+    std::vector<VEC_pD> pDependentParametersGroups;
 
     std::vector<Constraint*> clist;
-    std::map<Constraint*, VEC_pD> c2p;                // constraint to parameter adjacency list
-    std::map<double*, std::vector<Constraint*>> p2c;  // parameter to constraint adjacency list
+
+    // Constraints of clist grouped by tag, in clist order, so that removing or evaluating the
+    // constraints of one tag does not scan clist.
+    std::unordered_map<int, std::vector<Constraint*>> tagIndex;
+
+    // Removed constraints stay in clist until compactConstraints() drops them from it in a
+    // single pass and destroys them, so that removing many constraints is not quadratic.
+    // Anything reading clist must compact it first.
+    std::unordered_set<Constraint*> clistRemoved;
+    void retireConstraint(Constraint* constr);
+    void compactConstraints();
+
+    // The constraints of clist, and the vectors they hold, are allocated from this pool by
+    // createConstraint, which keeps them close together in memory and lets clear() hand all of
+    // it back at once: it destroys the constraints while the pool is dropping, which ignores
+    // what they give back, then releases the pool.
+    class ConstraintPool: public std::pmr::memory_resource
+    {
+    public:
+        bool dropping = false;
+        void release()
+        {
+            pool.release();
+            dropping = false;
+        }
+
+    private:
+        std::pmr::unsynchronized_pool_resource pool;
+        void* do_allocate(std::size_t bytes, std::size_t alignment) override
+        {
+            return pool.allocate(bytes, alignment);
+        }
+        void do_deallocate(void* p, std::size_t bytes, std::size_t alignment) override
+        {
+            if (!dropping) {
+                pool.deallocate(p, bytes, alignment);
+            }
+        }
+        bool do_is_equal(const std::pmr::memory_resource& other) const noexcept override
+        {
+            return this == &other;
+        }
+    };
+    ConstraintPool constraintPool;
+    template<typename T, typename... Args>
+    T* createConstraint(Args&&... args);
+    void destroyConstraint(Constraint* constr);
+    int addConstraint(Constraint* constr);  // takes a constraint made by createConstraint
+    // constraint to unknown parameter (index in plist) adjacency of the non-redundant
+    // constraints, rebuilt by initSolution
+    AdjacencyCSR c2p;
+
+    // Partition of plist into decoupled components, kept up to date incrementally by
+    // initSolution: constraints added since the last call are merged in, and only the
+    // components touched by removed constraints are recomputed.
+    DisjointSets pComponents;
+    std::size_t pComponentsAddedFrom;  // position in clist of the first constraint to merge in
+    VEC_I pComponentsDirty;   // plist indices of parameters in components to recompute
+    bool pComponentsValid;    // false forces initSolution to rebuild the partition
+    bool pComponentsReduced;  // the partition was built without the redundant constraints
+    void updateComponents(const std::vector<Constraint*>& clistR);
 
     std::vector<SubSystem*> subSystems, subSystemsAux;
     void clearSubSystems();
 
+    // A rigid cluster of a component: constraints that determine as many of its unknowns as
+    // they have equations, once the unknowns of the clusters before it are fixed.
+    struct Cluster
+    {
+        std::unique_ptr<SubSystem> subsys;
+        std::vector<std::pair<double*, double*>> aliases;  // reduced unknowns, their kept one
+        // A cluster of one point and two constraints that each hold it on a circle or a line
+        // can be placed at their intersection before it is solved: its kept coordinates and
+        // the two constraints, or null and empty.
+        double* pointX = nullptr;
+        double* pointY = nullptr;
+        std::vector<Constraint*> placing;
+    };
+    // The clusters of each component, in solving order, as planned by planClusters. Empty for
+    // a component that is solved whole.
+    std::vector<std::vector<Cluster>> clusters;
+    void planClusters(int cid);
+    int solveClusters(int cid, bool isFine, Algorithm alg, bool isRedundantsolving);
+    bool placeCluster(const Cluster& cluster, const MAP_pD_pD& reductionmap);
+
+    // What the last solve of each component started from, which lets solve() skip the
+    // components nothing changed in since their solution was applied.
+    struct ComponentState
+    {
+        VEC_pD params;  // unknowns and constants its constraints and reductions read, sorted
+        VEC_D applied;  // their values when its solution was last applied
+        int status = Failed;  // of its last solve
+        bool valid = false;   // applied holds the values of its last solve, which succeeded
+    };
+    std::vector<ComponentState> componentStates;
+    bool isComponentUnchanged(const ComponentState& state) const;
+    // the parameters a solution of the component depends on, into its state
+    void setComponentParams(int cid);
+    // an equality the parameters of which initSolution() merges or substitutes
+    static bool isReducibleEquality(Constraint* constr);
+    // solves a failed component again without constants substituted for its unknowns
+    int solveUnsubstituted(int cid, bool isFine, Algorithm alg, bool isRedundantsolving);
+
     VEC_D reference;
     void setReference();      // copies the current parameter values to reference
     void resetToReference();  // reverts all parameter values to the stored reference
@@ -134,20 +247,29 @@ private:
     // partitioned clist except equality constraints
     std::vector<std::vector<Constraint*>> clists;
     std::vector<MAP_pD_pD> reductionmaps;  // for simplification of equality constraints
+    // driving constraints without unknowns, which are checked rather than solved
+    std::vector<Constraint*> constantConstraints;
 
     int dofs;
     std::set<Constraint*> redundant;
     VEC_I conflictingTags, redundantTags, partiallyRedundantTags;
+    // the tags of the conflicting constraints the diagnosis chose to leave out of their groups
+    VEC_I chosenConflictingTags;
 
     bool hasUnknowns;   // if plist is filled with the unknown parameters
     bool hasDiagnosis;  // if dofs, conflictingTags, redundantTags are up to date
+    bool hasDofs;       // if dofs is up to date, set by diagnose() and diagnoseDofs()
+    bool hasDependentParameters;  // if pDependentParameters(Groups) are up to date
     bool isInit;        // if plists, clists, reductionmaps are up to date
 
     bool emptyDiagnoseMatrix;  // false only if there is at least one driving constraint.
 
     int solve_BFGS(SubSystem* subsys, bool isFine = true, bool isRedundantsolving = false);
+    int solve_LBFGS(SubSystem* subsys, bool isRedundantsolving = false);
     int solve_LM(SubSystem* subsys, bool isRedundantsolving = false);
     int solve_DL(SubSystem* subsys, bool isRedundantsolving = false);
+    // the status of a subsystem whose unknowns were all substituted
+    int checkSubstituted(SubSystem* subsys);
 
     void makeReducedJacobian(
         Eigen::MatrixXd& J,
@@ -156,6 +278,106 @@ private:
         std::map<int, int>& tagmultiplicity
     );
 
+    void makeDiagnoseList(GCS::VEC_pD& pdiagnoselist);
+
+#ifdef EIGEN_SPARSEQR_COMPATIBLE
+    // A SparseQR decomposition kept from one diagnosis to the next. Its fill-reducing ordering and
+    // symbolic analysis only depend on the sparsity pattern of the decomposed matrix, so they are
+    // reused, and only the numeric factorization is redone, while the pattern stays the same.
+    struct SparseQRCache
+    {
+        Eigen::SparseQR<Eigen::SparseMatrix<double>, Eigen::COLAMDOrdering<int>> qr;
+        VEC_I pattern;  // rows, columns, outer and inner indices of the analyzed matrix
+    };
+    // keyed on the first constraint of the diagnosis block decomposed with SparseQR
+    std::unordered_map<Constraint*, SparseQRCache> diagnosisSparseQR;
+#endif
+
+    // A connected block of the reduced Jacobian: driving constraints tagged >= 0 and the
+    // diagnosed parameters they share. The reduced Jacobian is block diagonal, so each block is
+    // decomposed on its own and the results are merged.
+    struct DiagnosisBlock
+    {
+        VEC_I rows;  // indices in clist
+        VEC_I cols;  // indices in pdiagnoselist, empty for a constraint without unknowns
+        int rank = 0;
+        std::vector<std::vector<Constraint*>> conflictGroups;
+        Eigen::FullPivHouseholderQR<Eigen::MatrixXd> denseQR;  // of the transposed block
+        double maxRowNorm = 0.0;  // of the rows of the block, the columns of its transpose
+#ifdef EIGEN_SPARSEQR_COMPATIBLE
+        SparseQRCache* sparseQR = nullptr;  // the decomposition to use if SparseQR is chosen
+        Eigen::SparseMatrix<double> SJ;  // the block, from its assembly to its factorization
+#endif
+    };
+
+    // What a diagnosis without dependent constraints leaves for checking the constraints added
+    // after it, without decomposing the Jacobian again: the dense QR decompositions of its blocks,
+    // and an orthonormal basis of the directions the added constraints span beyond them. It holds
+    // for as long as the diagnosed constraints, the unknowns and their parameter values do not
+    // change.
+    struct IncrementalDiagnosis
+    {
+        struct TagRows
+        {
+            int independent = 0;
+            int redundant = 0;
+            int conflicting = 0;
+        };
+
+        VEC_pD pdiagnoselist;
+        std::unordered_map<double*, int> colOfParam;  // index in pdiagnoselist
+        std::vector<DiagnosisBlock> blocks;
+        VEC_I blockOfCol;  // block of each diagnosed parameter, -1 if it is in no block
+        std::size_t constraintsNum = 0;  // size of the prefix of clist checked so far
+        VEC_D values;                    // of the parameters of those constraints
+        std::size_t satisfiedNum = 0;    // prefix of clist known to be satisfied
+        std::unordered_set<Constraint*> conflicting;
+        std::vector<Eigen::VectorXd> basis;
+        int rank = 0;
+        double maxPivot = 0.0;  // of the reduced Jacobian, which ranks are decided against
+        // the smallest pivot or residual taken as independent, which a larger maxPivot may not
+        // leave independent
+        double minPivot = std::numeric_limits<double>::infinity();
+        std::unordered_map<int, TagRows> addedTags;
+    };
+    std::unique_ptr<IncrementalDiagnosis> incrementalDiagnosis;
+    void dropIncrementalDiagnosis();  // sets it aside instead, if a transaction began with it
+    void keepIncrementalDiagnosis(
+        const GCS::VEC_pD& pdiagnoselist,
+        std::vector<DiagnosisBlock>& blocks
+    );
+    bool updateIncrementalDiagnosis();
+    void makeDiagnosisBlocks(
+        const GCS::VEC_pD& pdiagnoselist,
+        std::vector<DiagnosisBlock>& blocks,
+        std::map<int, int>& tagmultiplicity,
+        bool split
+    );
+    void decomposeDiagnosisBlocks(
+        const GCS::VEC_pD& pdiagnoselist,
+        std::vector<DiagnosisBlock>& blocks,
+        bool findConflictGroups
+    );
+    // Assembles a block, and decomposes it unless SparseQR was chosen for it
+    void prepareDiagnosisBlock(
+        const GCS::VEC_pD& pdiagnoselist,
+        DiagnosisBlock& block,
+        bool silent
+    );
+    // Finishes the decomposition of a prepared block. Its rank is decided against the scale of the
+    // whole reduced Jacobian rather than its own, as a decomposition of the whole would: a dense
+    // block counts the pivots above qrpivotThreshold times the largest pivot of all blocks, and a
+    // sparse one is factorized with sparsePivotThreshold.
+    void decomposeDiagnosisBlock(
+        DiagnosisBlock& block,
+        double maxPivot,
+        double sparsePivotThreshold,
+        bool findConflictGroups,
+        bool silent
+    );
+    template<typename T>
+    void appendConflictGroups(const T& qrJT, Eigen::MatrixXd& R, DiagnosisBlock& block);
+
     void makeDenseQRDecomposition(
         const Eigen::MatrixXd& J,
         const std::map<int, int>& jacobianconstraintmap,
@@ -168,13 +390,15 @@ private:
 
 #ifdef EIGEN_SPARSEQR_COMPATIBLE
     void makeSparseQRDecomposition(
-        const Eigen::MatrixXd& J,
+        const Eigen::SparseMatrix<double>& SJ,
         const std::map<int, int>& jacobianconstraintmap,
         Eigen::SparseQR<Eigen::SparseMatrix<double>, Eigen::COLAMDOrdering<int>>& SqrJT,
         int& rank,
         Eigen::MatrixXd& R,
         bool transposeJ = true,
-        bool silent = false
+        bool silent = false,
+        VEC_I* analyzedPattern = nullptr,
+        double pivotThreshold = 0.0  // for a decomposition reusing analyzedPattern
     );
 #endif
     // This function name is long for a reason:
@@ -187,16 +411,12 @@ private:
         int rank
     );
 
-    template<typename T>
     void identifyConflictingRedundantConstraints(
         Algorithm alg,
-        const T& qrJT,
-        const std::map<int, int>& jacobianconstraintmap,
+        const std::vector<DiagnosisBlock>& blocks,
         const std::map<int, int>& tagmultiplicity,
-        GCS::VEC_pD& pdiagnoselist,
-        Eigen::MatrixXd& R,
+        const GCS::VEC_pD& pdiagnoselist,
         int constrNum,
-        int rank,
         int& nonredundantconstrNum
     );
 
@@ -227,9 +447,80 @@ private:
         bool silent = true
     );
 
+    // the parameter half of the diagnosis, run by getDependentParams() when first needed
+    void diagnoseDependentParameters();
+
 #ifdef _GCS_EXTRACT_SOLVER_SUBSYSTEM_
     void extractSubsystem(SubSystem* subsys, bool isRedundantsolving);
 #endif
+
+    // What rollbackTransaction() brings back: the constraints and unknowns at the beginning of
+    // the transaction, and what was worked out about them. The constraints removed and the
+    // analysis replaced meanwhile are set aside here rather than destroyed.
+    struct Transaction
+    {
+        std::vector<Constraint*> clist;
+        std::unordered_set<Constraint*> kept;  // clist, as a set
+        std::vector<Constraint*> retired;      // of kept, compacted out of clist meanwhile
+        VEC_pD plist;
+        bool hasUnknowns;
+
+        int dofs;
+        std::set<Constraint*> redundant;
+        VEC_I conflictingTags, chosenConflictingTags, redundantTags, partiallyRedundantTags;
+        VEC_pD pDependentParameters;
+        std::vector<VEC_pD> pDependentParametersGroups;
+        bool hasDiagnosis, hasDofs, hasDependentParameters, emptyDiagnoseMatrix;
+
+        // the incremental diagnosis at the beginning, how far it had got, and the object itself
+        // once it is dropped
+        IncrementalDiagnosis* incremental;
+        std::unique_ptr<IncrementalDiagnosis> droppedIncremental;
+        std::size_t incrementalConstraintsNum = 0, incrementalValuesNum = 0;
+        std::size_t incrementalSatisfiedNum = 0, incrementalBasisNum = 0;
+        int incrementalRank = 0;
+        double incrementalMaxPivot = 0.0, incrementalMinPivot = 0.0;
+        std::unordered_map<int, IncrementalDiagnosis::TagRows> incrementalAddedTags;
+        std::unordered_set<Constraint*> incrementalConflicting;
+
+        DisjointSets pComponents;
+        std::size_t pComponentsAddedFrom;
+        VEC_I pComponentsDirty;
+        bool pComponentsValid, pComponentsReduced;
+
+        // the solving plan, moved here by setPlanAside() before it is first replaced
+        bool isInit;
+        bool planKept = false;
+        std::vector<SubSystem*> subSystems, subSystemsAux;
+        std::vector<std::vector<Cluster>> clusters;
+        std::vector<ComponentState> componentStates;
+        std::vector<VEC_pD> plists;
+        std::vector<std::vector<Constraint*>> clists;
+        std::vector<MAP_pD_pD> reductionmaps;
+        std::vector<Constraint*> constantConstraints;
+        AdjacencyCSR c2p;
+    };
+    std::unique_ptr<Transaction> transaction;
+    void setPlanAside();  // moves the solving plan into the transaction, the first time
+    void endTransaction();  // destroys what the transaction set aside
+
+    // the bytes of a constraint, the size createConstraint allocated for it included
+    static std::size_t constraintMemoryUsage(const Constraint* constr);
+    // adds the bytes of a solving plan to subsystems, and those of its adjacency to adjacency
+    static void planMemoryUsage(
+        const std::vector<SubSystem*>& subSystems,
+        const std::vector<SubSystem*>& subSystemsAux,
+        const std::vector<std::vector<Cluster>>& clusters,
+        const std::vector<ComponentState>& componentStates,
+        const std::vector<VEC_pD>& plists,
+        const std::vector<std::vector<Constraint*>>& clists,
+        const std::vector<MAP_pD_pD>& reductionmaps,
+        const std::vector<Constraint*>& constantConstraints,
+        std::size_t& subsystems,
+        std::size_t& adjacency
+    );
+    static std::size_t diagnosisBlockMemoryUsage(const DiagnosisBlock& block);
+    static std::size_t incrementalDiagnosisMemoryUsage(const IncrementalDiagnosis& incremental);
 public:
     int maxIter;
     int maxIterRedundant;
@@ -241,6 +532,13 @@ public:
     QRAlgorithm qrAlgorithm;
     bool autoChooseAlgorithm;
     int autoQRThreshold;
+    int lbfgsHistory;  // correction pairs kept by the L-BFGS solver
+    int clusterSizeLimit;  // most unknowns of a cluster solved on its own, 0 solves whole
+    bool splitDiagnosis;  // diagnose the connected blocks of the Jacobian apart, or as a whole
+    bool constructivePlacement;  // place simple clusters in closed form before solving them
+    int solveIterations;  // iterations of the numerical solvers in the last solve()
+    int solvePlacements;  // clusters placed in closed form in the last solve()
+    int solveSkipped;  // components left as they were by the last solve(), nothing changed
     DogLegGaussStep dogLegGaussStep;
     double qrpivotThreshold;
     DebugMode debugMode;
@@ -264,8 +562,8 @@ public:
 
     void clear();
     void clearByTag(int tagId);
+    void clearByTags(const VEC_I& tagIds);
 
-    int addConstraint(Constraint* constr);
     void removeConstraint(Constraint* constr);
 
     // basic constraints
@@ -579,6 +877,19 @@ public:
     // Effectively, it calculates the error of a UI constraint
     double calculateConstraintErrorByTag(int tagId);
 
+    // Calculates the error of every tag in one pass, as calculateConstraintErrorByTag would,
+    // with the tags in ascending order. If driving is given, only the constraints whose
+    // driving flag matches it are evaluated, and tags left without constraints are skipped.
+    void calculateConstraintErrors(VEC_I& tagIds, VEC_D& errors, std::optional<bool> driving);
+
+    // Derivatives of the unknowns (rows, in plist order) with respect to params (columns), which
+    // are not unknowns, at the current solution: -J_x^+ J_p from differentiating the driving
+    // constraints, the change that moves the unknowns least where they are not determined.
+    void calculateSensitivities(const VEC_pD& params, Eigen::MatrixXd& sensitivities);
+
+    // All constraints, in the order they were added
+    const std::vector<Constraint*>& getConstraints();
+
     void rescaleConstraint(int id, double coeff);
 
     void declareUnknowns(VEC_pD& params);
@@ -608,10 +919,18 @@ public:
     }
 
     int diagnose(Algorithm alg = DogLeg);
+    // Counts the dofs from the rank of the Jacobian only. Conflicting and redundant constraints
+    // are not identified, unless the system may be over-constrained, in which case the dofs
+    // depend on them and a full diagnose() is run.
+    int diagnoseDofs(Algorithm alg = DogLeg);
     int dofsNumber() const
     {
-        return hasDiagnosis ? dofs : -1;
+        return hasDofs ? dofs : -1;
     }
+    // The status of the constraints of a tag, or nothing for an unknown tag. Constraints added
+    // after a diagnosis without dependent constraints are checked against it, in time quadratic
+    // in the number of unknowns rather than cubic, as long as the geometry did not move.
+    std::optional<ConstraintStatus> getConstraintStatus(int tagId, Algorithm alg = DogLeg);
     void getConflicting(VEC_I& conflictingOut) const
     {
         conflictingOut = hasDiagnosis ? conflictingTags : VEC_I(0);
@@ -624,12 +943,18 @@ public:
     {
         partiallyredundantOut = hasDiagnosis ? partiallyRedundantTags : VEC_I(0);
     }
-    void getDependentParams(VEC_pD& pdependentparameterlist) const
+    void getDependentParams(VEC_pD& pdependentparameterlist)
     {
+        if (!hasDependentParameters) {
+            diagnoseDependentParameters();
+        }
         pdependentparameterlist = pDependentParameters;
     }
-    void getDependentParamsGroups(std::vector<std::vector<double*>>& pdependentparametergroups) const
+    void getDependentParamsGroups(std::vector<VEC_pD>& pdependentparametergroups)
     {
+        if (!hasDependentParameters) {
+            diagnoseDependentParameters();
+        }
         pdependentparametergroups = pDependentParametersGroups;
     }
     bool isEmptyDiagnoseMatrix() const
@@ -652,16 +977,66 @@ public:
 
     void invalidatedDiagnosis();
 
+    // The outcome of the last diagnosis, with constraints as indices in the constraint list and
+    // parameters as indices in the unknowns, so that it can be stored and handed to a system of
+    // the same structure, which then skips its own diagnosis.
+    struct DiagnosisRecord
+    {
+        int dofs = 0;
+        bool emptyDiagnoseMatrix = true;
+        VEC_I redundant;  // indices of the redundant constraints
+        VEC_I conflictingTags, chosenConflictingTags, redundantTags, partiallyRedundantTags;
+        bool hasDependentParameters = false;
+        VEC_I dependentParameters;
+        std::vector<VEC_I> dependentParametersGroups;
+    };
+    // false if there is no diagnosis to record
+    bool recordDiagnosis(DiagnosisRecord& record);
+    // false, leaving the system as it was, if the record refers to constraints, tags or unknowns
+    // the system does not have
+    bool restoreDiagnosis(const DiagnosisRecord& record);
+
+    // Tentative changes. rollbackTransaction() brings the constraints and the unknowns back to
+    // how they were at beginTransaction(), along with the diagnosis, the partition and the
+    // solving plan worked out for them then, which are not worked out again. commitTransaction()
+    // keeps the changes. Parameter values are left to the caller. Transactions do not nest, and
+    // clear() commits an open one.
+    void beginTransaction();
+    void commitTransaction();
+    void rollbackTransaction();
+    bool inTransaction() const
+    {
+        return transaction != nullptr;
+    }
+
+    // Estimated bytes held by the system, by what they are for. Containers are counted as
+    // libstdc++ lays them out (see heapBytes), and constraints by what createConstraint
+    // allocated for them, which leaves out the slack of the pools they are allocated from.
+    struct MemoryUsage
+    {
+        std::size_t unknowns = 0;     // plist and its index, the driven parameters, the reference
+        std::size_t constraints = 0;  // the constraints, what they hold, clist and the tag index
+        std::size_t adjacency = 0;    // c2p, p2c of the subsystems, the partition into components
+        std::size_t subsystems = 0;   // the subsystems and the rest of the solving plan
+        std::size_t diagnosis = 0;    // the results and decompositions kept from the diagnosis
+        std::size_t transaction = 0;  // what an open transaction set aside
+    };
+    void memoryUsage(MemoryUsage& usage) const;
+
+    // Points the constraints at the new locations of parameters the caller moved, for instance
+    // to compact its storage. Everything worked out from the old locations is dropped, and the
+    // unknowns have to be declared again.
+    void remapParams(const MAP_pD_pD& locations);
+
     // Unit testing interface - not intended for use by production code
 protected:
     size_t _getNumberOfConstraints(int tagID = -1)
     {
         if (tagID < 0) {
-            return clist.size();
+            return clist.size() - clistRemoved.size();
         }
-        return std::count_if(clist.begin(), clist.end(), [tagID](Constraint* constraint) {
-            return constraint->getTag() == tagID;
-        });
+        auto it = tagIndex.find(tagID);
+        return it == tagIndex.end() ? 0 : it->second.size();
     }
 };
 
@@ -172,6 +172,11 @@ Line* Line::Copy()
     return new Line(*this);
 }
 
+std::size_t Line::memoryUsage() const
+{
+    return sizeof(*this);
+}
+
 
 //---------------circle
 
@@ -224,6 +229,11 @@ Circle* Circle::Copy()
     return new Circle(*this);
 }
 
+std::size_t Circle::memoryUsage() const
+{
+    return sizeof(*this);
+}
+
 //------------arc
 int Arc::PushOwnParams(VEC_pD& pvec)
 {
@@ -264,6 +274,11 @@ Arc* Arc::Copy()
     return new Arc(*this);
 }
 
+std::size_t Arc::memoryUsage() const
+{
+    return sizeof(*this);
+}
+
 
 //--------------ellipse
 
@@ -389,6 +404,11 @@ Ellipse* Ellipse::Copy()
     return new Ellipse(*this);
 }
 
+std::size_t Ellipse::memoryUsage() const
+{
+    return sizeof(*this);
+}
+
 
 //---------------arc of ellipse
 int ArcOfEllipse::PushOwnParams(VEC_pD& pvec)
@@ -430,6 +450,11 @@ ArcOfEllipse* ArcOfEllipse::Copy()
     return new ArcOfEllipse(*this);
 }
 
+std::size_t ArcOfEllipse::memoryUsage() const
+{
+    return sizeof(*this);
+}
+
 //---------------hyperbola
 
 // this function is exposed to allow reusing pre-filled derivectors in constraints code
@@ -553,6 +578,11 @@ Hyperbola* Hyperbola::Copy()
     return new Hyperbola(*this);
 }
 
+std::size_t Hyperbola::memoryUsage() const
+{
+    return sizeof(*this);
+}
+
 //--------------- arc of hyperbola
 int ArcOfHyperbola::PushOwnParams(VEC_pD& pvec)
 {
@@ -593,6 +623,11 @@ ArcOfHyperbola* ArcOfHyperbola::Copy()
     return new ArcOfHyperbola(*this);
 }
 
+std::size_t ArcOfHyperbola::memoryUsage() const
+{
+    return sizeof(*this);
+}
+
 //---------------parabola
 
 DeriVector2 Parabola::CalculateNormal(const Point& p, const double* derivparam) const
@@ -671,6 +706,11 @@ Parabola* Parabola::Copy()
     return new Parabola(*this);
 }
 
+std::size_t Parabola::memoryUsage() const
+{
+    return sizeof(*this);
+}
+
 //--------------- arc of hyperbola
 int ArcOfParabola::PushOwnParams(VEC_pD& pvec)
 {
@@ -711,6 +751,11 @@ ArcOfParabola* ArcOfParabola::Copy()
     return new ArcOfParabola(*this);
 }
 
+std::size_t ArcOfParabola::memoryUsage() const
+{
+    return sizeof(*this);
+}
+
 // bspline
 DeriVector2 BSpline::CalculateNormal(const Point& p, const double* derivparam) const
 {
@@ -1060,6 +1105,12 @@ BSpline* BSpline::Copy()
     return new BSpline(*this);
 }
 
+std::size_t BSpline::memoryUsage() const
+{
+    return sizeof(*this) + heapBytes(poles) + heapBytes(weights) + heapBytes(knots)
+        + heapBytes(mult) + heapBytes(knotpointGeoids) + heapBytes(flattenedknots);
+}
+
 double BSpline::getLinCombFactor(double x, size_t k, size_t i, unsigned int p)
 {
     // Adapted to C++ from the python implementation in the Wikipedia page for de Boor algorithm
@@ -200,6 +200,8 @@ public:
     // DeepSOIC: I haven't found a way to simply copy a curve object provided pointer to a curve
     // object.
     virtual Curve* Copy() = 0;
+    // bytes of the curve object and of what it holds on the heap
+    virtual std::size_t memoryUsage() const = 0;
 };
 
 class SketcherExport Line: public Curve
@@ -212,6 +214,7 @@ public:
     int PushOwnParams(VEC_pD& pvec) override;
     void ReconstructOnNewPvec(VEC_pD& pvec, int& cnt) override;
     Line* Copy() override;
+    std::size_t memoryUsage() const override;
 };
 
 class SketcherExport Circle: public Curve
@@ -224,6 +227,7 @@ public:
     int PushOwnParams(VEC_pD& pvec) override;
     void ReconstructOnNewPvec(VEC_pD& pvec, int& cnt) override;
     Circle* Copy() override;
+    std::size_t memoryUsage() const override;
 };
 
 class SketcherExport Arc: public Circle
@@ -239,6 +243,7 @@ public:
     int PushOwnParams(VEC_pD& pvec) override;
     void ReconstructOnNewPvec(VEC_pD& pvec, int& cnt) override;
     Arc* Copy() override;
+    std::size_t memoryUsage() const override;
 };
 
 class SketcherExport MajorRadiusConic: public Curve
@@ -277,6 +282,7 @@ public:
     int PushOwnParams(VEC_pD& pvec) override;
     void ReconstructOnNewPvec(VEC_pD& pvec, int& cnt) override;
     Ellipse* Copy() override;
+    std::size_t memoryUsage() const override;
 };
 
 class SketcherExport ArcOfEllipse: public Ellipse
@@ -293,6 +299,7 @@ public:
     int PushOwnParams(VEC_pD& pvec) override;
     void ReconstructOnNewPvec(VEC_pD& pvec, int& cnt) override;
     ArcOfEllipse* Copy() override;
+    std::size_t memoryUsage() const override;
 };
 
 class SketcherExport Hyperbola: public MajorRadiusConic
@@ -315,6 +322,7 @@ public:
     int PushOwnParams(VEC_pD& pvec) override;
     void ReconstructOnNewPvec(VEC_pD& pvec, int& cnt) override;
     Hyperbola* Copy() override;
+    std::size_t memoryUsage() const override;
 };
 
 class SketcherExport ArcOfHyperbola: public Hyperbola
@@ -329,6 +337,7 @@ public:
     int PushOwnParams(VEC_pD& pvec) override;
     void ReconstructOnNewPvec(VEC_pD& pvec, int& cnt) override;
     ArcOfHyperbola* Copy() override;
+    std::size_t memoryUsage() const override;
 };
 
 class SketcherExport Parabola: public Curve
@@ -341,6 +350,7 @@ public:
     int PushOwnParams(VEC_pD& pvec) override;
     void ReconstructOnNewPvec(VEC_pD& pvec, int& cnt) override;
     Parabola* Copy() override;
+    std::size_t memoryUsage() const override;
 };
 
 class SketcherExport ArcOfParabola: public Parabola
@@ -355,6 +365,7 @@ public:
     int PushOwnParams(VEC_pD& pvec) override;
     void ReconstructOnNewPvec(VEC_pD& pvec, int& cnt) override;
     ArcOfParabola* Copy() override;
+    std::size_t memoryUsage() const override;
 };
 
 class SketcherExport BSpline: public Curve
@@ -394,6 +405,7 @@ public:
     int PushOwnParams(VEC_pD& pvec) override;
     void ReconstructOnNewPvec(VEC_pD& pvec, int& cnt) override;
     BSpline* Copy() override;
+    std::size_t memoryUsage() const override;
     /// finds the value B_i(x) such that spline(x) = sum(poles[i] * B_i(x))
     /// x is the point at which combination is needed
     /// k is the range in `flattenedknots` that contains x
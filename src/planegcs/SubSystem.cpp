@@ -26,6 +26,8 @@
 # pragma warning(disable : 4251)
 #endif
 
+#include <algorithm>
+#include <functional>
 #include <iostream>
 #include <iterator>
 
@@ -73,12 +75,17 @@ void SubSystem::initialize(VEC_pD& params, MAP_pD_pD& reductionmap)
 
     plist.clear();
     MAP_pD_I rindex;
+    MAP_pD_pD cindex;  // parameters substituted by a constant, i.e. a parameter not in params
     if (!reductionmap.empty()) {
         int i = 0;
         MAP_pD_I pindex;
+        SET_pD s1(params.begin(), params.end());
         for (VEC_pD::const_iterator itt = tmpplist.begin(); itt != tmpplist.end(); ++itt) {
             MAP_pD_pD::const_iterator itr = reductionmap.find(*itt);
-            if (itr != reductionmap.end()) {
+            if (itr != reductionmap.end() && s1.count(itr->second) == 0) {
+                cindex[itr->first] = itr->second;
+            }
+            else if (itr != reductionmap.end()) {
                 MAP_pD_I::const_iterator itp = pindex.find(itr->second);
                 if (itp == pindex.end()) {  // the reduction target is not in plist yet, so add it now
                     plist.push_back(itr->second);
@@ -111,34 +118,43 @@ void SubSystem::initialize(VEC_pD& params, MAP_pD_pD& reductionmap)
     for (MAP_pD_I::const_iterator itr = rindex.begin(); itr != rindex.end(); ++itr) {
         pmap[itr->first] = &pvals[itr->second];
     }
+    // constants are redirected to as well, but they are not variables of the subsystem
+    pmap.insert(cindex.begin(), cindex.end());
 
-    c2p.clear();
-    p2c.clear();
+    AdjacencyCSR c2p;  // constraint to parameter adjacency, transposed into p2c below
     for (std::vector<Constraint*>::iterator constr = clist.begin(); constr != clist.end(); ++constr) {
         (*constr)->revertParams();  // ensure that the constraint points to the original parameters
-        VEC_pD constr_params_orig = (*constr)->params();
-        SET_pD constr_params;
-        for (VEC_pD::const_iterator p = constr_params_orig.begin(); p != constr_params_orig.end();
-             ++p) {
-            MAP_pD_pD::const_iterator pmapfind = pmap.find(*p);
-            if (pmapfind != pmap.end()) {
-                constr_params.insert(pmapfind->second);
+        SET_I constr_params;
+        for (double* p : (*constr)->origParams()) {
+            MAP_pD_pD::const_iterator pmapfind = pmap.find(p);
+            if (pmapfind != pmap.end() && varIndex(pmapfind->second) >= 0) {
+                constr_params.insert(varIndex(pmapfind->second));
             }
         }
-        for (SET_pD::const_iterator p = constr_params.begin(); p != constr_params.end(); ++p) {
-            //            jacobi.set(*constr, *p, 0.);
-            c2p[*constr].push_back(*p);
-            p2c[*p].push_back(*constr);
-        }
-        //        (*constr)->redirectParams(pmap); // redirect parameters to pvec
+        c2p.index.insert(c2p.index.end(), constr_params.begin(), constr_params.end());
+        c2p.endRow();
     }
+    p2c.transpose(c2p, psize);
+    residual.resize(csize);
+    stepdir.resize(psize);
+}
+
+int SubSystem::varIndex(const double* param) const
+{
+    std::less<const double*> less;
+    if (less(param, pvals.data()) || !less(param, pvals.data() + psize)) {
+        return -1;
+    }
+    return static_cast<int>(param - pvals.data());
 }
 
 void SubSystem::redirectParams()
 {
     // copying values to pvals
     for (MAP_pD_pD::const_iterator p = pmap.begin(); p != pmap.end(); ++p) {
-        *(p->second) = *(p->first);
+        if (varIndex(p->second) >= 0) {
+            *(p->second) = *(p->first);
+        }
     }
 
     // redirect constraints to point to pvals
@@ -165,16 +181,30 @@ void SubSystem::getParamList(VEC_pD& plistOut)
     plistOut = plist;
 }
 
+void SubSystem::getParamIndices(const VEC_pD& params, VEC_I& indices)
+{
+    indices.resize(params.size());
+    for (int j = 0; j < int(params.size()); j++) {
+        MAP_pD_pD::const_iterator pmapfind = pmap.find(params[j]);
+        indices[j] = pmapfind != pmap.end() ? varIndex(pmapfind->second) : -1;
+    }
+}
+
 void SubSystem::getParams(VEC_pD& params, Eigen::VectorXd& xOut)
 {
-    if (xOut.size() != int(params.size())) {
-        xOut.setZero(params.size());
+    getParamIndices(params, pindices);
+    getParams(pindices, xOut);
+}
+
+void SubSystem::getParams(const VEC_I& indices, Eigen::VectorXd& xOut)
+{
+    if (xOut.size() != int(indices.size())) {
+        xOut.setZero(indices.size());
     }
 
-    for (int j = 0; j < int(params.size()); j++) {
-        MAP_pD_pD::const_iterator pmapfind = pmap.find(params[j]);
-        if (pmapfind != pmap.end()) {
-            xOut[j] = *(pmapfind->second);
+    for (int j = 0; j < int(indices.size()); j++) {
+        if (indices[j] >= 0) {
+            xOut[j] = pvals[indices[j]];
         }
     }
 }
@@ -192,11 +222,16 @@ void SubSystem::getParams(Eigen::VectorXd& xOut)
 
 void SubSystem::setParams(VEC_pD& params, Eigen::VectorXd& xIn)
 {
-    assert(xIn.size() == int(params.size()));
-    for (int j = 0; j < int(params.size()); j++) {
-        MAP_pD_pD::const_iterator pmapfind = pmap.find(params[j]);
-        if (pmapfind != pmap.end()) {
-            *(pmapfind->second) = xIn[j];
+    getParamIndices(params, pindices);
+    setParams(pindices, xIn);
+}
+
+void SubSystem::setParams(const VEC_I& indices, Eigen::VectorXd& xIn)
+{
+    assert(xIn.size() == int(indices.size()));
+    for (int j = 0; j < int(indices.size()); j++) {
+        if (indices[j] >= 0) {
+            pvals[indices[j]] = xIn[j];
         }
     }
 }
@@ -214,6 +249,29 @@ void SubSystem::getConstraintList(std::vector<Constraint*>& clist_)
     clist_ = clist;
 }
 
+void SubSystem::memoryUsage(std::size_t& bytes, std::size_t& adjacencyBytes) const
+{
+    adjacencyBytes = heapBytes(p2c);
+    bytes = sizeof(SubSystem) + heapBytes(clist) + heapBytes(plist) + heapBytes(pmap)
+        + heapBytes(pvals) + adjacencyBytes + heapBytes(residual) + heapBytes(stepdir)
+        + heapBytes(pindices);
+    for (const Eigen::VectorXd* v :
+         {&ws.x, &ws.x_new, &ws.xdir, &ws.grad, &ws.h, &ws.y, &ws.Dy, &ws.r, &ws.fx, &ws.fx_new,
+          &ws.g, &ws.h_sd, &ws.h_gn, &ws.h_dl, &ws.b, &ws.diag_A, &ws.x0, &ws.xls}) {
+        bytes += heapBytes(*v);
+    }
+    for (const Eigen::MatrixXd* m : {&ws.Jx, &ws.Jx_new, &ws.A, &ws.D}) {
+        bytes += heapBytes(*m);
+    }
+    // the LU factors with their row and column permutations and transpositions, the LDLT factor
+    // with its transpositions and a scratch vector
+    bytes += ws.lu.rows() * ws.lu.cols() * sizeof(double)
+        + 2 * (ws.lu.rows() + ws.lu.cols()) * sizeof(int);
+    bytes += ws.ldlt.rows() * (ws.ldlt.cols() * sizeof(double) + sizeof(int) + sizeof(double));
+    bytes += heapBytes(ws.lbfgsS) + heapBytes(ws.lbfgsY) + heapBytes(ws.lbfgsRho)
+        + heapBytes(ws.lbfgsAlpha);
+}
+
 double SubSystem::error()
 {
     double err = 0.;
@@ -253,57 +311,95 @@ void SubSystem::calcResidual(Eigen::VectorXd& r, double& err)
 
 void SubSystem::calcJacobi(VEC_pD& params, Eigen::MatrixXd& jacobi)
 {
-    jacobi.setZero(csize, params.size());
-    for (int j = 0; j < int(params.size()); j++) {
-        MAP_pD_pD::const_iterator pmapfind = pmap.find(params[j]);
-        if (pmapfind != pmap.end()) {
-            for (int i = 0; i < csize; i++) {
-                jacobi(i, j) = clist[i]->grad(pmapfind->second);
-            }
+    getParamIndices(params, pindices);
+    calcJacobi(pindices, jacobi);
+}
+
+void SubSystem::calcJacobi(const VEC_I& indices, Eigen::MatrixXd& jacobi)
+{
+    // only the structurally nonzero entries given by p2c are evaluated
+    jacobi.setZero(csize, indices.size());
+    for (int j = 0; j < int(indices.size()); j++) {
+        int k = indices[j];
+        if (k < 0) {
+            continue;
+        }
+        for (const int* i = p2c.begin(k); i != p2c.end(k); ++i) {
+            jacobi(*i, j) = clist[*i]->grad(&pvals[k]);
         }
     }
 }
 
 void SubSystem::calcJacobi(Eigen::MatrixXd& jacobi)
 {
-    calcJacobi(plist, jacobi);
+    jacobi.setZero(csize, psize);
+    for (int k = 0; k < psize; k++) {
+        for (const int* i = p2c.begin(k); i != p2c.end(k); ++i) {
+            jacobi(*i, k) = clist[*i]->grad(&pvals[k]);
+        }
+    }
 }
 
 void SubSystem::calcGrad(VEC_pD& params, Eigen::VectorXd& grad)
 {
-    assert(grad.size() == int(params.size()));
+    getParamIndices(params, pindices);
+    calcGrad(pindices, grad);
+}
+
+void SubSystem::calcGrad(const VEC_I& indices, Eigen::VectorXd& grad)
+{
+    assert(grad.size() == int(indices.size()));
+
+    for (int i = 0; i < csize; i++) {
+        residual[i] = clist[i]->error();
+    }
 
     grad.setZero();
-    for (int j = 0; j < int(params.size()); j++) {
-        MAP_pD_pD::const_iterator pmapfind = pmap.find(params[j]);
-        if (pmapfind != pmap.end()) {
-            std::vector<Constraint*> constrs = p2c[pmapfind->second];
-            for (std::vector<Constraint*>::const_iterator constr = constrs.begin();
-                 constr != constrs.end();
-                 ++constr) {
-                grad[j] += (*constr)->error() * (*constr)->grad(pmapfind->second);
-            }
+    for (int j = 0; j < int(indices.size()); j++) {
+        int k = indices[j];
+        if (k < 0) {
+            continue;
+        }
+        for (const int* i = p2c.begin(k); i != p2c.end(k); ++i) {
+            grad[j] += residual[*i] * clist[*i]->grad(&pvals[k]);
         }
     }
 }
 
 void SubSystem::calcGrad(Eigen::VectorXd& grad)
 {
-    calcGrad(plist, grad);
+    assert(grad.size() == psize);
+
+    for (int i = 0; i < csize; i++) {
+        residual[i] = clist[i]->error();
+    }
+
+    grad.setZero();
+    for (int k = 0; k < psize; k++) {
+        for (const int* i = p2c.begin(k); i != p2c.end(k); ++i) {
+            grad[k] += residual[*i] * clist[*i]->grad(&pvals[k]);
+        }
+    }
 }
 
 double SubSystem::maxStep(VEC_pD& params, Eigen::VectorXd& xdir)
 {
-    assert(xdir.size() == int(params.size()));
+    getParamIndices(params, pindices);
+    return maxStep(pindices, xdir);
+}
 
-    MAP_pD_D dir;
-    for (int j = 0; j < int(params.size()); j++) {
-        MAP_pD_pD::const_iterator pmapfind = pmap.find(params[j]);
-        if (pmapfind != pmap.end()) {
-            dir[pmapfind->second] = xdir[j];
+double SubSystem::maxStep(const VEC_I& indices, Eigen::VectorXd& xdir)
+{
+    assert(xdir.size() == int(indices.size()));
+
+    std::fill(stepdir.begin(), stepdir.end(), 0.);
+    for (int j = 0; j < int(indices.size()); j++) {
+        if (indices[j] >= 0) {
+            stepdir[indices[j]] = xdir[j];
         }
     }
 
+    StepDirection dir(pvals.data(), stepdir.data(), psize);
     double alpha = 1e10;
     for (std::vector<Constraint*>::iterator constr = clist.begin(); constr != clist.end(); ++constr) {
         alpha = (*constr)->maxStep(dir, alpha);
@@ -314,7 +410,15 @@ double SubSystem::maxStep(VEC_pD& params, Eigen::VectorXd& xdir)
 
 double SubSystem::maxStep(Eigen::VectorXd& xdir)
 {
-    return maxStep(plist, xdir);
+    assert(xdir.size() == psize);
+
+    StepDirection dir(pvals.data(), xdir.data(), psize);
+    double alpha = 1e10;
+    for (std::vector<Constraint*>::iterator constr = clist.begin(); constr != clist.end(); ++constr) {
+        alpha = (*constr)->maxStep(dir, alpha);
+    }
+
+    return alpha;
 }
 
 void SubSystem::applySolution()
@@ -29,6 +29,8 @@
 #undef max
 
 #include <Eigen/Core>
+#include <Eigen/Cholesky>
+#include <Eigen/LU>
 
 #include "Constraints.h"
 
@@ -36,18 +38,52 @@
 namespace GCS
 {
 
+// Heap bytes of a dense matrix or vector, and of a list of vectors, alongside those of Util.h
+template<typename S, int R, int C, int O, int MR, int MC>
+std::size_t heapBytes(const Eigen::Matrix<S, R, C, O, MR, MC>& m)
+{
+    return R == Eigen::Dynamic || C == Eigen::Dynamic ? m.size() * sizeof(S) : 0;
+}
+inline std::size_t heapBytes(const std::vector<Eigen::VectorXd>& v)
+{
+    std::size_t bytes = v.capacity() * sizeof(Eigen::VectorXd);
+    for (const Eigen::VectorXd& x : v) {
+        bytes += heapBytes(x);
+    }
+    return bytes;
+}
+
+// Scratch vectors and matrices of the iterative solvers. Every SubSystem owns one, so that
+// the iterations of a solve, and repeated solves of the same subsystem, reuse the storage
+// sized on first use instead of allocating it afresh.
+struct SolverWorkspace
+{
+    Eigen::VectorXd x, x_new, xdir, grad, h, y, Dy, r;
+    Eigen::VectorXd fx, fx_new, g, h_sd, h_gn, h_dl, b, diag_A;
+    Eigen::MatrixXd Jx, Jx_new, A, D;
+    Eigen::FullPivLU<Eigen::MatrixXd> lu;
+    Eigen::LDLT<Eigen::MatrixXd> ldlt;
+    Eigen::VectorXd x0, xls;  // used by lineSearch
+    std::vector<Eigen::VectorXd> lbfgsS, lbfgsY;  // L-BFGS correction pairs, oldest first
+    std::vector<double> lbfgsRho, lbfgsAlpha;
+};
+
 class SubSystem
 {
 private:
     int psize, csize;
     std::vector<Constraint*> clist;
     VEC_pD plist;    // pointers to the original parameters
-    MAP_pD_pD pmap;  // redirection map from the original parameters to pvals
+    MAP_pD_pD pmap;  // redirection map from the original parameters to pvals or constants
     VEC_D pvals;     // current variables vector (psize)
                      //        JacobianMatrix jacobi;  // jacobi matrix of the residuals
-    std::map<Constraint*, VEC_pD> c2p;                // constraint to parameter adjacency list
-    std::map<double*, std::vector<Constraint*>> p2c;  // parameter to constraint adjacency list
+    AdjacencyCSR p2c;  // parameter (index in pvals) to constraint (index in clist) adjacency
+    VEC_D residual;    // scratch residual used by calcGrad
+    VEC_D stepdir;     // scratch step direction used by maxStep
+    VEC_I pindices;    // scratch indices used by the VEC_pD overloads
+    SolverWorkspace ws;
     void initialize(VEC_pD& params, MAP_pD_pD& reductionmap);  // called by the constructors
+    int varIndex(const double* param) const;  // index in pvals, or -1 for other parameters
 public:
     SubSystem(std::vector<Constraint*>& clist_, VEC_pD& params);
     SubSystem(std::vector<Constraint*>& clist_, VEC_pD& params, MAP_pD_pD& reductionmap);
@@ -61,6 +97,10 @@ public:
     {
         return csize;
     };
+    SolverWorkspace& workspace()
+    {
+        return ws;
+    };
 
     void redirectParams();
     void revertParams();
@@ -68,22 +108,35 @@ public:
     void getParamMap(MAP_pD_pD& pmapOut);
     void getParamList(VEC_pD& plistOut);
 
+    // Resolves params to indices in the variables vector (-1 for parameters not in this
+    // subsystem). The overloads taking such indices avoid repeating the lookup on every call.
+    void getParamIndices(const VEC_pD& params, VEC_I& indices);
+
     void getParams(VEC_pD& params, Eigen::VectorXd& xOut);
+    void getParams(const VEC_I& indices, Eigen::VectorXd& xOut);
     void getParams(Eigen::VectorXd& xOut);
     void setParams(VEC_pD& params, Eigen::VectorXd& xIn);
+    void setParams(const VEC_I& indices, Eigen::VectorXd& xIn);
     void setParams(Eigen::VectorXd& xIn);
 
     void getConstraintList(std::vector<Constraint*>& clist_);
 
+    // Estimated bytes held by the subsystem, and of them, by its p2c adjacency. The constraints
+    // belong to the system.
+    void memoryUsage(std::size_t& bytes, std::size_t& adjacencyBytes) const;
+
     double error();
     void calcResidual(Eigen::VectorXd& r);
     void calcResidual(Eigen::VectorXd& r, double& err);
     void calcJacobi(VEC_pD& params, Eigen::MatrixXd& jacobi);
+    void calcJacobi(const VEC_I& indices, Eigen::MatrixXd& jacobi);
     void calcJacobi(Eigen::MatrixXd& jacobi);
     void calcGrad(VEC_pD& params, Eigen::VectorXd& grad);
+    void calcGrad(const VEC_I& indices, Eigen::VectorXd& grad);
     void calcGrad(Eigen::VectorXd& grad);
 
     double maxStep(VEC_pD& params, Eigen::VectorXd& xdir);
+    double maxStep(const VEC_I& indices, Eigen::VectorXd& xdir);
     double maxStep(Eigen::VectorXd& xdir);
 
     void applySolution();
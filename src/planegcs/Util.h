@@ -25,14 +25,21 @@
 #ifndef PLANEGCS_UTIL_H
 #define PLANEGCS_UTIL_H
 
+#include <cstddef>
 #include <map>
+#include <memory_resource>
 #include <set>
+#include <type_traits>
+#include <unordered_map>
+#include <unordered_set>
+#include <utility>
 #include <vector>
 
 
 namespace GCS
 {
-using VEC_pD = std::vector<double*>;
+// polymorphic, so that the constraints System allocates can keep theirs in its pool
+using VEC_pD = std::pmr::vector<double*>;
 using VEC_D = std::vector<double>;
 using VEC_I = std::vector<int>;
 using MAP_pD_pD = std::map<double*, double*>;
@@ -40,6 +47,182 @@ using MAP_pD_D = std::map<double*, double>;
 using MAP_pD_I = std::map<double*, int>;
 using SET_pD = std::set<double*>;
 using SET_I = std::set<int>;
+
+// Adjacency list in compressed sparse row form: the entries of row i are
+// index[start[i]], ..., index[start[i + 1] - 1]
+struct AdjacencyCSR
+{
+    VEC_I start {0};
+    VEC_I index;
+
+    void clear()
+    {
+        start.assign(1, 0);
+        index.clear();
+    }
+    int rows() const
+    {
+        return static_cast<int>(start.size()) - 1;
+    }
+    // closes the row whose entries were appended to index since the previous call
+    void endRow()
+    {
+        start.push_back(static_cast<int>(index.size()));
+    }
+    const int* begin(int row) const
+    {
+        return index.data() + start[row];
+    }
+    const int* end(int row) const
+    {
+        return index.data() + start[row + 1];
+    }
+    // fills this with the transpose of adj, which must have its entries in [0, cols)
+    void transpose(const AdjacencyCSR& adj, int cols)
+    {
+        start.assign(cols + 1, 0);
+        for (int j : adj.index) {
+            ++start[j + 1];
+        }
+        for (int j = 0; j < cols; ++j) {
+            start[j + 1] += start[j];
+        }
+        index.resize(adj.index.size());
+        VEC_I next(start.begin(), start.end() - 1);
+        for (int i = 0; i < adj.rows(); ++i) {
+            for (const int* j = adj.begin(i); j != adj.end(i); ++j) {
+                index[next[*j]++] = i;
+            }
+        }
+    }
+};
+
+// Disjoint-set forest over the integers [0, n), with path halving and union by size
+struct DisjointSets
+{
+    VEC_I parent;
+    VEC_I size;
+
+    void reset(int n)
+    {
+        parent.resize(n);
+        size.assign(n, 1);
+        for (int i = 0; i < n; ++i) {
+            parent[i] = i;
+        }
+    }
+    // adds singletons up to n
+    void grow(int n)
+    {
+        for (int i = static_cast<int>(parent.size()); i < n; ++i) {
+            parent.push_back(i);
+            size.push_back(1);
+        }
+    }
+    // makes i a singleton again; only valid once every member of its set has been isolated too
+    void isolate(int i)
+    {
+        parent[i] = i;
+        size[i] = 1;
+    }
+    int find(int i)
+    {
+        while (parent[i] != i) {
+            parent[i] = parent[parent[i]];
+            i = parent[i];
+        }
+        return i;
+    }
+    void unite(int i, int j)
+    {
+        i = find(i);
+        j = find(j);
+        if (i == j) {
+            return;
+        }
+        if (size[i] < size[j]) {
+            std::swap(i, j);
+        }
+        parent[j] = i;
+        size[i] += size[j];
+    }
+};
+
+// Estimated heap bytes of a container, with what its elements hold in turn, as libstdc++ lays
+// them out: a vector by its capacity, the tree and hash containers by a node per element, which
+// links it to the others, and their buckets. Other types are taken to hold nothing.
+template<typename T>
+std::size_t heapBytes(const T&)
+{
+    return 0;
+}
+template<typename K, typename V>
+std::size_t heapBytes(const std::pair<K, V>& p);
+template<typename T, typename A>
+std::size_t heapBytes(const std::vector<T, A>& v);
+template<typename K, typename C, typename A>
+std::size_t heapBytes(const std::set<K, C, A>& s);
+template<typename K, typename V, typename C, typename A>
+std::size_t heapBytes(const std::map<K, V, C, A>& m);
+template<typename K, typename H, typename E, typename A>
+std::size_t heapBytes(const std::unordered_set<K, H, E, A>& s);
+template<typename K, typename V, typename H, typename E, typename A>
+std::size_t heapBytes(const std::unordered_map<K, V, H, E, A>& m);
+
+constexpr std::size_t treeNodeLinks = 4 * sizeof(void*);  // color, parent, left and right
+constexpr std::size_t hashNodeLinks = sizeof(void*);      // next
+
+template<typename T>
+std::size_t elementsHeapBytes(const T& container)
+{
+    std::size_t bytes = 0;
+    if constexpr (!std::is_trivially_copyable_v<typename T::value_type>) {
+        for (const auto& element : container) {
+            bytes += heapBytes(element);
+        }
+    }
+    return bytes;
+}
+template<typename K, typename V>
+std::size_t heapBytes(const std::pair<K, V>& p)
+{
+    return heapBytes(p.first) + heapBytes(p.second);
+}
+template<typename T, typename A>
+std::size_t heapBytes(const std::vector<T, A>& v)
+{
+    return v.capacity() * sizeof(T) + elementsHeapBytes(v);
+}
+template<typename K, typename C, typename A>
+std::size_t heapBytes(const std::set<K, C, A>& s)
+{
+    return s.size() * (treeNodeLinks + sizeof(K)) + elementsHeapBytes(s);
+}
+template<typename K, typename V, typename C, typename A>
+std::size_t heapBytes(const std::map<K, V, C, A>& m)
+{
+    return m.size() * (treeNodeLinks + sizeof(std::pair<const K, V>)) + elementsHeapBytes(m);
+}
+template<typename K, typename H, typename E, typename A>
+std::size_t heapBytes(const std::unordered_set<K, H, E, A>& s)
+{
+    return s.bucket_count() * sizeof(void*) + s.size() * (hashNodeLinks + sizeof(K))
+        + elementsHeapBytes(s);
+}
+template<typename K, typename V, typename H, typename E, typename A>
+std::size_t heapBytes(const std::unordered_map<K, V, H, E, A>& m)
+{
+    return m.bucket_count() * sizeof(void*)
+        + m.size() * (hashNodeLinks + sizeof(std::pair<const K, V>)) + elementsHeapBytes(m);
+}
+inline std::size_t heapBytes(const AdjacencyCSR& adj)
+{
+    return heapBytes(adj.start) + heapBytes(adj.index);
+}
+inline std::size_t heapBytes(const DisjointSets& sets)
+{
+    return heapBytes(sets.parent) + heapBytes(sets.size);
+}
 }  // namespace GCS
 
 #endif  // PLANEGCS_UTIL_H
@@ -5,12 +5,25 @@
 #include "planegcs/Geo.h"
 #include "planegcs/Constraints.h"
 
+#include <algorithm>
+#include <array>
 #include <deque>
+#include <functional>
 #include <map>
+#include <optional>
+#include <set>
 #include <stdexcept>
+#include <string>
+#include <utility>
+#include <tuple>
 #include <vector>
 #include <variant>
+#include <bit>
 #include <cmath>
+#include <cstdint>
+#include <cstring>
+#include <unordered_map>
+#include <unordered_set>
 
 class SketchSolver {
 public:
@@ -20,7 +33,8 @@ public:
     // ── Parameter allocation ──────────────────────────────────────────
     // Every double* the GCS needs is allocated here for pointer stability.
     // fixed=false: geometry params (unknowns, adjusted by solver)
-    // fixed=true:  constraint value params (driving values, not adjusted)
+    // fixed=true:  constraint value params (driving values, not adjusted), and the params of
+    //              fixed geometry, which never become unknowns
     int add_param(double value, bool fixed = false) {
         int id = next_param_id_++;
         params_.push_back(value);
@@ -52,15 +66,16 @@ public:
     }
 
     // ── Geometry: Points ──────────────────────────────────────────────
-    int add_point(double x, double y) {
-        int px = add_param(x);
-        int py = add_param(y);
+    int add_point(double x, double y, bool fixed = false) {
+        int px = add_param(x, fixed);
+        int py = add_param(y, fixed);
         int id = next_geo_id_++;
         GCS::Point p;
         p.x = param_ptr(px);
         p.y = param_ptr(py);
         points_[id] = p;
         point_param_ids_[id] = {px, py};
+        parts_[id] = {{}, {px, py}};
         return id;
     }
 
@@ -69,6 +84,10 @@ public:
         return {*p.x, *p.y};
     }
 
+    std::pair<int, int> get_point_params(int id) const {
+        return point_param_ids_.at(id);
+    }
+
     // ── Geometry: Lines ──────────────────────────────────────────────
     int add_line(int p1_id, int p2_id) {
         int id = next_geo_id_++;
@@ -76,14 +95,17 @@ public:
         l.p1 = points_.at(p1_id);
         l.p2 = points_.at(p2_id);
         lines_[id] = l;
+        parts_[id];
         return id;
     }
 
     // Convenience: add_line with coordinates
-    int add_line(double x1, double y1, double x2, double y2) {
-        int p1 = add_point(x1, y1);
-        int p2 = add_point(x2, y2);
-        return add_line(p1, p2);
+    int add_line(double x1, double y1, double x2, double y2, bool fixed = false) {
+        int p1 = add_point(x1, y1, fixed);
+        int p2 = add_point(x2, y2, fixed);
+        int id = add_line(p1, p2);
+        parts_[id].points = {p1, p2};
+        return id;
     }
 
     // ── Geometry: Line accessors ────────────────────────────────────
@@ -98,14 +120,15 @@ public:
     }
 
     // ── Geometry: Circles ────────────────────────────────────────────
-    int add_circle(int center_id, double radius) {
-        int rad_id = add_param(radius);
+    int add_circle(int center_id, double radius, bool fixed = false) {
+        int rad_id = add_param(radius, fixed);
         int id = next_geo_id_++;
         GCS::Circle c;
         c.center = points_.at(center_id);
         c.rad = param_ptr(rad_id);
         circles_[id] = c;
         circle_rad_param_[id] = rad_id;
+        parts_[id] = {{}, {rad_id}};
         return id;
     }
 
@@ -120,15 +143,16 @@ public:
     }
 
     // ── Geometry: Arcs ──────────────────────────────────────────────
-    int add_arc_from_center(int center_id, double radius, double start_angle, double end_angle) {
-        int rad_id = add_param(radius);
-        int sa_id = add_param(start_angle);
-        int ea_id = add_param(end_angle);
+    int add_arc_from_center(int center_id, double radius, double start_angle, double end_angle,
+                            bool fixed = false) {
+        int rad_id = add_param(radius, fixed);
+        int sa_id = add_param(start_angle, fixed);
+        int ea_id = add_param(end_angle, fixed);
         // start/end points (computed by arc rules)
         double cx = *points_.at(center_id).x;
         double cy = *points_.at(center_id).y;
-        int sp = add_point(cx + radius * cos(start_angle), cy + radius * sin(start_angle));
-        int ep = add_point(cx + radius * cos(end_angle), cy + radius * sin(end_angle));
+        int sp = add_point(cx + radius * cos(start_angle), cy + radius * sin(start_angle), fixed);
+        int ep = add_point(cx + radius * cos(end_angle), cy + radius * sin(end_angle), fixed);
 
         int id = next_geo_id_++;
         GCS::Arc a;
@@ -139,6 +163,7 @@ public:
         a.start = points_.at(sp);
         a.end = points_.at(ep);
         arcs_[id] = a;
+        parts_[id] = {{sp, ep}, {rad_id, sa_id, ea_id}};
         return id;
     }
 
@@ -193,6 +218,7 @@ public:
         a.start = points_.at(sp);
         a.end = points_.at(ep);
         arcs_[id] = a;
+        parts_[id] = {{center, sp, ep}, {sa_id, ea_id}};
 
         // Add arc rules so start/end are computed from center+radius+angles
         arc_rules(id);
@@ -248,24 +274,25 @@ public:
     }
 
     // ── Geometry: Ellipses ───────────────────────────────────────────
-    int add_ellipse(int center_id, int focus1_id, double radmin) {
-        int rm_id = add_param(radmin);
+    int add_ellipse(int center_id, int focus1_id, double radmin, bool fixed = false) {
+        int rm_id = add_param(radmin, fixed);
         int id = next_geo_id_++;
         GCS::Ellipse e;
         e.center = points_.at(center_id);
         e.focus1 = points_.at(focus1_id);
         e.radmin = param_ptr(rm_id);
         ellipses_[id] = e;
+        parts_[id] = {{}, {rm_id}};
         return id;
     }
 
     // ── Geometry: ArcOfEllipse ───────────────────────────────────────
     int add_arc_of_ellipse(int center_id, int focus1_id, double radmin,
                            double start_angle, double end_angle,
-                           int start_id, int end_id) {
-        int rm_id = add_param(radmin);
-        int sa_id = add_param(start_angle);
-        int ea_id = add_param(end_angle);
+                           int start_id, int end_id, bool fixed = false) {
+        int rm_id = add_param(radmin, fixed);
+        int sa_id = add_param(start_angle, fixed);
+        int ea_id = add_param(end_angle, fixed);
         int id = next_geo_id_++;
         GCS::ArcOfEllipse ae;
         ae.center = points_.at(center_id);
@@ -276,28 +303,30 @@ public:
         ae.start = points_.at(start_id);
         ae.end = points_.at(end_id);
         arcs_of_ellipse_[id] = ae;
+        parts_[id] = {{}, {rm_id, sa_id, ea_id}};
         return id;
     }
 
     // ── Geometry: Hyperbola ──────────────────────────────────────────
-    int add_hyperbola(int center_id, int focus1_id, double radmin) {
-        int rm_id = add_param(radmin);
+    int add_hyperbola(int center_id, int focus1_id, double radmin, bool fixed = false) {
+        int rm_id = add_param(radmin, fixed);
         int id = next_geo_id_++;
         GCS::Hyperbola h;
         h.center = points_.at(center_id);
         h.focus1 = points_.at(focus1_id);
         h.radmin = param_ptr(rm_id);
         hyperbolas_[id] = h;
+        parts_[id] = {{}, {rm_id}};
         return id;
     }
 
     // ── Geometry: ArcOfHyperbola ─────────────────────────────────────
     int add_arc_of_hyperbola(int center_id, int focus1_id, double radmin,
                              double start_angle, double end_angle,
-                             int start_id, int end_id) {
-        int rm_id = add_param(radmin);
-        int sa_id = add_param(start_angle);
-        int ea_id = add_param(end_angle);
+                             int start_id, int end_id, bool fixed = false) {
+        int rm_id = add_param(radmin, fixed);
+        int sa_id = add_param(start_angle, fixed);
+        int ea_id = add_param(end_angle, fixed);
         int id = next_geo_id_++;
         GCS::ArcOfHyperbola ah;
         ah.center = points_.at(center_id);
@@ -308,6 +337,7 @@ public:
         ah.start = points_.at(start_id);
         ah.end = points_.at(end_id);
         arcs_of_hyperbola_[id] = ah;
+        parts_[id] = {{}, {rm_id, sa_id, ea_id}};
         return id;
     }
 
@@ -318,15 +348,16 @@ public:
         p.vertex = points_.at(vertex_id);
         p.focus1 = points_.at(focus1_id);
         parabolas_[id] = p;
+        parts_[id];
         return id;
     }
 
     // ── Geometry: ArcOfParabola ──────────────────────────────────────
     int add_arc_of_parabola(int vertex_id, int focus1_id,
                             double start_angle, double end_angle,
-                            int start_id, int end_id) {
-        int sa_id = add_param(start_angle);
-        int ea_id = add_param(end_angle);
+                            int start_id, int end_id, bool fixed = false) {
+        int sa_id = add_param(start_angle, fixed);
+        int ea_id = add_param(end_angle, fixed);
         int id = next_geo_id_++;
         GCS::ArcOfParabola ap;
         ap.vertex = points_.at(vertex_id);
@@ -336,28 +367,31 @@ public:
         ap.start = points_.at(start_id);
         ap.end = points_.at(end_id);
         arcs_of_parabola_[id] = ap;
+        parts_[id] = {{}, {sa_id, ea_id}};
         return id;
     }
 
     // ── Solving ─────────────────────────────────────────────────────
     void declare_unknowns() {
-        GCS::VEC_pD params;
+        unknowns_.clear();
         // Only non-fixed params are unknowns
         for (auto& [id, idx] : param_index_) {
             if (!is_param_fixed(id)) {
-                params.push_back(&params_[idx]);
+                unknowns_.push_back(&params_[idx]);
             }
         }
-        system_.declareUnknowns(params);
+        system_.declareUnknowns(unknowns_);
     }
 
     void init_solution(GCS::Algorithm alg = GCS::DogLeg) {
         system_.initSolution(alg);
     }
 
-    GCS::SolveStatus solve(GCS::Algorithm alg = GCS::DogLeg) {
+    // place=true places simple clusters in closed form before solving them
+    GCS::SolveStatus solve(GCS::Algorithm alg = GCS::DogLeg, bool place = false) {
         declare_unknowns();
         init_solution(alg);
+        system_.constructivePlacement = place;
         int status = system_.solve(true, alg);
         if (status == GCS::Success || status == GCS::Converged) {
             system_.applySolution();
@@ -369,6 +403,266 @@ public:
         system_.applySolution();
     }
 
+    // (iterations, placed, skipped) of the last solve: the iterations of the numerical solvers
+    // over all subsystems, the clusters placed in closed form before them, and the components
+    // left as they were because nothing changed in them since their last solve
+    std::tuple<int, int, int> solve_stats() const {
+        return {system_.solveIterations, system_.solvePlacements, system_.solveSkipped};
+    }
+
+    // Stores the current parameter values, which moved_geometry() compares with
+    void record_positions() {
+        recorded_.assign(params_.begin(), params_.end());
+    }
+
+    // Ids of the points, lines, circles, arcs and ellipses with a parameter that changed by more
+    // than tolerance since record_positions(), or that were added since
+    std::array<std::vector<int>, 5> moved_geometry(double tolerance = 0.0) {
+        std::unordered_set<const double*> moved;
+        for (std::size_t i = 0; i < params_.size(); i++) {
+            if (i >= recorded_.size() || std::abs(params_[i] - recorded_[i]) > tolerance) {
+                moved.insert(&params_[i]);
+            }
+        }
+        std::array<std::vector<int>, 5> result;
+        if (moved.empty()) {
+            return result;
+        }
+        GCS::VEC_pD pvec;
+        auto collect = [&](auto& geometries, std::vector<int>& ids) {
+            for (auto& [id, geometry] : geometries) {
+                pvec.clear();
+                geometry.PushOwnParams(pvec);
+                if (std::ranges::any_of(pvec, [&moved](double* p) { return moved.contains(p); })) {
+                    ids.push_back(id);
+                }
+            }
+        };
+        collect(points_, result[0]);
+        collect(lines_, result[1]);
+        collect(circles_, result[2]);
+        collect(arcs_, result[3]);
+        collect(ellipses_, result[4]);
+        return result;
+    }
+
+    // Hash of the structure of the sketch: the parameters and whether they are fixed, the kind
+    // and parameters of each geometry, and the type, tag, driving flag, parameters and built-in
+    // values (ratios, angle increments, ...) of each constraint. Parameter values other than
+    // those built into constraints are left out.
+    std::uint64_t structure_hash() {
+        std::uint64_t hash = 0;
+        auto mix = [&hash](std::uint64_t value) {  // boost::hash_combine, 64-bit
+            hash ^= value + 0x9e3779b97f4a7c15ULL + (hash << 12) + (hash >> 4);
+        };
+        std::unordered_map<const double*, int> param_ids;
+        param_ids.reserve(param_index_.size());
+        for (const auto& [id, idx] : param_index_) {
+            param_ids[&params_[idx]] = id;
+            mix(id);
+            mix(is_param_fixed(id));
+        }
+        GCS::VEC_pD pvec;
+        auto mix_params = [&](int kind, int id, auto& geometry) {
+            mix(kind);
+            mix(id);
+            pvec.clear();
+            geometry.PushOwnParams(pvec);
+            for (const double* param : pvec) {
+                mix(param_ids.at(param));
+            }
+        };
+        // PushOwnParams of the curves is not const
+        for (auto& [id, g] : points_) mix_params(0, id, g);
+        for (auto& [id, g] : lines_) mix_params(1, id, g);
+        for (auto& [id, g] : circles_) mix_params(2, id, g);
+        for (auto& [id, g] : arcs_) mix_params(3, id, g);
+        for (auto& [id, g] : ellipses_) mix_params(4, id, g);
+        for (auto& [id, g] : arcs_of_ellipse_) mix_params(5, id, g);
+        for (auto& [id, g] : hyperbolas_) mix_params(6, id, g);
+        for (auto& [id, g] : arcs_of_hyperbola_) mix_params(7, id, g);
+        for (auto& [id, g] : parabolas_) mix_params(8, id, g);
+        for (auto& [id, g] : arcs_of_parabola_) mix_params(9, id, g);
+
+        for (GCS::Constraint* constr : system_.getConstraints()) {
+            mix(constr->getTypeId());
+            mix(constr->getTag());
+            mix(constr->isDriving());
+            for (const double* param : constr->params()) {
+                auto it = param_ids.find(param);
+                mix(it == param_ids.end() ? -1 : it->second);
+            }
+            switch (constr->getTypeId()) {
+                case GCS::Equal:
+                    mix(std::bit_cast<std::uint64_t>(
+                        static_cast<GCS::ConstraintEqual*>(constr)->getRatio()));
+                    break;
+                case GCS::P2PAngle:
+                    mix(std::bit_cast<std::uint64_t>(
+                        static_cast<GCS::ConstraintP2PAngle*>(constr)->getIncrAngle()));
+                    break;
+                case GCS::TangentCircumf:
+                    mix(static_cast<GCS::ConstraintTangentCircumf*>(constr)->getInternal());
+                    break;
+                case GCS::InternalAlignmentPoint2Ellipse:
+                    mix(static_cast<GCS::ConstraintInternalAlignmentPoint2Ellipse*>(constr)
+                            ->getAlignmentType());
+                    break;
+                case GCS::InternalAlignmentPoint2Hyperbola:
+                    mix(static_cast<GCS::ConstraintInternalAlignmentPoint2Hyperbola*>(constr)
+                            ->getAlignmentType());
+                    break;
+                default:
+                    break;
+            }
+        }
+        return hash;
+    }
+
+    // Values of the parameters in id order: all of them, or only the fixed (true) or only the
+    // unknown (false) ones
+    std::vector<double> param_values(std::optional<bool> fixed = std::nullopt) const {
+        std::vector<double> values;
+        values.reserve(param_index_.size());
+        for (const auto& [id, idx] : param_index_) {
+            if (!fixed || is_param_fixed(id) == *fixed) {
+                values.push_back(params_[idx]);
+            }
+        }
+        return values;
+    }
+
+    // Sets the parameters in id order, as returned by param_values() with the same argument:
+    // all of them, or only the fixed (true) or only the unknown (false) ones
+    void set_param_values(const double* values, std::size_t count,
+                          std::optional<bool> fixed = std::nullopt) {
+        std::size_t expected = 0;
+        for (const auto& [id, idx] : param_index_) {
+            expected += !fixed || is_param_fixed(id) == *fixed;
+        }
+        if (count != expected) {
+            throw std::invalid_argument(
+                "expected " + std::to_string(expected) + " parameter values, got "
+                + std::to_string(count));
+        }
+        for (const auto& [id, idx] : param_index_) {
+            if (!fixed || is_param_fixed(id) == *fixed) {
+                params_[idx] = *values++;
+            }
+        }
+    }
+
+    // ── Plans ───────────────────────────────────────────────────────
+    // A plan is the diagnosis of the sketch as bytes, headed by the structure hash and the
+    // numbers of unknowns and constraints it was made for. Importing it into a sketch of the
+    // same structure lets the next solve skip the diagnosis. Integers are in native byte order.
+
+    std::string export_plan(GCS::Algorithm alg = GCS::DogLeg) {
+        declare_unknowns();
+        GCS::System::DiagnosisRecord record;
+        if (!system_.recordDiagnosis(record)) {
+            system_.diagnose(alg);
+            system_.recordDiagnosis(record);
+        }
+        std::string plan(plan_magic_, sizeof(plan_magic_));
+        auto put = [&plan](auto value) {
+            plan.append(reinterpret_cast<const char*>(&value), sizeof(value));
+        };
+        auto put_list = [&](const GCS::VEC_I& values) {
+            put(static_cast<std::int32_t>(values.size()));
+            for (int value : values) {
+                put(static_cast<std::int32_t>(value));
+            }
+        };
+        put(plan_version_);
+        put(structure_hash());
+        put(static_cast<std::int32_t>(unknowns_.size()));
+        put(static_cast<std::int32_t>(system_.getConstraints().size()));
+        put(static_cast<std::int32_t>(record.dofs));
+        put(static_cast<std::int32_t>(record.emptyDiagnoseMatrix)
+            | static_cast<std::int32_t>(record.hasDependentParameters) << 1);
+        put_list(record.redundant);
+        put_list(record.conflictingTags);
+        put_list(record.chosenConflictingTags);
+        put_list(record.redundantTags);
+        put_list(record.partiallyRedundantTags);
+        put_list(record.dependentParameters);
+        put(static_cast<std::int32_t>(record.dependentParametersGroups.size()));
+        for (const auto& group : record.dependentParametersGroups) {
+            put_list(group);
+        }
+        return plan;
+    }
+
+    void import_plan(const std::string& plan) {
+        std::size_t pos = 0;
+        auto get = [&]<typename T>(T& value) {
+            if (plan.size() - pos < sizeof(T)) {
+                throw std::invalid_argument("truncated plan");
+            }
+            std::memcpy(&value, plan.data() + pos, sizeof(T));
+            pos += sizeof(T);
+        };
+        auto get_int = [&]() {
+            std::int32_t value;
+            get(value);
+            return int(value);
+        };
+        auto get_list = [&](GCS::VEC_I& values) {
+            int size = get_int();
+            if (size < 0 || std::size_t(size) > (plan.size() - pos) / sizeof(std::int32_t)) {
+                throw std::invalid_argument("truncated plan");
+            }
+            values.resize(size);
+            for (int& value : values) {
+                value = get_int();
+            }
+        };
+        if (plan.compare(0, sizeof(plan_magic_), plan_magic_, sizeof(plan_magic_)) != 0) {
+            throw std::invalid_argument("not a planegcs plan");
+        }
+        pos = sizeof(plan_magic_);
+        std::uint32_t version;
+        get(version);
+        if (version != plan_version_) {
+            throw std::invalid_argument("unsupported plan version " + std::to_string(version));
+        }
+        std::uint64_t hash;
+        get(hash);
+        declare_unknowns();
+        int unknowns = get_int();
+        int constraints = get_int();
+        if (hash != structure_hash() || unknowns != int(unknowns_.size())
+            || constraints != int(system_.getConstraints().size())) {
+            throw std::invalid_argument("the plan was made for a sketch of another structure");
+        }
+        GCS::System::DiagnosisRecord record;
+        record.dofs = get_int();
+        int flags = get_int();
+        record.emptyDiagnoseMatrix = flags & 1;
+        record.hasDependentParameters = flags & 2;
+        get_list(record.redundant);
+        get_list(record.conflictingTags);
+        get_list(record.chosenConflictingTags);
+        get_list(record.redundantTags);
+        get_list(record.partiallyRedundantTags);
+        get_list(record.dependentParameters);
+        int groups = get_int();
+        if (groups < 0 || std::size_t(groups) > (plan.size() - pos) / sizeof(std::int32_t)) {
+            throw std::invalid_argument("truncated plan");
+        }
+        record.dependentParametersGroups.resize(groups);
+        for (auto& group : record.dependentParametersGroups) {
+            get_list(group);
+        }
+        if (pos != plan.size()) {
+            throw std::invalid_argument("trailing data after the plan");
+        }
+        if (!system_.restoreDiagnosis(record)) {
+            throw std::invalid_argument("the plan refers to constraints the sketch does not have");
+        }
+    }
+
     struct DiagnosisResult {
         int dof;                          // degrees of freedom (0 = fully constrained)
         std::vector<int> conflicting;     // tags of conflicting (over-constraining) constraints
@@ -376,17 +670,19 @@ public:
         std::vector<int> partially_redundant; // tags of partially redundant constraints
     };
 
-    int dof() {
+    // Only counts the dofs; see diagnose() for the conflicting and redundant constraints
+    int dof(GCS::Algorithm alg = GCS::DogLeg) {
         declare_unknowns();
-        init_solution();
-        system_.diagnose();
-        return system_.dofsNumber();
+        return system_.diagnoseDofs(alg);
     }
 
-    DiagnosisResult diagnose(GCS::Algorithm alg = GCS::DogLeg) {
+    // split=false decomposes the reduced Jacobian as a whole rather than block by block, as a
+    // reference for the block-wise diagnosis
+    DiagnosisResult diagnose(GCS::Algorithm alg = GCS::DogLeg, bool split = true) {
         declare_unknowns();
-        init_solution(alg);
+        system_.splitDiagnosis = split;
         system_.diagnose(alg);
+        system_.splitDiagnosis = true;
 
         DiagnosisResult result;
         result.dof = system_.dofsNumber();
@@ -404,7 +700,21 @@ public:
         return result;
     }
 
+    // Status of the constraints of a tag. Constraints added after a diagnosis without dependent
+    // constraints are checked without a new diagnosis, as long as the geometry did not move.
+    GCS::ConstraintStatus constraint_status(int tag, GCS::Algorithm alg = GCS::DogLeg) {
+        declare_unknowns();
+        auto status = system_.getConstraintStatus(tag, alg);
+        if (!status) {
+            throw std::out_of_range("unknown constraint tag " + std::to_string(tag));
+        }
+        return *status;
+    }
+
     void clear() {
+        if (system_.inTransaction()) {
+            throw std::logic_error("cannot clear the sketch during a transaction");
+        }
         system_.clear();
         params_.clear();
         param_index_.clear();
@@ -421,314 +731,375 @@ public:
         arcs_of_hyperbola_.clear();
         parabolas_.clear();
         arcs_of_parabola_.clear();
+        parts_.clear();
+        tag_deps_.clear();
         next_param_id_ = 0;
         next_geo_id_ = 0;
         next_constraint_tag_ = 1;
     }
 
+    // ── Transactions ────────────────────────────────────────────────
+    // rollback() takes the sketch back to begin_transaction(): the geometry, parameters and
+    // constraints added meanwhile go, the constraints removed come back, and every parameter
+    // gets its value back. What the system had worked out about the sketch then comes back too.
+
+    void begin_transaction() {
+        if (system_.inTransaction()) {
+            throw std::logic_error("a transaction is already open");
+        }
+        begun_.values.assign(params_.begin(), params_.end());
+        begun_.fixed = param_fixed_;
+        begun_.next_param_id = next_param_id_;
+        begun_.next_geo_id = next_geo_id_;
+        begun_.next_constraint_tag = next_constraint_tag_;
+        system_.beginTransaction();
+    }
+
+    void commit() {
+        require_transaction();
+        system_.commitTransaction();
+        begun_ = Begun();
+    }
+
+    void rollback() {
+        require_transaction();
+        system_.rollbackTransaction();
+        for (auto it = begun_.undo.rbegin(); it != begun_.undo.rend(); ++it) {
+            (*it)();
+        }
+        // ids only grow, so what was added meanwhile is at the end of each map
+        erase_from(points_, begun_.next_geo_id);
+        erase_from(point_param_ids_, begun_.next_geo_id);
+        erase_from(lines_, begun_.next_geo_id);
+        erase_from(circles_, begun_.next_geo_id);
+        erase_from(circle_rad_param_, begun_.next_geo_id);
+        erase_from(arcs_, begun_.next_geo_id);
+        erase_from(ellipses_, begun_.next_geo_id);
+        erase_from(arcs_of_ellipse_, begun_.next_geo_id);
+        erase_from(hyperbolas_, begun_.next_geo_id);
+        erase_from(arcs_of_hyperbola_, begun_.next_geo_id);
+        erase_from(parabolas_, begun_.next_geo_id);
+        erase_from(arcs_of_parabola_, begun_.next_geo_id);
+        erase_from(parts_, begun_.next_geo_id);
+        erase_from(tag_deps_, begun_.next_constraint_tag);
+        erase_from(param_index_, begun_.next_param_id);
+        params_.resize(begun_.values.size());
+        std::copy(begun_.values.begin(), begun_.values.end(), params_.begin());
+        param_fixed_ = std::move(begun_.fixed);
+        next_param_id_ = begun_.next_param_id;
+        next_geo_id_ = begun_.next_geo_id;
+        next_constraint_tag_ = begun_.next_constraint_tag;
+        begun_ = Begun();
+    }
+
+    bool in_transaction() const {
+        return system_.inTransaction();
+    }
+
     // ── Constraints ─────────────────────────────────────────────────
     // Each returns the tag assigned to this constraint.
 
     int coincident(int pt1_id, int pt2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintP2PCoincident(
-            points_.at(pt1_id), points_.at(pt2_id), tag, driving);
-        return tag;
+        return add_tagged({pt1_id, pt2_id}, {}, [&](int tag) {
+            system_.addConstraintP2PCoincident(
+                points_.at(pt1_id), points_.at(pt2_id), tag, driving);
+        });
     }
 
     int equal(int param1_id, int param2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintEqual(
-            param_ptr(param1_id), param_ptr(param2_id), tag, driving);
-        return tag;
+        return add_tagged({}, {param1_id, param2_id}, [&](int tag) {
+            system_.addConstraintEqual(
+                param_ptr(param1_id), param_ptr(param2_id), tag, driving);
+        });
     }
 
     int proportional(int param1_id, int param2_id, double ratio, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintProportional(
-            param_ptr(param1_id), param_ptr(param2_id), ratio, tag, driving);
-        return tag;
+        return add_tagged({}, {param1_id, param2_id}, [&](int tag) {
+            system_.addConstraintProportional(
+                param_ptr(param1_id), param_ptr(param2_id), ratio, tag, driving);
+        });
     }
 
     int difference(int param1_id, int param2_id, int diff_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintDifference(
-            param_ptr(param1_id), param_ptr(param2_id), param_ptr(diff_id), tag, driving);
-        return tag;
+        return add_tagged({}, {param1_id, param2_id, diff_id}, [&](int tag) {
+            system_.addConstraintDifference(
+                param_ptr(param1_id), param_ptr(param2_id), param_ptr(diff_id), tag, driving);
+        });
     }
 
     int p2p_distance(int pt1_id, int pt2_id, int distance_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintP2PDistance(
-            points_.at(pt1_id), points_.at(pt2_id), param_ptr(distance_id), tag, driving);
-        return tag;
+        return add_tagged({pt1_id, pt2_id}, {distance_id}, [&](int tag) {
+            system_.addConstraintP2PDistance(
+                points_.at(pt1_id), points_.at(pt2_id), param_ptr(distance_id), tag, driving);
+        });
     }
 
     int p2p_angle(int pt1_id, int pt2_id, int angle_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintP2PAngle(
-            points_.at(pt1_id), points_.at(pt2_id), param_ptr(angle_id), tag, driving);
-        return tag;
+        return add_tagged({pt1_id, pt2_id}, {angle_id}, [&](int tag) {
+            system_.addConstraintP2PAngle(
+                points_.at(pt1_id), points_.at(pt2_id), param_ptr(angle_id), tag, driving);
+        });
     }
 
     int p2p_angle_incr(int pt1_id, int pt2_id, int angle_id, double incr_angle, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintP2PAngle(
-            points_.at(pt1_id), points_.at(pt2_id), param_ptr(angle_id), incr_angle, tag, driving);
-        return tag;
+        return add_tagged({pt1_id, pt2_id}, {angle_id}, [&](int tag) {
+            system_.addConstraintP2PAngle(
+                points_.at(pt1_id), points_.at(pt2_id), param_ptr(angle_id), incr_angle, tag,
+                driving);
+        });
     }
 
     int p2l_distance(int pt_id, int line_id, int distance_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintP2LDistance(
-            points_.at(pt_id), lines_.at(line_id), param_ptr(distance_id), tag, driving);
-        return tag;
+        return add_tagged({pt_id, line_id}, {distance_id}, [&](int tag) {
+            system_.addConstraintP2LDistance(
+                points_.at(pt_id), lines_.at(line_id), param_ptr(distance_id), tag, driving);
+        });
     }
 
     int point_on_line(int pt_id, int line_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintPointOnLine(
-            points_.at(pt_id), lines_.at(line_id), tag, driving);
-        return tag;
+        return add_tagged({pt_id, line_id}, {}, [&](int tag) {
+            system_.addConstraintPointOnLine(
+                points_.at(pt_id), lines_.at(line_id), tag, driving);
+        });
     }
 
     int point_on_line_2pts(int pt_id, int lp1_id, int lp2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintPointOnLine(
-            points_.at(pt_id), points_.at(lp1_id), points_.at(lp2_id), tag, driving);
-        return tag;
+        return add_tagged({pt_id, lp1_id, lp2_id}, {}, [&](int tag) {
+            system_.addConstraintPointOnLine(
+                points_.at(pt_id), points_.at(lp1_id), points_.at(lp2_id), tag, driving);
+        });
     }
 
     int point_on_perp_bisector(int pt_id, int line_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintPointOnPerpBisector(
-            points_.at(pt_id), lines_.at(line_id), tag, driving);
-        return tag;
+        return add_tagged({pt_id, line_id}, {}, [&](int tag) {
+            system_.addConstraintPointOnPerpBisector(
+                points_.at(pt_id), lines_.at(line_id), tag, driving);
+        });
     }
 
     int parallel(int l1_id, int l2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintParallel(
-            lines_.at(l1_id), lines_.at(l2_id), tag, driving);
-        return tag;
+        return add_tagged({l1_id, l2_id}, {}, [&](int tag) {
+            system_.addConstraintParallel(
+                lines_.at(l1_id), lines_.at(l2_id), tag, driving);
+        });
     }
 
     int perpendicular(int l1_id, int l2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintPerpendicular(
-            lines_.at(l1_id), lines_.at(l2_id), tag, driving);
-        return tag;
+        return add_tagged({l1_id, l2_id}, {}, [&](int tag) {
+            system_.addConstraintPerpendicular(
+                lines_.at(l1_id), lines_.at(l2_id), tag, driving);
+        });
     }
 
     int l2l_angle(int l1_id, int l2_id, int angle_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintL2LAngle(
-            lines_.at(l1_id), lines_.at(l2_id), param_ptr(angle_id), tag, driving);
-        return tag;
+        return add_tagged({l1_id, l2_id}, {angle_id}, [&](int tag) {
+            system_.addConstraintL2LAngle(
+                lines_.at(l1_id), lines_.at(l2_id), param_ptr(angle_id), tag, driving);
+        });
     }
 
     int midpoint_on_line(int l1_id, int l2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintMidpointOnLine(
-            lines_.at(l1_id), lines_.at(l2_id), tag, driving);
-        return tag;
+        return add_tagged({l1_id, l2_id}, {}, [&](int tag) {
+            system_.addConstraintMidpointOnLine(
+                lines_.at(l1_id), lines_.at(l2_id), tag, driving);
+        });
     }
 
     int horizontal_line(int line_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintHorizontal(lines_.at(line_id), tag, driving);
-        return tag;
+        return add_tagged({line_id}, {}, [&](int tag) {
+            system_.addConstraintHorizontal(lines_.at(line_id), tag, driving);
+        });
     }
 
     int horizontal_points(int p1_id, int p2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintHorizontal(
-            points_.at(p1_id), points_.at(p2_id), tag, driving);
-        return tag;
+        return add_tagged({p1_id, p2_id}, {}, [&](int tag) {
+            system_.addConstraintHorizontal(
+                points_.at(p1_id), points_.at(p2_id), tag, driving);
+        });
     }
 
     int vertical_line(int line_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintVertical(lines_.at(line_id), tag, driving);
-        return tag;
+        return add_tagged({line_id}, {}, [&](int tag) {
+            system_.addConstraintVertical(lines_.at(line_id), tag, driving);
+        });
     }
 
     int vertical_points(int p1_id, int p2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintVertical(
-            points_.at(p1_id), points_.at(p2_id), tag, driving);
-        return tag;
+        return add_tagged({p1_id, p2_id}, {}, [&](int tag) {
+            system_.addConstraintVertical(
+                points_.at(p1_id), points_.at(p2_id), tag, driving);
+        });
     }
 
     int coordinate_x(int pt_id, int x_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintCoordinateX(
-            points_.at(pt_id), param_ptr(x_id), tag, driving);
-        return tag;
+        return add_tagged({pt_id}, {x_id}, [&](int tag) {
+            system_.addConstraintCoordinateX(
+                points_.at(pt_id), param_ptr(x_id), tag, driving);
+        });
     }
 
     int coordinate_y(int pt_id, int y_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintCoordinateY(
-            points_.at(pt_id), param_ptr(y_id), tag, driving);
-        return tag;
+        return add_tagged({pt_id}, {y_id}, [&](int tag) {
+            system_.addConstraintCoordinateY(
+                points_.at(pt_id), param_ptr(y_id), tag, driving);
+        });
     }
 
     int point_on_circle(int pt_id, int circle_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintPointOnCircle(
-            points_.at(pt_id), circles_.at(circle_id), tag, driving);
-        return tag;
+        return add_tagged({pt_id, circle_id}, {}, [&](int tag) {
+            system_.addConstraintPointOnCircle(
+                points_.at(pt_id), circles_.at(circle_id), tag, driving);
+        });
     }
 
     int point_on_ellipse(int pt_id, int ellipse_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintPointOnEllipse(
-            points_.at(pt_id), ellipses_.at(ellipse_id), tag, driving);
-        return tag;
+        return add_tagged({pt_id, ellipse_id}, {}, [&](int tag) {
+            system_.addConstraintPointOnEllipse(
+                points_.at(pt_id), ellipses_.at(ellipse_id), tag, driving);
+        });
     }
 
     int point_on_arc(int pt_id, int arc_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintPointOnArc(
-            points_.at(pt_id), arcs_.at(arc_id), tag, driving);
-        return tag;
+        return add_tagged({pt_id, arc_id}, {}, [&](int tag) {
+            system_.addConstraintPointOnArc(
+                points_.at(pt_id), arcs_.at(arc_id), tag, driving);
+        });
     }
 
     int arc_rules(int arc_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintArcRules(arcs_.at(arc_id), tag, driving);
-        return tag;
+        return add_tagged({arc_id}, {}, [&](int tag) {
+            system_.addConstraintArcRules(arcs_.at(arc_id), tag, driving);
+        });
     }
 
     int arc_of_ellipse_rules(int aoe_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintArcOfEllipseRules(arcs_of_ellipse_.at(aoe_id), tag, driving);
-        return tag;
+        return add_tagged({aoe_id}, {}, [&](int tag) {
+            system_.addConstraintArcOfEllipseRules(arcs_of_ellipse_.at(aoe_id), tag, driving);
+        });
     }
 
     int arc_of_hyperbola_rules(int aoh_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintArcOfHyperbolaRules(arcs_of_hyperbola_.at(aoh_id), tag, driving);
-        return tag;
+        return add_tagged({aoh_id}, {}, [&](int tag) {
+            system_.addConstraintArcOfHyperbolaRules(arcs_of_hyperbola_.at(aoh_id), tag, driving);
+        });
     }
 
     int arc_of_parabola_rules(int aop_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintArcOfParabolaRules(arcs_of_parabola_.at(aop_id), tag, driving);
-        return tag;
+        return add_tagged({aop_id}, {}, [&](int tag) {
+            system_.addConstraintArcOfParabolaRules(arcs_of_parabola_.at(aop_id), tag, driving);
+        });
     }
 
     int tangent_line_circle(int line_id, int circle_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintTangent(
-            lines_.at(line_id), circles_.at(circle_id), tag, driving);
-        return tag;
+        return add_tagged({line_id, circle_id}, {}, [&](int tag) {
+            system_.addConstraintTangent(
+                lines_.at(line_id), circles_.at(circle_id), tag, driving);
+        });
     }
 
     int tangent_line_ellipse(int line_id, int ellipse_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintTangent(
-            lines_.at(line_id), ellipses_.at(ellipse_id), tag, driving);
-        return tag;
+        return add_tagged({line_id, ellipse_id}, {}, [&](int tag) {
+            system_.addConstraintTangent(
+                lines_.at(line_id), ellipses_.at(ellipse_id), tag, driving);
+        });
     }
 
     int tangent_line_arc(int line_id, int arc_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintTangent(
-            lines_.at(line_id), arcs_.at(arc_id), tag, driving);
-        return tag;
+        return add_tagged({line_id, arc_id}, {}, [&](int tag) {
+            system_.addConstraintTangent(
+                lines_.at(line_id), arcs_.at(arc_id), tag, driving);
+        });
     }
 
     int tangent_circle_circle(int c1_id, int c2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintTangent(
-            circles_.at(c1_id), circles_.at(c2_id), tag, driving);
-        return tag;
+        return add_tagged({c1_id, c2_id}, {}, [&](int tag) {
+            system_.addConstraintTangent(
+                circles_.at(c1_id), circles_.at(c2_id), tag, driving);
+        });
     }
 
     int tangent_arc_arc(int a1_id, int a2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintTangent(
-            arcs_.at(a1_id), arcs_.at(a2_id), tag, driving);
-        return tag;
+        return add_tagged({a1_id, a2_id}, {}, [&](int tag) {
+            system_.addConstraintTangent(
+                arcs_.at(a1_id), arcs_.at(a2_id), tag, driving);
+        });
     }
 
     int tangent_circle_arc(int circle_id, int arc_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintTangent(
-            circles_.at(circle_id), arcs_.at(arc_id), tag, driving);
-        return tag;
+        return add_tagged({circle_id, arc_id}, {}, [&](int tag) {
+            system_.addConstraintTangent(
+                circles_.at(circle_id), arcs_.at(arc_id), tag, driving);
+        });
     }
 
     int circle_radius(int circle_id, int radius_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintCircleRadius(
-            circles_.at(circle_id), param_ptr(radius_id), tag, driving);
-        return tag;
+        return add_tagged({circle_id}, {radius_id}, [&](int tag) {
+            system_.addConstraintCircleRadius(
+                circles_.at(circle_id), param_ptr(radius_id), tag, driving);
+        });
     }
 
     int arc_radius(int arc_id, int radius_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintArcRadius(
-            arcs_.at(arc_id), param_ptr(radius_id), tag, driving);
-        return tag;
+        return add_tagged({arc_id}, {radius_id}, [&](int tag) {
+            system_.addConstraintArcRadius(
+                arcs_.at(arc_id), param_ptr(radius_id), tag, driving);
+        });
     }
 
     int circle_diameter(int circle_id, int diameter_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintCircleDiameter(
-            circles_.at(circle_id), param_ptr(diameter_id), tag, driving);
-        return tag;
+        return add_tagged({circle_id}, {diameter_id}, [&](int tag) {
+            system_.addConstraintCircleDiameter(
+                circles_.at(circle_id), param_ptr(diameter_id), tag, driving);
+        });
     }
 
     int arc_diameter(int arc_id, int diameter_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintArcDiameter(
-            arcs_.at(arc_id), param_ptr(diameter_id), tag, driving);
-        return tag;
+        return add_tagged({arc_id}, {diameter_id}, [&](int tag) {
+            system_.addConstraintArcDiameter(
+                arcs_.at(arc_id), param_ptr(diameter_id), tag, driving);
+        });
     }
 
     int equal_length(int l1_id, int l2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintEqualLength(
-            lines_.at(l1_id), lines_.at(l2_id), tag, driving);
-        return tag;
+        return add_tagged({l1_id, l2_id}, {}, [&](int tag) {
+            system_.addConstraintEqualLength(
+                lines_.at(l1_id), lines_.at(l2_id), tag, driving);
+        });
     }
 
     int equal_radius_cc(int c1_id, int c2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintEqualRadius(
-            circles_.at(c1_id), circles_.at(c2_id), tag, driving);
-        return tag;
+        return add_tagged({c1_id, c2_id}, {}, [&](int tag) {
+            system_.addConstraintEqualRadius(
+                circles_.at(c1_id), circles_.at(c2_id), tag, driving);
+        });
     }
 
     int equal_radius_ca(int circle_id, int arc_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintEqualRadius(
-            circles_.at(circle_id), arcs_.at(arc_id), tag, driving);
-        return tag;
+        return add_tagged({circle_id, arc_id}, {}, [&](int tag) {
+            system_.addConstraintEqualRadius(
+                circles_.at(circle_id), arcs_.at(arc_id), tag, driving);
+        });
     }
 
     int equal_radius_aa(int a1_id, int a2_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintEqualRadius(
-            arcs_.at(a1_id), arcs_.at(a2_id), tag, driving);
-        return tag;
+        return add_tagged({a1_id, a2_id}, {}, [&](int tag) {
+            system_.addConstraintEqualRadius(
+                arcs_.at(a1_id), arcs_.at(a2_id), tag, driving);
+        });
     }
 
     int symmetric_points_line(int p1_id, int p2_id, int line_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintP2PSymmetric(
-            points_.at(p1_id), points_.at(p2_id), lines_.at(line_id), tag, driving);
-        return tag;
+        return add_tagged({p1_id, p2_id, line_id}, {}, [&](int tag) {
+            system_.addConstraintP2PSymmetric(
+                points_.at(p1_id), points_.at(p2_id), lines_.at(line_id), tag, driving);
+        });
     }
 
     int symmetric_points_point(int p1_id, int p2_id, int center_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintP2PSymmetric(
-            points_.at(p1_id), points_.at(p2_id), points_.at(center_id), tag, driving);
-        return tag;
+        return add_tagged({p1_id, p2_id, center_id}, {}, [&](int tag) {
+            system_.addConstraintP2PSymmetric(
+                points_.at(p1_id), points_.at(p2_id), points_.at(center_id), tag, driving);
+        });
     }
 
     int p2p_coincident(int p1_id, int p2_id, bool driving = true) {
@@ -736,87 +1107,166 @@ public:
     }
 
     int p2c_distance(int pt_id, int circle_id, int distance_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintP2CDistance(
-            points_.at(pt_id), circles_.at(circle_id), param_ptr(distance_id), tag, driving);
-        return tag;
+        return add_tagged({pt_id, circle_id}, {distance_id}, [&](int tag) {
+            system_.addConstraintP2CDistance(
+                points_.at(pt_id), circles_.at(circle_id), param_ptr(distance_id), tag, driving);
+        });
     }
 
     int c2c_distance(int c1_id, int c2_id, int dist_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintC2CDistance(
-            circles_.at(c1_id), circles_.at(c2_id), param_ptr(dist_id), tag, driving);
-        return tag;
+        return add_tagged({c1_id, c2_id}, {dist_id}, [&](int tag) {
+            system_.addConstraintC2CDistance(
+                circles_.at(c1_id), circles_.at(c2_id), param_ptr(dist_id), tag, driving);
+        });
     }
 
     int c2l_distance(int circle_id, int line_id, int dist_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintC2LDistance(
-            circles_.at(circle_id), lines_.at(line_id), param_ptr(dist_id), tag, driving);
-        return tag;
+        return add_tagged({circle_id, line_id}, {dist_id}, [&](int tag) {
+            system_.addConstraintC2LDistance(
+                circles_.at(circle_id), lines_.at(line_id), param_ptr(dist_id), tag, driving);
+        });
     }
 
     int arc_length(int arc_id, int dist_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintArcLength(
-            arcs_.at(arc_id), param_ptr(dist_id), tag, driving);
-        return tag;
+        return add_tagged({arc_id}, {dist_id}, [&](int tag) {
+            system_.addConstraintArcLength(
+                arcs_.at(arc_id), param_ptr(dist_id), tag, driving);
+        });
     }
 
     // Internal alignment constraints
     int internal_alignment_point2ellipse(int ellipse_id, int pt_id,
                                          GCS::InternalAlignmentType alignmentType,
                                          bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintInternalAlignmentPoint2Ellipse(
-            ellipses_.at(ellipse_id), points_.at(pt_id), alignmentType, tag, driving);
-        return tag;
+        return add_tagged({ellipse_id, pt_id}, {}, [&](int tag) {
+            system_.addConstraintInternalAlignmentPoint2Ellipse(
+                ellipses_.at(ellipse_id), points_.at(pt_id), alignmentType, tag, driving);
+        });
     }
 
     int internal_alignment_ellipse_major_diameter(int ellipse_id, int p1_id, int p2_id,
                                                    bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintInternalAlignmentEllipseMajorDiameter(
-            ellipses_.at(ellipse_id), points_.at(p1_id), points_.at(p2_id), tag, driving);
-        return tag;
+        return add_tagged({ellipse_id, p1_id, p2_id}, {}, [&](int tag) {
+            system_.addConstraintInternalAlignmentEllipseMajorDiameter(
+                ellipses_.at(ellipse_id), points_.at(p1_id), points_.at(p2_id), tag, driving);
+        });
     }
 
     int internal_alignment_ellipse_minor_diameter(int ellipse_id, int p1_id, int p2_id,
                                                    bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintInternalAlignmentEllipseMinorDiameter(
-            ellipses_.at(ellipse_id), points_.at(p1_id), points_.at(p2_id), tag, driving);
-        return tag;
+        return add_tagged({ellipse_id, p1_id, p2_id}, {}, [&](int tag) {
+            system_.addConstraintInternalAlignmentEllipseMinorDiameter(
+                ellipses_.at(ellipse_id), points_.at(p1_id), points_.at(p2_id), tag, driving);
+        });
     }
 
     int internal_alignment_ellipse_focus1(int ellipse_id, int pt_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintInternalAlignmentEllipseFocus1(
-            ellipses_.at(ellipse_id), points_.at(pt_id), tag, driving);
-        return tag;
+        return add_tagged({ellipse_id, pt_id}, {}, [&](int tag) {
+            system_.addConstraintInternalAlignmentEllipseFocus1(
+                ellipses_.at(ellipse_id), points_.at(pt_id), tag, driving);
+        });
     }
 
     int internal_alignment_ellipse_focus2(int ellipse_id, int pt_id, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintInternalAlignmentEllipseFocus2(
-            ellipses_.at(ellipse_id), points_.at(pt_id), tag, driving);
-        return tag;
+        return add_tagged({ellipse_id, pt_id}, {}, [&](int tag) {
+            system_.addConstraintInternalAlignmentEllipseFocus2(
+                ellipses_.at(ellipse_id), points_.at(pt_id), tag, driving);
+        });
     }
 
     // Tangent circumference
     int tangent_circumf(int p1_id, int p2_id, int rd1_id, int rd2_id,
                         bool internal = false, bool driving = true) {
-        int tag = next_constraint_tag_++;
-        system_.addConstraintTangentCircumf(
-            points_.at(p1_id), points_.at(p2_id),
-            param_ptr(rd1_id), param_ptr(rd2_id),
-            internal, tag, driving);
-        return tag;
+        return add_tagged({p1_id, p2_id}, {rd1_id, rd2_id}, [&](int tag) {
+            system_.addConstraintTangentCircumf(
+                points_.at(p1_id), points_.at(p2_id),
+                param_ptr(rd1_id), param_ptr(rd2_id),
+                internal, tag, driving);
+        });
     }
 
-    // Clear constraints by tag
+    // Clear constraints by tag, along with the parameters attached to them
     void clear_by_tag(int tag) {
         system_.clearByTag(tag);
+        forget_tag(tag);
+    }
+
+    void clear_by_tags(const std::vector<int>& tags) {
+        system_.clearByTags(tags);
+        for (int tag : tags) {
+            forget_tag(tag);
+        }
+    }
+
+    // Parameters created for the constraints of a tag, such as the value of a dimension, which
+    // are removed along with them
+    void attach_params(int tag, const std::vector<int>& param_ids) {
+        auto it = tag_deps_.find(tag);
+        if (it == tag_deps_.end()) {
+            throw std::out_of_range("unknown constraint tag " + std::to_string(tag));
+        }
+        journal(tag_deps_, it);
+        it->second.attached.insert(it->second.attached.end(), param_ids.begin(), param_ids.end());
+    }
+
+    // ── Removal ─────────────────────────────────────────────────────
+    // Geometry goes along with the points and parameters created for it, the geometry built on
+    // any of those, and the constraints created on any of them, with their attached parameters.
+    // The storage of the parameters removed is only reclaimed by compact(). Each returns the ids
+    // of the geometry, the constraint tags and the parameters removed.
+
+    using Removed = std::tuple<std::vector<int>, std::vector<int>, std::vector<int>>;
+
+    Removed remove_geometry(const std::vector<int>& geo_ids) {
+        for (int id : geo_ids) {
+            if (!parts_.contains(id)) {
+                throw std::out_of_range("unknown geometry " + std::to_string(id));
+            }
+        }
+        return remove(geo_ids, {});
+    }
+
+    // The geometry built on the parameters goes as well
+    Removed remove_params(const std::vector<int>& param_ids) {
+        for (int id : param_ids) {
+            if (!param_index_.contains(id)) {
+                throw std::out_of_range("unknown parameter " + std::to_string(id));
+            }
+        }
+        return remove({}, param_ids);
+    }
+
+    // Moves the parameters to new storage without the ones removed, keeping their ids
+    void compact() {
+        if (system_.inTransaction()) {
+            throw std::logic_error("cannot compact the sketch during a transaction");
+        }
+        std::deque<double> params;
+        std::vector<double> recorded;
+        GCS::MAP_pD_pD locations;
+        for (auto& [id, idx] : param_index_) {
+            params.push_back(params_[idx]);
+            locations[&params_[idx]] = &params.back();
+            // parameters added since record_positions() come last, as ids and indices both grow
+            if (idx < recorded_.size()) {
+                recorded.push_back(recorded_[idx]);
+            }
+            idx = params.size() - 1;
+        }
+        GCS::VEC_pD pvec;
+        for_each_geometry([&](int, auto& geometry) {
+            pvec.clear();
+            geometry.PushOwnParams(pvec);
+            for (auto& param : pvec) {
+                param = locations.at(param);
+            }
+            int cnt = 0;
+            geometry.ReconstructOnNewPvec(pvec, cnt);
+        });
+        system_.remapParams(locations);
+        params_.swap(params);
+        recorded_.swap(recorded);
+        unknowns_ = GCS::VEC_pD();
     }
 
     // Constraint error
@@ -824,14 +1274,91 @@ public:
         return system_.calculateConstraintErrorByTag(tag);
     }
 
+    // Errors of all tags at once, optionally only of driving or non-driving constraints
+    std::pair<std::vector<int>, std::vector<double>>
+    constraint_errors(std::optional<bool> driving = std::nullopt) {
+        std::pair<std::vector<int>, std::vector<double>> result;
+        system_.calculateConstraintErrors(result.first, result.second, driving);
+        return result;
+    }
+
+    // Derivatives of the unknowns with respect to the given fixed parameters (driving values) at
+    // the current solution: the ids of the unknowns, and a matrix with a row for each of them and
+    // a column for each of param_ids
+    std::pair<std::vector<int>, Eigen::MatrixXd> sensitivity(const std::vector<int>& param_ids) {
+        GCS::VEC_pD params;
+        params.reserve(param_ids.size());
+        for (int id : param_ids) {
+            params.push_back(param_ptr(id));
+            if (!is_param_fixed(id)) {
+                throw std::invalid_argument(
+                    "parameter " + std::to_string(id) + " is an unknown, not a fixed value");
+            }
+        }
+        declare_unknowns();
+        std::pair<std::vector<int>, Eigen::MatrixXd> result;
+        result.first.reserve(unknowns_.size());
+        for (const auto& [id, idx] : param_index_) {
+            if (!is_param_fixed(id)) {
+                result.first.push_back(id);
+            }
+        }
+        system_.calculateSensitivities(params, result.second);
+        return result;
+    }
+
+    // Estimated bytes held by the sketch: (params, geometry, constraints, adjacency, subsystems,
+    // diagnosis, transaction). See GCS::System::MemoryUsage for the system's part of them.
+    using MemoryUsage = std::tuple<std::size_t, std::size_t, std::size_t, std::size_t,
+                                   std::size_t, std::size_t, std::size_t>;
+
+    MemoryUsage memory_usage() const {
+        using GCS::heapBytes;
+        GCS::System::MemoryUsage system;
+        system_.memoryUsage(system);
+
+        // libstdc++ stores a deque in 512-byte blocks, reached through a map of pointers to them
+        constexpr std::size_t block = 512;
+        std::size_t blocks = params_.size() * sizeof(double) / block + 1;
+        std::size_t params = blocks * block + (blocks + 2) * sizeof(void*)
+            + heapBytes(param_index_) + heapBytes(param_fixed_) + heapBytes(unknowns_)
+            + heapBytes(recorded_) + system.unknowns;
+
+        std::size_t geometry = heapBytes(points_) + heapBytes(point_param_ids_) + heapBytes(lines_)
+            + heapBytes(circles_) + heapBytes(circle_rad_param_) + heapBytes(arcs_)
+            + heapBytes(ellipses_) + heapBytes(arcs_of_ellipse_) + heapBytes(hyperbolas_)
+            + heapBytes(arcs_of_hyperbola_) + heapBytes(parabolas_) + heapBytes(arcs_of_parabola_)
+            + heapBytes(parts_);
+        for (const auto& [id, parts] : parts_) {
+            geometry += heapBytes(parts.points) + heapBytes(parts.params);
+        }
+
+        std::size_t constraints = heapBytes(tag_deps_) + system.constraints;
+        for (const auto& [tag, deps] : tag_deps_) {
+            constraints += heapBytes(deps.geometry) + heapBytes(deps.params)
+                + heapBytes(deps.attached);
+        }
+
+        std::size_t transaction = heapBytes(begun_.values) + heapBytes(begun_.fixed)
+            + heapBytes(begun_.undo) + system.transaction;
+
+        return {params, geometry, constraints, system.adjacency, system.subsystems,
+                system.diagnosis, transaction};
+    }
+
     // Access the GCS system for advanced use
     GCS::System& system() { return system_; }
 
 private:
+    static constexpr char plan_magic_[8] = {'P', 'G', 'C', 'S', 'P', 'L', 'A', 'N'};
+    static constexpr std::uint32_t plan_version_ = 1;
+
     GCS::System system_;
     std::deque<double> params_;  // pointer-stable storage
     std::map<int, size_t> param_index_;  // param_id -> index in params_
     std::map<int, bool> param_fixed_;  // param_id -> is fixed (not an unknown)
+    GCS::VEC_pD unknowns_;  // reused by declare_unknowns()
+    std::vector<double> recorded_;  // params_ as of record_positions(), for moved_geometry()
     std::map<int, GCS::Point> points_;
     std::map<int, std::pair<int,int>> point_param_ids_;  // point_id -> (px_id, py_id)
     std::map<int, GCS::Line> lines_;
@@ -847,6 +1374,182 @@ private:
     int next_param_id_ = 0;
     int next_geo_id_ = 0;
     int next_constraint_tag_ = 1;
+
+    // what removing a geometry takes along: the points and parameters created for it
+    struct Parts {
+        std::vector<int> points;
+        std::vector<int> params;
+    };
+    std::map<int, Parts> parts_;  // of every geometry
+    // what the constraints of a tag were created on, and the parameters attached to them
+    struct TagDeps {
+        std::vector<int> geometry;
+        std::vector<int> params;
+        std::vector<int> attached;
+    };
+    std::map<int, TagDeps> tag_deps_;
+
+    // the sketch as of begin_transaction(), for rollback()
+    struct Begun {
+        std::vector<double> values;  // of params_
+        std::map<int, bool> fixed;
+        int next_param_id = 0;
+        int next_geo_id = 0;
+        int next_constraint_tag = 1;
+        std::vector<std::function<void()>> undo;  // puts back the entries changed or removed
+    };
+    Begun begun_;
+
+    // Adds the constraints of a new tag with add, then hands the tag out, recording the
+    // geometry and parameters they are on. If add throws, e.g. on an unknown id, the tag is
+    // neither recorded nor used up.
+    template <typename Add>
+    int add_tagged(std::initializer_list<int> geometry, std::initializer_list<int> params,
+                   Add add) {
+        int tag = next_constraint_tag_;
+        add(tag);
+        next_constraint_tag_++;
+        tag_deps_[tag] = {geometry, params, {}};
+        return tag;
+    }
+
+    // Keeps the entry of map at it for rollback(), if a transaction is open
+    template <typename Map>
+    void journal(Map& map, typename Map::iterator it) {
+        if (system_.inTransaction()) {
+            begun_.undo.push_back([&map, entry = *it] {
+                map.insert_or_assign(entry.first, entry.second);
+            });
+        }
+    }
+
+    template <typename Map>
+    void erase_entry(Map& map, int key) {
+        auto it = map.find(key);
+        if (it != map.end()) {
+            journal(map, it);
+            map.erase(it);
+        }
+    }
+
+    void erase_param(int id) {
+        erase_entry(param_index_, id);
+        erase_entry(param_fixed_, id);
+    }
+
+    void forget_tag(int tag) {
+        auto it = tag_deps_.find(tag);
+        if (it == tag_deps_.end()) {
+            return;
+        }
+        for (int id : it->second.attached) {
+            erase_param(id);
+        }
+        erase_entry(tag_deps_, tag);
+    }
+
+    // Calls f(id, geometry) for every geometry
+    template <typename F>
+    void for_each_geometry(F&& f) {
+        for (auto& [id, g] : points_) f(id, g);
+        for (auto& [id, g] : lines_) f(id, g);
+        for (auto& [id, g] : circles_) f(id, g);
+        for (auto& [id, g] : arcs_) f(id, g);
+        for (auto& [id, g] : ellipses_) f(id, g);
+        for (auto& [id, g] : arcs_of_ellipse_) f(id, g);
+        for (auto& [id, g] : hyperbolas_) f(id, g);
+        for (auto& [id, g] : arcs_of_hyperbola_) f(id, g);
+        for (auto& [id, g] : parabolas_) f(id, g);
+        for (auto& [id, g] : arcs_of_parabola_) f(id, g);
+    }
+
+    Removed remove(std::vector<int> pending, const std::vector<int>& param_ids) {
+        std::set<int> geometry, params;
+        std::unordered_set<const double*> pointers;  // of params
+        auto add_params = [&](const std::vector<int>& ids) {
+            for (int id : ids) {
+                if (params.insert(id).second) {
+                    pointers.insert(param_ptr(id));
+                }
+            }
+        };
+        add_params(param_ids);
+        GCS::VEC_pD pvec;
+        std::size_t scanned = 0;  // pointers looked for in the geometry so far
+        do {
+            while (!pending.empty()) {
+                int id = pending.back();
+                pending.pop_back();
+                if (geometry.insert(id).second) {
+                    const Parts& parts = parts_.at(id);
+                    add_params(parts.params);
+                    pending.insert(pending.end(), parts.points.begin(), parts.points.end());
+                }
+            }
+            if (pointers.size() == scanned) {
+                break;
+            }
+            scanned = pointers.size();
+            // the geometry built on the parameters that go
+            for_each_geometry([&](int id, auto& g) {
+                pvec.clear();
+                g.PushOwnParams(pvec);
+                if (!geometry.contains(id)
+                    && std::ranges::any_of(pvec, [&](double* p) { return pointers.contains(p); })) {
+                    pending.push_back(id);
+                }
+            });
+        } while (!pending.empty());
+
+        std::vector<int> tags;
+        for (const auto& [tag, deps] : tag_deps_) {
+            if (std::ranges::any_of(deps.geometry, [&](int id) { return geometry.contains(id); })
+                || std::ranges::any_of(deps.params, [&](int id) { return params.contains(id); })) {
+                tags.push_back(tag);
+            }
+        }
+        system_.clearByTags(tags);
+        std::vector<int> removed_params(params.begin(), params.end());
+        for (int tag : tags) {
+            for (int id : tag_deps_.at(tag).attached) {
+                if (param_index_.contains(id) && params.insert(id).second) {
+                    removed_params.push_back(id);
+                }
+            }
+            forget_tag(tag);
+        }
+        for (int id : geometry) {
+            erase_entry(points_, id);
+            erase_entry(point_param_ids_, id);
+            erase_entry(lines_, id);
+            erase_entry(circles_, id);
+            erase_entry(circle_rad_param_, id);
+            erase_entry(arcs_, id);
+            erase_entry(ellipses_, id);
+            erase_entry(arcs_of_ellipse_, id);
+            erase_entry(hyperbolas_, id);
+            erase_entry(arcs_of_hyperbola_, id);
+            erase_entry(parabolas_, id);
+            erase_entry(arcs_of_parabola_, id);
+            erase_entry(parts_, id);
+        }
+        for (int id : params) {
+            erase_param(id);
+        }
+        std::ranges::sort(removed_params);
+        return {std::vector<int>(geometry.begin(), geometry.end()), tags, removed_params};
+    }
+
+    void require_transaction() const {
+        if (!system_.inTransaction()) {
+            throw std::logic_error("no transaction is open");
+        }
+    }
+
+    template <typename Map>
+    static void erase_from(Map& map, int first_id) {
+        map.erase(map.lower_bound(first_id), map.end());
+    }
 };
 
 #endif // PLANEGCS_WRAPPER_H
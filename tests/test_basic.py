@@ -1,8 +1,24 @@
 """Basic tests for planegcs: import, points, lines, simple solving."""
 
 import math
-
-from planegcs import Algorithm, Sketch, SketchSolver, SolveStatus
+from dataclasses import astuple
+from typing import cast
+
+import pytest
+
+from planegcs import (
+    Algorithm,
+    CacheStats,
+    LineId,
+    ParamId,
+    PointId,
+    Removed,
+    Sketch,
+    SketchSolver,
+    SolutionCache,
+    SolveStats,
+    SolveStatus,
+)
 
 
 def test_import():
@@ -195,7 +211,7 @@ def test_clear():
 
 def test_algorithms():
     """Solving works with different algorithms."""
-    for alg in [Algorithm.DogLeg, Algorithm.BFGS, Algorithm.LevenbergMarquardt]:
+    for alg in [Algorithm.DogLeg, Algorithm.BFGS, Algorithm.LevenbergMarquardt, Algorithm.LBFGS]:
         s = Sketch()
         s.add_fixed_point(0, 0)
         p2 = s.add_point(5, 3)
@@ -204,3 +220,582 @@ def test_algorithms():
         assert status == SolveStatus.Success
         assert abs(s.get_point(p2)[0] - 3.0) < 1e-6
         assert abs(s.get_point(p2)[1] - 4.0) < 1e-6
+
+
+def test_repeated_solves():
+    """Re-solving after value and structure changes tracks the latest sketch."""
+    for alg in [Algorithm.DogLeg, Algorithm.BFGS, Algorithm.LevenbergMarquardt, Algorithm.LBFGS]:
+        s = Sketch()
+        p1 = s.add_fixed_point(0, 0)
+        p2 = s.add_point(5, 3)
+        line = s.add_line(p1, p2)
+        s.horizontal(line)
+        d = s.add_param(4.0)
+        s.p2p_distance(p1, p2, d)
+        for length in [4.0, 7.0, 2.5]:
+            s.set_param(d, length)
+            assert s.solve(alg) == SolveStatus.Success
+            assert abs(s.get_point(p2)[0] - length) < 1e-6
+            assert abs(s.get_point(p2)[1]) < 1e-6
+        # Geometry and constraints added after solving must be picked up
+        p3 = s.add_point(1, 1)
+        s.coincident(p2, p3)
+        assert s.solve(alg) == SolveStatus.Success
+        assert abs(s.get_point(p3)[0] - 2.5) < 1e-6
+        s.vertical(line)
+        assert s.diagnose().is_over_constrained
+
+
+def test_solve_after_constraint_removal():
+    """Components coupled and decoupled again by later edits solve correctly."""
+    s = Sketch()
+    p1 = s.add_fixed_point(0, 0)
+    p2 = s.add_point(2, 1)
+    s.horizontal(s.add_line(p1, p2))
+    s.set_p2p_distance(p1, p2, 3.0)
+    p3 = s.add_fixed_point(10, 10)
+    p4 = s.add_point(9, 11)
+    s.vertical(s.add_line(p3, p4))
+    s.set_p2p_distance(p3, p4, 2.0)
+    assert s.solve() == SolveStatus.Success
+
+    p5 = s.add_point(1, 1)
+    tag = s.coincident(p2, p5)
+    assert s.solve() == SolveStatus.Success
+    assert abs(s.get_point(p5)[0] - 3.0) < 1e-8
+    assert abs(s.get_point(p5)[1]) < 1e-8
+
+    s.solver.clear_by_tag(tag)
+    s.coincident(p4, p5)
+    assert s.solve() == SolveStatus.Success
+    assert abs(s.get_point(p5)[0] - 10.0) < 1e-8
+    assert abs(s.get_point(p5)[1] - 12.0) < 1e-8
+    assert s.dof() == 0
+
+
+def test_clear_by_tags_then_solve():
+    """Constraints removed in bulk no longer take part in diagnosis or solving."""
+    s = Sketch()
+    origin = s.add_fixed_point(0, 0)
+    points = [s.add_point(i + 1.0, 0.1) for i in range(20)]
+    lengths = [s.set_p2p_distance(origin, p, 2.0) for p in points]
+    angles = [s.horizontal(s.add_line(origin, p)) for p in points]
+    assert s.solve() == SolveStatus.Success
+    assert s.dof() == 0
+
+    s.clear_by_tags(lengths[::2] + angles[1::2])
+    assert s.dof() == 20
+    assert s.solve() == SolveStatus.Success
+
+    s.set_p2p_distance(origin, points[0], 3.0)
+    assert s.solve() == SolveStatus.Success
+    assert abs(math.dist(s.get_point(origin), s.get_point(points[0])) - 3.0) < 1e-8
+    assert abs(math.dist(s.get_point(origin), s.get_point(points[1])) - 2.0) < 1e-8
+
+
+def test_solve_chain_of_rigid_clusters():
+    """A sketch that decomposes into small rigid clusters solves like a whole system."""
+    for alg in [Algorithm.DogLeg, Algorithm.BFGS, Algorithm.LevenbergMarquardt, Algorithm.LBFGS]:
+        s = Sketch()
+        top = [s.add_fixed_point(0, 0)]
+        bottom = [s.add_fixed_point(0, -1)]
+        for i in range(1, 11):
+            top.append(s.add_point(i + 0.2, 0.1 * (i % 2)))
+            bottom.append(s.add_point(i - 0.1, -1.2))
+            s.set_p2p_distance(top[i - 1], top[i], 1.0)
+            s.set_p2p_distance(bottom[i - 1], bottom[i], 1.0)
+            s.set_p2p_distance(top[i - 1], bottom[i], math.sqrt(2))
+            # the rung ends at a point made coincident with the top one
+            end = s.add_point(i + 0.1, 0.2)
+            s.coincident(end, top[i])
+            s.set_p2p_distance(end, bottom[i], 1.0)
+        tail = s.add_point(12, 1)  # left free to turn around the last point
+        s.set_p2p_distance(top[-1], tail, 2.0)
+        assert s.dof() == 1
+
+        assert s.solve(alg) == SolveStatus.Success
+        for i in range(11):
+            assert math.dist(s.get_point(top[i]), (i, 0)) < 1e-6
+            assert math.dist(s.get_point(bottom[i]), (i, -1)) < 1e-6
+        assert abs(math.dist(s.get_point(top[-1]), s.get_point(tail)) - 2.0) < 1e-6
+        _, errors = s.constraint_errors()
+        assert max(abs(errors)) < 1e-6
+
+
+def test_solve_block_larger_than_a_cluster():
+    """A square whose corners can only be placed together solves, with what depends on it."""
+    for alg in [Algorithm.DogLeg, Algorithm.BFGS, Algorithm.LevenbergMarquardt, Algorithm.LBFGS]:
+        s = Sketch()
+        corners = [(0, 0), (1, 0), (1, 1), (0, 1)]
+        anchors = [(-0.6, -0.8), (1.8, -0.6), (1.6, 1.8), (-0.8, 1.6)]
+        points = [s.add_point(x + 0.05 * (i % 2), y - 0.04) for i, (x, y) in enumerate(corners)]
+        for p, (x, y) in zip(points, anchors, strict=True):
+            s.set_p2p_distance(s.add_fixed_point(x, y), p, 1.0)
+        for i in range(4):
+            s.set_p2p_distance(points[i], points[(i + 1) % 4], 1.0)
+        apex = s.add_point(0.6, -0.9)  # placed by the square
+        s.set_p2p_distance(points[0], apex, 1.0)
+        s.set_p2p_distance(points[1], apex, 1.0)
+        free = s.add_point(3, 3)  # turns around a corner
+        s.set_p2p_distance(points[2], free, 2.0)
+        assert s.dof() == 1
+
+        assert s.solve(alg) == SolveStatus.Success
+        for p, corner in zip(points, corners, strict=True):
+            assert math.dist(s.get_point(p), corner) < 1e-6
+        assert math.dist(s.get_point(apex), (0.5, -math.sqrt(0.75))) < 1e-6
+        _, errors = s.constraint_errors()
+        assert max(abs(errors)) < 1e-6
+
+
+def _construction_sketch():
+    """Points each held by two constraints, which placing solves in closed form."""
+    s = Sketch()
+    a = s.add_fixed_point(0, 0)
+    b = s.add_fixed_point(4, 0)
+    base = s.add_line(a, b)
+    p1 = s.add_point(3.5, 2)  # two distances
+    s.set_p2p_distance(a, p1, 5.0)
+    s.set_p2p_distance(b, p1, 3.0)
+    p2 = s.add_point(0.5, 1)  # a distance and an angle
+    s.set_p2p_distance(a, p2, 2.0)
+    s.solver.p2p_angle(a, p2, s.add_param(math.pi / 2))
+    p3 = s.add_point(6, 0.5)  # on a line, at a distance
+    s.point_on_line(p3, base)
+    s.set_p2p_distance(p1, p3, 3.5)
+    circle = s.add_circle(s.add_point(1.4, 0.7), 0.8)  # tangent to two lines
+    s.set_circle_radius(circle, 1.0)
+    s.tangent_line_circle(base, circle)
+    s.tangent_line_circle(s.add_line(a, p2), circle)
+    return s, p1, p2, p3, circle
+
+
+def test_solve_places_points_in_closed_form():
+    """Points held by two constraints are placed before solving, to the same solution."""
+    for place in [True, False]:
+        s, p1, p2, p3, circle = _construction_sketch()
+        assert s.solve(place=place) == SolveStatus.Success
+        stats = s.solve_stats()
+        if place:
+            assert stats == SolveStats(iterations=0, placed=4, skipped=0)
+        else:
+            assert stats.iterations > 0 and stats.placed == 0
+        assert math.dist(s.get_point(p1), (4, 3)) < 1e-8
+        assert math.dist(s.get_point(p2), (0, 2)) < 1e-8
+        assert math.dist(s.get_point(p3), (4 + math.sqrt(3.25), 0)) < 1e-8
+        assert math.dist(s.get_circle(circle).center, (1, 1)) < 1e-8
+
+
+def test_solve_does_not_place_by_default():
+    """Placing is opt-in: a solve without it runs the numerical solvers from
+    the current coordinates, as it did before placing was added."""
+    default, p1, p2, p3, _ = _construction_sketch()
+    unplaced, *_ = _construction_sketch()
+    assert default.solve() == unplaced.solve(place=False) == SolveStatus.Success
+    assert default.solve_stats() == unplaced.solve_stats()
+    assert default.solve_stats().placed == 0
+    for p in [p1, p2, p3]:
+        assert default.get_point(p) == unplaced.get_point(p)
+
+
+def test_lbfgs_solves_under_constrained_grid():
+    """L-BFGS keeps a short history, and still solves a floppy grid of squares."""
+    s = Sketch()
+    side = s.add_param(1.0)
+    grid = {}
+    for i in range(8):
+        for j in range(8):
+            if i == j == 0:
+                grid[i, j] = s.add_fixed_point(0, 0)
+            else:
+                grid[i, j] = s.add_point(i + 0.03 * ((7 * i + 3 * j) % 5 - 2), j)
+            if i:
+                s.p2p_distance(grid[i - 1, j], grid[i, j], side)
+            if j:
+                s.p2p_distance(grid[i, j - 1], grid[i, j], side)
+    assert s.dof() > 0
+
+    for length in [1.0, 1.05]:
+        s.set_param(side, length)
+        assert s.solve(Algorithm.LBFGS) in (SolveStatus.Success, SolveStatus.Converged)
+        assert s.solve_stats().iterations > 10  # more than the history holds
+        _tags, errors = s.constraint_errors()
+        assert abs(errors).max() < 1e-8
+
+
+def test_solve_skips_unchanged_parts():
+    """Only the unconnected parts an edit changed are solved again."""
+    s = Sketch()
+    sides = []
+    apexes = []
+    for x in (0, 10):
+        p1 = s.add_fixed_point(x, 0)
+        p2 = s.add_point(x + 4, 0.5)
+        p3 = s.add_point(x + 2, 3)
+        s.p2p_distance(p1, p2, s.add_param(4.0))
+        s.horizontal(s.add_line(p1, p2))
+        sides.append(s.add_param(3.0))
+        s.p2p_distance(p2, p3, sides[-1])
+        s.set_p2p_distance(p3, p1, 3.0)
+        apexes.append(p3)
+
+    assert s.solve(place=False) == SolveStatus.Success
+    assert s.solve_stats().skipped == 0
+    assert s.solve(place=False) == SolveStatus.Success
+    assert s.solve_stats() == SolveStats(iterations=0, placed=0, skipped=2)
+
+    other = s.get_point(apexes[1])
+    s.set_param(sides[0], 3.5)
+    assert s.solve(place=False) == SolveStatus.Success
+    stats = s.solve_stats()
+    assert stats.skipped == 1 and stats.iterations > 0
+    assert s.get_point(apexes[1]) == other
+    _tags, errors = s.constraint_errors()
+    assert abs(errors).max() < 1e-8
+
+    # moving an unknown counts as a change as well: the last one is the apex of the second
+    unknowns = s.solver.param_values(False)
+    unknowns[-1] += 1.0
+    s.solver.set_param_values(unknowns, False)
+    assert s.solve(place=False) == SolveStatus.Success
+    assert s.solve_stats().skipped == 1
+    assert s.get_point(apexes[1]) == pytest.approx(other)
+
+
+def test_remove_geometry():
+    """Geometry goes with what depends on it, and compact() keeps the ids."""
+    s = Sketch()
+    p1 = s.add_fixed_point(0, 0)
+    p2 = s.add_point(4, 0.5)
+    line = s.add_line(p1, p2)
+    horizontal = s.horizontal(line)
+    distance = s.set_p2p_distance(p1, p2, 5.0)
+    circle = s.add_circle(p2, 1.0)
+    radius = s.set_circle_radius(circle, 2.0)
+    p3 = s.add_point(1, 1)
+    s.fix_point(p3, 1, 2)
+    arc_radius = s.add_param(3.0)
+    arc = s.add_arc_from_start_end(p3, p1, arc_radius)
+    assert s.solve() == SolveStatus.Success
+
+    assert s.remove_geometry([line]) == Removed([line], [horizontal], [])
+    assert s.dof() == 1
+
+    removed = s.remove_geometry([p2])
+    assert removed.geometry == [p2, circle]
+    assert removed.constraints == [distance, radius]
+    assert len(removed.params) == 5  # x, y, the radius, and the values of the constraints
+    with pytest.raises(IndexError):
+        s.get_point(p2)
+    with pytest.raises(IndexError):
+        s.remove_geometry([p3, p2])
+    assert s.get_point(p3) == pytest.approx((1, 2))
+
+    # the arc is built on its radius, and on a center and end points made for it
+    removed = s.remove_params([arc_radius])
+    assert removed.geometry[-1] == arc and len(removed.geometry) == 4
+    assert len(removed.constraints) == 3  # the arc rules, and its ends on p3 and p1
+    assert s.dof() == 0
+    s.remove_geometry([p3])
+    assert s.solver.param_values(False).size == 2  # what is left: the fixed point p1
+
+    p4 = s.add_point(3, 3)
+    s.vertical(s.add_line(p1, p4))
+    s.set_p2p_distance(p1, p4, 2.0)
+    values = s.solver.param_values()
+    s.compact()
+    assert (s.solver.param_values() == values).all()
+    assert s.solve() == SolveStatus.Success
+    assert s.get_point(p4) == pytest.approx((0, 2))
+    assert s.moved(1e-9).points == [p4]
+
+
+def test_constraint_on_unknown_ids():
+    """A constraint on ids that do not exist raises and leaves no tag behind."""
+    s = Sketch()
+    p1 = s.add_point(0, 0)
+    p2 = s.add_point(1, 1)
+    line = s.add_line(p1, p2)
+    distance = s.add_param(2.0)
+    usage = s.solver.memory_usage()
+    with pytest.raises(IndexError):
+        s.point_on_line(cast(PointId, line), cast(LineId, p1))  # the ids swapped
+    with pytest.raises(IndexError):
+        s.p2p_distance(p1, p2, cast(ParamId, distance + 1))
+    assert s.solver.memory_usage() == usage
+    tag = s.horizontal(line)
+    assert tag == 1
+    assert s.remove_geometry([p1]).constraints == [tag]
+
+
+def test_transaction():
+    """A transaction undoes the changes made in it if it raises or its last solve fails."""
+    s = Sketch()
+    p1 = s.add_fixed_point(0, 0)
+    p2 = s.add_point(4, 0.5)
+    line = s.add_line(p1, p2)
+    horizontal = s.horizontal(line)
+    width = s.add_param(4.0)
+    s.p2p_distance(p1, p2, width)
+    assert s.solve() == SolveStatus.Success
+    solved = s.get_point(p2)
+
+    with s.transaction() as t:
+        s.set_param(width, 6.0)
+        p3 = s.add_point(1, 1)
+        s.add_circle(p3, 2.0)
+        s.vertical(line)
+        assert s.solver.in_transaction()
+        assert s.solve() == SolveStatus.Failed
+    assert t.rolled_back
+    assert not s.solver.in_transaction()
+    assert s.get_param(width) == 4.0
+    assert s.get_point(p2) == solved
+    with pytest.raises(IndexError):
+        s.get_point(p3)
+    assert s.dof() == 0
+    # the plan of the solve before the transaction is back, and nothing changed since
+    assert s.solve() == SolveStatus.Success
+    assert s.solve_stats().skipped == 1
+
+    with pytest.raises(KeyError), s.transaction() as t:
+        s.set_param(width, 6.0)
+        s.clear_by_tags([horizontal])
+        raise KeyError
+    assert t.rolled_back
+    assert s.get_param(width) == 4.0
+    assert s.dof() == 0
+
+    with s.transaction() as t:
+        with pytest.raises(RuntimeError):
+            s.clear()
+        with pytest.raises(RuntimeError), s.transaction():
+            pass  # pragma: no cover
+        s.set_param(width, 6.0)
+        p3 = s.add_point(1, 1)
+        assert s.solve() == SolveStatus.Success
+    assert not t.rolled_back
+    assert s.get_point(p2) == pytest.approx((6.0, 0.0))
+    assert s.get_point(p3) == (1, 1)
+    with pytest.raises(RuntimeError):
+        s.solver.commit()
+
+    # removals are rolled back as well
+    with pytest.raises(KeyError), s.transaction() as t:
+        with pytest.raises(RuntimeError):
+            s.compact()
+        s.remove_geometry([p2])
+        p4 = s.add_point(2, 2)
+        s.remove_params([width])
+        assert s.solve() == SolveStatus.Success
+        raise KeyError
+    assert s.get_point(p2) == pytest.approx((6.0, 0.0))
+    assert s.solve() == SolveStatus.Success
+    assert s.solve_stats().skipped == 1
+    assert s.add_point(3, 3) == p4
+
+
+def test_memory_usage():
+    """The breakdown grows with the sketch, and with what solving works out."""
+    s = Sketch()
+    assert s.memory_usage().transaction == 0
+
+    def add_square(x):
+        p1 = s.add_fixed_point(x, 0)
+        p2 = s.add_point(x + 1, 0.1)
+        line = s.add_line(p1, p2)
+        s.horizontal(line)
+        s.set_p2p_distance(p1, p2, 2.0)
+        s.add_circle(p2, 1.0)
+
+    add_square(0)
+    small = s.memory_usage()
+    for i in range(1, 20):
+        add_square(10 * i)
+    large = s.memory_usage()
+    assert large.params > small.params
+    assert large.geometry > small.geometry
+    assert large.constraints > small.constraints
+    assert large.subsystems == 0
+
+    assert s.solve() == SolveStatus.Success
+    solved = s.memory_usage()
+    assert solved.subsystems > 0
+    assert solved.adjacency > large.adjacency
+    assert solved.diagnosis > large.diagnosis
+    assert solved.total == sum(astuple(solved))
+
+    with s.transaction():
+        add_square(1000)
+        assert s.solve() == SolveStatus.Success
+        assert s.memory_usage().transaction > 0
+
+
+def test_moved():
+    """The geometry a solve moved is reported, and nothing else."""
+    s = Sketch()
+    p1 = s.add_fixed_point(0, 0)
+    p2 = s.add_point(4, 0.5)
+    p3 = s.add_point(2, 3)
+    base = s.add_line(p1, p2)
+    s.horizontal(base)
+    s.set_p2p_distance(p1, p2, 4.0)
+    side = s.add_param(3.0)
+    s.p2p_distance(p2, p3, side)
+    s.set_p2p_distance(p3, p1, 3.0)
+    sides = [s.add_line(p2, p3), s.add_line(p3, p1)]
+    circle = s.add_circle(s.add_fixed_point(10, 0), 1.5)
+    s.set_circle_radius(circle, 1.0)
+
+    assert s.solve() == SolveStatus.Success
+    moved = s.moved()
+    assert list(moved.points) == [p2, p3]
+    assert list(moved.lines) == [base, *sides]
+    assert list(moved.circles) == [circle]
+    assert len(moved.arcs) == len(moved.ellipses) == 0
+
+    s.set_param(side, 3.5)
+    assert s.solve() == SolveStatus.Success
+    moved = s.moved()
+    assert list(moved.points) == [p3]
+    assert list(moved.lines) == sides
+    assert len(moved.circles) == 0
+    assert len(s.moved(tolerance=10.0).points) == 0
+
+    arc = s.add_arc_from_center(s.add_point(0, 5), 1.0, 0.0, math.pi / 2)
+    assert list(s.moved().arcs) == [arc]  # added since
+    assert list(s.moved().lines) == sides
+
+
+def test_sensitivity():
+    """Derivatives of the solution match finite differences of solves."""
+    s = Sketch()
+    p1 = s.add_fixed_point(0, 0)
+    p2 = s.add_point(4, 0.5)
+    p3 = s.add_point(2, 3)
+    s.horizontal(s.add_line(p1, p2))
+    dims = [s.add_param(4.0), s.add_param(3.0), s.add_param(3.5)]
+    s.p2p_distance(p1, p2, dims[0])
+    s.p2p_distance(p2, p3, dims[1])
+    s.p2p_distance(p3, p1, dims[2])
+    free = s.add_point(9, 9)
+    assert s.solve() == SolveStatus.Success
+
+    unknowns, matrix = s.sensitivity(dims)
+    assert matrix.shape == (len(unknowns), 3)
+    rows = {param: i for i, param in enumerate(unknowns)}
+    solved = s.solver.param_values(False)
+    for j, dim in enumerate(dims):
+        value = s.get_param(dim)
+        s.set_param(dim, value + 1e-6)
+        assert s.solve() == SolveStatus.Success
+        changed = (s.solver.param_values(False) - solved) / 1e-6
+        assert changed == pytest.approx(matrix[:, j], abs=1e-4)
+        s.set_param(dim, value)
+        assert s.solve() == SolveStatus.Success
+    # x of p3 = (base² + c² - a²) / (2 base), with a the side from p2 and c the one from p1
+    assert matrix[rows[s.get_point_params(p3)[0]], 1] == pytest.approx(-3.0 / 4.0)
+    assert not matrix[[rows[p] for p in s.get_point_params(free)]].any()
+
+    with pytest.raises(ValueError, match="is an unknown"):
+        s.sensitivity([s.get_point_params(p3)[0]])
+
+    s.p2p_distance(p1, p2, dims[0])  # redundant
+    assert s.solve() == SolveStatus.Success
+    redundant_unknowns, redundant_matrix = s.sensitivity(dims)
+    assert list(redundant_unknowns) == list(unknowns)
+    assert redundant_matrix == pytest.approx(matrix, abs=1e-9)
+
+
+def _dimensioned_triangle(base, side, *, driving=True):
+    s = Sketch()
+    p1 = s.add_fixed_point(0, 0)
+    p2 = s.add_point(4, 0.5)
+    p3 = s.add_point(2, 3)
+    s.horizontal(s.add_line(p1, p2))
+    s.add_line(p2, p3)
+    s.add_line(p3, p1)
+    s.set_p2p_distance(p1, p2, base)
+    s.solver.p2p_distance(p2, p3, s.add_param(side), driving)
+    s.set_p2p_distance(p3, p1, side)
+    return s, p3
+
+
+def test_solution_cache():
+    """Sketches of the same structure and dimensions are solved once."""
+    cache = SolutionCache(maxsize=2)
+    s, p3 = _dimensioned_triangle(4.0, 3.0)
+    assert s.solve(cache=cache) == SolveStatus.Success
+    solved = s.get_point(p3)
+    assert cache.stats() == CacheStats(hits=0, misses=1, warm_starts=0, size=1, maxsize=2)
+
+    s, p3 = _dimensioned_triangle(4.0, 3.0)
+    assert s.solve(cache=cache) == SolveStatus.Success
+    assert s.get_point(p3) == solved
+    assert cache.stats().hits == 1
+
+    # other dimensions, structure or algorithm miss
+    for s, _ in [_dimensioned_triangle(5.0, 3.0), _dimensioned_triangle(4.0, 3.0, driving=False)]:
+        assert s.solve(cache=cache) in (SolveStatus.Success, SolveStatus.Converged)
+    s, _ = _dimensioned_triangle(4.0, 3.0)
+    assert s.solve(Algorithm.LevenbergMarquardt, cache=cache) == SolveStatus.Success
+    assert cache.stats() == CacheStats(hits=1, misses=4, warm_starts=1, size=2, maxsize=2)
+
+    # the least recently used solutions are evicted
+    s, _ = _dimensioned_triangle(4.0, 3.0)
+    assert s.solve(cache=cache) == SolveStatus.Success
+    assert cache.stats().misses == 5
+    cache.maxsize = 1
+    s, _ = _dimensioned_triangle(4.0, 3.0)
+    s.solve(cache=cache)
+    assert cache.stats() == CacheStats(hits=2, misses=5, warm_starts=1, size=1, maxsize=1)
+
+    # failed solves, also from the nearest solution, are neither warm starts nor kept,
+    # and a cache of size 0 keeps nothing
+    s, _ = _dimensioned_triangle(4.0, 1.0)
+    assert s.solve(cache=cache) == SolveStatus.Failed
+    assert cache.stats().warm_starts == 1
+    cache.maxsize = 0
+    s, _ = _dimensioned_triangle(4.0, 3.0)
+    s.solve(cache=cache)
+    assert len(cache) == 0
+    cache.clear()
+    assert cache.stats() == CacheStats(hits=0, misses=0, warm_starts=0, size=0, maxsize=0)
+    assert SolutionCache().maxsize == 128
+    with pytest.raises(ValueError):
+        cache.maxsize = -1
+
+
+def test_solution_cache_warm_start():
+    """Misses start from the cached solution with the nearest dimensions."""
+    iterations = {}
+    for warm_start in [False, True]:
+        cache = SolutionCache(warm_start=warm_start)
+        iterations[warm_start] = 0
+        for i in range(10):
+            s, p3 = _dimensioned_triangle(4.0, 3.0 + 0.05 * i)
+            assert s.solve(cache=cache) == SolveStatus.Success
+            iterations[warm_start] += s.solve_stats().iterations
+            x, y = s.get_point(p3)
+            assert abs(x - 2.0) < 1e-8 and y > 0
+        assert cache.stats().warm_starts == (9 if warm_start else 0)
+    assert iterations[True] < iterations[False]
+
+
+def test_param_values():
+    """All parameters can be read and restored at once, in ID order."""
+    s, p3 = _dimensioned_triangle(4.0, 3.0)
+    before = s.solver.param_values()
+    fixed = s.solver.param_values(True)
+    assert len(fixed) + len(s.solver.param_values(False)) == len(before)
+    hash_before = s.solver.structure_hash()
+    assert s.solve() == SolveStatus.Success
+    assert s.solver.structure_hash() == hash_before
+    assert (s.solver.param_values(True) == fixed).all()
+
+    s.solver.set_param_values(before)
+    assert s.get_point(p3) == (2.0, 3.0)
+    with pytest.raises(ValueError):
+        s.solver.set_param_values(before[1:])
+    s.solver.set_param_values(fixed * 2, True)
+    assert (s.solver.param_values(True) == fixed * 2).all()
@@ -2,7 +2,10 @@
 
 import math
 
-from planegcs import Sketch, SketchSolver, SolveStatus
+import numpy as np
+import pytest
+
+from planegcs import Algorithm, Sketch, SketchSolver, SolveStatus
 
 
 def _dist(p1, p2):
@@ -227,6 +230,22 @@ def test_clear_by_tag():
     solver.clear_by_tag(tag)  # should not crash
 
 
+def test_clear_by_tags():
+    """Removing the constraints of several tags at once."""
+    solver = SketchSolver()
+    p1 = solver.add_point(0, 0)
+    p2 = solver.add_point(5, 0)
+    p3 = solver.add_point(0, 5)
+    d = solver.add_param(4.0, True)
+    t1 = solver.p2p_distance(p1, p2, d)
+    t2 = solver.p2p_distance(p1, p3, d)
+    t3 = solver.coincident(p2, p3)
+    solver.clear_by_tags([t1, t3, 12345])
+    assert math.isnan(solver.constraint_error(t1))
+    assert math.isnan(solver.constraint_error(t3))
+    assert abs(solver.constraint_error(t2) - 1.0) < 1e-12
+
+
 def test_horizontal_vertical_points():
     """Horizontal/vertical constraints between points."""
     s = Sketch()
@@ -244,3 +263,200 @@ def test_horizontal_vertical_points():
     pt3 = s.get_point(p3)
     assert abs(pt2[1]) < 1e-6  # same y as p1
     assert abs(pt3[0]) < 1e-6  # same x as p1
+
+
+def test_proportional():
+    """Proportional constraint between two unknowns keeps its ratio."""
+    solver = SketchSolver()
+    a = solver.add_param(1.0, False)
+    b = solver.add_param(5.0, False)
+    c = solver.add_param(3.0, True)
+    solver.proportional(a, b, 2.0)
+    solver.equal(b, c)
+    assert solver.solve() == SolveStatus.Success
+    assert abs(solver.get_param(a) - 6.0) < 1e-8
+    assert abs(solver.get_param(b) - 3.0) < 1e-8
+
+
+def test_conflicting_fixed_coordinates():
+    """Equalities tying a point to two different fixed positions fail to solve."""
+    s = Sketch()
+    p1 = s.add_fixed_point(0, 0)
+    p2 = s.add_fixed_point(1, 0)
+    p3 = s.add_point(3, 3)
+    s.coincident(p1, p3)
+    s.coincident(p2, p3)
+    assert s.solve() == SolveStatus.Failed
+    assert s.get_point(p3) == (3.0, 3.0)
+
+
+def test_substitution_with_other_constraints():
+    """Points substituted from fixed coordinates still drive other constraints."""
+    for alg in [Algorithm.DogLeg, Algorithm.BFGS, Algorithm.LevenbergMarquardt, Algorithm.LBFGS]:
+        s = Sketch()
+        a = s.add_fixed_point(1, 2)
+        b = s.add_point(0.5, 2.5)
+        s.coincident(a, b)
+        c = s.add_point(3.5, 1.5)
+        s.horizontal_points(b, c)
+        s.set_p2p_distance(b, c, 3.0)
+        d = s.add_point(1.5, 3.5)
+        s.vertical_points(a, d)
+        circle = s.add_circle(b, 2.5)
+        s.set_circle_radius(circle, 2.0)
+        s.point_on_circle(d, circle)
+        e = s.add_point(2.5, 5.0)
+        s.fix_point(e, 3.0, 4.5)
+        f = s.add_point(2.5, 4.0)
+        s.point_on_line(f, s.add_line(d, e))
+        s.set_p2p_distance(e, f, 1.0)
+        assert s.dof() == 0
+
+        assert s.solve(alg) == SolveStatus.Success
+        assert s.get_point(b) == pytest.approx((1.0, 2.0))
+        assert s.get_point(c) == pytest.approx((4.0, 2.0))
+        assert s.get_point(d) == pytest.approx((1.0, 4.0))
+        assert s.get_point(e) == pytest.approx((3.0, 4.5))
+        fx, fy = s.get_point(f)
+        assert _dist((fx, fy), (3.0, 4.5)) == pytest.approx(1.0)
+        assert (fx - 1.0) * 0.5 == pytest.approx((fy - 4.0) * 2.0)
+        assert max(s.constraint_errors()[1]) < 1e-9
+
+
+def test_substitution_conflicts_with_other_constraints():
+    """A substituted point that cannot meet its other constraints is diagnosed."""
+    s = Sketch()
+    a = s.add_fixed_point(0, 0)
+    b = s.add_fixed_point(1, 0)
+    p = s.add_point(0.5, 0.5)
+    s.coincident(a, p)
+    tag = s.set_p2p_distance(b, p, 3.0)
+    assert s.solve() == SolveStatus.Failed
+    assert s.get_point(p) == (0.5, 0.5)
+    assert tag in s.diagnose().conflicting
+
+
+def test_substitution_leaving_no_unknowns():
+    """A point tied to fixed points that agree is solved when no unknowns are
+    left to the solver, the remaining equalities holding at their values."""
+    for alg in [Algorithm.DogLeg, Algorithm.BFGS, Algorithm.LevenbergMarquardt, Algorithm.LBFGS]:
+        s = Sketch()
+        p = s.add_point(-9, -3.5)
+        s.coincident(s.add_fixed_point(3, -4), p)
+        s.coincident(s.add_fixed_point(3, -4), p)
+        s.fix_point(p, 3, -4)
+        assert s.solve(alg) == SolveStatus.Success
+        assert s.get_point(p) == (3.0, -4.0)
+
+
+def test_substitution_retried_unsubstituted():
+    """A component that fails with fixed values substituted is solved again
+    with its unknowns left to the solver. Here the substitution collapses a
+    line whose point_on_line is only rounding noise."""
+    for alg in [Algorithm.DogLeg, Algorithm.BFGS, Algorithm.LevenbergMarquardt, Algorithm.LBFGS]:
+        s = Sketch()
+        p = s.add_point(0.42, -4.73)
+        origin = s.add_fixed_point(0, 0)
+        s.point_on_line(p, s.add_line(p, origin))
+        s.coincident(p, origin)
+        assert s.solve(alg) == SolveStatus.Success
+        assert s.get_point(p) == pytest.approx((0.0, 0.0))
+        # solved again, from the plan the retry left
+        for param in s.get_point_params(p):
+            s.set_param(param, 1.0)
+        assert s.solve(alg) == SolveStatus.Success
+        assert s.get_point(p) == pytest.approx((0.0, 0.0))
+
+
+def test_substitution_follows_fixed_params():
+    """Changing a fixed coordinate moves the points substituted from it."""
+    s = Sketch()
+    px = s.add_param(1.0)
+    py = s.add_param(2.0)
+    a = s.add_point(0.7, 2.4)
+    s.solver.coordinate_x(a, px)
+    s.solver.coordinate_y(a, py)
+    b = s.add_point(0.2, 0.1)
+    s.coincident(a, b)
+    c = s.add_point(3.0, 1.0)
+    s.horizontal(s.add_line(b, c))
+    s.set_p2p_distance(b, c, 3.0)
+    assert s.solve() == SolveStatus.Success
+    assert s.get_point(c) == pytest.approx((4.0, 2.0))
+
+    s.set_param(px, -1.0)
+    s.set_param(py, 5.0)
+    assert s.solve() == SolveStatus.Success
+    assert s.get_point(a) == pytest.approx((-1.0, 5.0))
+    assert s.get_point(b) == pytest.approx((-1.0, 5.0))
+    assert s.get_point(c) == pytest.approx((2.0, 5.0))
+
+
+def test_substitution_contradicting_fixed_geometry():
+    """Equalities against fixed values that contradict each other do not
+    solve, whether unknowns are substituted or none are left at all."""
+    for alg in [Algorithm.DogLeg, Algorithm.BFGS, Algorithm.LevenbergMarquardt, Algorithm.LBFGS]:
+        s = Sketch()
+        q = s.add_point(2, 2, fixed=True)
+        p = s.add_point(0.5, 0.5)
+        s.fix_point(p, 1, 1)
+        s.coincident(p, q)
+        if alg in (Algorithm.BFGS, Algorithm.LBFGS):
+            # the minimizers settle for the least-squares compromise
+            assert s.solve(alg) == SolveStatus.Converged
+            assert s.get_point(p) == pytest.approx((1.5, 1.5))
+        else:
+            assert s.solve(alg) == SolveStatus.Failed
+            assert s.get_point(p) == (0.5, 0.5)
+
+        s = Sketch()
+        q = s.add_point(2, 2, fixed=True)
+        x = s.add_param(3.0)
+        tag = s.solver.coordinate_x(q, x)
+        assert s.solve(alg) == SolveStatus.Failed
+        assert s.diagnose().conflicting == [tag]
+        s.set_param(x, 2.0)
+        assert s.solve(alg) == SolveStatus.Success
+        assert s.diagnose().redundant == [tag]
+
+
+def test_constraint_errors():
+    """All tag errors at once agree with constraint_error per tag."""
+    solver = SketchSolver()
+    p1 = solver.add_point(0, 0)
+    p2 = solver.add_point(3, 4)
+    p3 = solver.add_point(1, 1)
+    d = solver.add_param(2.0, True)
+    ref = solver.add_param(0.0, True)
+    t1 = solver.p2p_distance(p1, p2, d)
+    t2 = solver.coincident(p1, p3)
+    t3 = solver.p2p_distance(p1, p3, ref, False)
+    solver.clear_by_tag(t2)
+    t4 = solver.coincident(p2, p3)
+
+    tags, errors = solver.constraint_errors()
+    assert tags.dtype == np.int32
+    assert errors.dtype == np.float64
+    assert tags.tolist() == [t1, t3, t4]
+    for tag, err in zip(tags, errors, strict=True):
+        assert err == solver.constraint_error(tag)
+
+    tags, errors = solver.constraint_errors(driving=False)
+    assert tags.tolist() == [t3]
+    assert errors[0] == solver.constraint_error(t3)
+    tags, errors = solver.constraint_errors(driving=True)
+    assert tags.tolist() == [t1, t4]
+
+
+def test_sketch_constraint_errors():
+    """Sketch.constraint_errors reports residuals before and after solving."""
+    s = Sketch()
+    p1 = s.add_fixed_point(0, 0)
+    p2 = s.add_point(3, 1)
+    tags = [s.horizontal(s.add_line(p1, p2)), s.set_p2p_distance(p1, p2, 2.0)]
+    found, errors = s.constraint_errors(driving=True)
+    assert found[-2:].tolist() == tags  # after the tags fixing p1
+    assert np.all(np.abs(errors[-2:]) > 0.1)
+    assert s.solve() == SolveStatus.Success
+    _, errors = s.constraint_errors()
+    assert np.all(np.abs(errors) < 1e-8)